@@ -16,6 +16,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import AsyncSessionLocal, User, db_manager
 from app.core.auth import get_current_user, create_spectator_token
 from app.core.processor_client import processor_client
+from app.core.table_catalog import table_catalog
+from app.core.tenant_tables import tenant_table
+from app.core.upload_stream import UploadStream, UploadTooLarge
+from app.core.wine_search import SEARCH_DOCUMENT_COLUMN, ensure_search_index
 from app.core.config import get_settings
 from app.services.app_settings import get_app_setting, set_app_setting
 
@@ -218,13 +222,23 @@ def get_user_table_name(user_id: int, business_name: str, table_type: str) -> st
     """
     Genera nome tabella dinamica utente.
     Formato: "{user_id}/{business_name} {table_type}"
-    Identico a Processor per compatibilità.
+    Identico a Processor per compatibilità; per i tenant migrati alle tabelle
+    condivise ritorna la tabella condivisa (vedi tenant_tables).
     """
     if not business_name:
         business_name = "Upload Manuale"
     
-    table_name = f'"{user_id}/{business_name} {table_type}"'
-    return table_name
+    return tenant_table(user_id, business_name, table_type)
+
+
+async def ensure_inventory_search_index(user_id: int, business_name: str) -> None:
+    """Crea subito colonna e indice di ricerca sulla tabella INVENTARIO appena creata"""
+    try:
+        async with AsyncSessionLocal() as session:
+            await ensure_search_index(session, get_user_table_name(user_id, business_name, "INVENTARIO"))
+    except Exception as e:
+        # search_wines usa la query legacy finché la migrazione all'avvio non crea l'indice
+        logger.warning(f"Indice ricerca non creato per user_id={user_id}: {e}")
 
 
 async def get_user_table_info(user_id: int) -> tuple[Optional[User], Optional[str]]:
@@ -780,6 +794,14 @@ async def create_user(
         password = secrets.token_urlsafe(12)
         logger.info(f"[CREATE_USER] Password generata automaticamente")
     
+    # File letto a blocchi: limite di dimensione verificato prima di creare l'utente
+    upload = None
+    if file:
+        try:
+            upload = await UploadStream(file).prepare()
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    
     # Crea utente nel database prima di chiamare Processor
     async with AsyncSessionLocal() as session:
         # Verifica email già esistente
@@ -809,8 +831,8 @@ async def create_user(
                     user_id=user.id,
                     business_name=business_name
                 )
+                await ensure_inventory_search_index(user.id, business_name)
                 
-                file_content = await file.read()
                 file_name = file.filename or f"onboarding_{user.id}.{file_type}"
                 
                 # POI inserisci l'inventario usando admin_insert_inventory (stesso comportamento admin bot)
@@ -818,7 +840,7 @@ async def create_user(
                 result = await processor_client.admin_insert_inventory(
                     user_id=user.id,
                     business_name=business_name,
-                    file_content=file_content,
+                    file_content=upload,  # Inviato in streaming a blocchi
                     file_name=file_name,
                     mode="replace"  # Replace per onboarding: sostituisce inventario esistente
                 )
@@ -843,6 +865,7 @@ async def create_user(
                     user_id=user.id,
                     business_name=business_name
                 )
+                await ensure_inventory_search_index(user.id, business_name)
                 return {
                     "user_id": user.id,
                     "message": "Utente creato e tabelle inizializzate",
@@ -1146,6 +1169,8 @@ async def get_user_table(
             for row in rows:
                 row_dict = {}
                 for key, value in row._mapping.items():
+                    if key == SEARCH_DOCUMENT_COLUMN:
+                        continue  # colonna generata per la ricerca, non dati utente
                     # Converti datetime in string
                     if hasattr(value, 'isoformat'):
                         row_dict[key] = value.isoformat()
@@ -1190,7 +1215,7 @@ async def update_table_row(
             params = {"row_id": row_id, "user_id": user.id}
             
             for key, value in data.model_dump(exclude_unset=True).items():
-                if key not in ["id", "user_id"]:  # Non permettere modifica ID
+                if key not in ["id", "user_id", SEARCH_DOCUMENT_COLUMN]:  # Non permettere modifica ID (né della colonna generata)
                     update_fields.append(f"{key} = :{key}")
                     params[key] = value
             
@@ -1198,16 +1223,8 @@ async def update_table_row(
                 raise HTTPException(status_code=400, detail="Nessun campo da aggiornare")
             
             # Aggiungi updated_at se esiste
-            try:
-                check_updated_at = sql_text(f"""
-                    SELECT column_name FROM information_schema.columns
-                    WHERE table_name = :table_name AND column_name = 'updated_at'
-                """)
-                result = await session.execute(check_updated_at, {"table_name": full_table_name.replace('"', '')})
-                if result.fetchone():
-                    update_fields.append("updated_at = CURRENT_TIMESTAMP")
-            except:
-                pass
+            if await table_catalog.has_column(session, full_table_name, "updated_at"):
+                update_fields.append("updated_at = CURRENT_TIMESTAMP")
             
             update_query = sql_text(f"""
                 UPDATE {full_table_name}
@@ -1227,6 +1244,8 @@ async def update_table_row(
             # Converti risultato in dict
             row_dict = {}
             for key, value in row._mapping.items():
+                if key == SEARCH_DOCUMENT_COLUMN:
+                    continue
                 if hasattr(value, 'isoformat'):
                     row_dict[key] = value.isoformat()
                 else:
@@ -1307,14 +1326,7 @@ async def create_table_row(
     async with AsyncSessionLocal() as session:
         try:
             # Ottieni colonne della tabella
-            columns_query = sql_text("""
-                SELECT column_name, data_type
-                FROM information_schema.columns
-                WHERE table_name = :table_name
-                ORDER BY ordinal_position
-            """)
-            result = await session.execute(columns_query, {"table_name": full_table_name.replace('"', '')})
-            columns = {row[0]: row[1] for row in result.fetchall()}
+            columns = await table_catalog.columns(session, full_table_name)
             
             # Prepara INSERT
             insert_fields = ["user_id"]
@@ -1322,7 +1334,7 @@ async def create_table_row(
             params = {"user_id": user.id}
             
             for key, value in data.model_dump(exclude_unset=True).items():
-                if key in columns and key != "id":  # id è auto-increment
+                if key in columns and key not in ("id", SEARCH_DOCUMENT_COLUMN):  # id è auto-increment, search_document generata
                     insert_fields.append(key)
                     insert_values.append(f":{key}")
                     params[key] = value
@@ -1349,6 +1361,8 @@ async def create_table_row(
             # Converti risultato in dict
             row_dict = {}
             for key, value in row._mapping.items():
+                if key == SEARCH_DOCUMENT_COLUMN:
+                    continue
                 if hasattr(value, 'isoformat'):
                     row_dict[key] = value.isoformat()
                 else:
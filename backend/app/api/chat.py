@@ -12,6 +12,8 @@ from app.core.database import db_manager
 from app.core.auth import get_current_user
 from app.core.config import get_settings
 from app.services.response_validator import ResponseValidator
+from app.services.request_complexity_analyzer import RequestComplexityAnalyzer
+from app.services.speculative_chat import process_speculative, speculation_stats
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +38,19 @@ else:
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
+_movement_agent = None
+
+
+def _get_movement_agent():
+    """MovementAgent condiviso: riusa quello di AIServiceV2 se attivo, altrimenti lo crea una volta sola"""
+    global _movement_agent
+    if ai_service_v2 is not None:
+        return ai_service_v2.movement
+    if _movement_agent is None:
+        from app.services.agents.movement_agent import MovementAgent
+        _movement_agent = MovementAgent()
+    return _movement_agent
+
 
 class ChatMessage(BaseModel):
     message: str
@@ -114,8 +129,7 @@ async def check_and_process_pending_movements(
         
         # Processa il movimento confermato usando MovementAgent
         logger.info(f"[CHAT] ✅ Rilevata conferma disambiguazione, processo movimento: {first_pending}")
-        from app.services.agents.movement_agent import MovementAgent
-        movement_agent = MovementAgent()
+        movement_agent = _get_movement_agent()
         
         movement_type = first_pending.get("type", "consumo")
         quantity = first_pending.get("quantity", 1)
@@ -292,15 +306,33 @@ async def process_text_message(
         conversation_history = None
     
     # Sistema ibrido: prova prima V1, se non funziona passa a V2
-    logger.info(f"[CHAT] 🔄 Provo prima con AIServiceV1...")
-    result = await ai_service_v1.process_message(
-        user_message=user_message,
-        user_id=user_id,
-        conversation_history=conversation_history
-    )
+    if (
+        ai_service_v2 is not None
+        and settings.SPECULATIVE_V2
+        and not RequestComplexityAnalyzer.is_simple(user_message)
+    ):
+        # Richiesta probabilmente complessa: V1 e V2 in parallelo, vince la prima risposta valida
+        logger.info("[CHAT] 🔀 Richiesta complessa, esecuzione speculativa V1/V2")
+        result = await process_speculative(
+            ai_service_v1,
+            ai_service_v2,
+            user_message=user_message,
+            user_id=user_id,
+            conversation_history=conversation_history,
+            conversation_id=conversation_id
+        )
+    else:
+        logger.info(f"[CHAT] 🔄 Provo prima con AIServiceV1...")
+        result = await ai_service_v1.process_message(
+            user_message=user_message,
+            user_id=user_id,
+            conversation_history=conversation_history
+        )
     
     # Valuta se la risposta è valida usando ResponseValidator
-    if ai_service_v2 is not None and ResponseValidator.should_fallback_to_v2(result):
+    if "speculation" in ((result or {}).get("metadata") or {}):
+        logger.info(f"[CHAT] ✅ Risposta da esecuzione speculativa ({result['metadata']['speculation']['winner']})")
+    elif ai_service_v2 is not None and ResponseValidator.should_fallback_to_v2(result):
         logger.info(f"[CHAT] ⚠️ Risposta V1 non soddisfacente, passo a AIServiceV2 (multi-agent)")
         result = await ai_service_v2.process_message(
             user_message=user_message,
@@ -570,8 +602,9 @@ async def chat_health():
         ai_configured = False
         if ai_service_v1 and hasattr(ai_service_v1, 'client'):
             ai_configured = ai_service_v1.client is not None
-        if ai_service_v2 and hasattr(ai_service_v2, 'router'):
-            ai_configured = ai_configured or (ai_service_v2.router is not None)
+        # V2 usa lo stesso client OpenAI condiviso: non forzare la costruzione del router qui
+        if ai_service_v2 is not None:
+            ai_configured = ai_configured or (ai_service_v2.client is not None)
     except:
         pass
     
@@ -580,6 +613,7 @@ async def chat_health():
         "service": "chat",
         "ai_configured": ai_configured,
         "ai_system": "hybrid" if (ai_service_v2 is not None) else "function-calling",
-        "audio_enabled": True
+        "audio_enabled": True,
+        "speculation": speculation_stats.as_dict() if settings.SPECULATIVE_V2 else None
     }
 
@@ -9,6 +9,10 @@ import logging
 from datetime import datetime
 from app.core.database import AsyncSessionLocal
 from app.services.app_settings import get_app_setting
+from app.core.inventory_cache import inventory_cache
+from app.core.pdf_cache import pdf_cache
+from app.core.table_catalog import table_catalog
+from app.core.tenant_tables import tenant_tables
 
 router = APIRouter(prefix="/api/debug", tags=["debug"])
 
@@ -71,3 +75,44 @@ async def receive_frontend_log(log_data: FrontendLog):
         # Log anche l'errore stesso
         frontend_logger.error(f"Errore nel logging frontend: {e}")
         raise HTTPException(status_code=500, detail=f"Errore nel logging: {str(e)}")
+
+
+@router.get("/inventory-cache")
+async def get_inventory_cache_stats():
+    """
+    Metriche della cache inventario per-tenant (hit/miss, memoria, eviction).
+    """
+    return inventory_cache.stats()
+
+
+@router.get("/pdf-cache")
+async def get_pdf_cache_stats():
+    """
+    Metriche della cache su disco dei PDF dei report (hit/miss, download condivisi, eviction).
+    """
+    return pdf_cache.stats()
+
+
+@router.get("/processor")
+async def get_processor_resilience_stats():
+    """
+    Stato dei circuit breaker e istogrammi di latenza delle chiamate al processor, per endpoint.
+    """
+    from app.core.processor_client import processor_client
+    return processor_client.resilience_stats()
+
+
+@router.get("/table-catalog")
+async def get_table_catalog_stats():
+    """
+    Metriche del catalogo tabelle/colonne (età, caricamenti completi e parziali).
+    """
+    return table_catalog.stats()
+
+
+@router.get("/tenant-tables")
+async def get_tenant_tables_stats():
+    """
+    Modalità storage tabelle tenant e numero di tenant su tabelle condivise.
+    """
+    return tenant_tables.stats()
@@ -1,7 +1,16 @@
 """
 API endpoints per test/connessione Processor
 """
-from fastapi import APIRouter
+import asyncio
+import json
+import secrets
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from app.core.auth import get_current_user
+from app.core.config import get_settings
+from app.core.job_tracker import TERMINAL_STATUSES, job_tracker
 from app.core.processor_client import processor_client
 import logging
 
@@ -9,6 +18,9 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/processor", tags=["processor"])
 
+# Commento SSE periodico: tiene aperta la connessione attraverso i proxy
+SSE_KEEPALIVE_SECONDS = 15.0
+
 
 @router.get("/health")
 async def processor_health():
@@ -16,3 +28,96 @@ async def processor_health():
     result = await processor_client.health_check()
     return result
 
+
+def _status_owner(status: Any) -> Optional[int]:
+    """user_id proprietario del job nello stato restituito dal processor (None se assente)"""
+    if not isinstance(status, dict):
+        return None
+    try:
+        return int(status.get("user_id"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def _owned_job(job_id: str, user_id: int):
+    """
+    Job dell'utente: (job tracciato o None, stato letto dal processor o None).
+    404 se il job è di un altro tenant o se il proprietario non è verificabile:
+    un job non tracciato per l'utente (es. avviato su un'altra replica) viene
+    accettato solo se lo stato del processor riporta lo stesso user_id.
+    """
+    job = job_tracker.get(job_id)
+    if job is not None and job.user_id is not None:
+        if job.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Job non trovato")
+        return job, None
+    status = await processor_client.get_job_status(job_id)
+    if _status_owner(status) != user_id:
+        raise HTTPException(status_code=404, detail="Job non trovato")
+    return job, status
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Ultimo stato noto del job (dal tracker, altrimenti chiesto al processor)"""
+    job, status = await _owned_job(job_id, current_user["user_id"])
+    if job is not None and job.status is not None:
+        return job.status
+    return status if status is not None else await processor_client.get_job_status(job_id)
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request, current_user: dict = Depends(get_current_user)):
+    """
+    Stream SSE dei cambi di stato del job: un evento "status" per ogni cambio,
+    chiuso allo stato finale. Un solo poller per job, condiviso tra i client.
+    """
+    user_id = current_user["user_id"]
+    # Il tracciamento parte solo dopo la verifica del proprietario
+    await _owned_job(job_id, user_id)
+    queue = job_tracker.subscribe(job_id, user_id)
+
+    async def events():
+        try:
+            while True:
+                try:
+                    status = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: status\ndata: {json.dumps(status, default=str)}\n\n"
+                if status.get("status") in TERMINAL_STATUSES:
+                    return
+        finally:
+            job_tracker.unsubscribe(job_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/jobs/callback")
+async def job_callback(
+    payload: Dict[str, Any] = Body(...),
+    x_processor_token: Optional[str] = Header(None)
+):
+    """
+    Callback del processor a fine job (o a ogni cambio di stato): risolve
+    subito i waiter e notifica i client. Richiede PROCESSOR_CALLBACK_TOKEN.
+    """
+    expected = get_settings().PROCESSOR_CALLBACK_TOKEN
+    if not expected:
+        raise HTTPException(status_code=404, detail="Callback non abilitata")
+    if not x_processor_token or not secrets.compare_digest(x_processor_token, expected):
+        raise HTTPException(status_code=401, detail="Token callback non valido")
+    job_id = payload.get("job_id")
+    if not job_id:
+        raise HTTPException(status_code=400, detail="job_id mancante")
+
+    tracked = job_tracker.resolve(str(job_id), payload)
+    logger.info(f"[PROCESSOR] Callback job {job_id}: status={payload.get('status')}, tracciato={tracked}")
+    return {"received": True, "tracked": tracked}
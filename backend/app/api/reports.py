@@ -1,10 +1,12 @@
 from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import Response
 
 from app.core.auth import get_current_user
+from app.core.pdf_cache import CachedPdf, pdf_cache
 from app.services.movements_service import get_movements_for_period
 from app.core.processor_client import processor_client
 
@@ -64,8 +66,44 @@ def _build_simple_pdf(lines: List[str]) -> bytes:
     return output.encode("latin-1", "replace")
 
 
+def _not_modified(request: Request, etag: str, last_modified: float) -> bool:
+    """Richiesta condizionale soddisfatta: If-None-Match (prioritario) o If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        tags = [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def _cached_pdf_response(request: Request, pdf: CachedPdf, filename: str) -> Response:
+    """PDF da pdf_cache con ETag/Last-Modified (304 se il client ha già questa versione)"""
+    etag = f'"{pdf.etag}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(pdf.last_modified, usegmt=True),
+        # Stesso URL, contenuto nuovo dopo movimenti/modifiche: il client rivalida sempre
+        "Cache-Control": "private, no-cache",
+    }
+    if _not_modified(request, etag, pdf.last_modified):
+        return Response(status_code=304, headers=headers)
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return Response(content=await pdf.read(), media_type="application/pdf", headers=headers)
+
+
+def _business_name(current_user: dict) -> Optional[str]:
+    return getattr(current_user.get("user"), "business_name", None)
+
+
 @router.get("/movements/pdf")
 async def download_movements_pdf(
+    request: Request,
     start_date: str = Query(...),
     end_date: str = Query(...),
     period_label: Optional[str] = Query(None),
@@ -89,31 +127,26 @@ async def download_movements_pdf(
         period_description = f"{start.strftime('%d/%m/%Y')} - {end.strftime('%d/%m/%Y')}"
 
     # Prova PDF con stesso stile del report giornaliero (processor)
+    business_name = _business_name(current_user)
+    filename = f"report_movimenti_{start.isoformat()}_{end.isoformat()}.pdf"
     if start == end:
-        pdf_data = await processor_client.get_daily_report_pdf(
+        pdf = await pdf_cache.get(
+            user_id, business_name, "daily", (start.isoformat(),),
+            lambda: processor_client.get_daily_report_pdf(user_id=user_id, report_date=start.isoformat())
+        )
+        if pdf:
+            return await _cached_pdf_response(request, pdf, filename)
+
+    pdf = await pdf_cache.get(
+        user_id, business_name, "movements", (start.isoformat(), end.isoformat()),
+        lambda: processor_client.get_movements_report_pdf_range(
             user_id=user_id,
-            report_date=start.isoformat()
+            start_date=start.isoformat(),
+            end_date=end.isoformat()
         )
-        if pdf_data:
-            filename = f"report_movimenti_{start.isoformat()}_{end.isoformat()}.pdf"
-            return Response(
-                content=pdf_data,
-                media_type="application/pdf",
-                headers={"Content-Disposition": f'attachment; filename="{filename}"'}
-            )
-
-    pdf_data = await processor_client.get_movements_report_pdf_range(
-        user_id=user_id,
-        start_date=start.isoformat(),
-        end_date=end.isoformat()
     )
-    if pdf_data:
-        filename = f"report_movimenti_{start.isoformat()}_{end.isoformat()}.pdf"
-        return Response(
-            content=pdf_data,
-            media_type="application/pdf",
-            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
-        )
+    if pdf:
+        return await _cached_pdf_response(request, pdf, filename)
 
     movements_data = await get_movements_for_period(
         user_id=user_id,
@@ -143,6 +176,9 @@ async def download_movements_pdf(
         consumi = wine_data.get("total_consumi", 0)
         rifornimenti = wine_data.get("total_rifornimenti", 0)
         stock = wine_data.get("current_stock", 0)
+        if "opening_stock" in wine_data:
+            # Stock a inizio e fine periodo (traiettoria calcolata in batch)
+            stock = f"{wine_data['opening_stock']} -> {wine_data['closing_stock']}"
         lines.append(f"- {name}: consumi {consumi}, rifornimenti {rifornimenti}, stock {stock}")
 
     if len(wines) > max_wines:
@@ -160,20 +196,19 @@ async def download_movements_pdf(
 
 @router.get("/inventory/pdf")
 async def download_inventory_stats_pdf(
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
     user_id = current_user.get("user_id") or current_user.get("id")
     if not user_id:
         raise HTTPException(status_code=401, detail="Utente non autenticato.")
 
-    pdf_data = await processor_client.get_inventory_stats_pdf(user_id=user_id)
-    if pdf_data:
-        filename = "report_statistiche_inventario.pdf"
-        return Response(
-            content=pdf_data,
-            media_type="application/pdf",
-            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
-        )
+    pdf = await pdf_cache.get(
+        user_id, _business_name(current_user), "inventory", (),
+        lambda: processor_client.get_inventory_stats_pdf(user_id=user_id)
+    )
+    if pdf:
+        return await _cached_pdf_response(request, pdf, "report_statistiche_inventario.pdf")
 
     # Calcola statistiche inventario
     from app.core.database import db_manager
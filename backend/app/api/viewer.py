@@ -1,9 +1,9 @@
 """
 API endpoints per viewer inventario
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.responses import Response
-from typing import Optional
+from typing import List, Optional
 import logging
 import csv
 import io
@@ -12,6 +12,11 @@ from sqlalchemy import select, text as sql_text
 
 from app.core.auth import get_current_user
 from app.core.database import db_manager, AsyncSessionLocal, User
+from app.core.movements_ledger import movements_ledger
+from app.core.stock_forecast import stock_forecast
+from app.core.stock_trajectories import BUCKETS, TrajectoryTooLarge, stock_trajectories
+from app.core.table_catalog import table_catalog
+from app.core.tenant_tables import INVENTARIO, STORICO_VINO, tenant_table
 
 logger = logging.getLogger(__name__)
 
@@ -45,24 +50,13 @@ async def get_viewer_snapshot(current_user: dict = Depends(get_current_user)):
                 }
             }
 
-        # Usa user_id invece di telegram_id per nome tabella
-        table_name = f'"{user_id}/{business_name} INVENTARIO"'
+        # Usa user_id invece di telegram_id per nome tabella (per-tenant o condivisa)
+        table_name = tenant_table(user_id, business_name, INVENTARIO)
 
         async with AsyncSessionLocal() as session:
-            # Verifica che la tabella esista (nome senza virgolette per information_schema)
+            # Verifica che la tabella esista (catalogo tabelle)
             table_name_check = table_name.strip('"')
-            check_table_query = sql_text("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = :table_name
-                )
-            """)
-            result = await session.execute(
-                check_table_query,
-                {"table_name": table_name_check}
-            )
-            table_exists = result.scalar()
+            table_exists = await table_catalog.table_exists(session, table_name_check)
 
             if not table_exists:
                 logger.info(f"[VIEWER] Tabella {table_name} non esiste per user_id={user_id}, business_name={business_name}")
@@ -202,23 +196,12 @@ async def export_viewer_csv(current_user: dict = Depends(get_current_user)):
                 detail="Inventario non disponibile"
             )
 
-        table_name = f'"{user_id}/{business_name} INVENTARIO"'
+        table_name = tenant_table(user_id, business_name, INVENTARIO)
 
         async with AsyncSessionLocal() as session:
-            # Verifica che la tabella esista (nome senza virgolette per information_schema)
+            # Verifica che la tabella esista (catalogo tabelle)
             table_name_check = table_name.strip('"')
-            check_table_query = sql_text("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = :table_name
-                )
-            """)
-            result = await session.execute(
-                check_table_query,
-                {"table_name": table_name_check}
-            )
-            table_exists = result.scalar()
+            table_exists = await table_catalog.table_exists(session, table_name_check)
 
             if not table_exists:
                 raise HTTPException(
@@ -308,11 +291,16 @@ async def export_viewer_csv(current_user: dict = Depends(get_current_user)):
 @router.get("/movements")
 async def get_wine_movements(
     wine_name: str,
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None),
+    bucket: str = Query("day"),
     current_user: dict = Depends(get_current_user)
 ):
     """
     Recupera movimenti (consumi/rifornimenti) per un vino specifico.
     Usa autenticazione JWT standard (Bearer token).
+    Con start_date (YYYY-MM-DD) include la traiettoria di stock del periodo
+    (campo "trajectory") e opening_stock è lo stock a inizio periodo.
     """
     try:
         user = current_user["user"]
@@ -326,23 +314,12 @@ async def get_wine_movements(
             )
 
         # Leggi da "Storico vino" (fonte unica di verità) invece di "Consumi e rifornimenti"
-        table_storico = f'"{user_id}/{business_name} Storico vino"'
+        table_storico = tenant_table(user_id, business_name, STORICO_VINO)
 
         async with AsyncSessionLocal() as session:
             # Verifica che la tabella esista
             table_name_check = table_storico.strip('"')
-            check_table_query = sql_text("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = :table_name
-                )
-            """)
-            result = await session.execute(
-                check_table_query,
-                {"table_name": table_name_check}
-            )
-            table_exists = result.scalar()
+            table_exists = await table_catalog.table_exists(session, table_name_check)
 
             if not table_exists:
                 logger.info(f"[VIEWER] Tabella Storico vino {table_storico} non esiste per user_id={user_id}, business_name={business_name}")
@@ -353,16 +330,19 @@ async def get_wine_movements(
                     "movements": []
                 }
 
-            # Cerca storico vino
+            # Cerca storico vino (history dal registro movimenti se disponibile)
             import json
+            use_ledger = await movements_ledger.ensure_synced(session, user_id, table_storico)
             query_storico = sql_text(f"""
                 SELECT 
                     current_stock,
-                    history,
+                    {'NULL' if use_ledger else 'history'} AS history,
                     first_movement_date,
                     last_movement_date,
                     total_consumi,
-                    total_rifornimenti
+                    total_rifornimenti,
+                    wine_name,
+                    {'id' if use_ledger else 'NULL'} AS storico_id
                 FROM {table_storico}
                 WHERE user_id = :user_id
                 AND (
@@ -397,7 +377,10 @@ async def get_wine_movements(
                 }
 
             # Estrai history (JSONB)
-            history = storico_row[1] if storico_row[1] else []
+            if use_ledger:
+                history = await movements_ledger.wine_history(session, user_id, storico_row[7])
+            else:
+                history = storico_row[1] if storico_row[1] else []
             if isinstance(history, str):
                 history = json.loads(history)
 
@@ -421,6 +404,20 @@ async def get_wine_movements(
             # Opening stock = primo movimento quantity_before (o 0 se non c'è)
             opening_stock = movements[0]["quantity_before"] if movements else 0
 
+            # Traiettoria del periodo richiesto (ancorata allo stock attuale)
+            trajectory = None
+            if start_date and use_ledger:
+                start, end = _parse_period_dates(start_date, end_date)
+                try:
+                    batch = await stock_trajectories.trajectories(
+                        session, user_id, table_storico, [storico_row[6]], start, end, _validate_bucket(bucket)
+                    )
+                except TrajectoryTooLarge as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+                if batch and batch["wines"]:
+                    trajectory = dict(batch["wines"][0], buckets=batch["buckets"], bucket=batch["bucket"])
+                    opening_stock = trajectory["opening_stock"]
+
             logger.info(
                 f"[VIEWER] Movimenti recuperati da Storico vino: wine_name='{wine_name}', count={len(movements)}, "
                 f"current_stock={current_stock}, user_id={user_id}, business_name={business_name}"
@@ -434,7 +431,8 @@ async def get_wine_movements(
                 "total_consumi": storico_row[4] or 0,
                 "total_rifornimenti": storico_row[5] or 0,
                 "first_movement_date": storico_row[2].isoformat() if storico_row[2] else None,
-                "last_movement_date": storico_row[3].isoformat() if storico_row[3] else None
+                "last_movement_date": storico_row[3].isoformat() if storico_row[3] else None,
+                "trajectory": trajectory
             }
 
     except HTTPException:
@@ -446,3 +444,99 @@ async def get_wine_movements(
         )
         raise HTTPException(status_code=500, detail=f"Errore interno: {str(e)}")
 
+
+def _parse_period_dates(start_date: str, end_date: Optional[str]):
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else datetime.now().date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato data non valido (usa YYYY-MM-DD).")
+    if end < start:
+        raise HTTPException(status_code=400, detail="Intervallo date non valido.")
+    return start, end
+
+
+def _validate_bucket(bucket: str) -> str:
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Bucket non valido (usa {', '.join(BUCKETS)}).")
+    return bucket
+
+
+@router.get("/trajectories")
+async def get_stock_trajectories(
+    start_date: str,
+    end_date: Optional[str] = Query(None),
+    bucket: str = Query("day"),
+    wine_name: Optional[List[str]] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Traiettorie di stock (stock a fine bucket, consumi, rifornimenti, stock di
+    apertura/chiusura) di più vini in una richiesta: tutti i vini dello storico
+    se wine_name non è indicato.
+    """
+    try:
+        user = current_user["user"]
+        user_id = current_user["user_id"]
+        if not user.business_name:
+            raise HTTPException(status_code=404, detail="Inventario non disponibile")
+
+        start, end = _parse_period_dates(start_date, end_date)
+        bucket = _validate_bucket(bucket)
+        table_storico = tenant_table(user_id, user.business_name, STORICO_VINO)
+
+        async with AsyncSessionLocal() as session:
+            if not await table_catalog.table_exists(session, table_storico.strip('"')):
+                return {"start_date": start.isoformat(), "end_date": end.isoformat(), "bucket": bucket, "buckets": [], "wines": []}
+
+            try:
+                result = await stock_trajectories.trajectories(
+                    session, user_id, table_storico, wine_name, start, end, bucket
+                )
+            except TrajectoryTooLarge as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if result is None:
+                raise HTTPException(status_code=503, detail="Registro movimenti non disponibile")
+
+            logger.info(
+                f"[VIEWER] Traiettorie calcolate: user_id={user_id}, vini={len(result['wines'])}, "
+                f"bucket={bucket}, periodo={start} - {end}"
+            )
+            return result
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"[VIEWER] Errore calcolo traiettorie: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Errore interno: {str(e)}")
+
+
+@router.get("/forecast")
+async def get_stock_forecast(current_user: dict = Depends(get_current_user)):
+    """
+    Previsione di esaurimento e riordino suggerito per tutti i vini dello
+    storico: consumo giornaliero, giorni all'esaurimento, punto di riordino e
+    stato (out_of_stock, urgent, reorder, ok), ordinati per urgenza.
+    """
+    try:
+        user = current_user["user"]
+        user_id = current_user["user_id"]
+        if not user.business_name:
+            raise HTTPException(status_code=404, detail="Inventario non disponibile")
+
+        table_storico = tenant_table(user_id, user.business_name, STORICO_VINO)
+
+        async with AsyncSessionLocal() as session:
+            if not await table_catalog.table_exists(session, table_storico.strip('"')):
+                return {"date": datetime.now().date().isoformat(), "summary": {}, "wines": []}
+
+            result = await stock_forecast.forecast(session, user_id, table_storico)
+            if result is None:
+                raise HTTPException(status_code=503, detail="Registro movimenti non disponibile")
+            return result
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"[VIEWER] Errore previsione scorte: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Errore interno: {str(e)}")
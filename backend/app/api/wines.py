@@ -50,6 +50,28 @@ class WineCreate(BaseModel):
     notes: Optional[str] = None
 
 
+def _wine_to_dict(wine) -> Dict[str, Any]:
+    """Vino in dict per le risposte API (getattr: attributi che potrebbero non esistere)"""
+    return {
+        "id": wine.id,
+        "name": wine.name,
+        "producer": getattr(wine, 'producer', None),
+        "quantity": getattr(wine, 'quantity', 0),
+        "selling_price": float(wine.selling_price) if getattr(wine, 'selling_price', None) else None,
+        "cost_price": float(wine.cost_price) if getattr(wine, 'cost_price', None) else None,
+        "vintage": getattr(wine, 'vintage', None),
+        "region": getattr(wine, 'region', None),
+        "country": getattr(wine, 'country', None),
+        "wine_type": getattr(wine, 'wine_type', None),
+        "supplier": getattr(wine, 'supplier', None),  # Potrebbe non esistere nel modello Wine
+        "grape_variety": getattr(wine, 'grape_variety', None),
+        "classification": getattr(wine, 'classification', None),
+        "alcohol_content": getattr(wine, 'alcohol_content', None),
+        "description": getattr(wine, 'description', None),
+        "notes": getattr(wine, 'notes', None),
+    }
+
+
 @router.get("/{wine_id}")
 async def get_wine(
     wine_id: int,
@@ -67,28 +89,7 @@ async def get_wine(
         if not wine:
             raise HTTPException(status_code=404, detail="Vino non trovato")
         
-        # Converti wine object in dict
-        # Usa getattr per gestire attributi che potrebbero non esistere
-        wine_dict = {
-            "id": wine.id,
-            "name": wine.name,
-            "producer": getattr(wine, 'producer', None),
-            "quantity": getattr(wine, 'quantity', 0),
-            "selling_price": float(wine.selling_price) if getattr(wine, 'selling_price', None) else None,
-            "cost_price": float(wine.cost_price) if getattr(wine, 'cost_price', None) else None,
-            "vintage": getattr(wine, 'vintage', None),
-            "region": getattr(wine, 'region', None),
-            "country": getattr(wine, 'country', None),
-            "wine_type": getattr(wine, 'wine_type', None),
-            "supplier": getattr(wine, 'supplier', None),  # Potrebbe non esistere nel modello Wine
-            "grape_variety": getattr(wine, 'grape_variety', None),
-            "classification": getattr(wine, 'classification', None),
-            "alcohol_content": getattr(wine, 'alcohol_content', None),
-            "description": getattr(wine, 'description', None),
-            "notes": getattr(wine, 'notes', None),
-        }
-        
-        return wine_dict
+        return _wine_to_dict(wine)
         
     except HTTPException:
         raise
@@ -130,67 +131,44 @@ async def update_wine(
         if not business_name:
             raise HTTPException(status_code=400, detail="Utente non ha business_name")
         
-        # Aggiorna vino tramite processor client (un campo alla volta)
+        # Valida quantity prima dell'invio (passa dall'endpoint con movimento)
+        errors = []
+        if 'quantity' in update_data:
+            value = update_data['quantity']
+            try:
+                quantity_int = int(value) if value is not None else None
+            except (TypeError, ValueError):
+                quantity_int = None
+                errors.append("quantity: Valore non valido (deve essere un numero intero)")
+            else:
+                if quantity_int is None or quantity_int < 0:
+                    errors.append("quantity: Quantità deve essere un intero >= 0")
+            if errors:
+                del update_data['quantity']
+            else:
+                update_data['quantity'] = quantity_int
+        
+        # Tutti i campi in una richiesta: il processor restituisce la riga aggiornata
         from app.core.processor_client import processor_client
         
         updated_fields = []
-        errors = []
-        
-        for field, value in update_data.items():
-            # Gestione speciale per quantity: usa endpoint con movimento
-            if field == 'quantity':
-                try:
-                    # Valida che quantity sia un intero
-                    quantity_int = int(value) if value is not None else None
-                    if quantity_int is None or quantity_int < 0:
-                        errors.append(f"{field}: Quantità deve essere un intero >= 0")
-                        continue
-                    
-                    result = await processor_client.update_wine_field_with_movement(
-                        user_id=user_id,
-                        business_name=business_name,
-                        wine_id=wine_id,
-                        new_quantity=quantity_int
-                    )
-                    
-                    if result.get("status") == "success" or result.get("success"):
-                        updated_fields.append(field)
-                        if result.get("movement_created"):
-                            logger.info(
-                                f"Quantità aggiornata con movimento per wine_id={wine_id}: "
-                                f"{result.get('quantity_before')} → {result.get('quantity_after')} "
-                                f"({result.get('movement_type')})"
-                            )
-                    else:
-                        error_msg = result.get("error", "Errore sconosciuto")
-                        errors.append(f"{field}: {error_msg}")
-                except ValueError:
-                    errors.append(f"{field}: Valore non valido (deve essere un numero intero)")
-                except Exception as e:
-                    logger.error(f"Errore aggiornamento quantity per wine_id={wine_id}: {e}", exc_info=True)
-                    errors.append(f"{field}: {str(e)}")
-            else:
-                # Altri campi: usa endpoint normale
-                try:
-                    # Converti None in stringa vuota per il processor
-                    value_str = str(value) if value is not None else ""
-                    
-                    result = await processor_client.update_wine_field(
-                        user_id=user_id,
-                        business_name=business_name,
-                        wine_id=wine_id,
-                        field=field,
-                        value=value_str
-                    )
-                    
-                    if result.get("status") == "success" or result.get("success"):
-                        updated_fields.append(field)
-                    else:
-                        error_msg = result.get("error", "Errore sconosciuto")
-                        errors.append(f"{field}: {error_msg}")
-                except Exception as e:
-                    logger.error(f"Errore aggiornamento campo {field} per wine_id={wine_id}: {e}", exc_info=True)
-                    errors.append(f"{field}: {str(e)}")
+        wine = None
+        if update_data:
+            result = await processor_client.update_wine(
+                user_id=user_id,
+                business_name=business_name,
+                wine_id=wine_id,
+                fields=update_data
+            )
+            updated_fields = result.get("updated_fields", [])
+            errors.extend(result.get("errors", []))
+            wine = result.get("wine")
+            if result.get("movement_created"):
+                logger.info(
+                    f"Quantità aggiornata con movimento per wine_id={wine_id}: "
+                    f"{result.get('quantity_before')} → {result.get('quantity_after')} "
+                    f"({result.get('movement_type')})"
+                )
         
         if errors:
             logger.warning(f"Alcuni campi non sono stati aggiornati per vino {wine_id}: {errors}")
@@ -200,7 +178,8 @@ async def update_wine(
                 "message": "Vino aggiornato con successo",
                 "wine_id": wine_id,
                 "updated_fields": updated_fields,
-                "errors": errors if errors else None
+                "errors": errors if errors else None,
+                "wine": _wine_to_dict(wine) if wine else None
             }
         else:
             raise HTTPException(
@@ -274,21 +253,13 @@ async def create_wine(
                 detail=f"wine_id restituito non valido: {wine_id}"
             )
         
-        # Recupera vino creato per generare wine card HTML
-        # Aggiungi piccolo delay per assicurare che il commit sia completato
-        import asyncio
-        await asyncio.sleep(0.1)
-        
-        wine = await db_manager.get_wine_by_id(user_id, wine_id)
+        # Riga creata restituita da add_wine (risposta del processor o lettura dopo il commit)
+        wine = result.get("wine")
         if not wine:
-            # Retry dopo un altro breve delay
-            await asyncio.sleep(0.2)
-            wine = await db_manager.get_wine_by_id(user_id, wine_id)
-            if not wine:
-                raise HTTPException(
-                    status_code=500,
-                    detail="Vino creato ma non trovato nel database"
-                )
+            raise HTTPException(
+                status_code=500,
+                detail="Vino creato ma non trovato nel database"
+            )
         
         # Genera wine card HTML con dicitura "vino aggiunto"
         from app.services.ai_service import AIService
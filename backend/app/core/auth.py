@@ -10,6 +10,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.core.config import get_settings
 from app.core.database import db_manager, AsyncSessionLocal
+from app.core.request_context import bind_request_user
 import bcrypt
 
 logger = logging.getLogger(__name__)
@@ -261,6 +262,10 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    if user:
+        # Unit of work: l'utente resta disponibile a db_manager/servizi/agent per tutta la richiesta
+        bind_request_user(user)
+    
     if not user:
         logger.warning(f"[AUTH] get_current_user: utente non trovato nel database, user_id={user_id}, telegram_id={telegram_id}")
         raise HTTPException(
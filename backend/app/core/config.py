@@ -12,10 +12,71 @@ class Settings(BaseSettings):
     
     # Processor
     PROCESSOR_URL: str = "https://gioia-processor-production.up.railway.app"
+    PROCESSOR_MAX_CONNECTIONS: int = 100  # Pool aiohttp condiviso (ProcessorClient)
+    PROCESSOR_MAX_CONNECTIONS_PER_HOST: int = 50
+    PROCESSOR_KEEPALIVE_SECONDS: float = 30.0
+    PROCESSOR_BATCH_CONCURRENCY: int = 4  # Chiamate singole parallele se manca l'endpoint batch movimenti
+    PROCESSOR_BATCH_RETRY_SECONDS: float = 300.0  # Dopo quanto riprovare l'endpoint batch non disponibile
+    PROCESSOR_CALLBACK_URL: Optional[str] = None  # URL pubblico di /api/processor/jobs/callback passato al processor
+    PROCESSOR_CALLBACK_TOKEN: Optional[str] = None  # Header X-Processor-Token richiesto dalla callback (senza: callback disattivata)
+    
+    # Resilienza chiamate al processor (processor_resilience)
+    PROCESSOR_BREAKER_FAILURES: int = 5  # Errori consecutivi che aprono il breaker dell'endpoint
+    PROCESSOR_BREAKER_OPEN_SECONDS: float = 30.0  # Durata open prima della chiamata di prova
+    PROCESSOR_GET_RETRIES: int = 2  # Ritentativi per le GET (idempotenti) su errori di connessione/5xx
+    PROCESSOR_RETRY_BASE_SECONDS: float = 0.2
+    PROCESSOR_RETRY_MAX_SECONDS: float = 2.0
+    PROCESSOR_HEDGE_PDF: bool = False  # Seconda richiesta per i PDF se la prima tarda oltre il p95
+    PROCESSOR_HEDGE_MIN_DELAY_SECONDS: float = 1.0
+    REQUEST_DEADLINE_SECONDS: float = 60.0  # Budget per richiesta HTTP in ingresso (0: solo X-Request-Timeout-Ms)
+    
+    # Job del processor (job_tracker)
+    JOB_POLL_INITIAL_SECONDS: float = 1.0
+    JOB_POLL_MAX_SECONDS: float = 15.0  # Tetto del backoff esponenziale
+    JOB_TRACK_MAX_SECONDS: float = 1800.0  # Oltre: job segnato come timeout
+    JOB_RESULT_TTL_SECONDS: float = 600.0  # Stato finale conservato per waiter/callback tardivi
+    
+    # Upload inventario in streaming (upload_stream)
+    UPLOAD_MAX_BYTES: int = 50 * 1024 * 1024
+    UPLOAD_CHUNK_BYTES: int = 256 * 1024  # Blocco letto e inviato al processor alla volta
+    
+    # Cache inventario per-tenant (get_user_wines)
+    INVENTORY_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    INVENTORY_CACHE_REVALIDATE_SECONDS: float = 2.0  # Finestra senza query del token di versione
+    INVENTORY_SEARCH_INDEX_ENABLED: bool = True  # Ricerca vini in memoria (inventory_search) prima del DB
+    
+    # Cache su disco dei PDF dei report generati dal processor (pdf_cache)
+    PDF_CACHE_ENABLED: bool = True
+    PDF_CACHE_DIR: Optional[str] = None  # Default: <tmp>/gioia-pdf-cache
+    PDF_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    
+    # Catalogo tabelle/colonne (sostituisce le query information_schema per richiesta)
+    TABLE_CATALOG_TTL_SECONDS: float = 60.0  # Intervallo di ricaricamento in background
+    
+    # Storage tabelle tenant: "per_tenant" (una tabella per tenant) o "shared" (tabelle condivise per i tenant migrati)
+    TENANT_STORAGE_MODE: str = "per_tenant"
+    TENANT_SHARED_TABLE_KINDS: str = "LOG interazione"  # Comma-separated; i tipi scritti dal processor solo quando il processor li supporta
+    TENANT_SHARED_PARTITIONS: int = 16  # Partizioni hash(user_id) create da migrate_tenants_to_shared.py
+    TENANT_STORAGE_REFRESH_SECONDS: float = 30.0  # Ogni quanto rileggere l'elenco dei tenant migrati
+    
+    # Previsione esaurimento scorte e riordini (stock_forecast)
+    FORECAST_WINDOW_DAYS: int = 90  # Storico consumi considerato
+    FORECAST_HALF_LIFE_DAYS: float = 30.0  # Peso dei consumi dimezzato ogni N giorni (consumi recenti contano di più)
+    FORECAST_LEAD_TIME_DAYS: int = 7  # Giorni tra ordine e consegna
+    FORECAST_COVERAGE_DAYS: int = 30  # Giorni di consumo coperti da un riordino
+    FORECAST_SERVICE_LEVEL_Z: float = 1.65  # Scorta di sicurezza: z * deviazione consumi giornalieri * sqrt(lead time)
+    FORECAST_CACHE_MAX_TENANTS: int = 500
+    
+    # Traiettorie di stock (stock_trajectories): dimensione massima per richiesta
+    TRAJECTORY_MAX_BUCKETS: int = 1096  # Es. 3 anni a bucket giornaliero
+    TRAJECTORY_MAX_CELLS: int = 500_000  # Vini × bucket
     
     # OpenAI
     OPENAI_API_KEY: str
     OPENAI_MODEL: str = "gpt-3.5-turbo"
+    OPENAI_MAX_CONNECTIONS: int = 100  # Pool httpx condiviso (AsyncOpenAI)
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OPENAI_TIMEOUT_SECONDS: float = 60.0
     
     # JWT
     JWT_SECRET_KEY: str
@@ -34,6 +95,11 @@ class Settings(BaseSettings):
     
     # AI Agent System
     USE_AGENT_SYSTEM: bool = False  # Feature flag per sistema multi-agent
+    ASSISTANTS_STREAMING: bool = True  # Run via streaming eventi (fallback: polling adattivo)
+    AGENT_RUN_TIMEOUT_SECONDS: float = 60.0
+    AGENT_WARMUP_ON_STARTUP: bool = False  # Pre-costruisce gli agent V2 in background dopo lo startup
+    INTENT_ROUTER_CONFIDENCE_THRESHOLD: float = 0.75  # Sotto soglia si usa il RouterAgent LLM
+    SPECULATIVE_V2: bool = False  # Richieste complesse: V1 e V2 in parallelo, vince la prima risposta valida
     
     class Config:
         env_file = ".env"
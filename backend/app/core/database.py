@@ -4,12 +4,21 @@ Reuse da telegram-ai-bot con adattamenti per web app
 """
 import os
 import logging
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy import select, text as sql_text, Column, Integer, BigInteger, String, Float, DateTime, Boolean, Text, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from app.core.config import get_settings
+from app.core.inventory_cache import inventory_cache
+from app.core.request_context import get_request_context, get_request_user
+from app.core.table_catalog import table_catalog
+from app.core.tenant_tables import INVENTARIO, LOG_INTERAZIONE, tenant_table, tenant_tables
+from app.core.wine_search import (
+    ACCENT_FROM, ACCENT_TO, STOP_WORDS, build_search_query, has_search_document,
+    normalize_plural_for_search, normalize_search_term, strip_accents,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -65,6 +74,54 @@ class Wine(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+WINE_FIELDS = (
+    'id', 'user_id', 'name', 'producer', 'vintage', 'grape_variety', 'region', 'country',
+    'wine_type', 'supplier', 'classification', 'quantity', 'min_quantity', 'cost_price',
+    'selling_price', 'alcohol_content', 'description', 'notes', 'created_at', 'updated_at',
+)
+# Valori per colonne assenti nelle tabelle più vecchie
+_WINE_FIELD_DEFAULTS = {'min_quantity': 0}
+
+
+class WineRow:
+    """
+    Vino letto da una tabella dinamica INVENTARIO (sola lettura).
+    Stessi attributi del modello Wine ma senza strumentazione SQLAlchemy:
+    costruito direttamente dalle righe del driver.
+    """
+    __slots__ = WINE_FIELDS
+    
+    @classmethod
+    def from_rows(cls, keys: List[str], rows) -> List["WineRow"]:
+        """Converte righe (indicizzabili per posizione) con colonne `keys` in WineRow"""
+        positions = {key: i for i, key in enumerate(keys)}
+        layout = [(field, positions.get(field), _WINE_FIELD_DEFAULTS.get(field)) for field in WINE_FIELDS]
+        wines = []
+        for row in rows:
+            wine = cls.__new__(cls)
+            for field, position, default in layout:
+                setattr(wine, field, row[position] if position is not None else default)
+            wines.append(wine)
+        return wines
+    
+    @classmethod
+    def from_result(cls, result) -> List["WineRow"]:
+        return cls.from_rows(list(result.keys()), result.fetchall())
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "WineRow":
+        """Vino da un dict (riga restituita dal processor in JSON: date in ISO 8601)"""
+        values = dict(data)
+        for field in ('created_at', 'updated_at'):
+            if isinstance(values.get(field), str):
+                values[field] = datetime.fromisoformat(values[field].replace('Z', '+00:00'))
+        keys = [key for key in WINE_FIELDS if key in values]
+        return cls.from_rows(keys, [[values[key] for key in keys]])[0]
+
+    def __repr__(self) -> str:
+        return f"<WineRow id={self.id} name={self.name!r}>"
+
+
 # Configurazione database
 def get_database_url() -> str:
     """Ottiene DATABASE_URL dalla configurazione."""
@@ -100,6 +157,37 @@ AsyncSessionLocal = async_sessionmaker(
 )
 
 
+@asynccontextmanager
+async def db_session():
+    """
+    Sessione database per un'unità di lavoro.
+    
+    Dentro una richiesta HTTP riusa l'AsyncSession del RequestContext; la
+    connessione torna al pool alla fine di ogni unità (come una sessione chiusa),
+    così non resta occupata durante le chiamate LLM. Fuori da una richiesta, o se
+    la sessione condivisa è già in uso (unità annidate, task concorrenti), apre
+    una sessione dedicata.
+    """
+    ctx = get_request_context()
+    if ctx is None or ctx.closed or ctx.session_lock.locked():
+        if ctx is not None and not ctx.closed:
+            ctx.dedicated_sessions += 1
+        async with AsyncSessionLocal() as session:
+            yield session
+        return
+    
+    async with ctx.session_lock:
+        if ctx.session is None:
+            ctx.session = AsyncSessionLocal()
+        ctx.session_uses += 1
+        try:
+            yield ctx.session
+        finally:
+            # Stessa semantica di una sessione chiusa: rollback del non committato,
+            # oggetti detached con attributi già caricati, connessione rilasciata
+            await ctx.session.close()
+
+
 async def get_db() -> AsyncSession:
     """Dependency per ottenere sessione database."""
     async with AsyncSessionLocal() as session:
@@ -115,8 +203,12 @@ class DatabaseManager:
     async def get_user_by_id(self, user_id: int) -> Optional[User]:
         """
         Trova utente per User ID.
+        Se è l'utente della richiesta corrente (già caricato da get_current_user) non interroga il DB.
         """
-        async with AsyncSessionLocal() as session:
+        user = get_request_user(user_id)
+        if user is not None:
+            return user
+        async with db_session() as session:
             result = await session.execute(
                 select(User).where(User.id == user_id)
             )
@@ -132,7 +224,7 @@ class DatabaseManager:
     async def get_user_by_email(self, email: str) -> Optional[User]:
         """Trova utente per email (normalizza sempre in lowercase)"""
         email_normalized = email.lower().strip()
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             result = await session.execute(
                 select(User).where(User.email == email_normalized)
             )
@@ -143,18 +235,44 @@ class DatabaseManager:
                 logger.debug(f"[DB] Nessun utente trovato per email: {email_normalized}")
             return user
     
-    async def get_user_wines(self, user_id: int) -> List[Wine]:
-        """Ottiene vini utente da tabelle dinamiche"""
-        async with AsyncSessionLocal() as session:
+    async def _get_inventory_version(self, session: AsyncSession, table_name: str, user_id: int) -> tuple:
+        """Token di versione inventario: (righe, max(updated_at), max(id)), solo aggregati"""
+        result = await session.execute(
+            sql_text(f"""
+                SELECT COUNT(*) AS n, MAX(updated_at) AS last_update, MAX(id) AS max_id
+                FROM {table_name}
+                WHERE user_id = :user_id
+            """),
+            {"user_id": user_id}
+        )
+        row = result.fetchone()
+        return (row.n, row.last_update, row.max_id)
+    
+    async def get_user_wines(self, user_id: int) -> List[WineRow]:
+        """
+        Ottiene vini utente da tabelle dinamiche.
+        Servito da inventory_cache finché il token di versione dell'inventario non cambia.
+        """
+        cached = inventory_cache.get_fresh(user_id)
+        if cached is not None:
+            return list(cached)
+        
+        async with db_session() as session:
             user = await self.get_user_by_id(user_id)
             if not user or not user.business_name:
                 logger.warning(f"[DB] User user_id={user_id} non trovato o business_name mancante")
                 return []
             
-            # Usa user.id per nome tabella
-            table_name = f'"{user.id}/{user.business_name} INVENTARIO"'
+            # Usa user.id per nome tabella (per-tenant o condivisa, vedi tenant_tables)
+            table_name = tenant_table(user.id, user.business_name, INVENTARIO)
             
             try:
+                generation = inventory_cache.generation(user_id)
+                version = await self._get_inventory_version(session, table_name, user.id)
+                cached = inventory_cache.get_if_version(user_id, table_name, version)
+                if cached is not None:
+                    return list(cached)
+                
                 query = sql_text(f"""
                     SELECT * FROM {table_name} 
                     WHERE user_id = :user_id
@@ -162,40 +280,11 @@ class DatabaseManager:
                 """)
                 
                 result = await session.execute(query, {"user_id": user.id})
-                rows = result.fetchall()
-                
-                # Converti le righe in oggetti Wine
-                wines = []
-                for row in rows:
-                    wine_dict = {
-                        'id': row.id,
-                        'user_id': row.user_id,
-                        'name': row.name,
-                        'producer': row.producer,
-                        'vintage': row.vintage,
-                        'grape_variety': row.grape_variety,
-                        'region': row.region,
-                        'country': row.country,
-                        'wine_type': row.wine_type,
-                        'classification': row.classification,
-                        'quantity': row.quantity,
-                        'min_quantity': row.min_quantity if hasattr(row, 'min_quantity') else 0,
-                        'cost_price': row.cost_price,
-                        'selling_price': row.selling_price,
-                        'alcohol_content': row.alcohol_content,
-                        'description': row.description,
-                        'notes': row.notes,
-                        'created_at': row.created_at,
-                        'updated_at': row.updated_at
-                    }
-                    
-                    wine = Wine()
-                    for key, value in wine_dict.items():
-                        setattr(wine, key, value)
-                    wines.append(wine)
+                wines = WineRow.from_result(result)
                 
                 logger.info(f"[DB] Recuperati {len(wines)} vini da tabella dinamica per user_id={user_id}, business_name={user.business_name}")
-                return wines
+                inventory_cache.put(user_id, table_name, version, wines, generation)
+                return list(wines)
                 
             except Exception as e:
                 logger.error(f"[DB] Errore leggendo inventario da tabella dinamica {table_name}: {e}", exc_info=True)
@@ -209,17 +298,17 @@ class DatabaseManager:
                     logger.error(f"Errore anche nel fallback vecchia tabella wines: {fallback_error}", exc_info=True)
                     return []
     
-    async def get_wine_by_id(self, user_id: int, wine_id: int) -> Optional[Wine]:
+    async def get_wine_by_id(self, user_id: int, wine_id: int) -> Optional[WineRow]:
         """
         Recupera un vino specifico per ID dalla tabella dinamica.
         """
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             user = await self.get_user_by_id(user_id)
             if not user or not user.business_name:
                 logger.warning(f"[DB] User user_id={user_id} non trovato o business_name mancante")
                 return None
             
-            table_name = f'"{user.id}/{user.business_name} INVENTARIO"'
+            table_name = tenant_table(user.id, user.business_name, INVENTARIO)
             
             try:
                 query = sql_text(f"""
@@ -229,40 +318,13 @@ class DatabaseManager:
                 """)
                 
                 result = await session.execute(query, {"wine_id": wine_id, "user_id": user.id})
-                row = result.fetchone()
+                wines = WineRow.from_result(result)
                 
-                if not row:
+                if not wines:
                     logger.warning(f"[DB] Vino id={wine_id} non trovato per user_id={user_id}")
                     return None
                 
-                # Converti la riga in oggetto Wine
-                wine_dict = {
-                    'id': row.id,
-                    'user_id': row.user_id,
-                    'name': row.name,
-                    'producer': row.producer,
-                    'vintage': row.vintage,
-                    'grape_variety': row.grape_variety,
-                    'region': row.region,
-                    'country': row.country,
-                    'wine_type': row.wine_type,
-                    'supplier': row.supplier if hasattr(row, 'supplier') else None,  # Campo supplier
-                    'classification': row.classification,
-                    'quantity': row.quantity,
-                    'min_quantity': row.min_quantity if hasattr(row, 'min_quantity') else 0,
-                    'cost_price': row.cost_price,
-                    'selling_price': row.selling_price,
-                    'alcohol_content': row.alcohol_content,
-                    'description': row.description,
-                    'notes': row.notes,
-                    'created_at': row.created_at,
-                    'updated_at': row.updated_at
-                }
-                
-                wine = Wine()
-                for key, value in wine_dict.items():
-                    setattr(wine, key, value)
-                
+                wine = wines[0]
                 logger.info(f"[DB] Recuperato vino id={wine_id} per user_id={user_id}: {wine.name}")
                 return wine
                 
@@ -270,229 +332,178 @@ class DatabaseManager:
                 logger.error(f"[DB] Errore recuperando vino id={wine_id} da tabella dinamica {table_name}: {e}", exc_info=True)
                 return None
     
-    async def search_wines(self, user_id: int, search_term: str, limit: int = 10) -> List[Wine]:
+    def _build_legacy_search_query(self, table_name: str, search_term: str, user_id: int, limit: int) -> tuple:
+        """
+        Query di ricerca senza indice trigram (ILIKE + translate() per riga).
+        Usata se la colonna search_document non può essere creata sulla tabella.
+        """
+        search_term_clean = normalize_search_term(search_term)
+        accent_from = ACCENT_FROM
+        accent_to = ACCENT_TO
+        search_term_unaccent = strip_accents(search_term_clean)
+        
+        search_variants = normalize_plural_for_search(search_term_clean)
+        
+        all_words = [w.strip() for w in search_term_clean.split()]
+        search_words = [w for w in all_words if len(w) > 2 and w not in STOP_WORDS]
+        
+        is_likely_producer = any(word in search_term_clean for word in [' del ', ' di ', ' da ', 'ca ', 'ca\'', 'castello', 'tenuta', 'azienda'])
+        
+        search_numeric = None
+        search_float = None
+        try:
+            search_numeric = int(search_term_clean)
+        except ValueError:
+            try:
+                search_float = float(search_term_clean.replace(',', '.'))
+            except ValueError:
+                pass
+        
+        search_pattern = f"%{search_term_clean}%"
+        search_pattern_unaccent = f"%{search_term_unaccent}%"
+        
+        # Ricerca estesa su tutti i campi rilevanti
+        query_conditions = [
+            # Campi principali (priorità alta)
+            "name ILIKE :search_pattern",
+            "producer ILIKE :search_pattern",
+            "grape_variety ILIKE :search_pattern",
+            # Campi secondari (regione, tipo, paese, fornitore)
+            "region ILIKE :search_pattern",
+            "wine_type ILIKE :search_pattern",
+            "country ILIKE :search_pattern",
+            "supplier ILIKE :search_pattern",
+            "classification ILIKE :search_pattern",
+            # Versioni senza accenti per tutti i campi
+            "translate(lower(name), :accent_from, :accent_to) ILIKE :search_pattern_unaccent",
+            "translate(lower(producer), :accent_from, :accent_to) ILIKE :search_pattern_unaccent",
+            "translate(lower(grape_variety), :accent_from, :accent_to) ILIKE :search_pattern_unaccent",
+            "translate(lower(region), :accent_from, :accent_to) ILIKE :search_pattern_unaccent",
+            "translate(lower(wine_type), :accent_from, :accent_to) ILIKE :search_pattern_unaccent",
+            "translate(lower(country), :accent_from, :accent_to) ILIKE :search_pattern_unaccent",
+            "translate(lower(supplier), :accent_from, :accent_to) ILIKE :search_pattern_unaccent",
+            "translate(lower(classification), :accent_from, :accent_to) ILIKE :search_pattern_unaccent"
+        ]
+        
+        variant_params = {}
+        for idx, variant in enumerate(search_variants[1:], start=1):
+            variant_pattern = f"%{variant}%"
+            variant_unaccent = strip_accents(variant)
+            variant_pattern_unaccent = f"%{variant_unaccent}%"
+            query_conditions.extend([
+                f"name ILIKE :search_variant_{idx}",
+                f"producer ILIKE :search_variant_{idx}",
+                f"grape_variety ILIKE :search_variant_{idx}",
+                f"region ILIKE :search_variant_{idx}",
+                f"wine_type ILIKE :search_variant_{idx}",
+                f"supplier ILIKE :search_variant_{idx}",
+                f"translate(lower(name), :accent_from, :accent_to) ILIKE :search_variant_unaccent_{idx}",
+                f"translate(lower(producer), :accent_from, :accent_to) ILIKE :search_variant_unaccent_{idx}",
+                f"translate(lower(grape_variety), :accent_from, :accent_to) ILIKE :search_variant_unaccent_{idx}",
+                f"translate(lower(region), :accent_from, :accent_to) ILIKE :search_variant_unaccent_{idx}",
+                f"translate(lower(wine_type), :accent_from, :accent_to) ILIKE :search_variant_unaccent_{idx}",
+                f"translate(lower(supplier), :accent_from, :accent_to) ILIKE :search_variant_unaccent_{idx}"
+            ])
+            variant_params[f"search_variant_{idx}"] = variant_pattern
+            variant_params[f"search_variant_unaccent_{idx}"] = variant_pattern_unaccent
+        
+        query_params = {
+            "user_id": user_id,
+            "search_pattern": search_pattern,
+            "search_pattern_unaccent": search_pattern_unaccent,
+            "accent_from": accent_from,
+            "accent_to": accent_to,
+            "limit": limit * 2
+        }
+        
+        # Aggiungi ricerca per parole singole anche su campi secondari
+        for i, word in enumerate(search_words):
+            word_pattern = f"%{word}%"
+            word_unaccent = strip_accents(word)
+            word_pattern_unaccent = f"%{word_unaccent}%"
+            query_conditions.extend([
+                f"region ILIKE :word_{i}",
+                f"wine_type ILIKE :word_{i}",
+                f"country ILIKE :word_{i}",
+                f"supplier ILIKE :word_{i}",
+                f"classification ILIKE :word_{i}",
+                f"translate(lower(region), :accent_from, :accent_to) ILIKE :word_unaccent_{i}",
+                f"translate(lower(wine_type), :accent_from, :accent_to) ILIKE :word_unaccent_{i}",
+                f"translate(lower(country), :accent_from, :accent_to) ILIKE :word_unaccent_{i}",
+                f"translate(lower(supplier), :accent_from, :accent_to) ILIKE :word_unaccent_{i}",
+                f"translate(lower(classification), :accent_from, :accent_to) ILIKE :word_unaccent_{i}"
+            ])
+            query_params[f"word_{i}"] = word_pattern
+            query_params[f"word_unaccent_{i}"] = word_pattern_unaccent
+            word_variants = normalize_plural_for_search(word)
+            for j, variant in enumerate(word_variants[1:], start=1):
+                param_key = f"word_{i}_var_{j}"
+                query_params[param_key] = f"%{variant}%"
+        
+        query_params.update(variant_params)
+        
+        if search_numeric is not None:
+            query_conditions.append("vintage = :search_numeric")
+            query_params["search_numeric"] = search_numeric
+        
+        if search_float is not None:
+            query_conditions.append("(ABS(cost_price - :search_float) < 0.01 OR ABS(selling_price - :search_float) < 0.01)")
+            query_params["search_float"] = search_float
+        
+        priority_case = """
+            CASE 
+                WHEN name ILIKE :search_pattern THEN 1
+                WHEN translate(lower(name), :accent_from, :accent_to) ILIKE :search_pattern_unaccent THEN 1
+                WHEN producer ILIKE :search_pattern THEN 1
+                WHEN translate(lower(producer), :accent_from, :accent_to) ILIKE :search_pattern_unaccent THEN 1
+                WHEN grape_variety ILIKE :search_pattern THEN 1
+                WHEN translate(lower(grape_variety), :accent_from, :accent_to) ILIKE :search_pattern_unaccent THEN 1
+                ELSE 2
+            END
+        """
+        
+        query = sql_text(f"""
+            SELECT *, 
+                {priority_case} as match_priority
+            FROM {table_name} 
+            WHERE user_id = :user_id
+            AND ({' OR '.join(query_conditions)})
+            ORDER BY match_priority ASC, name ASC
+            LIMIT :limit
+        """)
+        return query, query_params
+    
+    async def search_wines(self, user_id: int, search_term: str, limit: int = 10) -> List[WineRow]:
         """
         Cerca vini con ricerca fuzzy avanzata (async).
-        Reuse completo da telegram-ai-bot
+        Usa l'indice trigram su search_document (vedi wine_search) se la colonna
+        esiste; altrimenti la query legacy. Nessun DDL: la colonna è creata
+        dalla migrazione all'avvio e dopo la creazione delle tabelle.
         """
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             user = await self.get_user_by_id(user_id)
             if not user or not user.business_name:
                 logger.warning(f"[DB] User user_id={user_id} non trovato o business_name mancante")
                 return []
             
-            table_name = f'"{user.id}/{user.business_name} INVENTARIO"'
+            table_name = tenant_table(user.id, user.business_name, INVENTARIO)
             
             try:
-                # Normalizzazione avanzata: rimuovi caratteri speciali problematici e normalizza spazi
-                import re
-                search_term_normalized = search_term.strip()
-                
-                # Rimuovi parentesi e contenuto tra parentesi (spesso ridondante)
-                search_term_normalized = re.sub(r'\([^)]*\)', '', search_term_normalized)
-                
-                # Normalizza tutti i tipi di apostrofi a spazio o rimozione
-                apostrofi_varianti = ["'", "'", "`", "´", "ʼ"]
-                for apostrofo in apostrofi_varianti:
-                    search_term_normalized = search_term_normalized.replace(apostrofo, ' ')
-                
-                # Normalizza spazi multipli a singolo spazio
-                search_term_normalized = re.sub(r'\s+', ' ', search_term_normalized)
-                
-                search_term_clean = search_term_normalized.strip().lower()
-                
-                accent_from = "àáâäèéêëìíîïòóôöùúûüÀÁÂÄÈÉÊËÌÍÎÏÒÓÔÖÙÚÛÜ"
-                accent_to = "aaaaeeeeiiiioooouuuuAAAAEEEEIIIIOOOOUUUU"
-                
-                def strip_accents(s: str) -> str:
-                    # str.maketrans() richiede che tutte le chiavi siano di lunghezza 1
-                    accent_chars = 'àáâäèéêëìíîïòóôöùúûüÀÁÂÄÈÉÊËÌÍÎÏÒÓÔÖÙÚÛÜ'
-                    ascii_chars = 'aaaaeeeeiiiioooouuuuAAAAEEEEIIIIOOOOUUUU'
-                    trans = str.maketrans(accent_chars, ascii_chars)
-                    return s.translate(trans)
-                
-                search_term_unaccent = strip_accents(search_term_clean)
-                
-                def normalize_plural_for_search(term: str) -> list[str]:
-                    variants = [term]
-                    if len(term) > 2:
-                        if term.endswith('i'):
-                            base = term[:-1]
-                            variants.append(base + 'o')
-                            variants.append(base)
-                        elif term.endswith('e'):
-                            base = term[:-1]
-                            variants.append(base + 'a')
-                            variants.append(base + 'o')
-                            variants.append(base)
-                    return list(set(variants))
-                
-                search_variants = normalize_plural_for_search(search_term_clean)
-                stop_words = {'del', 'della', 'dello', 'dei', 'degli', 'delle', 'di', 'da', 'dal', 'dalla', 
-                             'dallo', 'dai', 'dagli', 'dalle', 'la', 'le', 'il', 'lo', 'gli', 'i', 'un', 
-                             'una', 'uno', 'e', 'o', 'a', 'in', 'su', 'per', 'con', 'tra', 'fra'}
-                
-                all_words = [w.strip() for w in search_term_clean.split()]
-                search_words = [w for w in all_words if len(w) > 2 and w not in stop_words]
-                
-                is_likely_producer = any(word in search_term_clean for word in [' del ', ' di ', ' da ', 'ca ', 'ca\'', 'castello', 'tenuta', 'azienda'])
-                
-                search_numeric = None
-                search_float = None
-                try:
-                    search_numeric = int(search_term_clean)
-                except ValueError:
+                if await has_search_document(session, table_name):
+                    query, query_params = build_search_query(table_name, search_term, user.id, limit)
                     try:
-                        search_float = float(search_term_clean.replace(',', '.'))
-                    except ValueError:
-                        pass
-                
-                search_pattern = f"%{search_term_clean}%"
-                search_pattern_unaccent = f"%{search_term_unaccent}%"
-                
-                # Ricerca estesa su tutti i campi rilevanti
-                query_conditions = [
-                    # Campi principali (priorità alta)
-                    "name ILIKE :search_pattern",
-                    "producer ILIKE :search_pattern",
-                    "grape_variety ILIKE :search_pattern",
-                    # Campi secondari (regione, tipo, paese, fornitore)
-                    "region ILIKE :search_pattern",
-                    "wine_type ILIKE :search_pattern",
-                    "country ILIKE :search_pattern",
-                    "supplier ILIKE :search_pattern",
-                    "classification ILIKE :search_pattern",
-                    # Versioni senza accenti per tutti i campi
-                    "translate(lower(name), :accent_from, :accent_to) ILIKE :search_pattern_unaccent",
-                    "translate(lower(producer), :accent_from, :accent_to) ILIKE :search_pattern_unaccent",
-                    "translate(lower(grape_variety), :accent_from, :accent_to) ILIKE :search_pattern_unaccent",
-                    "translate(lower(region), :accent_from, :accent_to) ILIKE :search_pattern_unaccent",
-                    "translate(lower(wine_type), :accent_from, :accent_to) ILIKE :search_pattern_unaccent",
-                    "translate(lower(country), :accent_from, :accent_to) ILIKE :search_pattern_unaccent",
-                    "translate(lower(supplier), :accent_from, :accent_to) ILIKE :search_pattern_unaccent",
-                    "translate(lower(classification), :accent_from, :accent_to) ILIKE :search_pattern_unaccent"
-                ]
-                
-                variant_params = {}
-                for idx, variant in enumerate(search_variants[1:], start=1):
-                    variant_pattern = f"%{variant}%"
-                    variant_unaccent = strip_accents(variant)
-                    variant_pattern_unaccent = f"%{variant_unaccent}%"
-                    query_conditions.extend([
-                        f"name ILIKE :search_variant_{idx}",
-                        f"producer ILIKE :search_variant_{idx}",
-                        f"grape_variety ILIKE :search_variant_{idx}",
-                        f"region ILIKE :search_variant_{idx}",
-                        f"wine_type ILIKE :search_variant_{idx}",
-                        f"supplier ILIKE :search_variant_{idx}",
-                        f"translate(lower(name), :accent_from, :accent_to) ILIKE :search_variant_unaccent_{idx}",
-                        f"translate(lower(producer), :accent_from, :accent_to) ILIKE :search_variant_unaccent_{idx}",
-                        f"translate(lower(grape_variety), :accent_from, :accent_to) ILIKE :search_variant_unaccent_{idx}",
-                        f"translate(lower(region), :accent_from, :accent_to) ILIKE :search_variant_unaccent_{idx}",
-                        f"translate(lower(wine_type), :accent_from, :accent_to) ILIKE :search_variant_unaccent_{idx}",
-                        f"translate(lower(supplier), :accent_from, :accent_to) ILIKE :search_variant_unaccent_{idx}"
-                    ])
-                    variant_params[f"search_variant_{idx}"] = variant_pattern
-                    variant_params[f"search_variant_unaccent_{idx}"] = variant_pattern_unaccent
-                
-                query_params = {
-                    "user_id": user.id,
-                    "search_pattern": search_pattern,
-                    "search_pattern_unaccent": search_pattern_unaccent,
-                    "accent_from": accent_from,
-                    "accent_to": accent_to,
-                    "limit": limit * 2
-                }
-                
-                # Aggiungi ricerca per parole singole anche su campi secondari
-                for i, word in enumerate(search_words):
-                    word_pattern = f"%{word}%"
-                    word_unaccent = strip_accents(word)
-                    word_pattern_unaccent = f"%{word_unaccent}%"
-                    query_conditions.extend([
-                        f"region ILIKE :word_{i}",
-                        f"wine_type ILIKE :word_{i}",
-                        f"country ILIKE :word_{i}",
-                        f"supplier ILIKE :word_{i}",
-                        f"classification ILIKE :word_{i}",
-                        f"translate(lower(region), :accent_from, :accent_to) ILIKE :word_unaccent_{i}",
-                        f"translate(lower(wine_type), :accent_from, :accent_to) ILIKE :word_unaccent_{i}",
-                        f"translate(lower(country), :accent_from, :accent_to) ILIKE :word_unaccent_{i}",
-                        f"translate(lower(supplier), :accent_from, :accent_to) ILIKE :word_unaccent_{i}",
-                        f"translate(lower(classification), :accent_from, :accent_to) ILIKE :word_unaccent_{i}"
-                    ])
-                    query_params[f"word_{i}"] = word_pattern
-                    query_params[f"word_unaccent_{i}"] = word_pattern_unaccent
-                    word_variants = normalize_plural_for_search(word)
-                    for j, variant in enumerate(word_variants[1:], start=1):
-                        param_key = f"word_{i}_var_{j}"
-                        query_params[param_key] = f"%{variant}%"
-                
-                query_params.update(variant_params)
-                
-                if search_numeric is not None:
-                    query_conditions.append("vintage = :search_numeric")
-                    query_params["search_numeric"] = search_numeric
-                
-                if search_float is not None:
-                    query_conditions.append("(ABS(cost_price - :search_float) < 0.01 OR ABS(selling_price - :search_float) < 0.01)")
-                    query_params["search_float"] = search_float
-                
-                priority_case = """
-                    CASE 
-                        WHEN name ILIKE :search_pattern THEN 1
-                        WHEN translate(lower(name), :accent_from, :accent_to) ILIKE :search_pattern_unaccent THEN 1
-                        WHEN producer ILIKE :search_pattern THEN 1
-                        WHEN translate(lower(producer), :accent_from, :accent_to) ILIKE :search_pattern_unaccent THEN 1
-                        WHEN grape_variety ILIKE :search_pattern THEN 1
-                        WHEN translate(lower(grape_variety), :accent_from, :accent_to) ILIKE :search_pattern_unaccent THEN 1
-                        ELSE 2
-                    END
-                """
-                
-                query = sql_text(f"""
-                    SELECT *, 
-                        {priority_case} as match_priority
-                    FROM {table_name} 
-                    WHERE user_id = :user_id
-                    AND ({' OR '.join(query_conditions)})
-                    ORDER BY match_priority ASC, name ASC
-                    LIMIT :limit
-                """)
-                
-                result = await session.execute(query, query_params)
-                rows = result.fetchall()
-                
-                wines = []
-                for row in rows:
-                    wine_dict = {
-                        'id': row.id,
-                        'user_id': row.user_id,
-                        'name': row.name,
-                        'producer': row.producer,
-                        'vintage': row.vintage,
-                        'grape_variety': row.grape_variety,
-                        'region': row.region,
-                        'country': row.country,
-                        'wine_type': row.wine_type,
-                        'classification': row.classification,
-                        'quantity': row.quantity,
-                        'min_quantity': row.min_quantity if hasattr(row, 'min_quantity') else 0,
-                        'cost_price': row.cost_price,
-                        'selling_price': row.selling_price,
-                        'alcohol_content': row.alcohol_content,
-                        'description': row.description,
-                        'notes': row.notes,
-                        'created_at': row.created_at,
-                        'updated_at': row.updated_at
-                    }
-                    
-                    wine = Wine()
-                    for key, value in wine_dict.items():
-                        setattr(wine, key, value)
-                    wines.append(wine)
-                
-                wines = wines[:limit]
+                        result = await session.execute(query, query_params)
+                    except Exception as e:
+                        # Tabella ricreata senza search_document (es. dal processor): catalogo da rileggere
+                        logger.warning(f"[DB] Ricerca indicizzata fallita su {table_name}, uso query legacy: {e}")
+                        table_catalog.invalidate_table(table_name)
+                        await session.rollback()
+                        query, query_params = self._build_legacy_search_query(table_name, search_term, user.id, limit)
+                        result = await session.execute(query, query_params)
+                else:
+                    query, query_params = self._build_legacy_search_query(table_name, search_term, user.id, limit)
+                    result = await session.execute(query, query_params)
+                wines = WineRow.from_result(result)[:limit]
                 logger.info(f"[DB] Trovati {len(wines)} vini per ricerca '{search_term}' per user_id={user_id}, business_name={user.business_name}")
                 return wines
                 
@@ -511,7 +522,7 @@ class DatabaseManager:
         username: Optional[str] = None
     ) -> User:
         """Crea nuovo utente"""
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             # Normalizza email in lowercase per consistenza
             email_normalized = email.lower().strip()
             user = User(
@@ -534,7 +545,7 @@ class DatabaseManager:
         password_hash: str
     ) -> bool:
         """Aggiorna password utente"""
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             result = await session.execute(
                 select(User).where(User.id == user_id)
             )
@@ -557,7 +568,7 @@ class DatabaseManager:
         """
         Aggiorna email e password per utente esistente.
         """
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             result = await session.execute(
                 select(User).where(User.id == user_id)
             )
@@ -577,29 +588,18 @@ class DatabaseManager:
         """
         Verifica se l'utente ha già tabelle dinamiche nel database.
         """
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             try:
-                check_tables_query = sql_text("""
-                    SELECT table_name 
-                    FROM information_schema.tables 
-                    WHERE table_schema = 'public'
-                    AND table_name LIKE :pattern
-                    LIMIT 1
-                """)
-                
                 # Cerca tabelle usando user_id
                 user = await self.get_user_by_id(user_id)
                 if not user:
                     return False, None
-                pattern = f"{user.id}/% INVENTARIO"
-                result = await session.execute(
-                    check_tables_query,
-                    {"pattern": pattern}
-                )
-                table_row = result.fetchone()
+                if user.business_name and tenant_tables.is_shared(user.id, INVENTARIO):
+                    return True, user.business_name
+                tables = await table_catalog.find_tables(session, f"{user.id}/", " INVENTARIO")
                 
-                if table_row:
-                    table_name = table_row[0]
+                if tables:
+                    table_name = tables[0]
                     parts = table_name.split("/")
                     if len(parts) == 2:
                         business_name_part = parts[1].replace(" INVENTARIO", "")
@@ -624,31 +624,20 @@ class DatabaseManager:
         Returns:
             True se salvato con successo, False altrimenti
         """
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             user = await self.get_user_by_id(user_id)
             if not user or not user.business_name:
                 logger.warning(f"[DB] User user_id={user_id} non trovato o business_name mancante per log_chat_message")
                 return False
             
-            table_name = f'"{user.id}/{user.business_name} LOG interazione"'
+            table_name = tenant_table(user.id, user.business_name, LOG_INTERAZIONE)
             try:
                 # Normalizza ruolo su tipi ammessi (stesso sistema Telegram bot)
                 interaction_type = 'chat_user' if role == 'user' or role == 'chat_user' else 'chat_assistant'
                 
                 # Verifica se la colonna conversation_id esiste, altrimenti non la usa
                 # (per retrocompatibilità con tabelle esistenti)
-                has_conversation_id = False
-                try:
-                    check_column_query = sql_text(f"""
-                        SELECT column_name 
-                        FROM information_schema.columns 
-                        WHERE table_name = :table_name 
-                        AND column_name = 'conversation_id'
-                    """)
-                    result = await session.execute(check_column_query, {"table_name": table_name.replace('"', '')})
-                    has_conversation_id = result.fetchone() is not None
-                except:
-                    pass
+                has_conversation_id = await table_catalog.has_column(session, table_name, 'conversation_id')
                 
                 if has_conversation_id and conversation_id:
                     insert_query = sql_text(f"""
@@ -696,27 +685,16 @@ class DatabaseManager:
             Lista di dict con 'role' ('user' o 'assistant'), 'content' e 'created_at'
             Ordinati dal più vecchio al più recente (cronologico)
         """
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             user = await self.get_user_by_id(user_id)
             if not user or not user.business_name:
                 logger.warning(f"[DB] User user_id={user_id} non trovato o business_name mancante per get_recent_chat_messages")
                 return []
             
-            table_name = f'"{user.id}/{user.business_name} LOG interazione"'
+            table_name = tenant_table(user.id, user.business_name, LOG_INTERAZIONE)
             try:
                 # Verifica se la colonna conversation_id esiste
-                has_conversation_id = False
-                try:
-                    check_column_query = sql_text(f"""
-                        SELECT column_name 
-                        FROM information_schema.columns 
-                        WHERE table_name = :table_name 
-                        AND column_name = 'conversation_id'
-                    """)
-                    result = await session.execute(check_column_query, {"table_name": table_name.replace('"', '')})
-                    has_conversation_id = result.fetchone() is not None
-                except:
-                    pass
+                has_conversation_id = await table_catalog.has_column(session, table_name, 'conversation_id')
                 
                 if has_conversation_id and conversation_id:
                     query = sql_text(f"""
@@ -772,7 +750,7 @@ class DatabaseManager:
         Returns:
             ID conversazione creata o None se errore
         """
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             try:
                 insert_query = sql_text("""
                     INSERT INTO conversations (user_id, telegram_id, title, created_at, updated_at, last_message_at)
@@ -805,7 +783,7 @@ class DatabaseManager:
         Returns:
             Lista di dict con id, title, created_at, updated_at, last_message_at
         """
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             try:
                 # Usa sempre user_id per filtrare conversazioni
                 query = sql_text("""
@@ -845,7 +823,7 @@ class DatabaseManager:
         Returns:
             True se aggiornato con successo
         """
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             try:
                 update_query = sql_text("""
                     UPDATE conversations
@@ -872,7 +850,7 @@ class DatabaseManager:
         Returns:
             True se aggiornato con successo
         """
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             try:
                 # Verifica che la conversazione appartenga all'utente
                 check_query = sql_text("""
@@ -908,7 +886,7 @@ class DatabaseManager:
         Returns:
             True se cancellata con successo
         """
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             try:
                 # Verifica che la conversazione appartenga all'utente
                 check_query = sql_text("""
@@ -947,7 +925,7 @@ class DatabaseManager:
         Returns:
             True se salvato con successo
         """
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             try:
                 import json
                 # Verifica che la conversazione appartenga all'utente
@@ -990,7 +968,7 @@ class DatabaseManager:
         Returns:
             Lista di dict con movimenti pendenti o None se non ci sono
         """
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             try:
                 import json
                 query = sql_text("""
@@ -1028,7 +1006,7 @@ class DatabaseManager:
         Returns:
             True se cancellato con successo
         """
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             try:
                 update_query = sql_text("""
                     UPDATE conversations
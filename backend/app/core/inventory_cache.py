@@ -0,0 +1,215 @@
+"""
+Cache per-tenant dell'inventario (risultato di get_user_wines).
+
+Ogni voce è legata a un token di versione dell'inventario: (numero righe,
+max(updated_at), max(id)) della tabella INVENTARIO. Entro
+INVENTORY_CACHE_REVALIDATE_SECONDS la voce è servita senza query; dopo, basta
+la query del token (aggregati, nessuna riga trasferita) per decidere se
+rileggere. Le scritture fatte tramite processor_client invalidano subito il
+tenant; creazione e modifica di un singolo vino aggiornano invece la voce in
+place con la riga restituita (apply_wine). Eviction LRU su budget di memoria
+stimato; la voce può portare anche l'indice di ricerca in memoria del tenant
+(vedi inventory_search), che ne condivide versione, invalidazione e budget.
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Overhead stimato per oggetto Wine (istanza, __dict__, stato SQLAlchemy)
+_WINE_OVERHEAD_BYTES = 600
+# Overhead stimato per WineRow (istanza con __slots__, nessun __dict__)
+_WINE_ROW_OVERHEAD_BYTES = 200
+_WINE_TEXT_FIELDS = (
+    "name", "producer", "grape_variety", "region", "country", "wine_type",
+    "classification", "description", "notes",
+)
+
+
+def estimate_wines_size(wines: List[Any]) -> int:
+    """Stima (byte) della memoria occupata da una lista di Wine/WineRow"""
+    size = 64
+    for wine in wines:
+        size += _WINE_ROW_OVERHEAD_BYTES if hasattr(type(wine), "__slots__") else _WINE_OVERHEAD_BYTES
+        for field in _WINE_TEXT_FIELDS:
+            value = getattr(wine, field, None)
+            if value:
+                size += len(value)
+    return size
+
+
+class _Entry:
+    def __init__(self, table_name: str, version: Tuple, wines: List[Any], size: int):
+        self.table_name = table_name
+        self.version = version
+        self.wines = wines
+        self.size = size
+        self.validated_at = time.monotonic()
+        self.search_index: Optional[Any] = None
+
+
+class InventoryCache:
+    """Cache LRU per-tenant con budget di memoria e metriche hit/miss"""
+
+    def __init__(self, max_bytes: int, revalidate_seconds: float):
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        # Contatore per tenant incrementato a ogni invalidazione: scarta i put concorrenti
+        self._generations: Dict[int, int] = {}
+        self.current_bytes = 0
+        self.hits = 0
+        self.revalidated_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.in_place_updates = 0
+        self.search_index_builds = 0
+
+    def generation(self, user_id: int) -> int:
+        return self._generations.get(user_id, 0)
+
+    def get_fresh(self, user_id: int) -> Optional[List[Any]]:
+        """Ritorna l'inventario se validato da meno di revalidate_seconds (nessuna query)"""
+        entry = self._entries.get(user_id)
+        if entry is None or time.monotonic() - entry.validated_at > self.revalidate_seconds:
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry.wines
+
+    def get_if_version(self, user_id: int, table_name: str, version: Tuple) -> Optional[List[Any]]:
+        """Ritorna l'inventario se il token di versione coincide, altrimenti None (miss)"""
+        entry = self._entries.get(user_id)
+        if entry is not None and entry.table_name == table_name and entry.version == version:
+            entry.validated_at = time.monotonic()
+            self._entries.move_to_end(user_id)
+            self.revalidated_hits += 1
+            return entry.wines
+        self.misses += 1
+        return None
+
+    def put(self, user_id: int, table_name: str, version: Tuple, wines: List[Any], generation: int) -> None:
+        """Memorizza l'inventario (ignorato se il tenant è stato invalidato durante la lettura)"""
+        if generation != self.generation(user_id):
+            return
+        size = estimate_wines_size(wines)
+        if size > self.max_bytes:
+            logger.info(f"[INVENTORY_CACHE] Inventario user_id={user_id} ({size} byte) oltre il budget, non in cache")
+            self._drop(user_id)
+            return
+        self._drop(user_id)
+        self._entries[user_id] = _Entry(table_name, version, wines, size)
+        self.current_bytes += size
+        self._enforce_budget()
+
+    def get_search_index(self, user_id: int, wines: List[Any], build: Callable[[List[Any]], Any]) -> Any:
+        """
+        Indice di ricerca dell'inventario (inventory_search), costruito al primo uso.
+        Va chiamato subito dopo get_user_wines, senza await in mezzo: se la voce
+        esiste corrisponde a `wines`. Senza voce (inventario fuori budget o
+        invalidato durante la lettura) l'indice è costruito e non memorizzato.
+        """
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return build(wines)
+        if entry.search_index is None:
+            entry.search_index = build(entry.wines)
+            index_size = getattr(entry.search_index, "size_bytes", 0)
+            entry.size += index_size
+            self.current_bytes += index_size
+            self.search_index_builds += 1
+            self._enforce_budget()
+        return entry.search_index
+
+    def _enforce_budget(self) -> None:
+        while self.current_bytes > self.max_bytes and self._entries:
+            evicted_id, _ = next(iter(self._entries.items()))
+            self._drop(evicted_id)
+            self.evictions += 1
+
+    def apply_wine(self, user_id: int, table_name: str, wine: Any, created: bool = False) -> bool:
+        """
+        Aggiorna in place la voce del tenant con la riga appena scritta (creata o
+        modificata) invece di invalidarla: la lettura successiva la vede senza
+        rileggere l'inventario. Il token di versione avanza come farebbe quello
+        calcolato dal DB (righe +1 se creato, max(updated_at), max(id)).
+
+        Returns:
+            True se la voce è stata aggiornata, False se è stata invalidata
+            (o non c'era)
+        """
+        self._generations[user_id] = self.generation(user_id) + 1
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return False
+        n, last_update, max_id = entry.version
+        position = next((i for i, cached in enumerate(entry.wines) if cached.id == wine.id), None)
+        try:
+            if created == (position is not None) or entry.table_name != table_name or wine.updated_at is None:
+                raise ValueError("voce non coerente con la scrittura")
+            last_update = wine.updated_at if last_update is None else max(last_update, wine.updated_at)
+        except (TypeError, ValueError):
+            # Es. vino assente dalla voce o updated_at con/senza fuso orario: rilettura completa
+            self.invalidate(user_id)
+            return False
+
+        wines = list(entry.wines)
+        if created:
+            # Stesso ordine di get_user_wines (ORDER BY name)
+            key = (wine.name or "").casefold()
+            position = next((i for i, cached in enumerate(wines) if (cached.name or "").casefold() > key), len(wines))
+            wines.insert(position, wine)
+            n += 1
+        else:
+            wines[position] = wine
+        size = estimate_wines_size(wines)
+        self._drop(user_id)
+        self._entries[user_id] = _Entry(table_name, (n, last_update, max(max_id or 0, wine.id)), wines, size)
+        self.current_bytes += size
+        self.in_place_updates += 1
+        self._enforce_budget()
+        return True
+
+    def invalidate(self, user_id: int) -> None:
+        """Invalida il tenant (chiamato dopo ogni scrittura sull'inventario)"""
+        self._generations[user_id] = self.generation(user_id) + 1
+        if self._drop(user_id):
+            self.invalidations += 1
+
+    def _drop(self, user_id: int) -> bool:
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return False
+        self.current_bytes -= entry.size
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.revalidated_hits + self.misses
+        return {
+            "tenants": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "revalidated_hits": self.revalidated_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.revalidated_hits) / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "in_place_updates": self.in_place_updates,
+            "search_index_builds": self.search_index_builds,
+            "search_indexes": sum(1 for entry in self._entries.values() if entry.search_index is not None),
+        }
+
+
+_settings = get_settings()
+
+# Istanza globale
+inventory_cache = InventoryCache(
+    max_bytes=_settings.INVENTORY_CACHE_MAX_BYTES,
+    revalidate_seconds=_settings.INVENTORY_CACHE_REVALIDATE_SECONDS,
+)
@@ -0,0 +1,263 @@
+"""
+Indice di ricerca in memoria per l'inventario di un tenant.
+
+Costruito dall'inventario in inventory_cache e agganciato alla sua voce: vale
+per la stessa versione dell'inventario, viene scartato con essa (invalidazione,
+nuovo token di versione, eviction LRU) e il suo peso rientra nel budget
+INVENTORY_CACHE_MAX_BYTES.
+
+Struttura: testi dei campi normalizzati come in search_wines (minuscolo, senza
+accenti, apostrofi → spazio), indice invertito token → vini e indice di
+trigrammi → vini per i match di sottostringa (equivalenti a ILIKE '%termine%');
+annata → vini e confronto sui prezzi per i termini numerici (come
+vintage = :search_numeric e ABS(prezzo - :search_float) < 0.01).
+Una sola passata risponde ai livelli della ricerca a cascata: ricerca originale
+(termine, plurali, parole significative), varianti del livello 1 e, in ultima
+istanza, match approssimato per similarità di trigrammi (errori di battitura).
+"""
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.config import get_settings
+from app.core.database import db_manager
+from app.core.inventory_cache import inventory_cache
+from app.core.wine_search import (
+    PRIMARY_FIELDS, SEARCH_FIELDS, STOP_WORDS,
+    normalize_plural_for_search, normalize_search_term, strip_accents,
+)
+
+logger = logging.getLogger(__name__)
+
+# Soglia di similarità (Jaccard sui trigrammi) per il match approssimato
+FUZZY_THRESHOLD = 0.45
+
+# Tolleranza del confronto sui prezzi (come la query SQL)
+PRICE_TOLERANCE = 0.01
+
+# Livelli in ordine di preferenza, come nella ricerca a cascata
+LEVEL_ORIGINAL = "original"
+LEVEL_1 = "level1"
+LEVEL_FUZZY = "fuzzy"
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def fold(value: Any) -> str:
+    """Normalizzazione dei testi indicizzati: stessa di normalize_search_term + accenti rimossi"""
+    if value is None:
+        return ""
+    return strip_accents(normalize_search_term(str(value)))
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _word_trigrams(word: str) -> Set[str]:
+    # Padding come pg_trgm: i bordi della parola pesano nella similarità
+    return trigrams(f"  {word} ")
+
+
+class _Doc:
+    __slots__ = ("wine", "primary", "full", "name")
+
+    def __init__(self, wine: Any):
+        self.wine = wine
+        self.primary = "\n".join(fold(getattr(wine, f, None)) for f in PRIMARY_FIELDS)
+        self.full = "\n".join(fold(getattr(wine, f, None)) for f in SEARCH_FIELDS)
+        self.name = fold(getattr(wine, "name", None))
+
+
+class InventorySearchIndex:
+    """Indice invertito + trigrammi su un inventario (immutabile dopo la costruzione)"""
+
+    def __init__(self, wines: List[Any]):
+        self.docs = [_Doc(wine) for wine in wines]
+        tokens: Dict[str, Set[int]] = {}
+        grams: Dict[str, Set[int]] = {}
+        for doc_id, doc in enumerate(self.docs):
+            for token in _TOKEN_RE.findall(doc.full):
+                tokens.setdefault(token, set()).add(doc_id)
+            for field_text in doc.full.split("\n"):
+                for gram in trigrams(field_text):
+                    grams.setdefault(gram, set()).add(doc_id)
+        # Posting list come tuple: metà della memoria dei set
+        self.tokens = {token: tuple(ids) for token, ids in tokens.items()}
+        self.grams = {gram: tuple(ids) for gram, ids in grams.items()}
+        self.vocabulary_grams = {token: _word_trigrams(token) for token in self.tokens if len(token) > 2}
+        vintages: Dict[int, List[int]] = {}
+        for doc_id, doc in enumerate(self.docs):
+            vintage = getattr(doc.wine, "vintage", None)
+            if vintage is not None:
+                vintages.setdefault(vintage, []).append(doc_id)
+        self.vintages = {vintage: tuple(ids) for vintage, ids in vintages.items()}
+        self.size_bytes = self._estimate_size()
+
+    def _estimate_size(self) -> int:
+        size = 256
+        for doc in self.docs:
+            size += 120 + 2 * (len(doc.primary) + len(doc.full))
+        for postings in (self.tokens, self.grams):
+            for key, ids in postings.items():
+                size += 120 + len(key) + 8 * len(ids)
+        size += 250 * len(self.vocabulary_grams)
+        for ids in self.vintages.values():
+            size += 120 + 8 * len(ids)
+        return size
+
+    def _docs_containing(self, pattern: str) -> Iterable[int]:
+        """Vini in cui pattern compare come sottostringa di un campo (ILIKE '%pattern%')"""
+        if not pattern:
+            return ()
+        if len(pattern) < 3:
+            return (i for i, doc in enumerate(self.docs) if pattern in doc.full)
+        postings = []
+        for gram in trigrams(pattern):
+            ids = self.grams.get(gram)
+            if not ids:
+                return ()
+            postings.append(ids)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            candidates.intersection_update(ids)
+            if not candidates:
+                return ()
+        # Verifica: i trigrammi potrebbero venire da campi o posizioni diverse
+        return (i for i in candidates if pattern in self.docs[i].full)
+
+    def _numeric_docs(self, term: str) -> Iterable[int]:
+        """Termine numerico: vini dell'annata (intero) o con prezzo di costo/vendita uguale (decimale)"""
+        try:
+            return self.vintages.get(int(term), ())
+        except ValueError:
+            pass
+        try:
+            price = float(term.replace(',', '.'))
+        except ValueError:
+            return ()
+        return (
+            i for i, doc in enumerate(self.docs)
+            if any(
+                value is not None and abs(value - price) < PRICE_TOLERANCE
+                for value in (getattr(doc.wine, "cost_price", None), getattr(doc.wine, "selling_price", None))
+            )
+        )
+
+    def _fuzzy_docs(self, words: List[str]) -> Dict[int, float]:
+        """Vini con token simili (trigrammi) alle parole cercate: doc_id → similarità migliore"""
+        scores: Dict[int, float] = {}
+        for word in words:
+            word_grams = _word_trigrams(word)
+            for token, token_grams in self.vocabulary_grams.items():
+                shared = len(word_grams & token_grams)
+                if not shared:
+                    continue
+                similarity = shared / len(word_grams | token_grams)
+                if similarity < FUZZY_THRESHOLD:
+                    continue
+                for doc_id in self.tokens[token]:
+                    if similarity > scores.get(doc_id, 0.0):
+                        scores[doc_id] = similarity
+        return scores
+
+    def search(
+        self,
+        query: str,
+        limit: int = 10,
+        variants: Optional[List[str]] = None
+    ) -> Tuple[List[Any], Optional[str], Optional[str]]:
+        """
+        Ricerca a cascata in una passata.
+
+        Args:
+            query: Termine cercato dall'utente
+            limit: Numero massimo di risultati
+            variants: Varianti del livello 1 (es. AIService._retry_level_1_normalize_local)
+
+        Returns:
+            (vini ordinati, livello, variante usata) — variante None per il livello originale
+        """
+        term = fold(query)
+        if not term:
+            return [], None, None
+
+        # Livello originale: stessi pattern di search_wines
+        term_patterns = [term] + [strip_accents(v) for v in normalize_plural_for_search(term) if v != term]
+        words = [w for w in term.split() if len(w) > 2 and w not in STOP_WORDS]
+        hits: Dict[int, List] = {}  # doc_id → [tier, parole trovate]
+        for tier, patterns in ((0, term_patterns[:1]), (1, term_patterns[1:])):
+            for pattern in patterns:
+                for doc_id in self._docs_containing(pattern):
+                    doc = self.docs[doc_id]
+                    # Termine in nome/produttore/vitigno prima degli altri campi (match_priority)
+                    doc_tier = tier if pattern in doc.primary else tier + 2
+                    if doc_id not in hits or doc_tier < hits[doc_id][0]:
+                        hits[doc_id] = [doc_tier, 0]
+        for word in words:
+            matched = set()
+            for variant in normalize_plural_for_search(word):
+                matched.update(self._docs_containing(strip_accents(variant)))
+            for doc_id in matched:
+                hit = hits.setdefault(doc_id, [4, 0])
+                hit[1] += 1
+        # Annata o prezzo: match_priority 2 nella query SQL (termine non in nome/produttore/vitigno)
+        for doc_id in self._numeric_docs(term):
+            if doc_id not in hits or hits[doc_id][0] > 2:
+                hits[doc_id] = [2, hits.get(doc_id, [0, 0])[1]]
+        if hits:
+            return self._rank(hits, term, limit), LEVEL_ORIGINAL, None
+
+        # Livello 1: varianti normalizzate, la prima che trova risultati
+        for variant in variants or []:
+            folded = fold(variant)
+            if not folded or folded == term:
+                continue
+            hits = {doc_id: [0 if folded in self.docs[doc_id].primary else 1, 0]
+                    for doc_id in self._docs_containing(folded)}
+            if hits:
+                return self._rank(hits, folded, limit), LEVEL_1, variant
+
+        # Match approssimato: parole con errori di battitura
+        scores = self._fuzzy_docs(words or [term])
+        if scores:
+            ranked = sorted(scores, key=lambda i: (-scores[i], self.docs[i].name))[:limit]
+            return [self.docs[i].wine for i in ranked], LEVEL_FUZZY, None
+        return [], None, None
+
+    def _rank(self, hits: Dict[int, List], term: str, limit: int) -> List[Any]:
+        term_grams = _word_trigrams(term)
+
+        def similarity(doc_id: int) -> float:
+            doc_grams = trigrams(f"  {self.docs[doc_id].name} ")
+            union = len(term_grams | doc_grams)
+            return len(term_grams & doc_grams) / union if union else 0.0
+
+        ranked = sorted(
+            hits,
+            key=lambda i: (hits[i][0], -hits[i][1], -similarity(i), self.docs[i].name)
+        )
+        return [self.docs[i].wine for i in ranked[:limit]]
+
+
+async def search_inventory(
+    user_id: int,
+    query: str,
+    limit: int = 10,
+    variants: Optional[List[str]] = None
+) -> Optional[Tuple[List[Any], Optional[str], Optional[str]]]:
+    """
+    Cerca nell'inventario del tenant usando l'indice in memoria.
+
+    Returns:
+        (vini, livello, variante usata), oppure None se l'indice non è utilizzabile
+        (disabilitato o inventario vuoto/non leggibile): il chiamante usa il DB
+    """
+    if not get_settings().INVENTORY_SEARCH_INDEX_ENABLED:
+        return None
+    wines = await db_manager.get_user_wines(user_id)
+    if not wines:
+        return None
+    index = inventory_cache.get_search_index(user_id, wines, InventorySearchIndex)
+    return index.search(query, limit=limit, variants=variants)
@@ -0,0 +1,188 @@
+"""
+Tracciamento dei job del processor (elaborazione inventario).
+
+wait_for_job_completion interrogava /status/{job_id} a intervallo fisso per
+ogni chiamante. Qui ogni job ha un solo poller, condiviso da tutti i waiter e
+dagli eventi inviati ai client:
+- polling con backoff esponenziale e jitter (JOB_POLL_INITIAL_SECONDS fino a
+  JOB_POLL_MAX_SECONDS) tramite la sessione HTTP condivisa di ProcessorClient;
+- il processor può notificare il completamento su
+  POST /api/processor/jobs/callback (se PROCESSOR_CALLBACK_TOKEN è
+  configurato): i waiter vengono risolti subito e il poller si ferma;
+- ogni cambio di stato è pubblicato ai sottoscrittori (stream SSE
+  /api/processor/jobs/{job_id}/events).
+
+Lo stato è in memoria per processo: callback ricevute da un'altra replica
+vengono comunque raggiunte dal polling.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, Optional, Set
+
+from app.core.config import get_settings
+from app.core.request_context import create_background_task
+from app.core.table_catalog import table_catalog
+
+logger = logging.getLogger(__name__)
+
+# "timeout": job non concluso entro JOB_TRACK_MAX_SECONDS (stato del tracker)
+TERMINAL_STATUSES = ("completed", "error", "failed", "timeout")
+
+
+class _TrackedJob:
+    def __init__(self, job_id: str, user_id: Optional[int]):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.status: Optional[Dict[str, Any]] = None
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.poller: Optional[asyncio.Task] = None
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+
+
+class JobTracker:
+    """Un poller per job_id, waiter e sottoscrittori condivisi"""
+
+    def __init__(self):
+        self._jobs: Dict[str, _TrackedJob] = {}
+        self.polls = 0
+        self.callbacks = 0
+
+    def _prune(self) -> None:
+        """Dimentica i job terminati da più di JOB_RESULT_TTL_SECONDS"""
+        ttl = get_settings().JOB_RESULT_TTL_SECONDS
+        now = time.monotonic()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > ttl and not job.subscribers
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def track(self, job_id: str, user_id: Optional[int] = None) -> _TrackedJob:
+        """Registra il job (idempotente) e avvia il poller se non è già attivo o concluso"""
+        self._prune()
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = self._jobs[job_id] = _TrackedJob(job_id, user_id)
+        elif job.user_id is None:
+            job.user_id = user_id
+        if not job.done.done() and (job.poller is None or job.poller.done()):
+            # Fuori dal contesto della richiesta: il job può durare più della sua deadline
+            job.poller = create_background_task(self._poll(job))
+        return job
+
+    def get(self, job_id: str) -> Optional[_TrackedJob]:
+        return self._jobs.get(job_id)
+
+    async def wait(
+        self,
+        job_id: str,
+        max_wait_seconds: float = 300,
+        user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Attende lo stato finale del job (stesso formato di get_job_status, o status=timeout)"""
+        job = self.track(job_id, user_id)
+        try:
+            # shield: il timeout di un waiter non cancella il risultato condiviso
+            return await asyncio.wait_for(asyncio.shield(job.done), timeout=max_wait_seconds)
+        except asyncio.TimeoutError:
+            return {
+                "status": "timeout",
+                "job_id": job_id,
+                "error": f"Timeout dopo {max_wait_seconds} secondi"
+            }
+
+    def resolve(self, job_id: str, status: Dict[str, Any]) -> bool:
+        """
+        Stato notificato dal processor (callback).
+
+        Returns:
+            True se il job era tracciato da questo processo
+        """
+        self.callbacks += 1
+        job = self._jobs.get(job_id)
+        tracked = job is not None
+        if job is None:
+            # Conservato per JOB_RESULT_TTL_SECONDS: i waiter successivi lo ricevono subito
+            job = self._jobs[job_id] = _TrackedJob(job_id, None)
+        self._publish(job, status)
+        return tracked
+
+    def subscribe(self, job_id: str, user_id: Optional[int] = None) -> asyncio.Queue:
+        """Coda degli stati del job: riceve subito l'ultimo stato noto"""
+        job = self.track(job_id, user_id)
+        queue: asyncio.Queue = asyncio.Queue()
+        job.subscribers.add(queue)
+        if job.status is not None:
+            queue.put_nowait(job.status)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue) -> None:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.subscribers.discard(queue)
+
+    def _publish(self, job: _TrackedJob, status: Dict[str, Any]) -> None:
+        """Nuovo stato: notifica i sottoscrittori se cambiato, risolve i waiter se finale"""
+        status = dict(status, job_id=job.job_id)
+        changed = job.status != status
+        job.status = status
+        if changed:
+            for queue in job.subscribers:
+                queue.put_nowait(status)
+        if status.get("status") in TERMINAL_STATUSES and not job.done.done():
+            job.done.set_result(status)
+            job.finished_at = time.monotonic()
+            if job.poller is not None and job.poller is not asyncio.current_task():
+                job.poller.cancel()
+            owner = job.user_id if job.user_id is not None else status.get("user_id")
+            if owner is not None:
+                # Il job può aver creato le tabelle del tenant: catalogo da ricaricare per il tenant
+                try:
+                    table_catalog.invalidate_tenant(int(owner))
+                except (TypeError, ValueError):
+                    pass
+            logger.info(f"[JOB_TRACKER] Job {job.job_id} concluso: {status.get('status')}")
+
+    async def _poll(self, job: _TrackedJob) -> None:
+        """Polling con backoff esponenziale e jitter fino allo stato finale o a JOB_TRACK_MAX_SECONDS"""
+        from app.core.processor_client import processor_client
+
+        settings = get_settings()
+        delay = settings.JOB_POLL_INITIAL_SECONDS
+        try:
+            while not job.done.done():
+                if time.monotonic() - job.started_at > settings.JOB_TRACK_MAX_SECONDS:
+                    self._publish(job, {
+                        "status": "timeout",
+                        "error": f"Job non concluso dopo {settings.JOB_TRACK_MAX_SECONDS:.0f} secondi"
+                    })
+                    return
+                status = await processor_client.get_job_status(job.job_id)
+                self.polls += 1
+                if status.get("retryable"):
+                    # Errore di connessione del polling, non del job: riprova al prossimo giro
+                    logger.warning(f"[JOB_TRACKER] Polling job {job.job_id} fallito: {status.get('error')}")
+                else:
+                    self._publish(job, status)
+                if job.done.done():
+                    return
+                # Equal jitter: metà del ritardo fissa, metà casuale (evita poll sincronizzati tra job)
+                await asyncio.sleep(delay / 2 + random.uniform(0, delay / 2))
+                delay = min(delay * 2, settings.JOB_POLL_MAX_SECONDS)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"[JOB_TRACKER] Errore polling job {job.job_id}: {e}", exc_info=True)
+
+    def stats(self) -> Dict[str, int]:
+        active = sum(1 for job in self._jobs.values() if not job.done.done())
+        return {"tracked": len(self._jobs), "active": active, "polls": self.polls, "callbacks": self.callbacks}
+
+
+# Istanza globale
+job_tracker = JobTracker()
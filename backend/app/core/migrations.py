@@ -6,6 +6,9 @@ import logging
 from sqlalchemy import text as sql_text
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import AsyncSessionLocal, db_manager
+from app.core.tenant_tables import (
+    INVENTARIO, LOG_INTERAZIONE, migrate_tenant_storage_table, tenant_table, tenant_tables,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +30,11 @@ async def run_migrations():
             print("[MIGRATIONS] Esecuzione migrazione tabella conversations...", file=sys.stderr)
             await migrate_conversations_table(session)
             
+            # Migrazione 6: Registro storage tenant (prima della 2: i tenant su tabelle condivise non vanno scansionati)
+            print("[MIGRATIONS] Esecuzione migrazione registro storage tenant...", file=sys.stderr)
+            await migrate_tenant_storage_table(session)
+            await tenant_tables.refresh(session)
+            
             # Migrazione 2: Aggiungi colonna conversation_id alle tabelle LOG interazione esistenti
             print("[MIGRATIONS] Esecuzione migrazione tabelle LOG interazione...", file=sys.stderr)
             await migrate_log_interaction_tables(session)
@@ -40,9 +48,27 @@ async def run_migrations():
             print("[MIGRATIONS] Esecuzione migrazione pending_movements...", file=sys.stderr)
             await migrate_pending_movements_column(session)
             
+            # Migrazione 5: Colonna search_document + indice trigram sulle tabelle INVENTARIO
+            print("[MIGRATIONS] Esecuzione migrazione indice ricerca INVENTARIO...", file=sys.stderr)
+            await migrate_inventory_search_index(session)
+            
+            # Migrazione 7: Registro movimenti normalizzato (wine_movements), popolato dalle history
+            print("[MIGRATIONS] Esecuzione migrazione registro movimenti...", file=sys.stderr)
+            from app.core.movements_ledger import migrate_movements_ledger_tables
+            await migrate_movements_ledger_tables(session)
+            
+            # Migrazione 8: Rollup giornaliero dei movimenti (wine_movements_daily)
+            print("[MIGRATIONS] Esecuzione migrazione rollup giornaliero movimenti...", file=sys.stderr)
+            from app.core.movements_rollup import migrate_movements_rollup_table
+            await migrate_movements_rollup_table(session)
+            
             print("[MIGRATIONS] Commit modifiche database...", file=sys.stderr)
             await session.commit()
             
+            # Tabelle/colonne modificate: il catalogo va ricaricato
+            from app.core.table_catalog import table_catalog
+            table_catalog.invalidate()
+            
             print("[MIGRATIONS] ✅ Migrazioni completate con successo", file=sys.stderr)
             logger.info("[MIGRATIONS] ✅ Migrazioni completate con successo")
     except Exception as e:
@@ -130,6 +156,10 @@ async def migrate_log_interaction_tables(session: AsyncSession):
         for user in users:
             user_id = user.id  # Usa user_id direttamente
             business_name = user.business_name
+            if tenant_tables.is_shared(user_id, LOG_INTERAZIONE):
+                # Tabella condivisa: conversation_id creata da migrate_tenants_to_shared.py
+                tables_skipped += 1
+                continue
             # Cerca tabella con pattern user_id (nuovo formato)
             table_name = f'"{user_id}/{business_name} LOG interazione"'
             
@@ -249,3 +279,38 @@ async def migrate_pending_movements_column(session: AsyncSession):
         logger.error(f"[MIGRATIONS] Errore aggiungendo colonna pending_movements: {e}", exc_info=True)
         # Non sollevare eccezione per non bloccare l'avvio
         logger.warning("[MIGRATIONS] Continuo comunque l'avvio dell'applicazione...")
+
+
+async def migrate_inventory_search_index(session: AsyncSession):
+    """
+    Aggiunge colonna generata search_document e indice GIN pg_trgm alle tabelle INVENTARIO esistenti.
+    Le tabelle sono dinamiche: "{user_id}/{business_name} INVENTARIO"
+    """
+    from app.core.wine_search import ensure_search_index
+    
+    try:
+        get_users_query = sql_text("""
+            SELECT id, business_name 
+            FROM users 
+            WHERE business_name IS NOT NULL AND business_name != ''
+        """)
+        result = await session.execute(get_users_query)
+        users = result.fetchall()
+        
+        if not users:
+            logger.info("[MIGRATIONS] Nessun utente con business_name trovato, skip migrazione indice ricerca")
+            return
+        
+        tables_indexed = 0
+        for user in users:
+            table_name = tenant_table(user.id, user.business_name, INVENTARIO)
+            # ensure_search_index salta le tabelle inesistenti e non solleva eccezioni
+            if await ensure_search_index(session, table_name):
+                tables_indexed += 1
+        
+        logger.info(f"[MIGRATIONS] ✅ Indice ricerca INVENTARIO: {tables_indexed}/{len(users)} tabelle indicizzate")
+        
+    except Exception as e:
+        logger.error(f"[MIGRATIONS] Errore durante migrazione indice ricerca INVENTARIO: {e}", exc_info=True)
+        # Non sollevare eccezione per non bloccare l'avvio
+        logger.warning("[MIGRATIONS] Continuo comunque l'avvio dell'applicazione...")
@@ -0,0 +1,382 @@
+"""
+Registro movimenti normalizzato (wine_movements) derivato dalle history di "Storico vino".
+
+I movimenti vivono nell'array JSON `history` di ogni riga di Storico vino,
+scritto dal processor. Le letture per periodo (movimenti per periodo, report
+giornaliero) caricavano e decodificavano tutte le history del tenant: il costo
+cresceva con la lunghezza totale dello storico, non con il periodo richiesto.
+
+wine_movements ha una riga per movimento (riga di Storico vino, vino, timestamp,
+tipo, quantità, stock prima/dopo, voce originale), chiave (user_id, storico_id,
+entry_index) e indice (user_id, ts): le letture per periodo sono range scan. La
+chiave è la riga di Storico vino, non il nome: più righe con lo stesso
+wine_name hanno history distinte. La sincronizzazione è incrementale e tutta in
+SQL (jsonb_array_elements), serializzata per tenant con un advisory lock:
+- in background dopo ogni movimento inviato al processor (processor_client);
+- prima di ogni lettura, se il token di versione dello storico (numero vini,
+  max updated_at / last_movement_date) è cambiato: copre anche i movimenti
+  scritti da altri client del processor.
+Vengono scompattate solo le righe modificate dopo l'ultima sincronizzazione;
+nella stessa transazione si ricalcolano i giorni toccati del rollup giornaliero
+(movements_rollup), da cui leggono i totali per periodo.
+Storico ricreato (upload inventario, vini eliminati) → il ledger del tenant
+viene ricostruito.
+
+Se il ledger non è utilizzabile (colonne mancanti, history non valide) i metodi
+di lettura ritornano None e i chiamanti leggono le history.
+"""
+import json
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from sqlalchemy import text as sql_text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.movements_rollup import movements_rollup
+from app.core.table_catalog import table_catalog
+
+logger = logging.getLogger(__name__)
+
+# Voce valida: data ISO in testa ("2025-01-23", "2025-01-23T10:30:00.123456", "2025-01-23 10:30:00")
+DATE_PREFIX_RE = r"^\d{4}-\d{2}-\d{2}"
+TIMESTAMP_RE = r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?$"
+INTEGER_RE = r"^\s*-?\d+\s*$"
+
+REQUIRED_COLUMNS = frozenset({"id", "wine_name", "history", "updated_at"})
+
+# Movimenti di dettaglio per vino nelle letture per periodo (card e report ne mostrano 5)
+DETAIL_MOVEMENTS = 5
+
+# Namespace dell'advisory lock per tenant
+_LOCK_NAMESPACE = 7420
+
+
+def history_int_field(key: str) -> str:
+    """Campo intero della voce JSON (troncato come int() in Python, NULL se non numerico)"""
+    value = f"e.value->'{key}'"
+    return f"""CASE
+        WHEN jsonb_typeof({value}) = 'number' THEN trunc(({value})::numeric)::int
+        WHEN jsonb_typeof({value}) = 'string' AND (e.value->>'{key}') ~ :int_re THEN trim(e.value->>'{key}')::int
+    END"""
+
+
+def _entry(value: Any) -> Dict[str, Any]:
+    return json.loads(value) if isinstance(value, str) else value
+
+
+async def migrate_movements_ledger_tables(session: AsyncSession) -> None:
+    """Crea wine_movements e lo stato di sincronizzazione per tenant se non esistono"""
+    await session.execute(sql_text("""
+        CREATE TABLE IF NOT EXISTS wine_movements (
+            id BIGSERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            storico_id INTEGER NOT NULL,
+            wine_name TEXT NOT NULL,
+            entry_index INTEGER NOT NULL,
+            ts TIMESTAMP NOT NULL,
+            movement_type VARCHAR(50),
+            quantity INTEGER,
+            quantity_before INTEGER,
+            quantity_after INTEGER,
+            entry JSONB NOT NULL,
+            UNIQUE (user_id, storico_id, entry_index)
+        )
+    """))
+    await session.execute(sql_text(
+        "CREATE INDEX IF NOT EXISTS idx_wine_movements_user_ts ON wine_movements (user_id, ts)"
+    ))
+    # Dettaglio per vino di period_movements (LATERAL per wine_name, ordinato per ts)
+    await session.execute(sql_text(
+        "CREATE INDEX IF NOT EXISTS idx_wine_movements_user_wine_ts ON wine_movements (user_id, wine_name, ts)"
+    ))
+    await session.execute(sql_text("""
+        CREATE TABLE IF NOT EXISTS wine_movements_sync (
+            user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+            storico_table TEXT NOT NULL,
+            wines INTEGER NOT NULL DEFAULT 0,
+            updated_upto TIMESTAMP,
+            movement_upto TIMESTAMP,
+            synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+
+
+class MovementsLedger:
+    """Sincronizzazione e letture di wine_movements"""
+
+    def __init__(self):
+        # Versione dello storico per cui la sincronizzazione è fallita: non riprovare finché non cambia
+        self._failed: Dict[int, Tuple] = {}
+        # Tenant da ricostruire (tabelle ricreate dal processor)
+        self._rebuild: Set[int] = set()
+        # Versione dello storico a cui il ledger del tenant è allineato (ultima ensure_synced riuscita)
+        self._versions: Dict[int, Tuple] = {}
+        self.syncs = 0
+        self.rebuilds = 0
+        self.failures = 0
+
+    def invalidate_tenant(self, user_id: int) -> None:
+        """Storico vino ricreato o eliminato: ricostruisci il ledger del tenant alla prossima lettura"""
+        self._rebuild.add(user_id)
+        self._failed.pop(user_id, None)
+        self._versions.pop(user_id, None)
+
+    def version(self, user_id: int) -> Optional[Tuple]:
+        """Token di versione dello storico allineato dall'ultima ensure_synced (chiave per cache derivate)"""
+        return self._versions.get(user_id)
+
+    async def _version(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        table_storico: str,
+        columns: FrozenSet[str]
+    ) -> Tuple:
+        """(tabella, numero vini, max updated_at, max last_movement_date): nessuna history letta"""
+        movement = "MAX(last_movement_date)::timestamp" if "last_movement_date" in columns else "NULL::timestamp"
+        result = await session.execute(sql_text(f"""
+            SELECT COUNT(*), MAX(updated_at)::timestamp, {movement} FROM {table_storico} WHERE user_id = :user_id
+        """), {"user_id": user_id})
+        count, updated_upto, movement_upto = result.fetchone()
+        return (table_storico, count, updated_upto, movement_upto)
+
+    async def _sync(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        table_storico: str,
+        columns: FrozenSet[str],
+        state: Optional[Tuple]
+    ) -> None:
+        """Copia le voci nuove delle righe modificate dopo state (tutte se state è None)"""
+        params: Dict[str, Any] = {
+            "user_id": user_id, "date_re": DATE_PREFIX_RE, "ts_re": TIMESTAMP_RE, "int_re": INTEGER_RE,
+        }
+        changed = "s.user_id = :user_id AND s.wine_name IS NOT NULL"
+        # Giorni (vino, data) da ricalcolare nel rollup giornaliero
+        touched: Set[Tuple[str, date]] = set()
+        if state is None:
+            await session.execute(sql_text("DELETE FROM wine_movements WHERE user_id = :user_id"), params)
+        else:
+            _, _, updated_upto, movement_upto = state
+            conditions = []
+            if updated_upto is not None:
+                conditions.append("s.updated_at::timestamp >= :updated_upto")
+                params["updated_upto"] = updated_upto
+            if movement_upto is not None and "last_movement_date" in columns:
+                conditions.append("s.last_movement_date::timestamp >= :movement_upto")
+                params["movement_upto"] = movement_upto
+            if conditions:
+                changed += f" AND ({' OR '.join(conditions)})"
+            # History accorciate: scarta le voci oltre la nuova lunghezza
+            discarded = await session.execute(sql_text(f"""
+                DELETE FROM wine_movements w
+                USING (
+                    SELECT s.id AS storico_id,
+                        CASE WHEN jsonb_typeof(s.history::jsonb) = 'array'
+                             THEN jsonb_array_length(s.history::jsonb) ELSE 0 END AS entries
+                    FROM {table_storico} s
+                    WHERE {changed}
+                ) c
+                WHERE w.user_id = :user_id AND w.storico_id = c.storico_id AND w.entry_index >= c.entries
+                RETURNING w.wine_name, w.ts::date
+            """), params)
+            touched.update(tuple(row) for row in discarded.fetchall())
+
+        inserted = await session.execute(sql_text(f"""
+            INSERT INTO wine_movements
+                (user_id, storico_id, wine_name, entry_index, ts, movement_type,
+                 quantity, quantity_before, quantity_after, entry)
+            SELECT :user_id, src.storico_id, src.wine_name, e.ord - 1,
+                CASE WHEN e.value->>'date' ~ :ts_re THEN (e.value->>'date')::timestamp
+                     ELSE substr(e.value->>'date', 1, 10)::timestamp END,
+                left(e.value->>'type', 50),
+                {history_int_field('quantity')},
+                {history_int_field('quantity_before')},
+                {history_int_field('quantity_after')},
+                e.value
+            FROM (
+                SELECT s.id AS storico_id, s.wine_name, s.history::jsonb AS history
+                FROM {table_storico} s
+                WHERE {changed}
+            ) src
+            LEFT JOIN LATERAL (
+                SELECT MAX(w.entry_index) AS last_index FROM wine_movements w
+                WHERE w.user_id = :user_id AND w.storico_id = src.storico_id
+            ) synced ON TRUE
+            CROSS JOIN LATERAL jsonb_array_elements(
+                CASE WHEN jsonb_typeof(src.history) = 'array' THEN src.history ELSE '[]'::jsonb END
+            ) WITH ORDINALITY AS e(value, ord)
+            WHERE e.ord - 1 > COALESCE(synced.last_index, -1)
+              AND jsonb_typeof(e.value) = 'object'
+              AND e.value->>'date' ~ :date_re
+            ON CONFLICT (user_id, storico_id, entry_index) DO NOTHING
+            RETURNING wine_name, ts::date
+        """), params)
+        touched.update(tuple(row) for row in inserted.fetchall())
+
+        if state is None:
+            await movements_rollup.rebuild(session, user_id)
+        else:
+            await movements_rollup.refresh(session, user_id, touched)
+
+    async def ensure_synced(self, session: AsyncSession, user_id: int, table_storico: str) -> bool:
+        """
+        Allinea il ledger del tenant allo storico (incrementale, committa se sincronizza).
+
+        Returns:
+            True se il ledger è utilizzabile per il tenant
+        """
+        columns = await table_catalog.columns(session, table_storico)
+        if not REQUIRED_COLUMNS <= columns:
+            return False
+        version = None
+        try:
+            version = await self._version(session, user_id, table_storico, columns)
+            if self._failed.get(user_id) == version:
+                return False
+
+            row = (await session.execute(sql_text("""
+                SELECT storico_table, wines, updated_upto, movement_upto
+                FROM wine_movements_sync WHERE user_id = :user_id
+            """), {"user_id": user_id})).fetchone()
+            state = tuple(row) if row is not None else None
+            if state == version and user_id not in self._rebuild:
+                self._versions[user_id] = version
+                return True
+
+            await session.execute(
+                sql_text("SELECT pg_advisory_xact_lock(:namespace, :user_id)"),
+                {"namespace": _LOCK_NAMESPACE, "user_id": user_id}
+            )
+            # Tabella diversa, vini eliminati o storico ricreato: ricostruisci
+            rebuild = (
+                user_id in self._rebuild
+                or state is None
+                or state[0] != table_storico
+                or version[1] < state[1]
+            )
+            await self._sync(session, user_id, table_storico, columns, None if rebuild else state)
+            await session.execute(sql_text("""
+                INSERT INTO wine_movements_sync (user_id, storico_table, wines, updated_upto, movement_upto, synced_at)
+                VALUES (:user_id, :storico_table, :wines, :updated_upto, :movement_upto, CURRENT_TIMESTAMP)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    storico_table = EXCLUDED.storico_table, wines = EXCLUDED.wines,
+                    updated_upto = EXCLUDED.updated_upto, movement_upto = EXCLUDED.movement_upto,
+                    synced_at = EXCLUDED.synced_at
+            """), {
+                "user_id": user_id,
+                "storico_table": version[0],
+                "wines": version[1],
+                "updated_upto": version[2],
+                "movement_upto": version[3],
+            })
+            await session.commit()
+
+            self._rebuild.discard(user_id)
+            self._versions[user_id] = version
+            self.syncs += 1
+            if rebuild:
+                self.rebuilds += 1
+                logger.info(f"[MOVEMENTS_LEDGER] Ledger ricostruito per user_id={user_id} da {table_storico}")
+            return True
+        except Exception as e:
+            await session.rollback()
+            self.failures += 1
+            if version is not None:
+                self._failed[user_id] = version
+            logger.warning(f"[MOVEMENTS_LEDGER] Sincronizzazione fallita per user_id={user_id}, uso le history: {e}")
+            return False
+
+    async def period_movements(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        table_storico: str,
+        start_date: date,
+        end_date: date
+    ) -> Optional[Tuple[List[Dict[str, Any]], int, int]]:
+        """
+        Movimenti del periodo [start_date, end_date] raggruppati per vino: totali
+        dal rollup giornaliero, "movements" limitato ai primi DETAIL_MOVEMENTS del
+        periodo ("movements_count" riporta il numero totale).
+
+        Returns:
+            (wines_with_movements, total_consumi, total_rifornimenti) nel formato di
+            get_movements_for_period, oppure None se il ledger non è utilizzabile
+        """
+        if not await self.ensure_synced(session, user_id, table_storico):
+            return None
+
+        # Totali dal rollup giornaliero: O(giorni × vini movimentati)
+        wines: Dict[str, Dict[str, Any]] = {}
+        total_consumi = 0
+        total_rifornimenti = 0
+        for wine_name, consumi, rifornimenti, count in await movements_rollup.period_totals(
+            session, user_id, start_date, end_date
+        ):
+            wines[wine_name] = {
+                "wine_name": wine_name,
+                "current_stock": 0,
+                "movements": [],
+                "movements_count": count,
+                "total_consumi": consumi,
+                "total_rifornimenti": rifornimenti
+            }
+            total_consumi += consumi
+            total_rifornimenti += rifornimenti
+
+        if wines:
+            # Dettaglio: solo i primi movimenti del periodo per vino (quelli mostrati da card e report)
+            details = await session.execute(sql_text("""
+                SELECT n.wine_name, d.entry
+                FROM unnest(CAST(:names AS TEXT[])) AS n(wine_name)
+                CROSS JOIN LATERAL (
+                    SELECT w.entry, w.ts, w.storico_id, w.entry_index FROM wine_movements w
+                    WHERE w.user_id = :user_id AND w.wine_name = n.wine_name
+                      AND w.ts >= :start AND w.ts < :end
+                    ORDER BY w.ts, w.storico_id, w.entry_index
+                    LIMIT :limit
+                ) d
+                ORDER BY n.wine_name, d.ts, d.storico_id, d.entry_index
+            """), {
+                "user_id": user_id,
+                "names": list(wines),
+                "start": datetime.combine(start_date, datetime.min.time()),
+                "end": datetime.combine(end_date + timedelta(days=1), datetime.min.time()),
+                "limit": DETAIL_MOVEMENTS,
+            })
+            for wine_name, entry in details.fetchall():
+                wines[wine_name]["movements"].append(_entry(entry))
+
+            # Stock attuale solo per i vini con movimenti, senza leggere le history
+            stocks = await session.execute(sql_text(f"""
+                SELECT wine_name, current_stock FROM {table_storico}
+                WHERE user_id = :user_id AND wine_name = ANY(:names)
+            """), {"user_id": user_id, "names": list(wines)})
+            for wine_name, current_stock in stocks.fetchall():
+                wines[wine_name]["current_stock"] = current_stock or 0
+
+        return list(wines.values()), total_consumi, total_rifornimenti
+
+    async def wine_history(self, session: AsyncSession, user_id: int, storico_id: int) -> List[Dict[str, Any]]:
+        """Voci di history (con data) di una riga di Storico vino in ordine di inserimento (dopo ensure_synced)"""
+        result = await session.execute(sql_text("""
+            SELECT entry FROM wine_movements
+            WHERE user_id = :user_id AND storico_id = :storico_id
+            ORDER BY entry_index
+        """), {"user_id": user_id, "storico_id": storico_id})
+        return [_entry(row[0]) for row in result.fetchall()]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "syncs": self.syncs,
+            "rebuilds": self.rebuilds,
+            "failures": self.failures,
+            "failed_tenants": len(self._failed),
+        }
+
+
+# Istanza globale
+movements_ledger = MovementsLedger()
@@ -0,0 +1,188 @@
+"""
+Rollup giornaliero dei movimenti (wine_movements_daily): una riga per tenant, vino e giorno.
+
+Report per periodo, report giornaliero e grafici dei vini sommavano consumi e
+rifornimenti movimento per movimento: un report su 365 giorni costava quanto
+tutti i movimenti dell'anno. Il rollup tiene per ogni (vino, giorno) consumi,
+rifornimenti, numero di movimenti e stock di chiusura: le letture costano
+O(giorni × vini movimentati).
+
+È derivato da wine_movements nella stessa transazione della sincronizzazione
+del registro (MovementsLedger._sync): vengono ricalcolati solo i giorni toccati
+dalle voci inserite o scartate. Si ricostruisce con
+scripts/rebuild_movements_rollup.py.
+
+Le letture presuppongono il registro allineato (movements_ledger.ensure_synced).
+"""
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text as sql_text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# Aggregati per (vino, giorno) con le regole di classificazione delle history
+_ROLLUP_SELECT = """
+    SELECT
+        w.user_id,
+        w.wine_name,
+        w.ts::date AS day,
+        COALESCE(SUM(abs(w.quantity)) FILTER (WHERE strpos(lower(w.movement_type), 'consum') > 0), 0),
+        COALESCE(SUM(abs(w.quantity)) FILTER (
+            WHERE strpos(lower(w.movement_type), 'consum') = 0 AND strpos(lower(w.movement_type), 'riforn') > 0
+        ), 0),
+        COUNT(*),
+        (array_agg(w.quantity_after ORDER BY w.ts DESC, w.entry_index DESC))[1]
+    FROM wine_movements w
+"""
+
+_ROLLUP_COLUMNS = "(user_id, wine_name, day, consumi, rifornimenti, movements, closing_stock)"
+
+
+async def migrate_movements_rollup_table(session: AsyncSession) -> None:
+    """Crea wine_movements_daily se non esiste, popolandola dal registro movimenti già presente"""
+    created = (await session.execute(sql_text("SELECT to_regclass('wine_movements_daily') IS NULL"))).scalar()
+    await session.execute(sql_text("""
+        CREATE TABLE IF NOT EXISTS wine_movements_daily (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            wine_name TEXT NOT NULL,
+            day DATE NOT NULL,
+            consumi INTEGER NOT NULL DEFAULT 0,
+            rifornimenti INTEGER NOT NULL DEFAULT 0,
+            movements INTEGER NOT NULL DEFAULT 0,
+            closing_stock INTEGER,
+            PRIMARY KEY (user_id, day, wine_name)
+        )
+    """))
+    await session.execute(sql_text(
+        "CREATE INDEX IF NOT EXISTS idx_wine_movements_daily_wine ON wine_movements_daily (user_id, wine_name, day)"
+    ))
+    if created:
+        await session.execute(sql_text(f"""
+            INSERT INTO wine_movements_daily {_ROLLUP_COLUMNS}
+            {_ROLLUP_SELECT}
+            GROUP BY w.user_id, w.wine_name, w.ts::date
+        """))
+        logger.info("[MOVEMENTS_ROLLUP] wine_movements_daily creata e popolata da wine_movements")
+
+
+def _daily_entry(
+    at: datetime,
+    movement_type: str,
+    quantity: int,
+    quantity_before: Optional[int],
+    quantity_after: Optional[int]
+) -> Dict[str, Any]:
+    entry: Dict[str, Any] = {"date": at.isoformat(), "type": movement_type, "quantity": quantity}
+    # Stock omessi se non noti: i chiamanti usano i loro default
+    if quantity_before is not None:
+        entry["quantity_before"] = quantity_before
+    if quantity_after is not None:
+        entry["quantity_after"] = quantity_after
+    return entry
+
+
+class MovementsRollup:
+    """Manutenzione e letture di wine_movements_daily"""
+
+    def __init__(self):
+        self.refreshed_days = 0
+        self.rebuilds = 0
+
+    async def rebuild(self, session: AsyncSession, user_id: int) -> None:
+        """Ricalcola il rollup del tenant da wine_movements (nessun commit)"""
+        params = {"user_id": user_id}
+        await session.execute(sql_text("DELETE FROM wine_movements_daily WHERE user_id = :user_id"), params)
+        await session.execute(sql_text(f"""
+            INSERT INTO wine_movements_daily {_ROLLUP_COLUMNS}
+            {_ROLLUP_SELECT}
+            WHERE w.user_id = :user_id
+            GROUP BY w.user_id, w.wine_name, w.ts::date
+        """), params)
+        self.rebuilds += 1
+
+    async def refresh(self, session: AsyncSession, user_id: int, keys: Iterable[Tuple[str, date]]) -> None:
+        """Ricalcola i giorni (wine_name, day) toccati da una sincronizzazione (nessun commit)"""
+        keys = set(keys)
+        if not keys:
+            return
+        params = {
+            "user_id": user_id,
+            "names": [wine_name for wine_name, _ in keys],
+            "days": [day for _, day in keys],
+        }
+        touched = "SELECT * FROM unnest(CAST(:names AS TEXT[]), CAST(:days AS DATE[]))"
+        # Giorni rimasti senza movimenti (history accorciate) spariscono dal rollup
+        await session.execute(sql_text(f"""
+            DELETE FROM wine_movements_daily
+            WHERE user_id = :user_id AND (wine_name, day) IN ({touched})
+        """), params)
+        await session.execute(sql_text(f"""
+            INSERT INTO wine_movements_daily {_ROLLUP_COLUMNS}
+            {_ROLLUP_SELECT}
+            WHERE w.user_id = :user_id AND (w.wine_name, w.ts::date) IN ({touched})
+            GROUP BY w.user_id, w.wine_name, w.ts::date
+        """), params)
+        self.refreshed_days += len(keys)
+
+    async def period_totals(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        start_date: date,
+        end_date: date
+    ) -> List[Tuple[str, int, int, int]]:
+        """(wine_name, consumi, rifornimenti, movimenti) dei vini movimentati nel periodo"""
+        result = await session.execute(sql_text("""
+            SELECT wine_name, SUM(consumi), SUM(rifornimenti), SUM(movements)
+            FROM wine_movements_daily
+            WHERE user_id = :user_id AND day BETWEEN :start AND :end
+            GROUP BY wine_name
+            ORDER BY wine_name
+        """), {"user_id": user_id, "start": start_date, "end": end_date})
+        return [
+            (wine_name, int(consumi), int(rifornimenti), int(movements))
+            for wine_name, consumi, rifornimenti, movements in result.fetchall()
+        ]
+
+    async def daily_entries(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        wine_name: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Andamento giornaliero di un vino come voci di history: per ogni giorno una
+        voce consumo e/o una rifornimento con le quantità totali del giorno, così i
+        grafici usano al massimo due punti al giorno invece di tutti i movimenti.
+        """
+        result = await session.execute(sql_text("""
+            SELECT day, consumi, rifornimenti, closing_stock
+            FROM wine_movements_daily
+            WHERE user_id = :user_id AND wine_name = :wine_name
+            ORDER BY day
+        """), {"user_id": user_id, "wine_name": wine_name})
+
+        entries = []
+        for day, consumi, rifornimenti, closing_stock in result.fetchall():
+            # Stock di apertura ricavato dalla chiusura (None se le voci non riportano quantity_after)
+            opening = closing_stock - rifornimenti + consumi if closing_stock is not None else None
+            day_start = datetime.combine(day, datetime.min.time())
+            if consumi:
+                after_consumi = opening - consumi if opening is not None else None
+                entries.append(_daily_entry(day_start, "consumo", consumi, opening, after_consumi))
+                opening = after_consumi
+            if rifornimenti:
+                entries.append(_daily_entry(
+                    day_start + timedelta(hours=12), "rifornimento", rifornimenti, opening, closing_stock
+                ))
+        return entries
+
+    def stats(self) -> Dict[str, int]:
+        return {"refreshed_days": self.refreshed_days, "rebuilds": self.rebuilds}
+
+
+# Istanza globale
+movements_rollup = MovementsRollup()
@@ -7,7 +7,10 @@ from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any, Optional
 from sqlalchemy import text as sql_text
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import AsyncSessionLocal, db_manager
+from app.core.database import db_session, db_manager
+from app.core.movements_ledger import movements_ledger
+from app.core.table_catalog import table_catalog
+from app.core.tenant_tables import STORICO_VINO, tenant_table
 import json
 
 logger = logging.getLogger(__name__)
@@ -99,108 +102,105 @@ async def generate_daily_report(user_id: int, report_date: Optional[datetime] =
             return None
         
         # Tabella Storico vino
-        table_storico = f'"{user_id}/{user.business_name} Storico vino"'
+        table_storico = tenant_table(user_id, user.business_name, STORICO_VINO)
         
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             # Verifica che la tabella esista
             table_name_check = table_storico.strip('"')
-            check_table_query = sql_text("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = :table_name
-                )
-            """)
-            result = await session.execute(check_table_query, {"table_name": table_name_check})
-            table_exists = result.scalar()
+            table_exists = await table_catalog.table_exists(session, table_name_check)
             
             if not table_exists:
                 logger.info(f"[NOTIFICATIONS] Tabella Storico vino non esiste per user_id={user_id}")
                 return None
             
-            # Recupera tutti i movimenti del giorno precedente
-            # La tabella Storico vino ha un campo history (JSON) con i movimenti
-            query_storico = sql_text(f"""
-                SELECT 
-                    wine_name,
-                    current_stock,
-                    history,
-                    total_consumi,
-                    total_rifornimenti
-                FROM {table_storico}
-                WHERE user_id = :user_id
-            """)
-            result = await session.execute(query_storico, {"user_id": user_id})
-            storico_rows = result.fetchall()
-            
-            if not storico_rows:
-                logger.info(f"[NOTIFICATIONS] Nessun vino nello storico per user_id={user_id}")
-                return None
-            
-            # Filtra movimenti del giorno precedente
-            report_movements = []
-            total_consumi = 0
-            total_rifornimenti = 0
-            wines_with_movements = []
-            
-            for row in storico_rows:
-                wine_name = row[0]
-                current_stock = row[1] or 0
-                history_json = row[2]
-                total_consumi_wine = row[3] or 0
-                total_rifornimenti_wine = row[4] or 0
+            # Registro movimenti indicizzato (range scan su user_id, ts)
+            ledger_result = await movements_ledger.period_movements(session, user_id, table_storico, report_date, report_date)
+            if ledger_result is not None:
+                wines_with_movements, total_consumi, total_rifornimenti = ledger_result
+            else:
+                # Recupera tutti i movimenti del giorno precedente
+                # La tabella Storico vino ha un campo history (JSON) con i movimenti
+                query_storico = sql_text(f"""
+                    SELECT 
+                        wine_name,
+                        current_stock,
+                        history,
+                        total_consumi,
+                        total_rifornimenti
+                    FROM {table_storico}
+                    WHERE user_id = :user_id
+                """)
+                result = await session.execute(query_storico, {"user_id": user_id})
+                storico_rows = result.fetchall()
                 
-                if not history_json:
-                    continue
+                if not storico_rows:
+                    logger.info(f"[NOTIFICATIONS] Nessun vino nello storico per user_id={user_id}")
+                    return None
                 
-                try:
-                    history = json.loads(history_json) if isinstance(history_json, str) else history_json
-                    if not isinstance(history, list):
+                # Filtra movimenti del giorno precedente
+                report_movements = []
+                total_consumi = 0
+                total_rifornimenti = 0
+                wines_with_movements = []
+                
+                for row in storico_rows:
+                    wine_name = row[0]
+                    current_stock = row[1] or 0
+                    history_json = row[2]
+                    total_consumi_wine = row[3] or 0
+                    total_rifornimenti_wine = row[4] or 0
+                    
+                    if not history_json:
                         continue
                     
-                    # Filtra movimenti del giorno precedente
-                    day_movements = []
-                    for movement in history:
-                        if not isinstance(movement, dict):
-                            continue
-                        
-                        movement_date_str = movement.get("date")
-                        if not movement_date_str:
+                    try:
+                        history = json.loads(history_json) if isinstance(history_json, str) else history_json
+                        if not isinstance(history, list):
                             continue
                         
-                        try:
-                            # Parse data movimento (formato: "YYYY-MM-DD" o "YYYY-MM-DD HH:MM:SS")
-                            if " " in movement_date_str:
-                                movement_date = datetime.strptime(movement_date_str.split()[0], "%Y-%m-%d").date()
-                            else:
-                                movement_date = datetime.strptime(movement_date_str, "%Y-%m-%d").date()
+                        # Filtra movimenti del giorno precedente
+                        day_movements = []
+                        for movement in history:
+                            if not isinstance(movement, dict):
+                                continue
+                            
+                            movement_date_str = movement.get("date")
+                            if not movement_date_str:
+                                continue
                             
-                            if movement_date == report_date:
-                                day_movements.append(movement)
-                                movement_type = movement.get("type", "").lower()
-                                quantity = abs(int(movement.get("quantity", 0)))
+                            try:
+                                # Parse data movimento (formato: "YYYY-MM-DD" o "YYYY-MM-DD HH:MM:SS")
+                                if " " in movement_date_str:
+                                    movement_date = datetime.strptime(movement_date_str.split()[0], "%Y-%m-%d").date()
+                                else:
+                                    movement_date = datetime.strptime(movement_date_str, "%Y-%m-%d").date()
                                 
-                                if "consumo" in movement_type or "consum" in movement_type:
-                                    total_consumi += quantity
-                                elif "rifornimento" in movement_type or "riforn" in movement_type:
-                                    total_rifornimenti += quantity
-                        except Exception as e:
-                            logger.debug(f"[NOTIFICATIONS] Errore parsing data movimento: {e}")
-                            continue
+                                if movement_date == report_date:
+                                    day_movements.append(movement)
+                                    movement_type = movement.get("type", "").lower()
+                                    quantity = abs(int(movement.get("quantity", 0)))
+                                    
+                                    if "consumo" in movement_type or "consum" in movement_type:
+                                        total_consumi += quantity
+                                    elif "rifornimento" in movement_type or "riforn" in movement_type:
+                                        total_rifornimenti += quantity
+                            except Exception as e:
+                                logger.debug(f"[NOTIFICATIONS] Errore parsing data movimento: {e}")
+                                continue
+                        
+                        if day_movements:
+                            wines_with_movements.append({
+                                "wine_name": wine_name,
+                                "current_stock": current_stock,
+                                "movements": day_movements,
+                                "total_consumi": sum(abs(int(m.get("quantity", 0))) for m in day_movements if "consumo" in m.get("type", "").lower() or "consum" in m.get("type", "").lower()),
+                                "total_rifornimenti": sum(abs(int(m.get("quantity", 0))) for m in day_movements if "rifornimento" in m.get("type", "").lower() or "riforn" in m.get("type", "").lower())
+                            })
+                            report_movements.extend(day_movements)
                     
-                    if day_movements:
-                        wines_with_movements.append({
-                            "wine_name": wine_name,
-                            "current_stock": current_stock,
-                            "movements": day_movements,
-                            "total_consumi": sum(abs(int(m.get("quantity", 0))) for m in day_movements if "consumo" in m.get("type", "").lower() or "consum" in m.get("type", "").lower()),
-                            "total_rifornimenti": sum(abs(int(m.get("quantity", 0))) for m in day_movements if "rifornimento" in m.get("type", "").lower() or "riforn" in m.get("type", "").lower())
-                        })
-                        report_movements.extend(day_movements)
-                
-                except Exception as e:
-                    logger.warning(f"[NOTIFICATIONS] Errore parsing history per {wine_name}: {e}")
-                    continue
+                    except Exception as e:
+                        logger.warning(f"[NOTIFICATIONS] Errore parsing history per {wine_name}: {e}")
+                        continue
             
             if not wines_with_movements:
                 logger.info(f"[NOTIFICATIONS] Nessun movimento trovato per {report_date} per user_id={user_id}")
@@ -224,6 +224,7 @@ async def generate_daily_report(user_id: int, report_date: Optional[datetime] =
             for wine_data in wines_with_movements:
                 wine_name = wine_data["wine_name"]
                 movements = wine_data["movements"]
+                movements_count = wine_data.get("movements_count", len(movements))
                 consumi = wine_data["total_consumi"]
                 rifornimenti = wine_data["total_rifornimenti"]
                 current_stock = wine_data["current_stock"]
@@ -243,8 +244,8 @@ async def generate_daily_report(user_id: int, report_date: Optional[datetime] =
                         mov_qty = mov.get("quantity", 0)
                         mov_time = mov.get("time", "")
                         content_parts.append(f"- {mov_type}: {abs(int(mov_qty))} bottiglie {mov_time}")
-                    if len(movements) > 5:
-                        content_parts.append(f"- ... e altri {len(movements) - 5} movimenti")
+                    if movements_count > 5:
+                        content_parts.append(f"- ... e altri {movements_count - 5} movimenti")
             
             content = "\n".join(content_parts)
             
@@ -281,7 +282,7 @@ async def save_notification(user_id: int, title: str, content: str, report_date:
         # Rimuovi timezone per compatibilità con asyncpg (il database gestisce il timezone)
         expires_at = (datetime.now(timezone.utc) + timedelta(days=3)).replace(tzinfo=None)
         
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             # Prepara metadata come JSON string
             metadata_json = json.dumps(metadata) if metadata else None
             
@@ -320,7 +321,7 @@ async def get_user_notifications(user_id: int, limit: int = 50, unread_only: boo
         Lista di notifiche
     """
     try:
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             if unread_only:
                 query = sql_text("""
                     SELECT id, type, title, content, report_date, created_at, expires_at, read_at, metadata
@@ -409,7 +410,7 @@ async def mark_notification_read(notification_id: int, user_id: int) -> bool:
     Marca una notifica come letta.
     """
     try:
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             update_query = sql_text("""
                 UPDATE notifications
                 SET read_at = CURRENT_TIMESTAMP
@@ -431,7 +432,7 @@ async def cleanup_expired_notifications():
     Elimina notifiche scadute (oltre 3 giorni).
     """
     try:
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             delete_query = sql_text("""
                 DELETE FROM notifications
                 WHERE expires_at < CURRENT_TIMESTAMP
@@ -0,0 +1,67 @@
+"""
+Client OpenAI condiviso per tutto il backend.
+
+Un'unica istanza AsyncOpenAI (con pool di connessioni httpx) viene riusata da
+AIService, BaseAgent e AudioAgent: le chiamate al modello non bloccano più
+l'event loop di uvicorn mentre si attende la risposta.
+"""
+import logging
+from typing import Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_async_client: Optional[AsyncOpenAI] = None
+
+
+def _build_http_limits(settings) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=30.0,
+    )
+
+
+def get_async_openai_client() -> Optional[AsyncOpenAI]:
+    """
+    Ritorna il client AsyncOpenAI condiviso (creato al primo utilizzo).
+
+    Returns:
+        AsyncOpenAI o None se OPENAI_API_KEY non è configurata
+    """
+    global _async_client
+    if _async_client is None:
+        settings = get_settings()
+        if not settings.OPENAI_API_KEY:
+            logger.warning("[OPENAI_CLIENT] OPENAI_API_KEY non configurata")
+            return None
+        http_client = httpx.AsyncClient(
+            limits=_build_http_limits(settings),
+            timeout=httpx.Timeout(settings.OPENAI_TIMEOUT_SECONDS, connect=10.0),
+        )
+        # L'header assistants=v2 è richiesto dalle Assistants API usate da BaseAgent
+        _async_client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            http_client=http_client,
+            default_headers={"OpenAI-Beta": "assistants=v2"},
+        )
+        logger.info(
+            f"[OPENAI_CLIENT] AsyncOpenAI inizializzato: max_connections={settings.OPENAI_MAX_CONNECTIONS}, "
+            f"max_keepalive={settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS}"
+        )
+    return _async_client
+
+
+async def close_openai_clients() -> None:
+    """Chiude il pool di connessioni (chiamato allo shutdown dell'app)."""
+    global _async_client
+    if _async_client is not None:
+        try:
+            await _async_client.close()
+        except Exception as e:
+            logger.warning(f"[OPENAI_CLIENT] Errore chiusura client async: {e}")
+        _async_client = None
@@ -0,0 +1,281 @@
+"""
+Cache su disco dei PDF generati dal processor (report giornaliero, movimenti, statistiche inventario).
+
+Ogni download da /api/reports/* e lo scheduler dei report giornalieri
+chiedevano al processor di rigenerare lo stesso PDF. Qui il PDF è conservato
+su disco (PDF_CACHE_DIR) con chiave (user_id, tipo di report, parametri,
+versione dei dati): la versione è il token aggregato di INVENTARIO e/o Storico
+vino (righe, max(updated_at), ...), quindi un movimento o una modifica
+all'inventario producono una chiave nuova e il PDF vecchio esce per LRU.
+
+- Eviction LRU su budget PDF_CACHE_MAX_BYTES (file eliminati dal disco).
+- File indirizzati per chiave: "<sha256 chiave>-<etag>.pdf", dove etag è lo
+  SHA-256 del contenuto; l'indice è ricostruito dal disco al primo uso, così
+  i PDF sopravvivono a un riavvio.
+- Single-flight: download identici concorrenti fanno una sola chiamata al
+  processor.
+
+Se la versione dei dati non è calcolabile (tabelle assenti, DB non
+raggiungibile) il PDF viene richiesto al processor senza cache.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import text as sql_text
+
+from app.core.config import get_settings
+from app.core.database import db_session
+from app.core.tenant_tables import INVENTARIO, STORICO_VINO, tenant_table
+
+logger = logging.getLogger(__name__)
+
+# Dati da cui dipende ogni tipo di report (versione nella chiave)
+REPORT_SOURCES = {
+    "daily": (INVENTARIO, STORICO_VINO),
+    "movements": (INVENTARIO, STORICO_VINO),
+    "inventory": (INVENTARIO,),
+}
+
+
+class CachedPdf:
+    """PDF in cache: file su disco con ETag (SHA-256 del contenuto) e data di generazione"""
+
+    def __init__(self, path: str, size: int, etag: str, last_modified: float):
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+
+    async def read(self) -> bytes:
+        return await asyncio.get_running_loop().run_in_executor(None, _read_file, self.path)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write_file(directory: str, name: str, content: bytes) -> str:
+    """Scrittura atomica (file temporaneo + rename): i lettori non vedono mai un PDF parziale"""
+    path = os.path.join(directory, name)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return path
+
+
+class PdfCache:
+    """Cache LRU su disco con budget, indice in memoria e richieste single-flight"""
+
+    def __init__(self, directory: str, max_bytes: int, enabled: bool = True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, CachedPdf]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._loaded = False
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared_fetches = 0
+        self.bypassed = 0
+        self.evictions = 0
+
+    def _load(self) -> None:
+        """Indice dai file già presenti su disco (ordine LRU per data di modifica)"""
+        self._loaded = True
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            found = []
+            for name in os.listdir(self.directory):
+                key, _, rest = name.partition("-")
+                path = os.path.join(self.directory, name)
+                if name.endswith(".tmp"):
+                    # Scrittura interrotta (quelle recenti possono essere in corso in un altro worker)
+                    if time.time() - os.stat(path).st_mtime > 3600:
+                        os.unlink(path)
+                    continue
+                if not rest.endswith(".pdf"):
+                    continue
+                stat = os.stat(path)
+                found.append((stat.st_mtime, key, CachedPdf(path, stat.st_size, rest[:-4], stat.st_mtime)))
+        except OSError as e:
+            logger.warning(f"[PDF_CACHE] Cartella {self.directory} non utilizzabile, cache disattivata: {e}")
+            self.enabled = False
+            return
+        for _, key, entry in sorted(found, key=lambda item: item[0]):
+            self._entries[key] = entry
+            self.current_bytes += entry.size
+        self._enforce_budget()
+        if found:
+            logger.info(f"[PDF_CACHE] Indice caricato da disco: {len(self._entries)} PDF, {self.current_bytes} byte")
+
+    async def _data_version(self, user_id: int, business_name: str, kind: str) -> Optional[Tuple]:
+        """Token aggregati (righe, max(updated_at), max(id)) delle tabelle da cui dipende il report"""
+        parts = []
+        params = {"user_id": user_id}
+        for table_kind in REPORT_SOURCES[kind]:
+            table_name = tenant_table(user_id, business_name, table_kind)
+            # max(id) solo per l'inventario (righe eliminate e reinserite), come inventory_cache
+            max_id = "MAX(id)" if table_kind == INVENTARIO else "NULL::bigint"
+            parts.append(f"""
+                SELECT '{table_kind}', COUNT(*), MAX(updated_at)::text, {max_id}
+                FROM {table_name} WHERE user_id = :user_id
+            """)
+        try:
+            async with db_session() as session:
+                result = await session.execute(sql_text(" UNION ALL ".join(parts)), params)
+                return tuple(sorted(tuple(row) for row in result.fetchall()))
+        except Exception as e:
+            logger.warning(f"[PDF_CACHE] Versione dati non calcolabile per user_id={user_id} ({kind}): {e}")
+            return None
+
+    async def get(
+        self,
+        user_id: int,
+        business_name: Optional[str],
+        kind: str,
+        params: Tuple,
+        fetch: Callable[[], Awaitable[Optional[bytes]]]
+    ) -> Optional[CachedPdf]:
+        """
+        PDF del report dalla cache o dal processor (fetch), memorizzato su disco.
+
+        Args:
+            kind: Tipo di report (chiave di REPORT_SOURCES)
+            params: Parametri del report (date) che identificano il PDF
+            fetch: Chiamata al processor, ritorna i bytes del PDF o None
+
+        Returns:
+            CachedPdf, oppure None se il processor non ha restituito il PDF
+        """
+        if not self._loaded:
+            self._load()
+        version = None
+        if self.enabled and business_name:
+            version = await self._data_version(user_id, business_name, kind)
+        if version is None:
+            self.bypassed += 1
+            content = await fetch()
+            return await self._store(None, content) if content else None
+
+        key = hashlib.sha256(repr((user_id, kind, tuple(params), version)).encode()).hexdigest()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if os.path.exists(entry.path):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            # File rimosso dall'esterno
+            self._drop(key, remove_file=False)
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.shared_fetches += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fetch_and_store(key, fetch))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget_inflight(key, done))
+        # shield: la cancellazione di un download non interrompe quello condiviso
+        return await asyncio.shield(task)
+
+    def _forget_inflight(self, key: str, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def _fetch_and_store(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Optional[bytes]]]
+    ) -> Optional[CachedPdf]:
+        content = await fetch()
+        return await self._store(key, content) if content else None
+
+    async def _store(self, key: Optional[str], content: bytes) -> CachedPdf:
+        """Scrive il PDF su disco e lo indicizza (key None: risultato non memorizzabile, solo in memoria)"""
+        etag = hashlib.sha256(content).hexdigest()[:32]
+        now = time.time()
+        if key is None or len(content) > self.max_bytes:
+            return _MemoryPdf(content, etag, now)
+        try:
+            path = await asyncio.get_running_loop().run_in_executor(
+                None, _write_file, self.directory, f"{key}-{etag}.pdf", content
+            )
+        except OSError as e:
+            logger.warning(f"[PDF_CACHE] Scrittura PDF in cache fallita: {e}")
+            return _MemoryPdf(content, etag, now)
+        self._drop(key, remove_file=False)
+        entry = CachedPdf(path, len(content), etag, now)
+        self._entries[key] = entry
+        self.current_bytes += entry.size
+        self._enforce_budget()
+        return entry
+
+    def _enforce_budget(self) -> None:
+        while self.current_bytes > self.max_bytes and self._entries:
+            evicted_key = next(iter(self._entries))
+            self._drop(evicted_key)
+            self.evictions += 1
+
+    def _drop(self, key: str, remove_file: bool = True) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.current_bytes -= entry.size
+        if remove_file:
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"[PDF_CACHE] Rimozione {entry.path} fallita: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.shared_fetches
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory,
+            "pdfs": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_fetches": self.shared_fetches,
+            "bypassed": self.bypassed,
+            "hit_ratio": round((self.hits + self.shared_fetches) / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+        }
+
+
+class _MemoryPdf(CachedPdf):
+    """PDF non memorizzato su disco (versione dati non disponibile o scrittura fallita)"""
+
+    def __init__(self, content: bytes, etag: str, last_modified: float):
+        super().__init__("", len(content), etag, last_modified)
+        self._content = content
+
+    async def read(self) -> bytes:
+        return self._content
+
+
+_settings = get_settings()
+
+# Istanza globale
+pdf_cache = PdfCache(
+    directory=_settings.PDF_CACHE_DIR or os.path.join(tempfile.gettempdir(), "gioia-pdf-cache"),
+    max_bytes=_settings.PDF_CACHE_MAX_BYTES,
+    enabled=_settings.PDF_CACHE_ENABLED,
+)
@@ -2,45 +2,413 @@
 Client per comunicare con il microservizio Gioia Processor.
 Reuse completo da telegram-ai-bot
 """
+import asyncio
+import functools
 import logging
+import time
 import aiohttp
-from typing import Optional, Dict, Any
+from contextlib import asynccontextmanager
+from sqlalchemy import text as sql_text
+from typing import Optional, Dict, Any, AsyncIterator, List, Tuple, Union
 from app.core.config import get_settings
+from app.core.database import AsyncSessionLocal, WineRow, db_session
+from app.core.inventory_cache import inventory_cache
+from app.core.job_tracker import TERMINAL_STATUSES, job_tracker
+from app.core.movements_ledger import movements_ledger
+from app.core.processor_resilience import (
+    CircuitBreaker, DeadlineExceeded, LatencyHistogram, ProcessorUnavailable, backoff_delay, is_failure,
+)
+from app.core.request_context import create_background_task, remaining_budget
+from app.core.table_catalog import table_catalog
+from app.core.tenant_tables import INVENTARIO, STORICO_VINO, legacy_table_name, tenant_table
+from app.core.upload_stream import UploadStream
+from app.core.wine_search import forget_search_index
 
 logger = logging.getLogger(__name__)
 
 
+def _invalidates_inventory(func):
+    """Invalida la cache inventario del tenant dopo una scrittura (anche se fallita: può essere parziale)"""
+    @functools.wraps(func)
+    async def wrapper(self, user_id: int, *args, **kwargs):
+        try:
+            return await func(self, user_id, *args, **kwargs)
+        finally:
+            inventory_cache.invalidate(user_id)
+    return wrapper
+
+
+def _changes_tables(func):
+    """Chiamate che possono creare/eliminare tabelle del tenant: catalogo e indice di ricerca vanno riverificati"""
+    @functools.wraps(func)
+    async def wrapper(self, user_id: int, business_name: str, *args, **kwargs):
+        try:
+            return await func(self, user_id, business_name, *args, **kwargs)
+        finally:
+            table_catalog.invalidate_tenant(user_id)
+            # Il processor lavora sulle tabelle per-tenant: quelle condivise non vengono ricreate
+            forget_search_index(legacy_table_name(user_id, business_name, INVENTARIO))
+            movements_ledger.invalidate_tenant(user_id)
+    return wrapper
+
+
+# Sincronizzazioni del registro movimenti in background: una per tenant, le richieste intanto arrivate la ripetono
+_ledger_syncs: Dict[int, asyncio.Task] = {}
+_ledger_resync: Dict[int, str] = {}
+
+
+def _sync_movements_ledger(user_id: int, business_name: str) -> None:
+    """
+    Allinea il registro movimenti dopo una scrittura su Storico vino, in background:
+    la risposta non aspetta la sincronizzazione (la prossima lettura riallinea
+    comunque il registro se il task non ha ancora finito).
+    """
+    table_storico = tenant_table(user_id, business_name, STORICO_VINO)
+    if user_id in _ledger_syncs:
+        _ledger_resync[user_id] = table_storico
+        return
+    _ledger_syncs[user_id] = create_background_task(_run_ledger_sync(user_id, table_storico))
+
+
+async def _run_ledger_sync(user_id: int, table_storico: str) -> None:
+    try:
+        while True:
+            try:
+                # Sessione dedicata: il task sopravvive alla richiesta che l'ha avviato
+                async with AsyncSessionLocal() as session:
+                    await movements_ledger.ensure_synced(session, user_id, table_storico)
+            except Exception as e:
+                logger.warning(f"[PROCESSOR_CLIENT] Registro movimenti non aggiornato per user_id={user_id}: {e}")
+            table_storico = _ledger_resync.pop(user_id, None)
+            if table_storico is None:
+                return
+    finally:
+        del _ledger_syncs[user_id]
+
+
+def _records_movements(func):
+    """Chiamate che aggiungono movimenti alle history di Storico vino: allinea il registro movimenti in background"""
+    @functools.wraps(func)
+    async def wrapper(self, user_id: int, business_name: str, *args, **kwargs):
+        result = await func(self, user_id, business_name, *args, **kwargs)
+        if isinstance(result, dict) and (result.get("status") in ("success", "partial") or result.get("success")):
+            _sync_movements_ledger(user_id, business_name)
+        return result
+    return wrapper
+
+
+def _applies_wine_row(created: bool):
+    """
+    Scritture di un singolo vino che restituiscono la riga aggiornata in result["wine"]:
+    la cache inventario del tenant è aggiornata in place invece che invalidata.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, user_id: int, business_name: str, *args, **kwargs):
+            result = None
+            try:
+                result = await func(self, user_id, business_name, *args, **kwargs)
+                return result
+            finally:
+                wine = result.get("wine") if isinstance(result, dict) else None
+                if isinstance(wine, WineRow):
+                    inventory_cache.apply_wine(
+                        user_id, tenant_table(user_id, business_name, INVENTARIO), wine, created=created
+                    )
+                else:
+                    inventory_cache.invalidate(user_id)
+        return wrapper
+    return decorator
+
+
+def _release_response(task: asyncio.Future) -> None:
+    """Rilascia la connessione di una risposta hedged non usata"""
+    if not task.cancelled() and task.exception() is None:
+        task.result().release()
+
+
+async def _file_size(file_content: Union[bytes, UploadStream]) -> int:
+    """Dimensione del file per i log (per gli stream calcolata dalla prima passata)"""
+    if isinstance(file_content, UploadStream):
+        if file_content.size is None:
+            await file_content.prepare()
+        return file_content.size
+    return len(file_content)
+
+
 class ProcessorClient:
     """Client per comunicare con il microservizio processor."""
     
     def __init__(self, base_url: str = None):
         settings = get_settings()
         self.base_url = base_url or settings.PROCESSOR_URL.rstrip('/')
+        # Sessione HTTP condivisa (pool keep-alive verso il processor), legata all'event loop che l'ha creata
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        # Endpoint batch movimenti non disponibile fino a (time.monotonic): chiamate singole
+        self._batch_unsupported_until = 0.0
+        # Endpoint /admin/update-wine non disponibile fino a (time.monotonic): un campo per chiamata
+        self._update_wine_unsupported_until = 0.0
+        # Upload inventario in corso per (endpoint, user_id, mode, sha256)
+        self._inflight_uploads: Dict[tuple, asyncio.Future] = {}
+        # Circuit breaker e latenze per endpoint (processor_resilience)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, LatencyHistogram] = {}
+        self.retries = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
         logger.info(f"[PROCESSOR_CLIENT] Inizializzato con URL: {self.base_url}")
     
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Sessione condivisa: connessioni (DNS, TCP, TLS) riusate tra le chiamate.
+        Creata allo startup dell'app o al primo utilizzo; ricreata se chiusa o se
+        l'event loop è cambiato (script che usano asyncio.run più volte).
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            settings = get_settings()
+            connector = aiohttp.TCPConnector(
+                limit=settings.PROCESSOR_MAX_CONNECTIONS,
+                limit_per_host=settings.PROCESSOR_MAX_CONNECTIONS_PER_HOST,
+                keepalive_timeout=settings.PROCESSOR_KEEPALIVE_SECONDS,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._session_loop = loop
+            logger.info(
+                f"[PROCESSOR_CLIENT] Sessione HTTP condivisa creata: limit={settings.PROCESSOR_MAX_CONNECTIONS}, "
+                f"limit_per_host={settings.PROCESSOR_MAX_CONNECTIONS_PER_HOST}, "
+                f"keepalive={settings.PROCESSOR_KEEPALIVE_SECONDS}s"
+            )
+        return self._session
+    
+    async def start(self) -> None:
+        """Apre la sessione condivisa (startup dell'app)."""
+        self._get_session()
+    
+    async def close(self) -> None:
+        """Chiude la sessione condivisa e le connessioni keep-alive (shutdown dell'app)."""
+        session, self._session, self._session_loop = self._session, None, None
+        if session is not None and not session.closed:
+            try:
+                await session.close()
+            except Exception as e:
+                logger.warning(f"[PROCESSOR_CLIENT] Errore chiusura sessione HTTP: {e}")
+    
+    def _breaker(self, route: str) -> CircuitBreaker:
+        breaker = self._breakers.get(route)
+        if breaker is None:
+            settings = get_settings()
+            breaker = self._breakers[route] = CircuitBreaker(
+                route, settings.PROCESSOR_BREAKER_FAILURES, settings.PROCESSOR_BREAKER_OPEN_SECONDS
+            )
+        return breaker
+    
+    def _latency(self, route: str) -> LatencyHistogram:
+        histogram = self._latencies.get(route)
+        if histogram is None:
+            histogram = self._latencies[route] = LatencyHistogram()
+        return histogram
+    
+    def _call_timeout(self, route: str, timeout: float) -> Tuple[float, bool]:
+        """Timeout della chiamata ridotto al budget della richiesta in ingresso: (timeout, ridotto)"""
+        budget = remaining_budget()
+        if budget is None or budget >= timeout:
+            return timeout, False
+        if budget <= 0.05:
+            self.deadline_exceeded += 1
+            raise DeadlineExceeded(f"Tempo della richiesta esaurito prima della chiamata a {route}")
+        return budget, True
+    
+    def _hedge_delay(self, route: str, breaker: CircuitBreaker, call_timeout: float) -> Optional[float]:
+        """Ritardo della richiesta hedged: p95 dell'endpoint (minimo PROCESSOR_HEDGE_MIN_DELAY_SECONDS)"""
+        settings = get_settings()
+        if not settings.PROCESSOR_HEDGE_PDF or breaker.state != "closed":
+            return None
+        p95_ms = self._latency(route).quantile(0.95)
+        delay = max(settings.PROCESSOR_HEDGE_MIN_DELAY_SECONDS, (p95_ms or 0) / 1000)
+        return delay if delay < call_timeout else None
+    
+    async def _send(
+        self,
+        method: str,
+        endpoint: str,
+        call_timeout: float,
+        hedge_after: Optional[float],
+        **kwargs
+    ) -> aiohttp.ClientResponse:
+        """Invio (risposta con header ricevuti); con hedge_after una seconda richiesta se la prima tarda"""
+        session = self._get_session()
+        url = f"{self.base_url}{endpoint}"
+        if hedge_after is None:
+            return await session.request(method, url, timeout=aiohttp.ClientTimeout(total=call_timeout), **kwargs)
+        
+        first = asyncio.ensure_future(
+            session.request(method, url, timeout=aiohttp.ClientTimeout(total=call_timeout), **kwargs)
+        )
+        pending = {first}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=hedge_after)
+            if not done:
+                self.hedged += 1
+                pending.add(asyncio.ensure_future(
+                    session.request(method, url, timeout=aiohttp.ClientTimeout(total=call_timeout - hedge_after), **kwargs)
+                ))
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        # Eventuali altre risposte completate nello stesso giro vengono rilasciate
+                        for other in done - {task}:
+                            _release_response(other)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(_release_response)
+    
+    @asynccontextmanager
+    async def _request(
+        self,
+        method: str,
+        endpoint: str,
+        timeout: float,
+        route: Optional[str] = None,
+        hedge: bool = False,
+        **kwargs
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        Richiesta HTTP al processor, con la risposta disponibile nel blocco with.
+        
+        - Circuit breaker per endpoint (route, default endpoint): se aperto la
+          chiamata fallisce subito con ProcessorUnavailable (un ClientError).
+        - timeout ridotto al tempo rimanente della richiesta in ingresso e
+          inoltrato al processor in X-Request-Timeout-Ms; budget esaurito:
+          DeadlineExceeded senza inviare nulla.
+        - GET (idempotenti) ritentate fino a PROCESSOR_GET_RETRIES volte con
+          backoff e jitter su errori di connessione, timeout e HTTP 5xx.
+        - hedge (download PDF, con PROCESSOR_HEDGE_PDF): seconda richiesta
+          identica se la prima non risponde entro il p95 dell'endpoint.
+        - Latenza ed esito registrati per endpoint (resilience_stats).
+        """
+        settings = get_settings()
+        route = route or endpoint
+        breaker = self._breaker(route)
+        histogram = self._latency(route)
+        retries = settings.PROCESSOR_GET_RETRIES if method == "GET" else 0
+        extra_headers = kwargs.pop("headers", None) or {}
+        attempt = 0
+        while True:
+            attempt += 1
+            call_timeout, clipped = self._call_timeout(route, timeout)
+            if not breaker.allow():
+                raise ProcessorUnavailable(f"Processor non disponibile ({route}): circuit breaker aperto")
+            headers = {**extra_headers, "X-Request-Timeout-Ms": str(int(call_timeout * 1000))}
+            hedge_after = self._hedge_delay(route, breaker, call_timeout) if hedge and method == "GET" else None
+            started = time.monotonic()
+            try:
+                response = await self._send(method, endpoint, call_timeout, hedge_after, headers=headers, **kwargs)
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                failed = is_failure(e)
+                self._record(breaker, histogram, started, failed, clipped and isinstance(e, asyncio.TimeoutError))
+                delay = self._retry_delay(attempt) if failed and attempt <= retries else None
+                if delay is None:
+                    raise
+                await self._retry_sleep(route, attempt, delay)
+                continue
+            
+            delay = self._retry_delay(attempt) if response.status >= 500 and attempt <= retries else None
+            if delay is not None:
+                response.release()
+                self._record(breaker, histogram, started, True, False)
+                await self._retry_sleep(route, attempt, delay)
+                continue
+            
+            error: Optional[BaseException] = None
+            try:
+                yield response
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                response.release()
+                if isinstance(error, asyncio.CancelledError):
+                    breaker.release()
+                else:
+                    failed = is_failure(status=response.status) or (error is not None and is_failure(error))
+                    self._record(breaker, histogram, started, failed, clipped and isinstance(error, asyncio.TimeoutError))
+            return
+    
+    def _record(
+        self,
+        breaker: CircuitBreaker,
+        histogram: LatencyHistogram,
+        started: float,
+        failed: bool,
+        budget_timeout: bool
+    ) -> None:
+        """Esito della chiamata; un timeout dovuto al budget della richiesta non è un guasto del processor"""
+        histogram.observe((time.monotonic() - started) * 1000, failed)
+        if budget_timeout:
+            breaker.release()
+        else:
+            breaker.record(failed)
+    
+    def _retry_delay(self, attempt: int) -> Optional[float]:
+        """Attesa con jitter prima del ritentativo; None se il budget della richiesta non basta"""
+        settings = get_settings()
+        delay = backoff_delay(attempt, settings.PROCESSOR_RETRY_BASE_SECONDS, settings.PROCESSOR_RETRY_MAX_SECONDS)
+        budget = remaining_budget()
+        if budget is not None and budget <= delay:
+            return None
+        return delay
+    
+    async def _retry_sleep(self, route: str, attempt: int, delay: float) -> None:
+        self.retries += 1
+        logger.info(f"[PROCESSOR_CLIENT] Ritentativo {attempt} di {route} tra {delay:.2f}s")
+        await asyncio.sleep(delay)
+    
+    def resilience_stats(self) -> Dict[str, Any]:
+        """Stato dei circuit breaker e latenze per endpoint"""
+        return {
+            "breakers": {route: breaker.stats() for route, breaker in self._breakers.items()},
+            "latency": {route: histogram.stats() for route, histogram in self._latencies.items()},
+            "retries": self.retries,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "deadline_exceeded": self.deadline_exceeded,
+        }
+    
     async def _make_request(
         self,
         method: str,
         endpoint: str,
+        route: Optional[str] = None,
         **kwargs
     ) -> Dict[str, Any]:
         """Esegue una richiesta HTTP al processor."""
-        url = f"{self.base_url}{endpoint}"
-        
         try:
-            timeout = aiohttp.ClientTimeout(total=30.0)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.request(method, url, **kwargs) as response:
-                    response.raise_for_status()
-                    return await response.json()
+            async with self._request(method, endpoint, route=route, timeout=30.0, **kwargs) as response:
+                response.raise_for_status()
+                return await response.json()
         except aiohttp.ClientResponseError as e:
             logger.error(f"[PROCESSOR_CLIENT] Errore {method} {endpoint}: HTTP {e.status} - {e.message}")
             if e.status == 404:
                 return {"status": "error", "error": f"Endpoint non trovato: {endpoint}"}
             return {"status": "error", "error": f"HTTP {e.status}: {e.message[:200]}"}
-        except aiohttp.ClientError as e:
-            logger.error(f"[PROCESSOR_CLIENT] Errore connessione {method} {endpoint}: {e}")
-            return {"status": "error", "error": f"Errore connessione: {str(e)}"}
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"[PROCESSOR_CLIENT] Errore connessione {method} {endpoint}: {e!r}")
+            return {"status": "error", "error": f"Errore connessione: {str(e) or type(e).__name__}", "retryable": True}
         except Exception as e:
             logger.error(f"[PROCESSOR_CLIENT] Errore inaspettato {method} {endpoint}: {e}", exc_info=True)
             return {"status": "error", "error": f"Errore inaspettato: {str(e)}"}
@@ -49,24 +417,25 @@ class ProcessorClient:
         """Verifica stato del processor."""
         return await self._make_request("GET", "/health")
     
+    @_invalidates_inventory
+    @_changes_tables
     async def create_tables(self, user_id: int, business_name: str) -> Dict[str, Any]:
         """Crea tabelle utente nel processor."""
         logger.info(f"[PROCESSOR_CLIENT] Chiamata create_tables: user_id={user_id}, business_name={business_name}")
         
         try:
-            timeout = aiohttp.ClientTimeout(total=30.0)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(
-                    f"{self.base_url}/create-tables",
-                    data={
-                        "user_id": user_id,  # Passa user_id come user_id per retrocompatibilità
-                        "business_name": business_name
-                    }
-                ) as response:
-                    response.raise_for_status()
-                    result = await response.json()
-                    logger.info(f"[PROCESSOR_CLIENT] create_tables successo: {result}")
-                    return result
+            async with self._request(
+                "POST", "/create-tables",
+                timeout=30.0,
+                data={
+                    "user_id": user_id,  # Passa user_id come user_id per retrocompatibilità
+                    "business_name": business_name
+                }
+            ) as response:
+                response.raise_for_status()
+                result = await response.json()
+                logger.info(f"[PROCESSOR_CLIENT] create_tables successo: {result}")
+                return result
         except aiohttp.ClientResponseError as e:
             logger.error(f"[PROCESSOR_CLIENT] Errore create_tables: HTTP {e.status} - {e.message}")
             if e.status == 404:
@@ -79,22 +448,27 @@ class ProcessorClient:
             logger.error(f"[PROCESSOR_CLIENT] Errore inaspettato create_tables: {e}", exc_info=True)
             return {"status": "error", "error": f"Errore inaspettato: {str(e)}"}
     
+    @_invalidates_inventory
+    @_changes_tables
     async def process_inventory(
         self,
         user_id: int,
         business_name: str,
         file_type: str,
-        file_content: bytes,
+        file_content: Union[bytes, UploadStream],
         file_name: str,
         client_msg_id: Optional[str] = None,
         correlation_id: Optional[str] = None,
         mode: str = "add"
     ) -> Dict[str, Any]:
-        """Invia file inventario al processor per elaborazione."""
+        """
+        Invia file inventario al processor per elaborazione.
+        file_content può essere un UploadStream: il file viene inviato a blocchi.
+        """
         logger.info(
             f"[PROCESSOR_CLIENT] process_inventory: user_id={user_id}, "
             f"business_name={business_name}, file_type={file_type}, file_name={file_name}, "
-            f"file_size={len(file_content)} bytes"
+            f"file_size={await _file_size(file_content)} bytes"
         )
         
         data = {
@@ -109,19 +483,7 @@ class ProcessorClient:
             data["correlation_id"] = correlation_id
         
         try:
-            timeout = aiohttp.ClientTimeout(total=60.0)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                form_data = aiohttp.FormData()
-                form_data.add_field('file', file_content, filename=file_name)
-                for key, value in data.items():
-                    form_data.add_field(key, str(value))
-                
-                async with session.post(
-                    f"{self.base_url}/process-inventory",
-                    data=form_data
-                ) as response:
-                    response.raise_for_status()
-                    return await response.json()
+            return await self._upload_inventory_file("/process-inventory", data, file_content, file_name)
         except aiohttp.ClientResponseError as e:
             logger.error(f"[PROCESSOR_CLIENT] Errore process_inventory: HTTP {e.status} - {e.message}")
             return {"status": "error", "error": f"HTTP {e.status}: {e.message[:200]}"}
@@ -129,9 +491,78 @@ class ProcessorClient:
             logger.error(f"[PROCESSOR_CLIENT] Errore process_inventory: {e}", exc_info=True)
             return {"status": "error", "error": str(e)}
     
+    async def _upload_inventory_file(
+        self,
+        endpoint: str,
+        fields: Dict[str, Any],
+        file_content: Union[bytes, UploadStream],
+        file_name: str
+    ) -> Dict[str, Any]:
+        """
+        POST multipart di un file inventario. Con un UploadStream gli upload
+        identici concorrenti (stesso endpoint, tenant, modalità e SHA-256)
+        condividono una sola richiesta al processor.
+        """
+        if not isinstance(file_content, UploadStream):
+            return await self._send_inventory_file(endpoint, fields, file_content, file_name)
+        
+        if file_content.sha256 is None:
+            await file_content.prepare()
+        key = (endpoint, fields.get("user_id"), fields.get("mode"), file_content.sha256)
+        inflight = self._inflight_uploads.get(key)
+        if inflight is not None:
+            logger.info(
+                f"[PROCESSOR_CLIENT] Upload identico già in corso ({endpoint}, user_id={fields.get('user_id')}, "
+                f"sha256={file_content.sha256[:12]}): riuso del risultato"
+            )
+            return await asyncio.shield(inflight)
+        
+        task = asyncio.ensure_future(self._send_inventory_file(endpoint, fields, file_content, file_name))
+        self._inflight_uploads[key] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if self._inflight_uploads.get(key) is task:
+                del self._inflight_uploads[key]
+    
+    async def _send_inventory_file(
+        self,
+        endpoint: str,
+        fields: Dict[str, Any],
+        file_content: Union[bytes, UploadStream],
+        file_name: str
+    ) -> Dict[str, Any]:
+        form_data = aiohttp.FormData()
+        if isinstance(file_content, UploadStream):
+            # Multipart chunked: un blocco alla volta in memoria
+            form_data.add_field('file', file_content.chunks(), filename=file_name)
+            form_data.add_field('content_sha256', file_content.sha256)
+        else:
+            form_data.add_field('file', file_content, filename=file_name)
+        for key, value in fields.items():
+            form_data.add_field(key, str(value))
+        settings = get_settings()
+        if settings.PROCESSOR_CALLBACK_URL:
+            # Il processor notifica qui il completamento del job (job_tracker.resolve)
+            form_data.add_field('callback_url', settings.PROCESSOR_CALLBACK_URL)
+        
+        async with self._request(
+            "POST", endpoint,
+            timeout=60.0,
+            data=form_data
+        ) as response:
+            response.raise_for_status()
+            result = await response.json()
+        
+        job_id = result.get("job_id") if isinstance(result, dict) else None
+        if job_id and result.get("status") not in TERMINAL_STATUSES:
+            # Stato del job pubblicato ai client connessi anche senza waiter
+            job_tracker.track(str(job_id), user_id=fields.get("user_id"))
+        return result
+    
     async def get_job_status(self, job_id: str) -> Dict[str, Any]:
         """Ottiene stato di un job di elaborazione."""
-        return await self._make_request("GET", f"/status/{job_id}")
+        return await self._make_request("GET", f"/status/{job_id}", route="/status")
     
     async def wait_for_job_completion(
         self,
@@ -139,28 +570,16 @@ class ProcessorClient:
         max_wait_seconds: int = 300,
         poll_interval: float = 2.0
     ) -> Dict[str, Any]:
-        """Attende completamento di un job con polling."""
-        import asyncio
-        import time
-        
-        start_time = time.time()
-        
-        while time.time() - start_time < max_wait_seconds:
-            status = await self.get_job_status(job_id)
-            
-            if status.get('status') == 'completed':
-                return status
-            elif status.get('status') == 'error' or status.get('status') == 'failed':
-                return status
-            
-            await asyncio.sleep(poll_interval)
-        
-        return {
-            "status": "timeout",
-            "job_id": job_id,
-            "error": f"Timeout dopo {max_wait_seconds} secondi"
-        }
+        """
+        Attende completamento di un job tramite job_tracker: un solo poller per
+        job_id (backoff esponenziale con jitter), risolto subito dalla callback
+        del processor se configurata. poll_interval è mantenuto per compatibilità:
+        l'intervallo iniziale è JOB_POLL_INITIAL_SECONDS.
+        """
+        return await job_tracker.wait(job_id, max_wait_seconds)
     
+    @_invalidates_inventory
+    @_records_movements
     async def process_movement(
         self,
         user_id: int,
@@ -175,22 +594,31 @@ class ProcessorClient:
             f"business_name={business_name}, wine_name={wine_name}, "
             f"movement_type={movement_type}, quantity={quantity}"
         )
-        
+        return await self._send_movement(user_id, business_name, wine_name, movement_type, quantity)
+    
+    async def _send_movement(
+        self,
+        user_id: int,
+        business_name: str,
+        wine_name: str,
+        movement_type: str,
+        quantity: int
+    ) -> Dict[str, Any]:
+        """POST /process-movement (senza invalidazioni: le applicano i metodi pubblici)."""
         try:
-            timeout = aiohttp.ClientTimeout(total=30.0)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(
-                    f"{self.base_url}/process-movement",
-                    data={
-                        "user_id": user_id,
-                        "business_name": business_name,
-                        "wine_name": wine_name,
-                        "movement_type": movement_type,
-                        "quantity": quantity
-                    }
-                ) as response:
-                    response.raise_for_status()
-                    return await response.json()
+            async with self._request(
+                "POST", "/process-movement",
+                timeout=30.0,
+                data={
+                    "user_id": user_id,
+                    "business_name": business_name,
+                    "wine_name": wine_name,
+                    "movement_type": movement_type,
+                    "quantity": quantity
+                }
+            ) as response:
+                response.raise_for_status()
+                return await response.json()
         except aiohttp.ClientResponseError as e:
             logger.error(f"[PROCESSOR_CLIENT] Errore process_movement: HTTP {e.status} - {e.message}")
             return {"status": "error", "error": f"HTTP {e.status}: {e.message[:200]}"}
@@ -198,6 +626,123 @@ class ProcessorClient:
             logger.error(f"[PROCESSOR_CLIENT] Errore process_movement: {e}", exc_info=True)
             return {"status": "error", "error": str(e)}
     
+    @_invalidates_inventory
+    @_records_movements
+    async def process_movements_batch(
+        self,
+        user_id: int,
+        business_name: str,
+        movements: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Processa più movimenti in una richiesta (POST /process-movements-batch).
+        
+        Se il processor non espone l'endpoint batch (404/405/501) ripiega su
+        chiamate singole concorrenti (al massimo PROCESSOR_BATCH_CONCURRENCY),
+        con i movimenti dello stesso vino inviati in sequenza nell'ordine dato.
+        
+        Args:
+            movements: Lista di dict con wine_name, movement_type, quantity
+        
+        Returns:
+            Dict con status ("success" se tutti riusciti, "partial", "error") e
+            results: un risultato per movimento, nello stesso ordine, nel formato
+            di process_movement
+        """
+        logger.info(
+            f"[PROCESSOR_CLIENT] process_movements_batch: user_id={user_id}, "
+            f"business_name={business_name}, movimenti={len(movements)}"
+        )
+        if not movements:
+            return {"status": "success", "results": []}
+        
+        results = None
+        if time.monotonic() >= self._batch_unsupported_until:
+            results = await self._send_movements_batch(user_id, business_name, movements)
+        if results is None:
+            results = await self._send_movements_concurrently(user_id, business_name, movements)
+        
+        succeeded = sum(1 for r in results if r.get("status") == "success")
+        status = "success" if succeeded == len(results) else ("partial" if succeeded else "error")
+        return {"status": status, "results": results}
+    
+    async def _send_movements_batch(
+        self,
+        user_id: int,
+        business_name: str,
+        movements: List[Dict[str, Any]]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Endpoint batch del processor; None se non disponibile (usa le chiamate singole)."""
+        payload = {
+            "user_id": user_id,
+            "business_name": business_name,
+            "movements": [
+                {
+                    "wine_name": m["wine_name"],
+                    "movement_type": m["movement_type"],
+                    "quantity": m["quantity"]
+                }
+                for m in movements
+            ]
+        }
+        try:
+            async with self._request(
+                "POST", "/process-movements-batch",
+                timeout=60.0,
+                json=payload
+            ) as response:
+                if response.status in (404, 405, 501):
+                    settings = get_settings()
+                    self._batch_unsupported_until = time.monotonic() + settings.PROCESSOR_BATCH_RETRY_SECONDS
+                    logger.info(
+                        f"[PROCESSOR_CLIENT] Endpoint batch movimenti non disponibile (HTTP {response.status}): "
+                        f"chiamate singole per {settings.PROCESSOR_BATCH_RETRY_SECONDS:.0f}s"
+                    )
+                    return None
+                response.raise_for_status()
+                result = await response.json()
+        except aiohttp.ClientResponseError as e:
+            logger.error(f"[PROCESSOR_CLIENT] Errore process_movements_batch: HTTP {e.status} - {e.message}")
+            error = {"status": "error", "error": f"HTTP {e.status}: {e.message[:200]}"}
+            return [dict(error) for _ in movements]
+        except Exception as e:
+            logger.error(f"[PROCESSOR_CLIENT] Errore process_movements_batch: {e}", exc_info=True)
+            return [{"status": "error", "error": str(e)} for _ in movements]
+        
+        results = result.get("results") if isinstance(result, dict) else None
+        if not isinstance(results, list) or len(results) != len(movements):
+            # Risposta non conforme: nessuna garanzia su quali movimenti siano stati applicati
+            logger.error(f"[PROCESSOR_CLIENT] Risposta batch movimenti non valida: {str(result)[:200]}")
+            error = {"status": "error", "error": "Risposta batch del processor non valida"}
+            return [dict(error) for _ in movements]
+        return results
+    
+    async def _send_movements_concurrently(
+        self,
+        user_id: int,
+        business_name: str,
+        movements: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Chiamate singole concorrenti limitate; sequenziali per vino (ordine dei movimenti preservato)."""
+        by_wine: Dict[str, List[int]] = {}
+        for index, movement in enumerate(movements):
+            by_wine.setdefault(movement["wine_name"].strip().lower(), []).append(index)
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(movements)
+        semaphore = asyncio.Semaphore(get_settings().PROCESSOR_BATCH_CONCURRENCY)
+        
+        async def send_wine(indexes: List[int]) -> None:
+            async with semaphore:
+                for index in indexes:
+                    m = movements[index]
+                    results[index] = await self._send_movement(
+                        user_id, business_name, m["wine_name"], m["movement_type"], m["quantity"]
+                    )
+        
+        await asyncio.gather(*(send_wine(indexes) for indexes in by_wine.values()))
+        return results
+    
+    @_invalidates_inventory
     async def update_wine_field(
         self,
         user_id: int,
@@ -207,26 +752,36 @@ class ProcessorClient:
         value: str
     ) -> Dict[str, Any]:
         """Aggiorna un campo di un vino."""
+        return await self._send_wine_field(user_id, business_name, wine_id, field, value)
+    
+    async def _send_wine_field(
+        self,
+        user_id: int,
+        business_name: str,
+        wine_id: int,
+        field: str,
+        value: str
+    ) -> Dict[str, Any]:
+        """Invio di un campo al processor (senza effetti sulle cache)."""
         logger.info(
             f"[PROCESSOR_CLIENT] update_wine_field: user_id={user_id}, "
             f"wine_id={wine_id}, field={field}"
         )
         
         try:
-            timeout = aiohttp.ClientTimeout(total=30.0)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(
-                    f"{self.base_url}/admin/update-wine-field",
-                    data={
-                        "user_id": user_id,
-                        "business_name": business_name,
-                        "wine_id": wine_id,
-                        "field": field,
-                        "value": value
-                    }
-                ) as response:
-                    response.raise_for_status()
-                    return await response.json()
+            async with self._request(
+                "POST", "/admin/update-wine-field",
+                timeout=30.0,
+                data={
+                    "user_id": user_id,
+                    "business_name": business_name,
+                    "wine_id": wine_id,
+                    "field": field,
+                    "value": value
+                }
+            ) as response:
+                response.raise_for_status()
+                return await response.json()
         except aiohttp.ClientResponseError as e:
             logger.error(f"[PROCESSOR_CLIENT] Errore update_wine_field: HTTP {e.status} - {e.message}")
             return {"status": "error", "error": f"HTTP {e.status}: {e.message[:200]}"}
@@ -234,6 +789,8 @@ class ProcessorClient:
             logger.error(f"[PROCESSOR_CLIENT] Errore update_wine_field: {e}", exc_info=True)
             return {"status": "error", "error": str(e)}
     
+    @_invalidates_inventory
+    @_records_movements
     async def update_wine_field_with_movement(
         self,
         user_id: int,
@@ -245,33 +802,42 @@ class ProcessorClient:
         Aggiorna campo quantity creando automaticamente un movimento nel log.
         Mantiene il flusso di tracciabilità come se fosse fatto in chat.
         """
+        return await self._send_wine_quantity(user_id, business_name, wine_id, new_quantity)
+    
+    async def _send_wine_quantity(
+        self,
+        user_id: int,
+        business_name: str,
+        wine_id: int,
+        new_quantity: int
+    ) -> Dict[str, Any]:
+        """Invio della nuova quantity al processor (senza effetti sulle cache)."""
         logger.info(
             f"[PROCESSOR_CLIENT] update_wine_field_with_movement: user_id={user_id}, "
             f"wine_id={wine_id}, new_quantity={new_quantity}"
         )
         
         try:
-            timeout = aiohttp.ClientTimeout(total=30.0)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(
-                    f"{self.base_url}/admin/update-wine-field-with-movement",
-                    data={
-                        "user_id": user_id,
-                        "business_name": business_name,
-                        "wine_id": wine_id,
-                        "field": "quantity",
-                        "new_value": str(new_quantity)
-                    }
-                ) as response:
-                    response.raise_for_status()
-                    result = await response.json()
-                    if result.get("status") == "success":
-                        logger.info(
-                            f"[PROCESSOR_CLIENT] update_wine_field_with_movement successo: "
-                            f"wine_id={wine_id}, movement_created={result.get('movement_created', False)}, "
-                            f"movement_type={result.get('movement_type', 'N/A')}"
-                        )
-                    return result
+            async with self._request(
+                "POST", "/admin/update-wine-field-with-movement",
+                timeout=30.0,
+                data={
+                    "user_id": user_id,
+                    "business_name": business_name,
+                    "wine_id": wine_id,
+                    "field": "quantity",
+                    "new_value": str(new_quantity)
+                }
+            ) as response:
+                response.raise_for_status()
+                result = await response.json()
+                if result.get("status") == "success":
+                    logger.info(
+                        f"[PROCESSOR_CLIENT] update_wine_field_with_movement successo: "
+                        f"wine_id={wine_id}, movement_created={result.get('movement_created', False)}, "
+                        f"movement_type={result.get('movement_type', 'N/A')}"
+                    )
+                return result
         except aiohttp.ClientResponseError as e:
             logger.error(
                 f"[PROCESSOR_CLIENT] Errore update_wine_field_with_movement: HTTP {e.status} - {e.message}"
@@ -284,19 +850,164 @@ class ProcessorClient:
             )
             return {"status": "error", "error": str(e)}
     
+    @_applies_wine_row(created=False)
+    async def update_wine(
+        self,
+        user_id: int,
+        business_name: str,
+        wine_id: int,
+        fields: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Aggiorna più campi di un vino in una richiesta (POST /admin/update-wine).
+        
+        quantity passa dalla logica con movimento del processor (come
+        update_wine_field_with_movement). Se il processor non espone l'endpoint
+        (404/405/501) ripiega su una chiamata per campo, in sequenza.
+        
+        Returns:
+            Dict con status ("success", "partial", "error"), updated_fields,
+            errors ("campo: errore") e wine: la riga aggiornata (WineRow) dalla
+            risposta del processor o, se assente, da una sola lettura (il
+            processor risponde a commit avvenuto)
+        """
+        logger.info(
+            f"[PROCESSOR_CLIENT] update_wine: user_id={user_id}, "
+            f"wine_id={wine_id}, fields={list(fields)}"
+        )
+        
+        result = None
+        if time.monotonic() >= self._update_wine_unsupported_until:
+            result = await self._send_wine_update(user_id, business_name, wine_id, fields)
+        if result is None:
+            result = await self._send_wine_fields(user_id, business_name, wine_id, fields)
+        
+        if result["updated_fields"]:
+            if "quantity" in result["updated_fields"]:
+                _sync_movements_ledger(user_id, business_name)
+            if result.get("wine") is None:
+                result["wine"] = await self._read_wine(user_id, business_name, wine_id)
+        return result
+    
+    async def _send_wine_update(
+        self,
+        user_id: int,
+        business_name: str,
+        wine_id: int,
+        fields: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Endpoint multi-campo del processor; None se non disponibile (usa le chiamate per campo)."""
+        try:
+            async with self._request(
+                "POST", "/admin/update-wine",
+                timeout=30.0,
+                json={
+                    "user_id": user_id,
+                    "business_name": business_name,
+                    "wine_id": wine_id,
+                    "fields": fields
+                }
+            ) as response:
+                if response.status in (404, 405, 501):
+                    settings = get_settings()
+                    self._update_wine_unsupported_until = time.monotonic() + settings.PROCESSOR_BATCH_RETRY_SECONDS
+                    logger.info(
+                        f"[PROCESSOR_CLIENT] Endpoint update-wine non disponibile (HTTP {response.status}): "
+                        f"un campo per chiamata per {settings.PROCESSOR_BATCH_RETRY_SECONDS:.0f}s"
+                    )
+                    return None
+                response.raise_for_status()
+                result = await response.json()
+        except aiohttp.ClientResponseError as e:
+            logger.error(f"[PROCESSOR_CLIENT] Errore update_wine: HTTP {e.status} - {e.message}")
+            return {"status": "error", "updated_fields": [], "errors": [f"HTTP {e.status}: {e.message[:200]}"]}
+        except Exception as e:
+            logger.error(f"[PROCESSOR_CLIENT] Errore update_wine: {e}", exc_info=True)
+            return {"status": "error", "updated_fields": [], "errors": [str(e)]}
+        
+        if result.get("status") == "error" and not result.get("updated_fields"):
+            return {"status": "error", "updated_fields": [], "errors": [result.get("error", "Errore sconosciuto")]}
+        updated_fields = result.get("updated_fields", list(fields))
+        errors = result.get("errors") or []
+        status = "success" if not errors else ("partial" if updated_fields else "error")
+        return {
+            **result,
+            "status": status,
+            "updated_fields": updated_fields,
+            "errors": errors,
+            "wine": self._wine_from_response(result)
+        }
+    
+    async def _send_wine_fields(
+        self,
+        user_id: int,
+        business_name: str,
+        wine_id: int,
+        fields: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Una chiamata per campo (processor senza /admin/update-wine)."""
+        updated_fields = []
+        errors = []
+        for field, value in fields.items():
+            if field == "quantity":
+                try:
+                    new_quantity = int(value)
+                except (TypeError, ValueError):
+                    errors.append(f"{field}: Valore non valido (deve essere un numero intero)")
+                    continue
+                result = await self._send_wine_quantity(user_id, business_name, wine_id, new_quantity)
+            else:
+                # Il processor riceve stringhe: None diventa stringa vuota
+                value_str = str(value) if value is not None else ""
+                result = await self._send_wine_field(user_id, business_name, wine_id, field, value_str)
+            if result.get("status") == "success" or result.get("success"):
+                updated_fields.append(field)
+            else:
+                errors.append(f"{field}: {result.get('error', 'Errore sconosciuto')}")
+        status = "success" if not errors else ("partial" if updated_fields else "error")
+        return {"status": status, "updated_fields": updated_fields, "errors": errors}
+    
+    def _wine_from_response(self, result: Dict[str, Any]) -> Optional[WineRow]:
+        """Riga del vino inclusa nella risposta del processor (result["wine"]), se presente e valida"""
+        wine = result.get("wine")
+        if not isinstance(wine, dict) or wine.get("id") is None:
+            return None
+        try:
+            return WineRow.from_dict(wine)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"[PROCESSOR_CLIENT] Riga vino nella risposta non valida: {e}")
+            return None
+    
+    async def _read_wine(self, user_id: int, business_name: str, wine_id: int) -> Optional[WineRow]:
+        """Riga del vino appena scritta, con una sola query (senza attese: il processor ha già fatto commit)"""
+        table_name = tenant_table(user_id, business_name, INVENTARIO)
+        try:
+            async with db_session() as session:
+                result = await session.execute(
+                    sql_text(f"SELECT * FROM {table_name} WHERE id = :wine_id AND user_id = :user_id"),
+                    {"wine_id": wine_id, "user_id": user_id}
+                )
+                wines = WineRow.from_result(result)
+        except Exception as e:
+            logger.warning(f"[PROCESSOR_CLIENT] Lettura vino id={wine_id} dopo la scrittura fallita: {e}")
+            return None
+        return wines[0] if wines else None
+    
+    @_invalidates_inventory
+    @_changes_tables
     async def delete_tables(self, user_id: int, business_name: str) -> Dict[str, Any]:
         """Elimina tabelle utente."""
         logger.info(f"[PROCESSOR_CLIENT] delete_tables: user_id={user_id}, business_name={business_name}")
         
         try:
-            timeout = aiohttp.ClientTimeout(total=30.0)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.delete(
-                    f"{self.base_url}/tables/{user_id}",
-                    params={"business_name": business_name}
-                ) as response:
-                    response.raise_for_status()
-                    return await response.json()
+            async with self._request(
+                "DELETE", f"/tables/{user_id}",
+                route="/tables",
+                timeout=30.0,
+                params={"business_name": business_name}
+            ) as response:
+                response.raise_for_status()
+                return await response.json()
         except aiohttp.ClientResponseError as e:
             logger.error(f"[PROCESSOR_CLIENT] Errore delete_tables: HTTP {e.status} - {e.message}")
             return {"status": "error", "error": f"HTTP {e.status}: {e.message[:200]}"}
@@ -304,41 +1015,36 @@ class ProcessorClient:
             logger.error(f"[PROCESSOR_CLIENT] Errore delete_tables: {e}", exc_info=True)
             return {"status": "error", "error": str(e)}
     
+    @_invalidates_inventory
+    @_changes_tables
     async def admin_insert_inventory(
         self,
         user_id: int,
         business_name: str,
-        file_content: bytes,
+        file_content: Union[bytes, UploadStream],
         file_name: str,
         mode: str = "replace"  # "add" o "replace" - default replace per onboarding
     ) -> Dict[str, Any]:
         """
         Inserisce inventario pulito direttamente nel database (come admin bot).
         NON passa attraverso la pipeline, inserisce direttamente i dati dal CSV.
+        file_content può essere un UploadStream: il file viene inviato a blocchi.
         """
         logger.info(
             f"[PROCESSOR_CLIENT] admin_insert_inventory: user_id={user_id}, "
             f"business_name={business_name}, file_name={file_name}, "
-            f"file_size={len(file_content)} bytes, mode={mode}"
+            f"file_size={await _file_size(file_content)} bytes, mode={mode}"
         )
         
         try:
-            timeout = aiohttp.ClientTimeout(total=60.0)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                form_data = aiohttp.FormData()
-                form_data.add_field('file', file_content, filename=file_name)
-                form_data.add_field('user_id', str(user_id))
-                form_data.add_field('business_name', business_name)
-                form_data.add_field('mode', mode)
-                
-                async with session.post(
-                    f"{self.base_url}/admin/insert-inventory",
-                    data=form_data
-                ) as response:
-                    response.raise_for_status()
-                    result = await response.json()
-                    logger.info(f"[PROCESSOR_CLIENT] admin_insert_inventory successo: {result}")
-                    return result
+            result = await self._upload_inventory_file(
+                "/admin/insert-inventory",
+                {"user_id": user_id, "business_name": business_name, "mode": mode},
+                file_content,
+                file_name
+            )
+            logger.info(f"[PROCESSOR_CLIENT] admin_insert_inventory successo: {result}")
+            return result
         except aiohttp.ClientResponseError as e:
             logger.error(f"[PROCESSOR_CLIENT] Errore admin_insert_inventory: HTTP {e.status} - {e.message}")
             return {"status": "error", "error": f"HTTP {e.status}: {e.message[:200]}"}
@@ -346,6 +1052,7 @@ class ProcessorClient:
             logger.error(f"[PROCESSOR_CLIENT] Errore admin_insert_inventory: {e}", exc_info=True)
             return {"status": "error", "error": str(e)}
     
+    @_applies_wine_row(created=True)
     async def add_wine(
         self,
         user_id: int,
@@ -354,6 +1061,8 @@ class ProcessorClient:
     ) -> Dict[str, Any]:
         """
         Aggiunge un nuovo vino all'inventario.
+        In caso di successo result["wine"] è la riga creata (WineRow): dalla
+        risposta del processor o da una sola lettura dopo la scrittura.
         """
         logger.info(
             f"[PROCESSOR_CLIENT] add_wine: user_id={user_id}, "
@@ -361,37 +1070,44 @@ class ProcessorClient:
         )
         
         try:
-            timeout = aiohttp.ClientTimeout(total=30.0)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                # Prepara dati form
-                form_data = aiohttp.FormData()
-                form_data.add_field('user_id', str(user_id))
-                form_data.add_field('business_name', business_name)
+            # Prepara dati form
+            form_data = aiohttp.FormData()
+            form_data.add_field('user_id', str(user_id))
+            form_data.add_field('business_name', business_name)
                 
-                # Aggiungi tutti i campi del vino
-                for key, value in wine_data.items():
-                    if value is not None:
-                        form_data.add_field(key, str(value))
-                
-                async with session.post(
-                    f"{self.base_url}/admin/add-wine",
-                    data=form_data
-                ) as response:
-                    response.raise_for_status()
-                    result = await response.json()
-                    
-                    logger.info(
-                        f"[PROCESSOR_CLIENT] add_wine completato: wine_id={result.get('wine_id')}, "
-                        f"wine_name={wine_data.get('name')}"
-                    )
+            # Aggiungi tutti i campi del vino
+            for key, value in wine_data.items():
+                if value is not None:
+                    form_data.add_field(key, str(value))
+            
+            async with self._request(
+                "POST", "/admin/add-wine",
+                timeout=30.0,
+                data=form_data
+            ) as response:
+                response.raise_for_status()
+                result = await response.json()
                     
-                    return result
+                logger.info(
+                    f"[PROCESSOR_CLIENT] add_wine completato: wine_id={result.get('wine_id')}, "
+                    f"wine_name={wine_data.get('name')}"
+                )
         except aiohttp.ClientResponseError as e:
             logger.error(f"[PROCESSOR_CLIENT] Errore add_wine: HTTP {e.status} - {e.message}")
             return {"status": "error", "error": f"HTTP {e.status}: {e.message[:200]}"}
         except Exception as e:
             logger.error(f"[PROCESSOR_CLIENT] Errore add_wine: {e}", exc_info=True)
             return {"status": "error", "error": str(e)}
+        
+        if result.get("status") != "error":
+            wine = self._wine_from_response(result)
+            if wine is None and result.get("wine_id") is not None:
+                try:
+                    wine = await self._read_wine(user_id, business_name, int(result["wine_id"]))
+                except (TypeError, ValueError):
+                    wine = None
+            result["wine"] = wine
+        return result
     
     async def get_daily_report_pdf(
         self,
@@ -409,20 +1125,21 @@ class ProcessorClient:
             Bytes del PDF o None se errore
         """
         try:
-            url = f"{self.base_url}/api/reports/daily/{user_id}"
-            if report_date:
-                url += f"?report_date={report_date}"
-            
-            timeout = aiohttp.ClientTimeout(total=30.0)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(url) as response:
-                    if response.status == 404:
-                        logger.debug(f"[PROCESSOR_CLIENT] Report PDF non trovato per user_id={user_id}, date={report_date}")
-                        return None
-                    response.raise_for_status()
-                    pdf_data = await response.read()
-                    logger.info(f"[PROCESSOR_CLIENT] PDF recuperato: {len(pdf_data)} bytes per user_id={user_id}")
-                    return pdf_data
+            params = {"report_date": report_date} if report_date else None
+            async with self._request(
+                "GET", f"/api/reports/daily/{user_id}",
+                route="/api/reports/daily",
+                timeout=30.0,
+                hedge=True,
+                params=params
+            ) as response:
+                if response.status == 404:
+                    logger.debug(f"[PROCESSOR_CLIENT] Report PDF non trovato per user_id={user_id}, date={report_date}")
+                    return None
+                response.raise_for_status()
+                pdf_data = await response.read()
+                logger.info(f"[PROCESSOR_CLIENT] PDF recuperato: {len(pdf_data)} bytes per user_id={user_id}")
+                return pdf_data
         except aiohttp.ClientResponseError as e:
             if e.status == 404:
                 logger.debug(f"[PROCESSOR_CLIENT] Report PDF non trovato: {e}")
@@ -448,25 +1165,26 @@ class ProcessorClient:
             end_date: Data fine (YYYY-MM-DD)
         """
         try:
-            url = f"{self.base_url}/api/reports/movements/{user_id}"
-            url += f"?start_date={start_date}&end_date={end_date}"
-
-            timeout = aiohttp.ClientTimeout(total=30.0)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(url) as response:
-                    if response.status == 404:
-                        logger.debug(
-                            f"[PROCESSOR_CLIENT] Report movimenti range non trovato per user_id={user_id}, "
-                            f"start_date={start_date}, end_date={end_date}"
-                        )
-                        return None
-                    response.raise_for_status()
-                    pdf_data = await response.read()
-                    logger.info(
-                        f"[PROCESSOR_CLIENT] PDF movimenti range recuperato: {len(pdf_data)} bytes "
-                        f"per user_id={user_id}, start_date={start_date}, end_date={end_date}"
+            async with self._request(
+                "GET", f"/api/reports/movements/{user_id}",
+                route="/api/reports/movements",
+                timeout=30.0,
+                hedge=True,
+                params={"start_date": start_date, "end_date": end_date}
+            ) as response:
+                if response.status == 404:
+                    logger.debug(
+                        f"[PROCESSOR_CLIENT] Report movimenti range non trovato per user_id={user_id}, "
+                        f"start_date={start_date}, end_date={end_date}"
                     )
-                    return pdf_data
+                    return None
+                response.raise_for_status()
+                pdf_data = await response.read()
+                logger.info(
+                    f"[PROCESSOR_CLIENT] PDF movimenti range recuperato: {len(pdf_data)} bytes "
+                    f"per user_id={user_id}, start_date={start_date}, end_date={end_date}"
+                )
+                return pdf_data
         except aiohttp.ClientResponseError as e:
             if e.status == 404:
                 logger.debug(f"[PROCESSOR_CLIENT] Report movimenti range non trovato: {e}")
@@ -485,18 +1203,19 @@ class ProcessorClient:
         Recupera PDF statistiche inventario per un utente.
         """
         try:
-            url = f"{self.base_url}/api/reports/inventory/{user_id}"
-
-            timeout = aiohttp.ClientTimeout(total=30.0)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(url) as response:
-                    if response.status == 404:
-                        logger.debug(f"[PROCESSOR_CLIENT] Report inventario non trovato per user_id={user_id}")
-                        return None
-                    response.raise_for_status()
-                    pdf_data = await response.read()
-                    logger.info(f"[PROCESSOR_CLIENT] PDF inventario recuperato: {len(pdf_data)} bytes per user_id={user_id}")
-                    return pdf_data
+            async with self._request(
+                "GET", f"/api/reports/inventory/{user_id}",
+                route="/api/reports/inventory",
+                timeout=30.0,
+                hedge=True
+            ) as response:
+                if response.status == 404:
+                    logger.debug(f"[PROCESSOR_CLIENT] Report inventario non trovato per user_id={user_id}")
+                    return None
+                response.raise_for_status()
+                pdf_data = await response.read()
+                logger.info(f"[PROCESSOR_CLIENT] PDF inventario recuperato: {len(pdf_data)} bytes per user_id={user_id}")
+                return pdf_data
         except aiohttp.ClientResponseError as e:
             if e.status == 404:
                 logger.debug(f"[PROCESSOR_CLIENT] Report inventario non trovato: {e}")
@@ -0,0 +1,156 @@
+"""
+Resilienza delle chiamate al processor: circuit breaker per endpoint e istogrammi di latenza.
+
+Con il processor lento ogni metodo di ProcessorClient aspettava il proprio
+timeout pieno (30-60 s): turni di chat e modifiche vini si accumulavano. Qui:
+- CircuitBreaker: dopo PROCESSOR_BREAKER_FAILURES errori consecutivi
+  (connessione, timeout, HTTP 5xx) l'endpoint è "open" e le chiamate falliscono
+  subito con ProcessorUnavailable; dopo PROCESSOR_BREAKER_OPEN_SECONDS passa a
+  "half_open" e lascia passare una sola chiamata di prova: se riesce torna
+  "closed", altrimenti si riapre;
+- LatencyHistogram: distribuzione delle latenze per endpoint (bucket fissi),
+  esposta su /api/debug/processor insieme allo stato dei breaker.
+
+Gli errori 4xx non contano come guasti: il processor ha risposto.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Limiti superiori dei bucket di latenza (ms); l'ultimo bucket raccoglie il resto
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class ProcessorUnavailable(aiohttp.ClientConnectionError):
+    """Chiamata non inviata: circuit breaker aperto o budget di tempo della richiesta esaurito"""
+
+
+class DeadlineExceeded(ProcessorUnavailable):
+    """Budget di tempo della richiesta in ingresso esaurito prima della chiamata"""
+
+
+def is_failure(error: Optional[BaseException] = None, status: Optional[int] = None) -> bool:
+    """Esito che conta come guasto del processor per il circuit breaker"""
+    if error is not None:
+        return isinstance(error, (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)) \
+            and not isinstance(error, ProcessorUnavailable)
+    return status is not None and status >= 500
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Attesa prima del tentativo attempt (da 1): backoff esponenziale con full jitter"""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+class CircuitBreaker:
+    """Breaker closed/open/half_open con una chiamata di prova alla volta in half_open"""
+
+    def __init__(self, name: str, failure_threshold: int, open_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self.rejected = 0
+        self.opens = 0
+
+    def allow(self) -> bool:
+        """True se la chiamata può partire (in half_open solo la chiamata di prova)"""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self.state = "half_open"
+            logger.info(f"[PROCESSOR_BREAKER] {self.name}: half_open, chiamata di prova")
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                self.rejected += 1
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def record(self, failed: bool) -> None:
+        """Esito di una chiamata lasciata passare da allow()"""
+        probe = self._probe_in_flight
+        self._probe_in_flight = False
+        if not failed:
+            if self.state != "closed":
+                logger.info(f"[PROCESSOR_BREAKER] {self.name}: closed")
+            self.state = "closed"
+            self.consecutive_failures = 0
+            return
+        self.consecutive_failures += 1
+        if probe or (self.state == "closed" and self.consecutive_failures >= self.failure_threshold):
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.opens += 1
+            logger.warning(
+                f"[PROCESSOR_BREAKER] {self.name}: open per {self.open_seconds:g}s "
+                f"dopo {self.consecutive_failures} errori consecutivi"
+            )
+
+    def release(self) -> None:
+        """Chiamata autorizzata ma annullata senza esito (es. richiesta hedged perdente)"""
+        self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        retry_in = None
+        if self.state == "open":
+            retry_in = round(max(self.open_seconds - (time.monotonic() - self.opened_at), 0), 1)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opens": self.opens,
+            "rejected": self.rejected,
+            "retry_in_seconds": retry_in,
+        }
+
+
+class LatencyHistogram:
+    """Conteggi per bucket di latenza, con esiti ed errori"""
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.failures = 0
+
+    def observe(self, latency_ms: float, failed: bool) -> None:
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if latency_ms <= bound), len(LATENCY_BUCKETS_MS))
+        self.counts[index] += 1
+        self.total += 1
+        self.sum_ms += latency_ms
+        if failed:
+            self.failures += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Stima (limite superiore del bucket, ms) del quantile q; None senza osservazioni"""
+        if not self.total:
+            return None
+        threshold = q * self.total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= threshold:
+                return float(LATENCY_BUCKETS_MS[index]) if index < len(LATENCY_BUCKETS_MS) else None
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        labels = [f"le_{bound}ms" for bound in LATENCY_BUCKETS_MS] + ["inf"]
+        return {
+            "count": self.total,
+            "failures": self.failures,
+            "mean_ms": round(self.sum_ms / self.total, 1) if self.total else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
@@ -0,0 +1,133 @@
+"""
+Contesto per-richiesta (unit of work).
+
+Il middleware crea un RequestContext per ogni richiesta HTTP e lo rende
+disponibile tramite contextvar a db_manager, servizi e agent:
+- l'utente già risolto da get_current_user (niente get_user_by_id ripetuti,
+  da cui derivano anche i nomi delle tabelle tenant);
+- un'unica AsyncSession condivisa (vedi database.db_session);
+- la scadenza della richiesta (deadline): header X-Request-Timeout-Ms del
+  client, altrimenti REQUEST_DEADLINE_SECONDS. ProcessorClient riduce i
+  propri timeout al tempo rimanente e lo inoltra al processor.
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class RequestContext:
+    """Stato condiviso per la durata di una richiesta HTTP"""
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.user: Optional[Any] = None
+        # time.monotonic() entro cui la richiesta deve rispondere (None: nessun limite)
+        self.deadline = deadline
+        self.session: Optional[Any] = None
+        self.closed = False
+        # Serializza l'uso della sessione: task concorrenti della stessa richiesta
+        # (es. rami speculativi) ripiegano su una sessione dedicata
+        self.session_lock = asyncio.Lock()
+        self.session_uses = 0
+        self.dedicated_sessions = 0
+        self.user_lookups_saved = 0
+
+    async def close(self) -> None:
+        self.closed = True
+        if self.session is not None:
+            try:
+                await self.session.close()
+            except Exception as e:
+                logger.warning(f"[REQUEST_CONTEXT] Errore chiusura sessione: {e}")
+            self.session = None
+
+
+_current_request: ContextVar[Optional[RequestContext]] = ContextVar("request_context", default=None)
+
+
+def get_request_context() -> Optional[RequestContext]:
+    return _current_request.get()
+
+
+def bind_request_user(user: Any) -> None:
+    """Registra l'utente autenticato nel contesto della richiesta corrente"""
+    ctx = _current_request.get()
+    if ctx is not None and user is not None:
+        ctx.user = user
+
+
+def get_request_user(user_id: int) -> Optional[Any]:
+    """Utente della richiesta corrente se coincide con user_id, altrimenti None"""
+    ctx = _current_request.get()
+    if ctx is not None and ctx.user is not None and ctx.user.id == user_id:
+        ctx.user_lookups_saved += 1
+        return ctx.user
+    return None
+
+
+def remaining_budget() -> Optional[float]:
+    """Secondi rimanenti prima della scadenza della richiesta corrente (None: nessun limite)"""
+    ctx = _current_request.get()
+    # Task avviati durante la richiesta che le sopravvivono: nessun limite dopo la chiusura
+    # (quelli in background partono comunque senza contesto, vedi create_background_task)
+    if ctx is None or ctx.closed or ctx.deadline is None:
+        return None
+    return ctx.deadline - time.monotonic()
+
+
+def create_background_task(coro) -> asyncio.Task:
+    """
+    Avvia un task che sopravvive alla richiesta corrente, fuori dal suo contesto.
+
+    asyncio.create_task copia i contextvar del chiamante: senza un contesto vuoto
+    il task erediterebbe RequestContext (sessione e deadline della richiesta) e,
+    finché la richiesta resta aperta (es. SSE), ogni chiamata al processor
+    fallirebbe con DeadlineExceeded allo scadere di REQUEST_DEADLINE_SECONDS.
+    """
+    return contextvars.Context().run(asyncio.create_task, coro)
+
+
+def _request_deadline(scope) -> Optional[float]:
+    """Scadenza dalla richiesta in ingresso: X-Request-Timeout-Ms o REQUEST_DEADLINE_SECONDS"""
+    budget = get_settings().REQUEST_DEADLINE_SECONDS
+    for name, value in scope.get("headers") or ():
+        if name == b"x-request-timeout-ms":
+            try:
+                requested = float(value) / 1000
+            except ValueError:
+                break
+            if requested > 0:
+                budget = min(budget, requested) if budget else requested
+            break
+    return time.monotonic() + budget if budget else None
+
+
+class RequestContextMiddleware:
+    """Middleware ASGI: un RequestContext per ogni richiesta HTTP"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        ctx = RequestContext(deadline=_request_deadline(scope))
+        token = _current_request.set(ctx)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await ctx.close()
+            _current_request.reset(token)
+            if ctx.session_uses:
+                logger.debug(
+                    f"[REQUEST_CONTEXT] {scope.get('path')}: sessione condivisa usata {ctx.session_uses} volte, "
+                    f"{ctx.dedicated_sessions} sessioni dedicate, {ctx.user_lookups_saved} lookup utente evitati"
+                )
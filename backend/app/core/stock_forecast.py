@@ -0,0 +1,205 @@
+"""
+Previsione di esaurimento scorte e suggerimenti di riordino calcolati in batch con NumPy.
+
+Gli alert scorte basse confrontavano solo quantity < soglia e il modello AI
+doveva improvvisare i riordini. Qui, per tutti i vini del tenant in un solo
+passaggio sulle righe del rollup giornaliero (wine_movements_daily) degli
+ultimi FORECAST_WINDOW_DAYS giorni, si calcolano:
+- consumo giornaliero medio pesato esponenzialmente (half-life FORECAST_HALF_LIFE_DAYS);
+- giorni all'esaurimento = stock attuale / consumo giornaliero;
+- scorta di sicurezza = z * deviazione dei consumi giornalieri * sqrt(lead time);
+- punto di riordino = consumo * lead time + scorta di sicurezza;
+- riordino suggerito = consumo * (lead time + copertura) + scorta di sicurezza - stock.
+
+I giorni prima del primo movimento del vino nella finestra non contano come
+giorni a consumo zero (vini appena inseriti). Il risultato è in cache per
+versione dello storico (movements_ledger.version) e giorno.
+"""
+import logging
+import math
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.movements_ledger import movements_ledger
+from app.core.stock_trajectories import stock_trajectories
+
+logger = logging.getLogger(__name__)
+
+# Ordine di presentazione: prima i vini da riordinare con urgenza
+STATUSES = ("out_of_stock", "urgent", "reorder", "ok")
+
+
+def compute_forecast(
+    wine_names: Sequence[str],
+    current_stock: Sequence[int],
+    movements: np.ndarray,
+    window_days: int,
+    half_life_days: float,
+    lead_time_days: int,
+    coverage_days: int,
+    service_level_z: float,
+    today: date
+) -> Dict[str, Any]:
+    """
+    Previsione per tutti i vini in un passaggio.
+
+    Args:
+        wine_names: Vini da calcolare (ordine delle matrici)
+        current_stock: Stock attuale di ogni vino (stesso ordine)
+        movements: Matrice int (n, 4) delle righe del rollup dall'inizio della finestra:
+            indice del vino, giorni dall'inizio finestra, consumi, rifornimenti
+        window_days: Giorni della finestra (l'ultimo è today)
+        half_life_days: Giorni dopo cui il peso di un consumo si dimezza
+        lead_time_days: Giorni tra ordine e consegna
+        coverage_days: Giorni di consumo da coprire con un riordino
+        service_level_z: Moltiplicatore della scorta di sicurezza
+        today: Data di riferimento
+
+    Returns:
+        Dict con parametri, conteggi per stato e previsione per vino ordinata per urgenza
+    """
+    n_wines = len(wine_names)
+    movements = np.asarray(movements, dtype=np.int64).reshape(-1, 4)
+    wine_idx, offsets, consumi, _ = movements.T
+    inside = (offsets >= 0) & (offsets < window_days)
+    wine_idx, offsets, consumi = wine_idx[inside], offsets[inside], consumi[inside]
+
+    # Consumi giornalieri (vino × giorno) e primo giorno con movimenti di ogni vino
+    daily = np.bincount(
+        wine_idx * window_days + offsets, weights=consumi, minlength=n_wines * window_days
+    ).reshape(n_wines, window_days)
+    first_day = np.full(n_wines, window_days, dtype=np.int64)
+    np.minimum.at(first_day, wine_idx, offsets)
+
+    days = np.arange(window_days)
+    weights = np.power(0.5, (window_days - 1 - days) / half_life_days)
+    weights = np.where(days[None, :] >= first_day[:, None], weights[None, :], 0.0)
+    weight_sum = weights.sum(axis=1)
+    has_history = weight_sum > 0
+    safe_sum = np.where(has_history, weight_sum, 1.0)
+
+    rate = (daily * weights).sum(axis=1) / safe_sum
+    variance = (weights * (daily - rate[:, None]) ** 2).sum(axis=1) / safe_sum
+    std = np.sqrt(variance)
+
+    stock = np.asarray(current_stock, dtype=np.float64)
+    consuming = rate > 0
+    days_to_stockout = np.where(consuming, np.maximum(stock, 0) / np.where(consuming, rate, 1.0), np.inf)
+    safety = service_level_z * std * math.sqrt(lead_time_days)
+    reorder_point = rate * lead_time_days + safety
+    suggested = np.ceil(np.maximum(rate * (lead_time_days + coverage_days) + safety - stock, 0))
+
+    status = np.select(
+        [stock <= 0, consuming & (days_to_stockout <= lead_time_days), consuming & (stock <= reorder_point)],
+        [0, 1, 2],
+        default=3
+    )
+    order = np.lexsort((days_to_stockout, status))
+
+    columns = (
+        rate.tolist(), std.tolist(), daily.sum(axis=1).tolist(), days_to_stockout.tolist(),
+        safety.tolist(), reorder_point.tolist(), suggested.astype(np.int64).tolist(), status.tolist(),
+    )
+    wines = []
+    for i in order.tolist():
+        wine_rate, wine_std, consumed, to_stockout, wine_safety, wine_reorder, wine_suggested, wine_status = (
+            column[i] for column in columns
+        )
+        finite = math.isfinite(to_stockout)
+        wines.append({
+            "wine_name": wine_names[i],
+            "current_stock": int(current_stock[i]),
+            "daily_consumption": round(wine_rate, 2),
+            "daily_consumption_std": round(wine_std, 2),
+            "consumed_in_window": int(consumed),
+            "has_history": bool(has_history[i]),
+            "days_to_stockout": round(to_stockout, 1) if finite else None,
+            "stockout_date": (today + timedelta(days=int(to_stockout))).isoformat() if finite else None,
+            "safety_stock": math.ceil(wine_safety),
+            "reorder_point": math.ceil(wine_reorder),
+            "suggested_reorder": wine_suggested,
+            "status": STATUSES[wine_status],
+        })
+
+    counts = np.bincount(status, minlength=len(STATUSES)).tolist()
+    return {
+        "date": today.isoformat(),
+        "window_days": window_days,
+        "half_life_days": half_life_days,
+        "lead_time_days": lead_time_days,
+        "coverage_days": coverage_days,
+        "summary": dict(zip(STATUSES, counts)),
+        "wines": wines,
+    }
+
+
+class StockForecaster:
+    """Previsione per tenant con cache LRU per versione dello storico"""
+
+    def __init__(self):
+        self._cache: "OrderedDict[int, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, user_id: int) -> None:
+        self._cache.pop(user_id, None)
+
+    async def forecast(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        table_storico: str,
+        today: Optional[date] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Previsione di tutti i vini dello storico del tenant.
+
+        Returns:
+            Risultato di compute_forecast, oppure None se il registro movimenti
+            non è utilizzabile per il tenant
+        """
+        if not await movements_ledger.ensure_synced(session, user_id, table_storico):
+            return None
+        today = today or date.today()
+        key = (table_storico, movements_ledger.version(user_id), today)
+
+        cached = self._cache.get(user_id)
+        if cached is not None and cached[0] == key:
+            self._cache.move_to_end(user_id)
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+
+        settings = get_settings()
+        window = settings.FORECAST_WINDOW_DAYS
+        start = today - timedelta(days=window - 1)
+        names, current_stock, movements = await stock_trajectories.load(
+            session, user_id, table_storico, None, start
+        )
+        result = compute_forecast(
+            names, current_stock, movements, window, settings.FORECAST_HALF_LIFE_DAYS,
+            settings.FORECAST_LEAD_TIME_DAYS, settings.FORECAST_COVERAGE_DAYS,
+            settings.FORECAST_SERVICE_LEVEL_Z, today
+        )
+
+        self._cache[user_id] = (key, result)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > settings.FORECAST_CACHE_MAX_TENANTS:
+            self._cache.popitem(last=False)
+        logger.info(
+            f"[STOCK_FORECAST] Previsione calcolata: user_id={user_id}, vini={len(names)}, "
+            f"stati={result['summary']}"
+        )
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "tenants": len(self._cache)}
+
+
+# Istanza globale
+stock_forecast = StockForecaster()
@@ -0,0 +1,281 @@
+"""
+Traiettorie di stock per vino calcolate in batch con NumPy.
+
+Grafici e report ricostruivano stock di apertura e curva di stock un vino alla
+volta, scorrendo le voci di history in Python. Qui le righe del rollup
+giornaliero (wine_movements_daily) di tutti i vini richiesti vengono caricate in
+array contigui (indice vino, indice bucket, quantità con segno) e curve, stock
+di apertura/chiusura e totali del periodo si ottengono in un solo passaggio
+(bincount per cella vino × bucket + cumsum sull'asse dei bucket).
+
+Lo stock è ancorato a current_stock di "Storico vino" (fonte unica di verità):
+chiusura del periodo = stock attuale - saldo dei movimenti successivi al
+periodo, apertura = chiusura - saldo del periodo.
+
+Dimensione limitata: al massimo TRAJECTORY_MAX_BUCKETS bucket e
+TRAJECTORY_MAX_CELLS celle vino × bucket per richiesta (TrajectoryTooLarge),
+verificati prima di caricare il rollup.
+"""
+import logging
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text as sql_text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.movements_ledger import movements_ledger
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = ("day", "week", "month")
+
+# Preset dei grafici (ChartHelper): giorni coperti e granularità
+PERIOD_PRESETS = {
+    "day": (1, "day"),
+    "week": (7, "day"),
+    "month": (30, "day"),
+    "quarter": (91, "week"),
+    "year": (365, "month"),
+}
+
+
+class TrajectoryTooLarge(Exception):
+    """Richiesta oltre TRAJECTORY_MAX_BUCKETS bucket o TRAJECTORY_MAX_CELLS celle vino × bucket"""
+
+    def __init__(self, wines: int, buckets: int, message: str):
+        super().__init__(message)
+        self.wines = wines
+        self.buckets = buckets
+
+
+def period_range(period: str, today: Optional[date] = None) -> Tuple[date, date, str]:
+    """(start, end, bucket) di un preset dei grafici (default: week)"""
+    days, bucket = PERIOD_PRESETS.get(period, PERIOD_PRESETS["week"])
+    end = today or date.today()
+    return end - timedelta(days=days - 1), end, bucket
+
+
+def bucket_starts(start_date: date, end_date: date, bucket: str) -> List[date]:
+    """Date di inizio dei bucket che coprono [start_date, end_date]"""
+    if bucket == "day":
+        return [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    if bucket == "week":
+        return [start_date + timedelta(days=i) for i in range(0, (end_date - start_date).days + 1, 7)]
+    starts = []
+    current = start_date
+    while current <= end_date:
+        starts.append(current)
+        current = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+    return starts
+
+
+def bucket_count(start_date: date, end_date: date, bucket: str) -> int:
+    """Numero di bucket che coprono [start_date, end_date] (senza costruirne l'elenco)"""
+    days = (end_date - start_date).days
+    if bucket == "day":
+        return days + 1
+    if bucket == "week":
+        return days // 7 + 1
+    return (end_date.year - start_date.year) * 12 + end_date.month - start_date.month + 1
+
+
+def check_size(wines: Optional[int], buckets: int) -> None:
+    """Solleva TrajectoryTooLarge oltre i limiti (wines None: numero di vini non ancora noto)"""
+    settings = get_settings()
+    if buckets > settings.TRAJECTORY_MAX_BUCKETS:
+        raise TrajectoryTooLarge(
+            wines or 0, buckets,
+            f"Periodo troppo lungo: {buckets} bucket (massimo {settings.TRAJECTORY_MAX_BUCKETS}), "
+            f"riduci il periodo o usa un bucket più ampio"
+        )
+    if wines is not None and wines * buckets > settings.TRAJECTORY_MAX_CELLS:
+        raise TrajectoryTooLarge(
+            wines, buckets,
+            f"Troppi dati: {wines} vini × {buckets} bucket (massimo {settings.TRAJECTORY_MAX_CELLS} celle), "
+            f"filtra i vini, riduci il periodo o usa un bucket più ampio"
+        )
+
+
+def _bucket_index(offsets: np.ndarray, start_date: date, bucket: str) -> np.ndarray:
+    """Indice del bucket per ogni giorno del periodo (offset in giorni da start_date)"""
+    if bucket == "day":
+        return offsets
+    if bucket == "week":
+        return offsets // 7
+    days = np.datetime64(start_date, "D") + offsets
+    return (days.astype("datetime64[M]") - np.datetime64(start_date, "M")).astype(np.int64)
+
+
+def compute_trajectories(
+    wine_names: Sequence[str],
+    current_stock: Sequence[int],
+    movements: np.ndarray,
+    start_date: date,
+    end_date: date,
+    bucket: str = "day"
+) -> Dict[str, Any]:
+    """
+    Traiettorie di tutti i vini in un passaggio.
+
+    Args:
+        wine_names: Vini da calcolare (ordine del risultato)
+        current_stock: Stock attuale di ogni vino (stesso ordine)
+        movements: Matrice int (n, 4) delle righe del rollup dal giorno start_date in
+            poi: indice del vino in wine_names, giorni da start_date, consumi, rifornimenti
+        start_date: Inizio periodo
+        end_date: Fine periodo (incluso)
+        bucket: "day", "week" o "month"
+
+    Returns:
+        Dict con buckets (date di inizio ISO) e, per vino, stock di apertura/chiusura,
+        totali del periodo e serie per bucket (stock a fine bucket, consumi, rifornimenti)
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"Bucket non valido: {bucket}")
+    starts = bucket_starts(start_date, end_date, bucket)
+    n_wines, n_buckets = len(wine_names), len(starts)
+
+    movements = np.asarray(movements, dtype=np.int64).reshape(-1, 4)
+    wine_idx, offsets, consumi, rifornimenti = movements.T
+    net = rifornimenti - consumi
+
+    # Ancoraggio: saldo dei movimenti dopo il periodo, per vino
+    after = offsets > (end_date - start_date).days
+    net_after = np.bincount(wine_idx[after], weights=net[after], minlength=n_wines).astype(np.int64)
+    closing = np.asarray(current_stock, dtype=np.int64) - net_after
+
+    # Somme per cella (vino, bucket) su indice piatto
+    period = ~after
+    cells = wine_idx[period] * n_buckets + _bucket_index(offsets[period], start_date, bucket)
+    size = n_wines * n_buckets
+
+    def per_cell(values: np.ndarray) -> np.ndarray:
+        return np.bincount(cells, weights=values[period], minlength=size).astype(np.int64).reshape(n_wines, n_buckets)
+
+    deltas = per_cell(net)
+    consumi_matrix = per_cell(consumi)
+    rifornimenti_matrix = per_cell(rifornimenti)
+
+    opening = closing - deltas.sum(axis=1)
+    stock = opening[:, None] + np.cumsum(deltas, axis=1)
+
+    # Conversione unica a liste Python (JSON) per tutte le matrici
+    columns = zip(
+        wine_names, current_stock, opening.tolist(), closing.tolist(),
+        consumi_matrix.sum(axis=1).tolist(), rifornimenti_matrix.sum(axis=1).tolist(),
+        stock.tolist(), consumi_matrix.tolist(), rifornimenti_matrix.tolist(),
+    )
+    wines = [
+        {
+            "wine_name": name,
+            "current_stock": int(stock_now),
+            "opening_stock": opening_stock,
+            "closing_stock": closing_stock,
+            "total_consumi": total_consumi,
+            "total_rifornimenti": total_rifornimenti,
+            "stock": curve,
+            "consumi": consumi_series,
+            "rifornimenti": rifornimenti_series,
+        }
+        for (name, stock_now, opening_stock, closing_stock, total_consumi, total_rifornimenti,
+             curve, consumi_series, rifornimenti_series) in columns
+    ]
+    return {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "bucket": bucket,
+        "buckets": [start.isoformat() for start in starts],
+        "wines": wines,
+    }
+
+
+class StockTrajectoryEngine:
+    """Carica rollup e stock attuali dal DB e calcola le traiettorie in batch"""
+
+    def __init__(self):
+        self.batches = 0
+        self.wines = 0
+
+    async def load(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        table_storico: str,
+        wine_names: Optional[Sequence[str]],
+        start_date: date,
+        buckets: Optional[int] = None
+    ) -> Tuple[List[str], List[int], np.ndarray]:
+        """
+        Vini, stock attuali e matrice int (indice vino, giorni da start_date, consumi,
+        rifornimenti) delle righe del rollup dal giorno start_date (dopo ensure_synced).
+        Con buckets, solleva TrajectoryTooLarge prima di leggere il rollup se
+        vini × bucket supera TRAJECTORY_MAX_CELLS.
+        """
+        params: Dict[str, Any] = {"user_id": user_id}
+        wine_filter = ""
+        if wine_names is not None:
+            wine_filter = " AND wine_name = ANY(:names)"
+            params["names"] = list(wine_names)
+
+        stocks = await session.execute(sql_text(f"""
+            SELECT wine_name, COALESCE(current_stock, 0) FROM {table_storico}
+            WHERE user_id = :user_id AND wine_name IS NOT NULL{wine_filter}
+            ORDER BY wine_name
+        """), params)
+        current = dict(stocks.fetchall())
+        names = list(dict.fromkeys(wine_names)) if wine_names is not None else list(current)
+        names = [name for name in names if name in current]
+        if buckets is not None:
+            check_size(len(names), buckets)
+
+        # Righe già numeriche (indice vino, offset giorno): conversione diretta in matrice int
+        rows = await session.execute(sql_text("""
+            SELECT n.idx - 1, d.day - CAST(:start AS DATE), d.consumi, d.rifornimenti
+            FROM wine_movements_daily d
+            JOIN unnest(CAST(:names AS TEXT[])) WITH ORDINALITY AS n(wine_name, idx) ON n.wine_name = d.wine_name
+            WHERE d.user_id = :user_id AND d.day >= :start
+        """), {"user_id": user_id, "start": start_date, "names": names})
+
+        self.batches += 1
+        self.wines += len(names)
+        return names, [current[name] for name in names], np.array(rows.fetchall(), dtype=np.int64)
+
+    async def trajectories(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        table_storico: str,
+        wine_names: Optional[Sequence[str]],
+        start_date: date,
+        end_date: date,
+        bucket: str = "day"
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Traiettorie dei vini indicati (tutti i vini dello storico se wine_names è None).
+
+        Returns:
+            Risultato di compute_trajectories, oppure None se il registro movimenti
+            non è utilizzabile per il tenant
+
+        Raises:
+            TrajectoryTooLarge: bucket o celle vino × bucket oltre i limiti
+        """
+        if bucket not in BUCKETS:
+            raise ValueError(f"Bucket non valido: {bucket}")
+        buckets = bucket_count(start_date, end_date, bucket)
+        check_size(len(set(wine_names)) if wine_names is not None else None, buckets)
+        if not await movements_ledger.ensure_synced(session, user_id, table_storico):
+            return None
+        names, current_stock, movements = await self.load(
+            session, user_id, table_storico, wine_names, start_date, buckets
+        )
+        return compute_trajectories(names, current_stock, movements, start_date, end_date, bucket)
+
+    def stats(self) -> Dict[str, int]:
+        return {"batches": self.batches, "wines": self.wines}
+
+
+# Istanza globale
+stock_trajectories = StockTrajectoryEngine()
@@ -0,0 +1,170 @@
+"""
+Catalogo tabelle/colonne dello schema public.
+
+Sostituisce le verifiche su information_schema fatte a ogni richiesta (esistenza
+delle tabelle dinamiche tenant, presenza di conversation_id nei LOG). Il
+catalogo è caricato all'avvio e ricaricato da un task di background ogni
+TABLE_CATALOG_TTL_SECONDS (run_refresh_loop): le richieste non interrogano
+information_schema, nemmeno per una tabella assente. Le modifiche note allo
+schema invalidano esplicitamente il catalogo:
+- chiamate processor_client che creano/eliminano tabelle e job del processor
+  conclusi (solo il tenant, ricaricato alla prima lettura successiva);
+- ALTER TABLE dell'applicazione (solo la tabella);
+- migrazioni (tutto).
+Tabelle create da altri processi compaiono al ricaricamento successivo.
+
+I metodi ricevono la sessione del chiamante: nessuna connessione aggiuntiva.
+"""
+import asyncio
+import itertools
+import logging
+import time
+from typing import Dict, FrozenSet, List, Optional, Set
+
+from sqlalchemy import text as sql_text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def _bare(table_name: str) -> str:
+    return table_name.strip('"')
+
+
+class TableCatalog:
+    """Snapshot {tabella: colonne} ricaricato in background, con invalidazione per prefisso"""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._tables: Dict[str, FrozenSet[str]] = {}
+        self._loaded_at: Optional[float] = None
+        # Prefissi (es. "12/") da ricaricare alla prossima lettura -> numero d'ordine dell'invalidazione:
+        # un'invalidazione arrivata durante un caricamento non viene persa
+        self._dirty_prefixes: Dict[str, int] = {}
+        self._full_invalidation = 0
+        self._sequence = itertools.count(1)
+        self._lock = asyncio.Lock()
+        self.full_loads = 0
+        self.partial_loads = 0
+        self.lookups = 0
+
+    async def _load(self, session: AsyncSession, prefix: Optional[str] = None) -> None:
+        query = """
+            SELECT table_name, column_name
+            FROM information_schema.columns
+            WHERE table_schema = 'public'
+        """
+        params = {}
+        if prefix is not None:
+            query += " AND table_name LIKE :pattern"
+            params["pattern"] = prefix.replace("%", r"\%").replace("_", r"\_") + "%"
+        dirty = dict(self._dirty_prefixes)
+        full_invalidation = self._full_invalidation
+        result = await session.execute(sql_text(query), params)
+
+        tables: Dict[str, Set[str]] = {}
+        for table_name, column_name in result.fetchall():
+            tables.setdefault(table_name, set()).add(column_name)
+
+        if prefix is None:
+            self._tables = {name: frozenset(cols) for name, cols in tables.items()}
+            if self._full_invalidation == full_invalidation:
+                self._loaded_at = time.monotonic()
+            for dirty_prefix, sequence in dirty.items():
+                if self._dirty_prefixes.get(dirty_prefix) == sequence:
+                    del self._dirty_prefixes[dirty_prefix]
+            self.full_loads += 1
+            logger.debug(f"[TABLE_CATALOG] Catalogo caricato: {len(self._tables)} tabelle")
+        else:
+            for name in [name for name in self._tables if name.startswith(prefix)]:
+                del self._tables[name]
+            self._tables.update({name: frozenset(cols) for name, cols in tables.items()})
+            if self._dirty_prefixes.get(prefix) == dirty.get(prefix):
+                self._dirty_prefixes.pop(prefix, None)
+            self.partial_loads += 1
+
+    async def load(self, session: AsyncSession) -> None:
+        """Caricamento completo (avvio e task di background)"""
+        async with self._lock:
+            await self._load(session)
+
+    async def run_refresh_loop(self, session_factory) -> None:
+        """Task di background: carica il catalogo all'avvio e lo ricarica ogni ttl_seconds"""
+        while True:
+            try:
+                async with session_factory() as session:
+                    await self.load(session)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[TABLE_CATALOG] Ricaricamento catalogo fallito: {e}")
+            await asyncio.sleep(self.ttl_seconds)
+
+    def _dirty_prefix_for(self, bare_name: str) -> Optional[str]:
+        for prefix in self._dirty_prefixes:
+            if bare_name.startswith(prefix):
+                return prefix
+        return None
+
+    async def _refresh_for(self, session: AsyncSession, bare_name: str) -> None:
+        self.lookups += 1
+        if self._loaded_at is not None and self._dirty_prefix_for(bare_name) is None:
+            return
+        async with self._lock:
+            # Ricontrolla: un'altra richiesta può aver già ricaricato durante l'attesa
+            if self._loaded_at is None:
+                # Catalogo mai caricato (task di background non avviato, es. script) o migrazioni appena eseguite
+                await self._load(session)
+                return
+            prefix = self._dirty_prefix_for(bare_name)
+            if prefix is not None:
+                await self._load(session, prefix)
+
+    async def columns(self, session: AsyncSession, table_name: str) -> FrozenSet[str]:
+        """Colonne della tabella (vuoto se la tabella non esiste)"""
+        bare_name = _bare(table_name)
+        await self._refresh_for(session, bare_name)
+        return self._tables.get(bare_name, frozenset())
+
+    async def table_exists(self, session: AsyncSession, table_name: str) -> bool:
+        bare_name = _bare(table_name)
+        await self._refresh_for(session, bare_name)
+        return bare_name in self._tables
+
+    async def has_column(self, session: AsyncSession, table_name: str, column_name: str) -> bool:
+        return column_name in await self.columns(session, table_name)
+
+    async def find_tables(self, session: AsyncSession, prefix: str, suffix: str = "") -> List[str]:
+        """Tabelle (nomi senza virgolette) che iniziano con prefix e finiscono con suffix"""
+        await self._refresh_for(session, prefix)
+        return sorted(name for name in self._tables if name.startswith(prefix) and name.endswith(suffix))
+
+    def invalidate_tenant(self, user_id: int) -> None:
+        """Tabelle del tenant create/eliminate: ricarica solo "{user_id}/..." alla prossima lettura"""
+        self._dirty_prefixes[f"{user_id}/"] = next(self._sequence)
+
+    def invalidate_table(self, table_name: str) -> None:
+        """Colonne modificate (ALTER TABLE): ricarica solo questa tabella"""
+        self._dirty_prefixes[_bare(table_name)] = next(self._sequence)
+
+    def invalidate(self) -> None:
+        """Ricarica completa alla prossima lettura (es. dopo le migrazioni)"""
+        self._full_invalidation += 1
+        self._loaded_at = None
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "tables": len(self._tables),
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at is not None else None,
+            "ttl_seconds": self.ttl_seconds,
+            "dirty_prefixes": len(self._dirty_prefixes),
+            "full_loads": self.full_loads,
+            "partial_loads": self.partial_loads,
+            "lookups": self.lookups,
+        }
+
+
+# Istanza globale
+table_catalog = TableCatalog(ttl_seconds=get_settings().TABLE_CATALOG_TTL_SECONDS)
@@ -0,0 +1,147 @@
+"""
+Risoluzione delle tabelle tenant (INVENTARIO, Storico vino, LOG interazione,
+Consumi e rifornimenti).
+
+Modalità di storage (TENANT_STORAGE_MODE):
+- "per_tenant" (default): una tabella per tenant, "{user_id}/{business_name} {tipo}";
+- "shared": i tenant già migrati (tabella tenant_storage, vedi
+  scripts/migrate_tenants_to_shared.py) usano tabelle condivise partizionate per
+  hash(user_id). Stesso testo SQL per tutti i tenant: la cache dei prepared
+  statement di asyncpg torna utile e il catalogo Postgres non cresce con i tenant.
+  I tenant non ancora migrati restano sulle tabelle per-tenant.
+
+Solo i tipi in TENANT_SHARED_TABLE_KINDS passano alle tabelle condivise: i tipi
+scritti dal processor (INVENTARIO, Storico vino, Consumi e rifornimenti) vanno
+aggiunti solo quando anche il processor scrive sulle tabelle condivise.
+
+Tutte le query sulle tabelle tenant filtrano già per user_id, quindi lo stesso
+SQL vale per entrambe le modalità.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, FrozenSet, Optional, Set
+
+from sqlalchemy import text as sql_text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+INVENTARIO = "INVENTARIO"
+STORICO_VINO = "Storico vino"
+LOG_INTERAZIONE = "LOG interazione"
+CONSUMI_RIFORNIMENTI = "Consumi e rifornimenti"
+
+TENANT_TABLE_KINDS = (INVENTARIO, STORICO_VINO, LOG_INTERAZIONE, CONSUMI_RIFORNIMENTI)
+
+SHARED_TABLE_NAMES: Dict[str, str] = {
+    INVENTARIO: "tenant_inventario",
+    STORICO_VINO: "tenant_storico_vino",
+    LOG_INTERAZIONE: "tenant_log_interazione",
+    CONSUMI_RIFORNIMENTI: "tenant_consumi_rifornimenti",
+}
+
+STORAGE_PER_TENANT = "per_tenant"
+STORAGE_SHARED = "shared"
+
+
+def legacy_table_name(user_id: int, business_name: str, kind: str) -> str:
+    """Nome (tra virgolette) della tabella per-tenant, identico al processor"""
+    return f'"{user_id}/{business_name} {kind}"'
+
+
+async def migrate_tenant_storage_table(session: AsyncSession) -> None:
+    """Crea la tabella di registro tenant_storage (stato migrazione per tenant) se non esiste"""
+    await session.execute(sql_text("""
+        CREATE TABLE IF NOT EXISTS tenant_storage (
+            user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+            storage_mode VARCHAR(20) NOT NULL DEFAULT 'per_tenant',
+            cursors JSONB NOT NULL DEFAULT '{}'::jsonb,
+            synced_at TIMESTAMP,
+            migrated_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+
+
+class TenantTableResolver:
+    """Sceglie la tabella (per-tenant o condivisa) per tenant e tipo"""
+
+    def __init__(self, mode: str, shared_kinds: FrozenSet[str], refresh_seconds: float):
+        self.mode = mode
+        self.shared_kinds = shared_kinds
+        self.refresh_seconds = refresh_seconds
+        self._shared_tenants: Set[int] = set()
+        self.loaded_at: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode == STORAGE_SHARED
+
+    def is_shared(self, user_id: int, kind: str) -> bool:
+        return self.enabled and kind in self.shared_kinds and user_id in self._shared_tenants
+
+    def table(self, user_id: int, business_name: str, kind: str) -> str:
+        """Nome tabella da usare nelle query (tipi sconosciuti: sempre per-tenant)"""
+        if self.is_shared(user_id, kind):
+            return SHARED_TABLE_NAMES[kind]
+        return legacy_table_name(user_id, business_name, kind)
+
+    async def refresh(self, session: AsyncSession) -> None:
+        """Ricarica da tenant_storage l'elenco dei tenant migrati"""
+        if not self.enabled:
+            return
+        result = await session.execute(
+            sql_text("SELECT user_id FROM tenant_storage WHERE storage_mode = :mode"),
+            {"mode": STORAGE_SHARED}
+        )
+        shared = {row[0] for row in result.fetchall()}
+        if shared != self._shared_tenants:
+            logger.info(f"[TENANT_TABLES] Tenant su tabelle condivise: {len(shared)}")
+        self._shared_tenants = shared
+        self.loaded_at = time.monotonic()
+
+    async def run_refresh_loop(self, session_factory) -> None:
+        """Task di background: segue le migrazioni fatte da altri processi (script di migrazione)"""
+        while True:
+            try:
+                async with session_factory() as session:
+                    await self.refresh(session)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[TENANT_TABLES] Errore aggiornamento tenant condivisi: {e}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "mode": self.mode,
+            "shared_kinds": sorted(self.shared_kinds),
+            "shared_tenants": len(self._shared_tenants),
+            "age_seconds": round(time.monotonic() - self.loaded_at, 1) if self.loaded_at is not None else None,
+        }
+
+
+def _parse_kinds(value: str) -> FrozenSet[str]:
+    kinds = frozenset(kind.strip() for kind in value.split(",") if kind.strip())
+    unknown = kinds - set(TENANT_TABLE_KINDS)
+    if unknown:
+        logger.warning(f"[TENANT_TABLES] Tipi tabella sconosciuti in TENANT_SHARED_TABLE_KINDS ignorati: {sorted(unknown)}")
+    return kinds & frozenset(TENANT_TABLE_KINDS)
+
+
+_settings = get_settings()
+
+# Istanza globale
+tenant_tables = TenantTableResolver(
+    mode=_settings.TENANT_STORAGE_MODE,
+    shared_kinds=_parse_kinds(_settings.TENANT_SHARED_TABLE_KINDS),
+    refresh_seconds=_settings.TENANT_STORAGE_REFRESH_SECONDS,
+)
+
+
+def tenant_table(user_id: int, business_name: str, kind: str) -> str:
+    """Scorciatoia per tenant_tables.table"""
+    return tenant_tables.table(user_id, business_name, kind)
@@ -0,0 +1,104 @@
+"""
+Upload inventario in streaming verso il processor.
+
+Gli import inventario leggevano l'intero UploadFile in memoria (bytes) e
+costruivano un FormData in RAM prima di inoltrarlo: con upload concorrenti di
+Excel/CSV grandi la memoria cresceva con la dimensione dei file. UploadStream
+legge l'UploadFile a blocchi di UPLOAD_CHUNK_BYTES e li passa ad aiohttp come
+generatore asincrono (multipart chunked): in memoria resta un blocco alla volta,
+qualunque sia la dimensione del file. Starlette ha già scritto il corpo della
+richiesta in un file temporaneo (SpooledTemporaryFile, su disco oltre 1MB).
+
+prepare() fa una prima passata a blocchi: applica il limite UPLOAD_MAX_BYTES
+prima di contattare il processor e calcola lo SHA-256 del contenuto (chiave di
+idempotenza: upload identici concorrenti condividono una sola richiesta). La
+passata di invio ricalcola l'hash e segnala eventi di avanzamento.
+"""
+import hashlib
+import inspect
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Union
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Callback di avanzamento: (byte inviati, byte totali)
+ProgressCallback = Callable[[int, int], Union[None, Awaitable[None]]]
+
+
+class UploadTooLarge(Exception):
+    """File oltre UPLOAD_MAX_BYTES"""
+
+    def __init__(self, size: int, limit: int):
+        super().__init__(f"File troppo grande: oltre {limit // (1024 * 1024)}MB")
+        self.size = size
+        self.limit = limit
+
+
+class UploadStream:
+    """Sorgente a blocchi di un file caricato (UploadFile o qualunque oggetto con read/seek asincroni)"""
+
+    def __init__(
+        self,
+        source: Any,
+        filename: Optional[str] = None,
+        on_progress: Optional[ProgressCallback] = None
+    ):
+        settings = get_settings()
+        self.source = source
+        self.filename = filename or getattr(source, "filename", None) or "upload"
+        self.chunk_size = settings.UPLOAD_CHUNK_BYTES
+        self.max_bytes = settings.UPLOAD_MAX_BYTES
+        self.on_progress = on_progress
+        self.size: Optional[int] = None
+        self.sha256: Optional[str] = None
+        self.bytes_sent = 0
+
+    async def _chunks(self) -> AsyncIterator[bytes]:
+        """Blocchi dall'inizio del file, con il limite di dimensione"""
+        await self.source.seek(0)
+        read = 0
+        while True:
+            chunk = await self.source.read(self.chunk_size)
+            if not chunk:
+                return
+            read += len(chunk)
+            if read > self.max_bytes:
+                raise UploadTooLarge(read, self.max_bytes)
+            yield chunk
+
+    async def prepare(self) -> "UploadStream":
+        """Prima passata: dimensione e SHA-256 (solleva UploadTooLarge oltre il limite)"""
+        digest = hashlib.sha256()
+        size = 0
+        async for chunk in self._chunks():
+            digest.update(chunk)
+            size += len(chunk)
+        self.size = size
+        self.sha256 = digest.hexdigest()
+        return self
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """Blocchi per l'invio al processor, con eventi di avanzamento e verifica dell'hash"""
+        if self.sha256 is None:
+            await self.prepare()
+        digest = hashlib.sha256()
+        self.bytes_sent = 0
+        next_log = 0.25
+        async for chunk in self._chunks():
+            digest.update(chunk)
+            self.bytes_sent += len(chunk)
+            yield chunk
+            if self.on_progress is not None:
+                outcome = self.on_progress(self.bytes_sent, self.size)
+                if inspect.isawaitable(outcome):
+                    await outcome
+            if self.size and self.bytes_sent / self.size >= next_log:
+                logger.debug(
+                    f"[UPLOAD_STREAM] {self.filename}: {self.bytes_sent}/{self.size} byte inviati"
+                )
+                next_log += 0.25
+        if digest.hexdigest() != self.sha256:
+            # Il file è cambiato tra le due passate: l'idempotenza non sarebbe affidabile
+            raise ValueError(f"Contenuto di {self.filename} modificato durante l'upload")
@@ -0,0 +1,207 @@
+"""
+Ricerca vini indicizzata sulle tabelle INVENTARIO.
+
+Ogni tabella inventario riceve una colonna generata `search_document`
+(campi testuali concatenati, minuscoli e senza accenti) con indice GIN pg_trgm:
+i pattern `LIKE '%termine%'` usano l'indice invece di una scansione sequenziale
+con translate() valutata riga per riga.
+
+Il DDL (ensure_search_index) gira solo nella migrazione all'avvio e dopo la
+creazione delle tabelle, mai in una ricerca: search_wines verifica soltanto la
+presenza della colonna (has_search_document) e altrimenti usa la query legacy.
+
+La normalizzazione degli accenti usa translate() con la stessa mappa della
+ricerca originale: a differenza di unaccent() è IMMUTABLE e può alimentare una
+colonna generata senza estensioni aggiuntive.
+"""
+import hashlib
+import logging
+import re
+from typing import Dict, List, Tuple
+
+from sqlalchemy import text as sql_text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.table_catalog import table_catalog
+
+logger = logging.getLogger(__name__)
+
+SEARCH_DOCUMENT_COLUMN = "search_document"
+
+ACCENT_FROM = "àáâäèéêëìíîïòóôöùúûüÀÁÂÄÈÉÊËÌÍÎÏÒÓÔÖÙÚÛÜ"
+ACCENT_TO = "aaaaeeeeiiiioooouuuuAAAAEEEEIIIIOOOOUUUU"
+
+# Campi indicizzati (quelli della ricerca originale) e campi a priorità alta
+SEARCH_FIELDS = (
+    "name", "producer", "grape_variety", "region",
+    "wine_type", "country", "supplier", "classification",
+)
+PRIMARY_FIELDS = ("name", "producer", "grape_variety")
+
+STOP_WORDS = {
+    'del', 'della', 'dello', 'dei', 'degli', 'delle', 'di', 'da', 'dal', 'dalla',
+    'dallo', 'dai', 'dagli', 'dalle', 'la', 'le', 'il', 'lo', 'gli', 'i', 'un',
+    'una', 'uno', 'e', 'o', 'a', 'in', 'su', 'per', 'con', 'tra', 'fra'
+}
+
+_ACCENT_TRANS = str.maketrans(ACCENT_FROM, ACCENT_TO)
+
+# Tabelle per cui lo stato dell'indice è già noto in questo processo
+_index_state: Dict[str, bool] = {}
+
+
+def strip_accents(s: str) -> str:
+    return s.translate(_ACCENT_TRANS)
+
+
+def normalize_plural_for_search(term: str) -> List[str]:
+    variants = [term]
+    if len(term) > 2:
+        if term.endswith('i'):
+            base = term[:-1]
+            variants.append(base + 'o')
+            variants.append(base)
+        elif term.endswith('e'):
+            base = term[:-1]
+            variants.append(base + 'a')
+            variants.append(base + 'o')
+            variants.append(base)
+    return list(set(variants))
+
+
+def normalize_search_term(search_term: str) -> str:
+    """Rimuove parentesi, apostrofi e spazi multipli; ritorna il termine in minuscolo"""
+    normalized = re.sub(r'\([^)]*\)', '', search_term.strip())
+    for apostrofo in ["'", "'", "`", "´", "ʼ"]:
+        normalized = normalized.replace(apostrofo, ' ')
+    normalized = re.sub(r'\s+', ' ', normalized)
+    return normalized.strip().lower()
+
+
+def _index_name(table_name: str) -> str:
+    # Nomi indice globali nello schema e max 63 caratteri: hash del nome tabella
+    digest = hashlib.md5(table_name.strip('"').encode("utf-8")).hexdigest()[:16]
+    return f"idx_inv_search_{digest}"
+
+
+def _folded_expression(columns: List[str]) -> str:
+    parts = " || ' ' || ".join(f"coalesce({col}::text, '')" for col in columns)
+    return f"translate(lower({parts}), '{ACCENT_FROM}', '{ACCENT_TO}')"
+
+
+async def has_search_document(session: AsyncSession, table_name: str) -> bool:
+    """True se la tabella ha la colonna search_document (solo catalogo, nessun DDL)"""
+    return await table_catalog.has_column(session, table_name, SEARCH_DOCUMENT_COLUMN)
+
+
+async def ensure_search_index(session: AsyncSession, table_name: str) -> bool:
+    """
+    Garantisce colonna search_document + indice GIN trigram sulla tabella (esito
+    memorizzato per processo). Il DDL gira in un savepoint e viene committato:
+    in caso di errore la transazione del chiamante resta valida.
+    Solo per migrazioni e creazione tabelle: ALTER TABLE ... STORED riscrive la
+    tabella sotto ACCESS EXCLUSIVE.
+
+    Returns:
+        True se la ricerca indicizzata è disponibile per la tabella
+    """
+    state = _index_state.get(table_name)
+    if state is not None:
+        return state
+
+    try:
+        columns = await table_catalog.columns(session, table_name)
+        if not columns:
+            # Tabella non ancora creata: non memorizzare, riprova alla prossima ricerca
+            return False
+
+        async with session.begin_nested():
+            if SEARCH_DOCUMENT_COLUMN not in columns:
+                await session.execute(sql_text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                indexed = [col for col in SEARCH_FIELDS if col in columns]
+                logger.info(f"[WINE_SEARCH] Aggiunta colonna {SEARCH_DOCUMENT_COLUMN} a {table_name} ({len(indexed)} campi)")
+                await session.execute(sql_text(f"""
+                    ALTER TABLE {table_name}
+                    ADD COLUMN IF NOT EXISTS {SEARCH_DOCUMENT_COLUMN} TEXT
+                    GENERATED ALWAYS AS ({_folded_expression(indexed)}) STORED
+                """))
+                table_catalog.invalidate_table(table_name)
+            await session.execute(sql_text(f"""
+                CREATE INDEX IF NOT EXISTS {_index_name(table_name)}
+                ON {table_name} USING gin ({SEARCH_DOCUMENT_COLUMN} gin_trgm_ops)
+            """))
+        await session.commit()
+        _index_state[table_name] = True
+        return True
+    except Exception as e:
+        logger.warning(f"[WINE_SEARCH] Ricerca indicizzata non disponibile per {table_name}, uso ricerca legacy: {e}")
+        _index_state[table_name] = False
+        return False
+
+
+def forget_search_index(table_name: str) -> None:
+    """Dimentica lo stato dell'indice (tabella eliminata o ricreata)"""
+    _index_state.pop(table_name, None)
+
+
+def build_search_query(table_name: str, search_term: str, user_id: int, limit: int) -> Tuple:
+    """
+    Query indicizzata: stessi pattern della ricerca originale (termine, varianti
+    plurali, parole significative, annata/prezzo numerici) sulla colonna
+    search_document. Ordinamento: match_priority (1 se il termine è in nome,
+    produttore o vitigno), poi similarità trigram, poi nome.
+
+    Returns:
+        (query, params)
+    """
+    term = normalize_search_term(search_term)
+    term_unaccent = strip_accents(term)
+
+    patterns = [term_unaccent]
+    patterns += [strip_accents(v) for v in normalize_plural_for_search(term) if v != term]
+    for word in term.split():
+        if len(word) > 2 and word not in STOP_WORDS:
+            patterns += [strip_accents(v) for v in normalize_plural_for_search(word)]
+    # Deduplica mantenendo l'ordine
+    patterns = list(dict.fromkeys(p for p in patterns if p))
+
+    params = {
+        "user_id": user_id,
+        "limit": limit,
+        "term": term_unaccent,
+        "term_pattern": f"%{term_unaccent}%",
+        "accent_from": ACCENT_FROM,
+        "accent_to": ACCENT_TO,
+    }
+    conditions = []
+    for i, pattern in enumerate(patterns):
+        params[f"p_{i}"] = f"%{pattern}%"
+        conditions.append(f"{SEARCH_DOCUMENT_COLUMN} LIKE :p_{i}")
+
+    try:
+        params["search_numeric"] = int(term)
+        conditions.append("vintage = :search_numeric")
+    except ValueError:
+        try:
+            params["search_float"] = float(term.replace(',', '.'))
+            conditions.append("(ABS(cost_price - :search_float) < 0.01 OR ABS(selling_price - :search_float) < 0.01)")
+        except ValueError:
+            pass
+
+    if not conditions:
+        conditions.append("FALSE")
+
+    priority_case = " OR ".join(
+        f"translate(lower({col}), :accent_from, :accent_to) LIKE :term_pattern" for col in PRIMARY_FIELDS
+    )
+    query = sql_text(f"""
+        SELECT *,
+            CASE WHEN {priority_case} THEN 1 ELSE 2 END AS match_priority,
+            similarity({SEARCH_DOCUMENT_COLUMN}, :term) AS match_score
+        FROM {table_name}
+        WHERE user_id = :user_id
+        AND ({' OR '.join(conditions)})
+        ORDER BY match_priority ASC, match_score DESC, name ASC
+        LIMIT :limit
+    """)
+    return query, params
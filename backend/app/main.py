@@ -13,6 +13,7 @@ from dotenv import load_dotenv
 # Setup logging PRIMA di tutto
 from app.core.logging_config import setup_logging
 setup_logging(service_name="web-app")
+from app.core.request_context import RequestContextMiddleware
 logger = logging.getLogger(__name__)
 
 load_dotenv()
@@ -49,6 +50,9 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Contesto per-richiesta: utente risolto e sessione DB condivisa (unit of work)
+app.add_middleware(RequestContextMiddleware)
+
 # Serve static files from frontend directory
 # On Railway: working dir is /app, so frontend is at /app/frontend
 # From backend/app/main.py: go up to /app, then to frontend
@@ -140,6 +144,57 @@ async def startup_tasks():
     except Exception as e:
         startup_logger.error(f"Errore avvio scheduler: {e}", exc_info=True)
         # Non bloccare l'avvio se lo scheduler fallisce
+    
+    # Warm-up opzionale agent multi-agent (background, non ritarda la readiness)
+    try:
+        from app.core.config import get_settings
+        if get_settings().AGENT_WARMUP_ON_STARTUP and chat.ai_service_v2 is not None:
+            import asyncio
+            app.state.agent_warmup_task = asyncio.create_task(chat.ai_service_v2.warm_up())
+            startup_logger.info("🔥 Warm-up agent avviato in background")
+    except Exception as e:
+        startup_logger.error(f"Errore avvio warm-up agent: {e}", exc_info=True)
+    
+    # Sessione HTTP condivisa verso il processor (chiusa allo shutdown)
+    try:
+        from app.core.processor_client import processor_client
+        await processor_client.start()
+    except Exception as e:
+        startup_logger.error(f"Errore apertura sessione processor: {e}", exc_info=True)
+    
+    # Tabelle tenant condivise: segue i tenant migrati da scripts/migrate_tenants_to_shared.py
+    try:
+        from app.core.tenant_tables import tenant_tables
+        if tenant_tables.enabled:
+            import asyncio
+            from app.core.database import AsyncSessionLocal
+            app.state.tenant_tables_task = asyncio.create_task(tenant_tables.run_refresh_loop(AsyncSessionLocal))
+            startup_logger.info("🗂️ Aggiornamento tenant su tabelle condivise avviato")
+    except Exception as e:
+        startup_logger.error(f"Errore avvio aggiornamento tabelle tenant: {e}", exc_info=True)
+    
+    # Catalogo tabelle/colonne: caricato ora e ricaricato in background (mai nelle richieste)
+    try:
+        import asyncio
+        from app.core.database import AsyncSessionLocal
+        from app.core.table_catalog import table_catalog
+        app.state.table_catalog_task = asyncio.create_task(table_catalog.run_refresh_loop(AsyncSessionLocal))
+    except Exception as e:
+        startup_logger.error(f"Errore avvio caricamento catalogo tabelle: {e}", exc_info=True)
+
+@app.on_event("shutdown")
+async def shutdown_tasks():
+    """
+    Rilascia le risorse condivise allo shutdown.
+    """
+    for task_name in ("tenant_tables_task", "table_catalog_task"):
+        task = getattr(app.state, task_name, None)
+        if task is not None:
+            task.cancel()
+    from app.core.openai_client import close_openai_clients
+    await close_openai_clients()
+    from app.core.processor_client import processor_client
+    await processor_client.close()
 
 if __name__ == "__main__":
     import uvicorn
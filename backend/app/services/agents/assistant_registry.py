@@ -0,0 +1,207 @@
+"""
+Assistant Registry - Riuso persistente degli assistant OpenAI.
+
+Ogni definizione (name, model, instructions, tools) viene ridotta a un hash.
+L'ID dell'assistant è salvato nella tabella app_settings, così processi
+diversi e riavvii successivi riusano lo stesso assistant: si crea (o si
+aggiorna) un assistant solo quando la sua definizione cambia.
+
+Nessuna connessione al DB resta occupata durante le chiamate OpenAI: il
+registro viene letto, la chiamata fatta a sessione chiusa e il risultato
+scritto con un UPSERT condizionato (compare-and-set). Se un altro processo ha
+registrato nel frattempo la stessa definizione, si usa il suo assistant e si
+rimuove il duplicato.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text as sql_text
+
+from app.core.database import AsyncSessionLocal
+from app.services.app_settings import ensure_settings_table
+
+logger = logging.getLogger(__name__)
+
+SETTINGS_KEY_PREFIX = "assistant_registry:"
+
+
+def definition_hash(name: str, model: str, instructions: str, tools: Optional[List[Dict[str, Any]]]) -> str:
+    """Hash stabile della definizione di un assistant."""
+    payload = json.dumps(
+        {"name": name, "model": model, "instructions": instructions, "tools": tools or []},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _parse(value: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def _delete_assistant(client, assistant_id: str) -> None:
+    try:
+        await client.beta.assistants.delete(assistant_id)
+    except Exception as e:
+        logger.warning(f"[ASSISTANT_REGISTRY] Rimozione assistant duplicato {assistant_id} fallita: {e}")
+
+
+class AssistantRegistry:
+    """Registro process-wide degli assistant, persistito in app_settings."""
+
+    def __init__(self):
+        # name -> (hash, assistant_id)
+        self._cache: Dict[str, Tuple[str, str]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _lock_for(self, name: str) -> asyncio.Lock:
+        lock = self._locks.get(name)
+        if lock is None:
+            lock = self._locks[name] = asyncio.Lock()
+        return lock
+
+    async def ensure(
+        self,
+        client,
+        name: str,
+        model: str,
+        instructions: str,
+        tools: Optional[List[Dict[str, Any]]] = None
+    ) -> str:
+        """
+        Ritorna l'ID dell'assistant per questa definizione, creandolo o
+        aggiornandolo solo se necessario.
+        """
+        def_hash = definition_hash(name, model, instructions, tools)
+        cached = self._cache.get(name)
+        if cached and cached[0] == def_hash:
+            return cached[1]
+
+        async with self._lock_for(name):
+            cached = self._cache.get(name)
+            if cached and cached[0] == def_hash:
+                return cached[1]
+
+            key = f"{SETTINGS_KEY_PREFIX}{name}"
+            # Nessuna sessione aperta durante le chiamate OpenAI: lettura, chiamata, scrittura breve
+            stored_value = await self._read(key)
+            stored = _parse(stored_value)
+            if stored and stored.get("hash") == def_hash and stored.get("id"):
+                self._cache[name] = (def_hash, stored["id"])
+                logger.info(f"[ASSISTANT_REGISTRY] Riuso assistant '{name}' con ID: {stored['id']}")
+                return stored["id"]
+
+            assistant_id = None
+            created = False
+            if stored and stored.get("id"):
+                # Definizione cambiata: aggiorna l'assistant esistente invece di crearne uno nuovo
+                try:
+                    await client.beta.assistants.update(
+                        stored["id"],
+                        name=name,
+                        instructions=instructions,
+                        model=model,
+                        tools=tools or []
+                    )
+                    assistant_id = stored["id"]
+                    logger.info(f"[ASSISTANT_REGISTRY] Aggiornato assistant '{name}' con ID: {assistant_id}")
+                except Exception as e:
+                    logger.warning(f"[ASSISTANT_REGISTRY] Update assistant '{name}' fallito, lo ricreo: {e}")
+
+            if not assistant_id:
+                assistant = await client.beta.assistants.create(
+                    name=name,
+                    instructions=instructions,
+                    model=model,
+                    tools=tools or []
+                )
+                assistant_id = assistant.id
+                created = True
+                logger.info(f"✅ Created assistant '{name}' with ID: {assistant_id}")
+
+            value = json.dumps({"id": assistant_id, "hash": def_hash, "model": model})
+            if not await self._write_if_unchanged(key, stored_value, value):
+                # Un altro processo ha registrato l'assistant nel frattempo
+                winner = _parse(await self._read(key))
+                if created and winner and winner.get("hash") == def_hash and winner.get("id"):
+                    # Stessa definizione: usa il suo e rimuovi il duplicato appena creato
+                    await _delete_assistant(client, assistant_id)
+                    assistant_id = winner["id"]
+                    logger.info(f"[ASSISTANT_REGISTRY] Assistant '{name}' registrato da un altro processo, uso ID: {assistant_id}")
+                else:
+                    await self._write_if_unchanged(key, None, value, force=True)
+
+            self._cache[name] = (def_hash, assistant_id)
+            return assistant_id
+
+    async def _read(self, key: str) -> Optional[str]:
+        async with AsyncSessionLocal() as session:
+            await ensure_settings_table(session)
+            result = await session.execute(
+                sql_text("SELECT value FROM app_settings WHERE key = :key"),
+                {"key": key},
+            )
+            row = result.fetchone()
+            return row[0] if row else None
+
+    async def _write_if_unchanged(
+        self,
+        key: str,
+        expected: Optional[str],
+        value: str,
+        force: bool = False
+    ) -> bool:
+        """
+        Scrive il valore solo se quello salvato è ancora `expected` (None: chiave
+        assente); force sovrascrive comunque. Una sola istruzione: la transazione
+        dura quanto l'UPSERT.
+
+        Returns:
+            True se il valore è stato scritto
+        """
+        if force:
+            condition = "TRUE"
+        elif expected is None:
+            condition = "FALSE"
+        else:
+            condition = "app_settings.value = :expected"
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                sql_text(
+                    f"""
+                    INSERT INTO app_settings (key, value, updated_at)
+                    VALUES (:key, :value, NOW())
+                    ON CONFLICT (key) DO UPDATE
+                    SET value = EXCLUDED.value, updated_at = NOW()
+                    WHERE {condition}
+                    RETURNING key
+                    """
+                ),
+                {"key": key, "value": value, **({"expected": expected} if ":expected" in condition else {})},
+            )
+            written = result.fetchone() is not None
+            await session.commit()
+            return written
+
+    async def forget(self, name: str) -> None:
+        """Rimuove l'assistant dal registro (cache e app_settings)."""
+        self._cache.pop(name, None)
+        async with AsyncSessionLocal() as session:
+            await ensure_settings_table(session)
+            await session.execute(
+                sql_text("DELETE FROM app_settings WHERE key = :key"),
+                {"key": f"{SETTINGS_KEY_PREFIX}{name}"},
+            )
+            await session.commit()
+
+
+# Istanza globale
+assistant_registry = AssistantRegistry()
@@ -3,7 +3,7 @@ Audio Agent - Specializzato per conversione audio in testo (speech-to-text).
 Usa OpenAI Whisper API per la trascrizione.
 """
 from .base_agent import BaseAgent
-from openai import OpenAI
+from app.core.openai_client import get_async_openai_client
 import os
 import logging
 from typing import Dict, Any, Optional
@@ -20,7 +20,8 @@ class AudioAgent(BaseAgent):
         if not api_key:
             raise ValueError("OPENAI_API_KEY non configurata")
         
-        self.client = OpenAI(api_key=api_key)
+        # Client AsyncOpenAI condiviso: la trascrizione non blocca l'event loop
+        self.client = get_async_openai_client()
         self.name = "AudioAgent"
         logger.info(f"✅ Created {self.name}")
     
@@ -72,7 +73,7 @@ class AudioAgent(BaseAgent):
                 "Usa punteggiatura corretta e scrivi i numeri in cifre (es: 5 bottiglie, non cinque bottiglie)."
             )
             
-            transcript = self.client.audio.transcriptions.create(
+            transcript = await self.client.audio.transcriptions.create(
                 model="whisper-1",  # Modello più recente e accurato disponibile (ultimo aggiornamento: 2023)
                 file=audio_io,
                 language=language,  # "it" per italiano - migliora accuratezza
@@ -5,8 +5,12 @@ Usa OpenAI Assistants API per creare agent con memoria e contesto.
 import os
 import logging
 from typing import Dict, Any, Optional, List
-from openai import OpenAI
-import time
+
+from app.core.config import get_settings
+from app.core.openai_client import get_async_openai_client
+from app.services.token_meter import record_usage
+from .assistant_registry import assistant_registry
+from .run_driver import RunHandle
 
 logger = logging.getLogger(__name__)
 
@@ -33,35 +37,34 @@ class BaseAgent:
         if not api_key:
             raise ValueError("OPENAI_API_KEY non configurata")
         
-        # OpenAI Assistants API v2 richiede header specifico
-        # Nota: nella versione più recente di OpenAI Python SDK, l'header viene gestito automaticamente
-        # ma possiamo specificarlo esplicitamente se necessario
-        self.client = OpenAI(
-            api_key=api_key,
-            default_headers={"OpenAI-Beta": "assistants=v2"}
-        )
+        # Client AsyncOpenAI condiviso (header assistants=v2 già impostato):
+        # thread/run/messages non bloccano l'event loop
+        self.client = get_async_openai_client()
         self.name = name
         self.model = model
         self.instructions = instructions
         self.tools = tools or []
+        settings = get_settings()
+        self.use_streaming = settings.ASSISTANTS_STREAMING
+        self.run_timeout = settings.AGENT_RUN_TIMEOUT_SECONDS
+        # L'assistant è risolto al primo process() tramite il registry persistente
         self.assistant_id = None
-        self._create_assistant()
     
-    def _create_assistant(self):
-        """Crea assistant su OpenAI Assistants API"""
-        try:
-            # Nota: temperature non è supportato in assistants.create() - viene gestito a livello di thread/run
-            assistant = self.client.beta.assistants.create(
-                name=self.name,
-                instructions=self.instructions,
-                model=self.model,
-                tools=self.tools
-            )
-            self.assistant_id = assistant.id
-            logger.info(f"✅ Created assistant '{self.name}' with ID: {self.assistant_id}")
-        except Exception as e:
-            logger.error(f"❌ Error creating assistant '{self.name}': {e}", exc_info=True)
-            raise
+    async def _ensure_assistant(self) -> str:
+        """Risolve l'ID assistant dal registry (crea/aggiorna solo se la definizione è cambiata)"""
+        if not self.assistant_id:
+            try:
+                self.assistant_id = await assistant_registry.ensure(
+                    self.client,
+                    name=self.name,
+                    model=self.model,
+                    instructions=self.instructions,
+                    tools=self.tools
+                )
+            except Exception as e:
+                logger.error(f"❌ Error resolving assistant '{self.name}': {e}", exc_info=True)
+                raise
+        return self.assistant_id
     
     async def process(
         self,
@@ -82,43 +85,44 @@ class BaseAgent:
         Returns:
             Dict con risposta e metadati
         """
-        if not self.assistant_id:
-            raise ValueError(f"Assistant {self.name} non inizializzato")
+        await self._ensure_assistant()
         
         # Crea thread se non esiste
         if not thread_id:
-            thread = self.client.beta.threads.create()
+            thread = await self.client.beta.threads.create()
             thread_id = thread.id
             logger.debug(f"Created new thread: {thread_id} for agent {self.name}")
         
         # Aggiungi contesto se fornito
         if context:
             context_message = self._format_context(context)
-            self.client.beta.threads.messages.create(
+            await self.client.beta.threads.messages.create(
                 thread_id=thread_id,
                 role="user",
                 content=context_message
             )
         
         # Aggiungi messaggio utente
-        self.client.beta.threads.messages.create(
+        await self.client.beta.threads.messages.create(
             thread_id=thread_id,
             role="user",
             content=message
         )
         
-        # Esegui run
-        run = self.client.beta.threads.runs.create(
-            thread_id=thread_id,
-            assistant_id=self.assistant_id
+        # Esegui run (streaming eventi, fallback polling adattivo)
+        handle = self.start_run(thread_id)
+        run = await handle.wait(timeout=self.run_timeout)
+        record_usage(getattr(run, "usage", None))
+        logger.info(
+            f"[{self.name}] Run {handle.run_id} {run.status} ({handle.mode}): "
+            f"queue={handle.timings['queue_ms']}ms run={handle.timings['run_ms']}ms "
+            f"polls={handle.timings['poll_count']} poll_wait={handle.timings['poll_wait_ms']}ms "
+            f"total={handle.timings['total_ms']}ms"
         )
         
-        # Attendi completamento (polling)
-        run = self._wait_for_run_completion(thread_id, run.id)
-        
         if run.status == "completed":
             # Recupera messaggi
-            messages = self.client.beta.threads.messages.list(
+            messages = await self.client.beta.threads.messages.list(
                 thread_id=thread_id,
                 order="asc"
             )
@@ -139,7 +143,8 @@ class BaseAgent:
                 "message": response_text,
                 "thread_id": thread_id,
                 "agent": self.name,
-                "model": self.model
+                "model": self.model,
+                "run_timings": handle.timings
             }
         else:
             error_msg = f"Run failed with status: {run.status}"
@@ -150,37 +155,34 @@ class BaseAgent:
                 "success": False,
                 "error": error_msg,
                 "thread_id": thread_id,
-                "agent": self.name
+                "agent": self.name,
+                "run_timings": handle.timings
             }
     
-    def _wait_for_run_completion(self, thread_id: str, run_id: str, timeout: int = 60):
-        """Attende completamento run con polling"""
-        start_time = time.time()
-        
-        while True:
-            run = self.client.beta.threads.runs.retrieve(
-                thread_id=thread_id,
-                run_id=run_id
-            )
-            
-            if run.status in ["completed", "failed", "cancelled", "expired"]:
-                return run
-            
-            if time.time() - start_time > timeout:
-                raise TimeoutError(f"Run {run_id} timeout dopo {timeout}s")
-            
-            time.sleep(1)  # Poll ogni secondo
+    def start_run(self, thread_id: str) -> RunHandle:
+        """
+        Avvia un run sul thread e ritorna subito l'handle.
+        `await handle.wait(timeout)` attende il risultato, `await handle.cancel()` lo interrompe.
+        """
+        return RunHandle(
+            client=self.client,
+            thread_id=thread_id,
+            assistant_id=self.assistant_id,
+            use_streaming=self.use_streaming
+        ).start()
     
     def _format_context(self, context: Dict[str, Any]) -> str:
         """Formatta contesto per l'agent"""
         # Implementazione base, può essere sovrascritta
         return f"Contesto aggiuntivo: {context}"
     
-    def delete_assistant(self):
-        """Elimina assistant (utile per cleanup)"""
+    async def delete_assistant(self):
+        """Elimina assistant e lo rimuove dal registry (utile per cleanup)"""
         if self.assistant_id:
             try:
-                self.client.beta.assistants.delete(self.assistant_id)
+                await self.client.beta.assistants.delete(self.assistant_id)
+                await assistant_registry.forget(self.name)
+                self.assistant_id = None
                 logger.info(f"Deleted assistant {self.name}")
             except Exception as e:
                 logger.error(f"Error deleting assistant {self.name}: {e}")
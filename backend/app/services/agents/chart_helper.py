@@ -47,6 +47,10 @@ class ChartHelper:
         movements = movements_data.get("movements", [])
         current_stock = movements_data.get("current_stock", 0)
         opening_stock = movements_data.get("opening_stock", 0)
+        # Traiettoria precalcolata (stock_trajectories): stock di apertura del periodo già ancorato
+        trajectory = movements_data.get("trajectory")
+        if trajectory:
+            opening_stock = trajectory["opening_stock"]
         
         # Prepara dati per il grafico (stesso formato che si aspetta AnchoredFlowStockChart)
         chart_data = {
@@ -58,7 +62,8 @@ class ChartHelper:
             "total_consumi": movements_data.get("total_consumi", 0),
             "total_rifornimenti": movements_data.get("total_rifornimenti", 0),
             "first_movement_date": movements_data.get("first_movement_date"),
-            "last_movement_date": movements_data.get("last_movement_date")
+            "last_movement_date": movements_data.get("last_movement_date"),
+            "trajectory": trajectory
         }
         
         # Genera HTML con canvas e script per renderizzazione
@@ -176,18 +181,20 @@ class ChartHelper:
         # Sezione grafico integrata nella wine card
         movements = movements_data.get("movements", [])
         current_stock = movements_data.get("current_stock", 0)
+        trajectory = movements_data.get("trajectory")
         
         if movements and len(movements) > 0:
             chart_data = {
                 "wine_name": wine.name,
                 "current_stock": current_stock,
-                "opening_stock": movements_data.get("opening_stock", 0),
+                "opening_stock": trajectory["opening_stock"] if trajectory else movements_data.get("opening_stock", 0),
                 "movements": movements,
                 "period": period,
                 "total_consumi": movements_data.get("total_consumi", 0),
                 "total_rifornimenti": movements_data.get("total_rifornimenti", 0),
                 "first_movement_date": movements_data.get("first_movement_date"),
-                "last_movement_date": movements_data.get("last_movement_date")
+                "last_movement_date": movements_data.get("last_movement_date"),
+                "trajectory": trajectory
             }
             
             import uuid
@@ -106,6 +106,8 @@ class MovementsCardHelper:
         for wine_data in wines[:20]:  # Max 20 vini
             wine_name = wine_data["wine_name"]
             movements = wine_data["movements"]
+            # Dal rollup arrivano solo i primi movimenti: il totale è in movements_count
+            movements_count = wine_data.get("movements_count", len(movements))
             consumi = wine_data["total_consumi"]
             rifornimenti = wine_data["total_rifornimenti"]
             current_stock = wine_data["current_stock"]
@@ -172,8 +174,8 @@ class MovementsCardHelper:
                         html += f'<span class="movement-date">{mov_date_formatted}</span>'
                     html += '</div>'
                     html += '</div>'
-                if len(movements) > 5:
-                    html += f'<div class="movement-more">+ {len(movements) - 5} altri movimenti</div>'
+                if movements_count > 5:
+                    html += f'<div class="movement-more">+ {movements_count - 5} altri movimenti</div>'
                 html += '</div>'
             
             html += '</div>'  # Chiude movement-wine-item
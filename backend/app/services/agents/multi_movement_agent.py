@@ -1,8 +1,9 @@
 """
 Multi Movement Agent - Coordina movimenti inventario multipli.
 Quando l'utente registra più movimenti in un singolo messaggio,
-questo agent estrae tutti i movimenti e li processa sequenzialmente
-usando MovementAgent per ogni movimento singolo.
+questo agent estrae tutti i movimenti, risolve i vini con la stessa logica
+di MovementAgent (fuzzy matching di AIService) e li registra in un'unica
+richiesta al processor (process_movements_batch).
 """
 from .movement_agent import MovementAgent
 from app.core.database import db_manager
@@ -17,7 +18,8 @@ logger = logging.getLogger(__name__)
 class MultiMovementAgent:
     """
     Agent specializzato per coordinare movimenti multipli.
-    Non usa Assistants API, delega ogni movimento singolo a MovementAgent.
+    Non usa Assistants API: risolve i vini tramite l'AIService di MovementAgent
+    e registra tutti i movimenti del messaggio in batch.
     """
     
     def __init__(self, movement_agent: MovementAgent):
@@ -42,8 +44,9 @@ class MultiMovementAgent:
         
         Flow:
         1. Analizza messaggio e estrae tutti i movimenti
-        2. Per ogni movimento, chiama MovementAgent per processarlo
-        3. Combina i risultati e fornisce feedback unificato
+        2. Risolve il vino di ogni movimento (fino alla prima ambiguità)
+        3. Registra i movimenti risolti in un'unica richiesta al processor
+        4. Combina i risultati e fornisce feedback unificato
         
         Args:
             message: Messaggio dell'utente contenente movimenti multipli
@@ -75,80 +78,26 @@ class MultiMovementAgent:
                     thread_id=thread_id
                 )
             
-            logger.info(f"[MULTI_MOVEMENT] ✅ Estratti {len(movements)} movimenti, avvio processamento sequenziale")
+            logger.info(f"[MULTI_MOVEMENT] ✅ Estratti {len(movements)} movimenti, avvio registrazione in batch")
             
-            # Step 2: Processa ogni movimento usando MovementAgent
+            # Step 2: Risolvi i vini (fuzzy matching) nell'ordine del messaggio, fino alla prima ambiguità
+            ai_service = self.movement_agent.ai_service_v1
             results = []
             errors = []
+            to_register = []  # (movimento estratto, movimento risolto)
             has_ambiguity = False  # Flag per tracciare se c'è almeno una disambiguazione
             
             for idx, movement in enumerate(movements, 1):
-                movement_type = movement.get("type", "")
+                movement_type = "consumo" if movement.get("type", "") == "consumo" else "rifornimento"
                 wine_name = movement.get("wine_name", "")
                 quantity = movement.get("quantity", 0)
                 
-                logger.info(f"[MULTI_MOVEMENT] Processamento movimento {idx}/{len(movements)}: {movement_type} {quantity}x {wine_name}")
+                logger.info(f"[MULTI_MOVEMENT] Risoluzione movimento {idx}/{len(movements)}: {movement_type} {quantity}x {wine_name}")
                 
-                # Prepara messaggio specifico per MovementAgent
-                movement_message = self._prepare_movement_message(movement_type, wine_name, quantity)
-                
-                # Processa movimento singolo
                 try:
-                    movement_result = await self.movement_agent.process_with_context(
-                        message=movement_message,
-                        user_id=user_id,
-                        thread_id=thread_id
+                    resolved, error_result = await ai_service.resolve_movement(
+                        user_id, movement_type, wine_name, int(quantity or 0), log_prefix="multi_movement"
                     )
-                    
-                    if movement_result.get("success"):
-                        results.append({
-                            "movement": movement,
-                            "result": movement_result,
-                            "status": "success"
-                        })
-                    else:
-                        # Estrai messaggio di errore (potrebbe essere in 'error' o 'message')
-                        error_msg = movement_result.get("error") or movement_result.get("message", "Errore sconosciuto")
-                        
-                        # Controlla se l'errore contiene HTML con wine cards (ambiguità vino)
-                        if movement_result.get("is_html") or "<div class=\"wines-list-card\">" in str(error_msg):
-                            # È un errore con wine cards HTML (ambiguità vino)
-                            has_ambiguity = True
-                            errors.append({
-                                "movement": movement,
-                                "error": str(error_msg),  # Mantieni HTML originale
-                                "status": "error",
-                                "is_html": True,  # Marca come HTML
-                                "raw_error": error_msg
-                            })
-                            logger.info(f"[MULTI_MOVEMENT] ⚠️ Movimento {idx} richiede selezione vino (HTML con wine cards)")
-                            
-                            # Salva i movimenti rimanenti per continuare dopo la disambiguazione
-                            remaining_movements = movements[idx:]  # Tutti i movimenti da questo in poi
-                            if remaining_movements and conversation_id:
-                                try:
-                                    await db_manager.save_pending_movements(
-                                        conversation_id=conversation_id,
-                                        user_id=user_id,
-                                        pending_movements=remaining_movements
-                                    )
-                                    logger.info(f"[MULTI_MOVEMENT] 💾 Salvati {len(remaining_movements)} movimenti rimanenti per conversazione {conversation_id}")
-                                except Exception as e:
-                                    logger.error(f"[MULTI_MOVEMENT] ❌ Errore salvando movimenti pendenti: {e}", exc_info=True)
-                            # Interrompi il loop quando incontriamo una disambiguazione (processeremo i rimanenti dopo)
-                            break
-                        else:
-                            # Errore normale, pulisci HTML
-                            error_msg_clean = self._clean_error_message(str(error_msg))
-                            errors.append({
-                                "movement": movement,
-                                "error": error_msg_clean,
-                                "status": "error",
-                                "is_html": False,
-                                "raw_error": error_msg
-                            })
-                            logger.warning(f"[MULTI_MOVEMENT] ❌ Movimento {idx} fallito: {error_msg_clean}")
-                
                 except Exception as e:
                     error_msg = str(e)
                     error_msg_clean = self._clean_error_message(error_msg)
@@ -158,9 +107,74 @@ class MultiMovementAgent:
                         "status": "error",
                         "raw_error": error_msg  # Mantieni errore originale per logging
                     })
-                    logger.error(f"[MULTI_MOVEMENT] ❌ Errore processamento movimento {idx}: {error_msg_clean} (raw: {error_msg})", exc_info=True)
+                    logger.error(f"[MULTI_MOVEMENT] ❌ Errore risoluzione movimento {idx}: {error_msg_clean} (raw: {error_msg})", exc_info=True)
+                    continue
+                
+                if error_result is None:
+                    to_register.append((movement, resolved))
+                    continue
+                
+                error_msg = error_result.get("error") or error_result.get("message", "Errore sconosciuto")
+                if error_result.get("needs_confirmation"):
+                    # Più vini possibili: wine cards HTML per la selezione
+                    has_ambiguity = True
+                    errors.append({
+                        "movement": movement,
+                        "error": str(error_msg),  # Mantieni HTML originale
+                        "status": "error",
+                        "is_html": True,  # Marca come HTML
+                        "raw_error": error_msg
+                    })
+                    logger.info(f"[MULTI_MOVEMENT] ⚠️ Movimento {idx} richiede selezione vino (HTML con wine cards)")
+                    
+                    # Salva i movimenti rimanenti per continuare dopo la disambiguazione
+                    remaining_movements = movements[idx:]  # Tutti i movimenti da questo in poi
+                    if remaining_movements and conversation_id:
+                        try:
+                            await db_manager.save_pending_movements(
+                                conversation_id=conversation_id,
+                                user_id=user_id,
+                                pending_movements=remaining_movements
+                            )
+                            logger.info(f"[MULTI_MOVEMENT] 💾 Salvati {len(remaining_movements)} movimenti rimanenti per conversazione {conversation_id}")
+                        except Exception as e:
+                            logger.error(f"[MULTI_MOVEMENT] ❌ Errore salvando movimenti pendenti: {e}", exc_info=True)
+                    # Interrompi quando incontriamo una disambiguazione (processeremo i rimanenti dopo)
+                    break
+                
+                # Errore normale, pulisci HTML
+                error_msg_clean = self._clean_error_message(str(error_msg))
+                errors.append({
+                    "movement": movement,
+                    "error": error_msg_clean,
+                    "status": "error",
+                    "is_html": False,
+                    "raw_error": error_msg
+                })
+                logger.warning(f"[MULTI_MOVEMENT] ❌ Movimento {idx} non valido: {error_msg_clean}")
+            
+            # Step 3: Registra i movimenti risolti in un'unica richiesta al processor
+            tool_results = await ai_service.register_movements(user_id, [resolved for _, resolved in to_register])
+            for (movement, _), tool_result in zip(to_register, tool_results):
+                if tool_result.get("success"):
+                    results.append({
+                        "movement": movement,
+                        "result": tool_result,
+                        "status": "success"
+                    })
+                else:
+                    error_msg = tool_result.get("error", "Errore sconosciuto")
+                    # Card HTML (es. quantità insufficiente) mostrata così com'è
+                    errors.append({
+                        "movement": movement,
+                        "error": str(error_msg) if tool_result.get("is_html") else self._clean_error_message(str(error_msg)),
+                        "status": "error",
+                        "is_html": bool(tool_result.get("is_html")),
+                        "raw_error": error_msg
+                    })
+                    logger.warning(f"[MULTI_MOVEMENT] ❌ Movimento fallito: {movement.get('wine_name')}")
             
-            # Step 3: Combina risultati
+            # Step 4: Combina risultati
             combined_message, has_html = self._combine_results(results, errors)
             
             return {
@@ -5,7 +5,13 @@ Genera notifiche basate su stato inventario e pattern.
 from .base_agent import BaseAgent
 from .wine_card_helper import WineCardHelper
 from .chart_helper import ChartHelper
-from app.core.database import db_manager, AsyncSessionLocal
+from app.core.database import db_manager, db_session
+from app.core.movements_ledger import movements_ledger
+from app.core.movements_rollup import movements_rollup
+from app.core.stock_forecast import stock_forecast
+from app.core.stock_trajectories import period_range, stock_trajectories
+from app.core.table_catalog import table_catalog
+from app.core.tenant_tables import STORICO_VINO, tenant_table
 from sqlalchemy import text as sql_text
 from typing import Dict, Any, Optional, List
 import logging
@@ -123,6 +129,73 @@ class NotificationAgent(BaseAgent):
             logger.error(f"[NOTIFICATION] Errore generazione alert scorte basse: {e}", exc_info=True)
             return []
     
+    async def generate_reorder_alerts(
+        self,
+        user_id: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Genera alert di riordino dalla previsione scorte (stock_forecast): vini
+        esauriti, in esaurimento entro il lead time o sotto il punto di riordino,
+        con consumo giornaliero, giorni all'esaurimento e quantità suggerita.
+        
+        Args:
+            user_id: ID utente
+        
+        Returns:
+            Lista di alert ordinata per urgenza (vuota se la previsione non è disponibile)
+        """
+        try:
+            user = await db_manager.get_user_by_id(user_id)
+            if not user or not user.business_name:
+                return []
+            
+            table_storico = tenant_table(user_id, user.business_name, STORICO_VINO)
+            async with db_session() as session:
+                if not await table_catalog.table_exists(session, table_storico.strip('"')):
+                    return []
+                forecast = await stock_forecast.forecast(session, user_id, table_storico)
+            if forecast is None:
+                return []
+            
+            severities = {"out_of_stock": "critical", "urgent": "critical", "reorder": "warning"}
+            return [
+                {
+                    "type": "reorder",
+                    "severity": severities[w["status"]],
+                    "status": w["status"],
+                    "wine_name": w["wine_name"],
+                    "current_stock": w["current_stock"],
+                    "daily_consumption": w["daily_consumption"],
+                    "days_to_stockout": w["days_to_stockout"],
+                    "reorder_point": w["reorder_point"],
+                    "suggested_reorder": w["suggested_reorder"],
+                    "message": self._format_reorder_message(w)
+                }
+                for w in forecast["wines"]
+                if w["status"] in severities
+            ]
+        
+        except Exception as e:
+            logger.error(f"[NOTIFICATION] Errore generazione alert riordino: {e}", exc_info=True)
+            return []
+    
+    def _format_reorder_message(self, forecast_wine: Dict[str, Any]) -> str:
+        """Formatta messaggio alert riordino"""
+        name = forecast_wine["wine_name"]
+        suggested = forecast_wine["suggested_reorder"]
+        if forecast_wine["status"] == "out_of_stock":
+            text = f"🚨 **{name}** è esaurito."
+        elif forecast_wine["days_to_stockout"] is not None:
+            text = (
+                f"⚠️ **{name}**: {forecast_wine['current_stock']} bottiglie, consumo medio "
+                f"{forecast_wine['daily_consumption']}/giorno, esaurimento tra circa {forecast_wine['days_to_stockout']} giorni."
+            )
+        else:
+            text = f"⚠️ **{name}**: {forecast_wine['current_stock']} bottiglie, sotto il punto di riordino."
+        if suggested:
+            text += f" Riordino suggerito: {suggested} bottiglie."
+        return text
+    
     def _format_low_stock_message(self, wine, threshold: int) -> str:
         """Formatta messaggio alert scorta bassa"""
         qty = wine.quantity or 0
@@ -266,7 +339,8 @@ class NotificationAgent(BaseAgent):
     async def get_wine_movements_data(
         self,
         user_id: int,
-        wine_name: str
+        wine_name: str,
+        period: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Recupera dati movimenti storici per un vino specifico.
@@ -275,6 +349,7 @@ class NotificationAgent(BaseAgent):
         Args:
             user_id: ID utente
             wine_name: Nome del vino
+            period: Preset del grafico ("day", "week", ...): aggiunge la traiettoria di stock del periodo
         
         Returns:
             Dict con dati movimenti nel formato dell'API viewer
@@ -289,23 +364,12 @@ class NotificationAgent(BaseAgent):
                     "movements": []
                 }
             
-            table_storico = f'"{user_id}/{user.business_name} Storico vino"'
+            table_storico = tenant_table(user_id, user.business_name, STORICO_VINO)
             
-            async with AsyncSessionLocal() as session:
+            async with db_session() as session:
                 # Verifica che la tabella esista
                 table_name_check = table_storico.strip('"')
-                check_table_query = sql_text("""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.tables 
-                        WHERE table_schema = 'public' 
-                        AND table_name = :table_name
-                    )
-                """)
-                result = await session.execute(
-                    check_table_query,
-                    {"table_name": table_name_check}
-                )
-                table_exists = result.scalar()
+                table_exists = await table_catalog.table_exists(session, table_name_check)
                 
                 if not table_exists:
                     logger.info(f"[NOTIFICATION] Tabella Storico vino non esiste per user_id={user_id}")
@@ -320,10 +384,11 @@ class NotificationAgent(BaseAgent):
                 # Prima prova match esatto (case-insensitive)
                 # Poi prova match parziale (LIKE)
                 # Infine prova con caratteri accentati normalizzati
+                use_ledger = await movements_ledger.ensure_synced(session, user.id, table_storico)
                 query_storico = sql_text(f"""
                     SELECT 
                         current_stock,
-                        history,
+                        {'NULL' if use_ledger else 'history'} AS history,
                         first_movement_date,
                         last_movement_date,
                         total_consumi,
@@ -376,8 +441,11 @@ class NotificationAgent(BaseAgent):
                         "movements": []
                     }
                 
-                # Estrai history (JSONB)
-                history = storico_row[1] if storico_row[1] else []
+                # Estrai history (JSONB); dal rollup giornaliero se disponibile (al più due punti al giorno per il grafico)
+                if use_ledger:
+                    history = await movements_rollup.daily_entries(session, user.id, storico_row[6])
+                else:
+                    history = storico_row[1] if storico_row[1] else []
                 if isinstance(history, str):
                     history = json.loads(history)
                 
@@ -401,6 +469,16 @@ class NotificationAgent(BaseAgent):
                 
                 logger.info(f"[NOTIFICATION] Storico trovato per '{actual_wine_name}': {len(movements)} movimenti, stock={current_stock}")
                 
+                # Traiettoria del periodo del grafico, calcolata in batch dal rollup
+                trajectory = None
+                if period and use_ledger:
+                    start, end, bucket = period_range(period)
+                    batch = await stock_trajectories.trajectories(
+                        session, user.id, table_storico, [actual_wine_name], start, end, bucket
+                    )
+                    if batch and batch["wines"]:
+                        trajectory = dict(batch["wines"][0], buckets=batch["buckets"], bucket=batch["bucket"])
+                
                 return {
                     "wine_name": actual_wine_name,  # Usa il nome trovato nello storico
                     "current_stock": current_stock,
@@ -409,7 +487,8 @@ class NotificationAgent(BaseAgent):
                     "total_consumi": storico_row[4] or 0,
                     "total_rifornimenti": storico_row[5] or 0,
                     "first_movement_date": storico_row[2].isoformat() if storico_row[2] else None,
-                    "last_movement_date": storico_row[3].isoformat() if storico_row[3] else None
+                    "last_movement_date": storico_row[3].isoformat() if storico_row[3] else None,
+                    "trajectory": trajectory
                 }
         
         except Exception as e:
@@ -456,7 +535,7 @@ class NotificationAgent(BaseAgent):
             
             # Recupera dati movimenti storici - usa il nome ESATTO del vino dall'inventario
             # IMPORTANTE: Passa wine.name (nome esatto dal DB) invece di wine_name (da messaggio utente)
-            movements_data = await self.get_wine_movements_data(user_id, wine.name)
+            movements_data = await self.get_wine_movements_data(user_id, wine.name, period=period)
             
             logger.info(f"[NOTIFICATION] Richiesta statistiche vino '{wine.name}': trovati {len(movements_data.get('movements', []))} movimenti")
             
@@ -583,6 +662,22 @@ class NotificationAgent(BaseAgent):
                         "message": "✅ Nessun vino esaurito. Tutti i vini hanno scorte disponibili!",
                         "agent": self.name
                     }
+            elif "riordin" in message.lower() or "previsione" in message.lower():
+                # Riordini suggeriti dalla previsione scorte (consumi reali, non soglia fissa)
+                alerts = await self.generate_reorder_alerts(user_id)
+                if alerts:
+                    return {
+                        "success": True,
+                        "message": "📦 **Riordini suggeriti**\n\n" + "\n\n".join(alert["message"] for alert in alerts[:10]),
+                        "agent": self.name,
+                        "metadata": {"type": "reorder_alerts", "count": len(alerts)}
+                    }
+                else:
+                    return {
+                        "success": True,
+                        "message": "✅ Nessun riordino necessario: le scorte coprono i consumi previsti.",
+                        "agent": self.name
+                    }
             elif "scorte" in message.lower() or "bassa" in message.lower():
                 # Richiesta per vini a bassa scorta (ma non esauriti)
                 alerts = await self.generate_low_stock_alerts(user_id)
@@ -0,0 +1,160 @@
+"""
+Run Driver - Esecuzione async dei run Assistants API.
+
+Usa lo streaming degli eventi del run quando disponibile (nessun polling, la
+risposta arriva appena il run termina). Se lo streaming non è disponibile
+ripiega su polling adattivo: primi poll ravvicinati, poi backoff esponenziale.
+Ogni run registra i tempi di coda/esecuzione/polling in `RunHandle.timings`.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Stati in cui il run non avanza più da solo
+TERMINAL_STATUSES = {"completed", "failed", "cancelled", "expired", "incomplete", "requires_action"}
+
+# Polling adattivo: primi intervalli fissi, poi backoff esponenziale fino a POLL_MAX_DELAY
+POLL_INITIAL_DELAYS = (0.1, 0.15, 0.25, 0.4)
+POLL_BACKOFF_FACTOR = 1.5
+POLL_MAX_DELAY = 2.0
+
+
+def adaptive_poll_delays():
+    """Generatore degli intervalli di polling (secondi)."""
+    for delay in POLL_INITIAL_DELAYS:
+        yield delay
+    delay = POLL_INITIAL_DELAYS[-1]
+    while True:
+        delay = min(delay * POLL_BACKOFF_FACTOR, POLL_MAX_DELAY)
+        yield delay
+
+
+class RunHandle:
+    """
+    Handle di un run in esecuzione.
+
+    `wait()` e `cancel()` sono awaitable; `timings` contiene (in ms):
+    queue_ms (creato → in_progress), run_ms (in_progress → terminale),
+    poll_wait_ms, total_ms e il numero di poll (0 in modalità streaming).
+    """
+
+    def __init__(self, client, thread_id: str, assistant_id: str, use_streaming: bool = True):
+        self.client = client
+        self.thread_id = thread_id
+        self.assistant_id = assistant_id
+        self.use_streaming = use_streaming
+        self.run_id: Optional[str] = None
+        self.run = None
+        self.mode: Optional[str] = None
+        self.timings: Dict[str, Any] = {
+            "queue_ms": None,
+            "run_ms": None,
+            "poll_wait_ms": 0.0,
+            "poll_count": 0,
+            "total_ms": None,
+        }
+        self._started_at = time.perf_counter()
+        self._in_progress_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> "RunHandle":
+        """Avvia il run in un task in background e ritorna l'handle."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._drive())
+        return self
+
+    async def wait(self, timeout: Optional[float] = None):
+        """
+        Attende la fine del run e ritorna l'oggetto run finale.
+        In caso di timeout cancella il run lato OpenAI e solleva TimeoutError.
+        """
+        self.start()
+        try:
+            return await asyncio.wait_for(asyncio.shield(self._task), timeout=timeout)
+        except asyncio.TimeoutError:
+            await self.cancel()
+            raise TimeoutError(f"Run {self.run_id} timeout dopo {timeout}s")
+        except asyncio.CancelledError:
+            # Il chiamante è stato cancellato: non lasciare il run attivo lato OpenAI
+            await self.cancel()
+            raise
+
+    async def cancel(self) -> None:
+        """Interrompe il run (task locale e run remoto se già creato)."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self.run_id and (self.run is None or self.run.status not in TERMINAL_STATUSES):
+            try:
+                await self.client.beta.threads.runs.cancel(thread_id=self.thread_id, run_id=self.run_id)
+                logger.info(f"[RUN_DRIVER] Run {self.run_id} cancellato")
+            except Exception as e:
+                logger.warning(f"[RUN_DRIVER] Errore cancellazione run {self.run_id}: {e}")
+
+    def _mark_status(self, status: str) -> None:
+        now = time.perf_counter()
+        if status == "in_progress" and self._in_progress_at is None:
+            self._in_progress_at = now
+            self.timings["queue_ms"] = round((now - self._started_at) * 1000, 1)
+        elif status in TERMINAL_STATUSES and self.timings["total_ms"] is None:
+            if self._in_progress_at is not None:
+                self.timings["run_ms"] = round((now - self._in_progress_at) * 1000, 1)
+            self.timings["total_ms"] = round((now - self._started_at) * 1000, 1)
+
+    async def _drive(self):
+        if self.use_streaming:
+            try:
+                return await self._drive_streaming()
+            except Exception as e:
+                if self.run_id:
+                    # Run già creato: continua a seguirlo via polling invece di ricrearlo
+                    logger.warning(f"[RUN_DRIVER] Streaming interrotto per run {self.run_id}, passo a polling: {e}")
+                    return await self._poll_until_terminal()
+                logger.warning(f"[RUN_DRIVER] Streaming non disponibile, uso polling adattivo: {e}")
+        return await self._drive_polling()
+
+    async def _drive_streaming(self):
+        self.mode = "streaming"
+        async with self.client.beta.threads.runs.stream(
+            thread_id=self.thread_id,
+            assistant_id=self.assistant_id
+        ) as stream:
+            async for event in stream:
+                if not event.event.startswith("thread.run.") or event.event.startswith("thread.run.step"):
+                    continue
+                self.run = event.data
+                self.run_id = event.data.id
+                self._mark_status(event.data.status)
+            self.run = await stream.get_final_run()
+        self._mark_status(self.run.status)
+        return self.run
+
+    async def _drive_polling(self):
+        self.mode = "polling"
+        self.run = await self.client.beta.threads.runs.create(
+            thread_id=self.thread_id,
+            assistant_id=self.assistant_id
+        )
+        self.run_id = self.run.id
+        return await self._poll_until_terminal()
+
+    async def _poll_until_terminal(self):
+        self.mode = self.mode or "polling"
+        delays = adaptive_poll_delays()
+        while self.run is None or self.run.status not in TERMINAL_STATUSES:
+            delay = next(delays)
+            await asyncio.sleep(delay)
+            self.timings["poll_wait_ms"] = round(self.timings["poll_wait_ms"] + delay * 1000, 1)
+            self.timings["poll_count"] += 1
+            self.run = await self.client.beta.threads.runs.retrieve(
+                thread_id=self.thread_id,
+                run_id=self.run_id
+            )
+            self._mark_status(self.run.status)
+        return self.run
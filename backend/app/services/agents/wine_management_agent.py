@@ -358,7 +358,7 @@ IMPORTANTE: Rispondi SOLO con il JSON, senza testo aggiuntivo."""
             # Recupera vino creato per mostrare wine card
             wine_id = add_result.get("wine_id")
             if wine_id:
-                wine = await db_manager.get_wine_by_id(user_id, wine_id)
+                wine = add_result.get("wine")
                 if wine:
                     wine_card_html = WineCardHelper.generate_wine_card_html(wine, is_new=True, badge="✅ Vino creato")
                     return {
@@ -399,7 +399,7 @@ IMPORTANTE: Rispondi SOLO con il JSON, senza testo aggiuntivo."""
         context: str
     ) -> Dict[str, Any]:
         """
-        Gestisce modifica vino esistente estraendo dati e chiamando processor_client.update_wine_field.
+        Gestisce modifica vino esistente estraendo dati e chiamando processor_client.update_wine.
         """
         try:
             # Cerca vino menzionato nel messaggio
@@ -484,25 +484,24 @@ IMPORTANTE: Rispondi SOLO con il JSON, senza testo aggiuntivo."""
                     "agent": self.name
                 }
             
-            # Chiama processor_client.update_wine_field per modificare il vino
+            # Chiama processor_client.update_wine per modificare il vino
             logger.info(f"[WINE_MANAGEMENT] Modifica vino {wine_to_update.id}: {field} = {value}")
-            update_result = await processor_client.update_wine_field(
+            update_result = await processor_client.update_wine(
                 user_id=user.id,
                 business_name=user.business_name,
                 wine_id=wine_to_update.id,
-                field=field,
-                value=str(value)
+                fields={field: value}
             )
             
             if update_result.get("status") == "error":
                 return {
                     "success": False,
-                    "error": f"Errore durante la modifica: {update_result.get('error', 'Errore sconosciuto')}",
+                    "error": f"Errore durante la modifica: {', '.join(update_result.get('errors') or ['Errore sconosciuto'])}",
                     "agent": self.name
                 }
             
-            # Recupera vino aggiornato per mostrare wine card
-            wine = await db_manager.get_wine_by_id(user_id, wine_to_update.id)
+            # Vino aggiornato restituito da update_wine per mostrare wine card
+            wine = update_result.get("wine")
             if wine:
                 wine_card_html = WineCardHelper.generate_wine_card_html(wine, badge="✅ Vino modificato")
                 return {
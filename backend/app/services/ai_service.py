@@ -7,7 +7,7 @@ import os
 import sys
 from pathlib import Path
 from typing import Optional, Dict, Any, List, Tuple
-from openai import OpenAI, OpenAIError
+from openai import OpenAIError
 import json
 import re
 
@@ -26,8 +26,14 @@ else:
     logger.warning(f"[AI_SERVICE] Path telegram bot non trovato: {telegram_bot_src}")
 
 from app.core.config import get_settings
-from app.core.database import db_manager
+from app.core.database import db_manager, db_session
+from app.core.inventory_search import search_inventory
 from app.core.processor_client import processor_client
+from app.core.stock_forecast import stock_forecast
+from app.core.tenant_tables import INVENTARIO, STORICO_VINO, tenant_table
+from app.core.openai_client import get_async_openai_client
+from app.services.speculative_chat import mark_side_effects
+from app.services.token_meter import record_usage
 
 # Disabilita proxy automatici
 os.environ.pop('HTTP_PROXY', None)
@@ -50,7 +56,8 @@ class AIService:
             logger.warning("OpenAI API key non configurata")
             self.client = None
         else:
-            self.client = OpenAI(api_key=self.openai_api_key)
+            # Client AsyncOpenAI condiviso: non blocca l'event loop durante le chiamate
+            self.client = get_async_openai_client()
     
     async def process_message(
         self,
@@ -122,6 +129,7 @@ class AIService:
                             "is_html": True
                         }
                     
+                    mark_side_effects()
                     result = await processor_client.process_movement(
                         user_id=user_id,
                         business_name=user.business_name,
@@ -1319,7 +1327,7 @@ INFORMAZIONI UTENTE:
                 return None
             
             # Usa user.id invece di user_id per nome tabella
-            table_name = f'"{user.id}/{user.business_name} INVENTARIO"'
+            table_name = tenant_table(user.id, user.business_name, INVENTARIO)
             
             # Determina ORDER BY e NULLS LAST/FIRST
             if query_type == 'max':
@@ -1333,7 +1341,7 @@ INFORMAZIONI UTENTE:
             
             # Query SQL: prima trova il valore min/max, poi tutti i vini con quel valore
             from sqlalchemy import text as sql_text
-            from app.core.database import AsyncSessionLocal
+            from app.core.database import db_session
             
             # Step 1: Trova il valore min/max
             find_value_query = sql_text(f"""
@@ -1345,7 +1353,7 @@ INFORMAZIONI UTENTE:
                 LIMIT 1
             """)
             
-            async with AsyncSessionLocal() as session:
+            async with db_session() as session:
                 result = await session.execute(find_value_query, {"user_id": user.id})
                 value_row = result.fetchone()
                 
@@ -1373,41 +1381,12 @@ INFORMAZIONI UTENTE:
                 """)
                 
                 result = await session.execute(find_all_query, {"user_id": user.id, "target_value": target_value})
-                rows = result.fetchall()
                 
-                if not rows:
-                    return self._generate_error_message_html("Errore: valore trovato ma nessun vino corrispondente.")
+                from app.core.database import WineRow
+                wines = WineRow.from_result(result)
                 
-                # Costruisci oggetti Wine
-                from app.core.database import Wine
-                wines = []
-                for row in rows:
-                    wine_dict = {
-                        'id': row.id,
-                        'user_id': row.user_id,
-                        'name': row.name,
-                        'producer': row.producer,
-                        'vintage': row.vintage,
-                        'grape_variety': row.grape_variety,
-                        'region': row.region,
-                        'country': row.country,
-                        'wine_type': row.wine_type,
-                        'classification': row.classification,
-                        'quantity': row.quantity,
-                        'min_quantity': row.min_quantity if hasattr(row, 'min_quantity') else 0,
-                        'cost_price': row.cost_price,
-                        'selling_price': row.selling_price,
-                        'alcohol_content': row.alcohol_content,
-                        'description': row.description,
-                        'notes': row.notes,
-                        'created_at': row.created_at,
-                        'updated_at': row.updated_at
-                    }
-                    
-                    wine = Wine()
-                    for key, value in wine_dict.items():
-                        setattr(wine, key, value)
-                    wines.append(wine)
+                if not wines:
+                    return self._generate_error_message_html("Errore: valore trovato ma nessun vino corrispondente.")
                 
                 # Se un solo vino, usa card HTML
                 if len(wines) == 1:
@@ -1733,7 +1712,7 @@ Esempio di risposta: vermentino
             
             logger.info(f"[RETRY_L3] Chiamo AI per reinterpretare query: {original_query[:50]}")
             
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.openai_model,
                 messages=[
                     {"role": "system", "content": "Sei un assistente che aiuta a normalizzare query di ricerca per vini. Rispondi solo con il termine normalizzato."},
@@ -1742,6 +1721,7 @@ Esempio di risposta: vermentino
                 max_tokens=50,
                 temperature=0.3  # Bassa temperatura per risposte più deterministiche
             )
+            record_usage(response.usage)
             
             if response.choices and response.choices[0].message.content:
                 retry_query = response.choices[0].message.content.strip().strip('"').strip("'").strip()
@@ -1768,17 +1748,39 @@ Esempio di risposta: vermentino
         Returns:
             (wines_found, retry_query_used, level_used)
         """
+        # Ricerca semplice: originale + livello 1 (+ match approssimato) risolti in
+        # una passata sull'indice in memoria dell'inventario, senza query DB
+        local_searched = False
+        if search_func == db_manager.search_wines and not original_filters:
+            try:
+                variants = await self._retry_level_1_normalize_local(original_query)
+                local = await search_inventory(
+                    user_id,
+                    search_func_args.get("search_term", original_query),
+                    limit=search_func_args.get("limit", 10),
+                    variants=variants
+                )
+                if local is not None:
+                    wines, level_used, variant_used = local
+                    if wines:
+                        logger.info(f"[RETRY] ✅ Indice in memoria ha trovato {len(wines)} vini (livello: {level_used})")
+                        return wines, variant_used, level_used
+                    local_searched = True
+            except Exception as e:
+                logger.warning(f"[RETRY] Errore ricerca su indice in memoria, uso DB: {e}")
+        
         # Tentativo originale
-        try:
-            wines = await search_func(**search_func_args)
-            if wines:
-                logger.info(f"[RETRY] ✅ Ricerca originale ha trovato {len(wines)} vini")
-                return wines, None, "original"
-        except Exception as e:
-            logger.warning(f"[RETRY] Errore ricerca originale: {e}")
+        if not local_searched:
+            try:
+                wines = await search_func(**search_func_args)
+                if wines:
+                    logger.info(f"[RETRY] ✅ Ricerca originale ha trovato {len(wines)} vini")
+                    return wines, None, "original"
+            except Exception as e:
+                logger.warning(f"[RETRY] Errore ricerca originale: {e}")
         
         # Livello 1: Normalizzazione locale (solo per ricerca non filtrata o con name_contains)
-        if not original_filters or "name_contains" in search_func_args.get("filters", {}):
+        if not local_searched and (not original_filters or "name_contains" in search_func_args.get("filters", {})):
             variants = await self._retry_level_1_normalize_local(original_query)
             for variant in variants[1:]:  # Skip primo (originale già provato)
                 if variant == original_query:
@@ -1839,7 +1841,11 @@ Esempio di risposta: vermentino
                     elif "query" in args_retry:
                         args_retry["query"] = retry_query
                     
-                    wines = await search_func(**args_retry)
+                    if local_searched:
+                        local = await search_inventory(user_id, retry_query, limit=args_retry.get("limit", 10))
+                        wines = local[0] if local else None
+                    else:
+                        wines = await search_func(**args_retry)
                     if wines:
                         logger.info(f"[RETRY_L3] ✅ Trovati {len(wines)} vini con query AI: '{retry_query}'")
                         return wines, retry_query, "level3"
@@ -2053,6 +2059,20 @@ Formato filters: {"region": "Toscana", "country": "Italia", "wine_type": "rosso"
                     }
                 }
             },
+            {
+                "type": "function",
+                "function": {
+                    "name": "get_reorder_forecast",
+                    "description": "Previsione già calcolata dai movimenti: consumo medio giornaliero, giorni all'esaurimento, punto di riordino e quantità di riordino suggerita per i vini da riordinare. Usala per suggerire riordini invece di stimarli.",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "limit": {"type": "integer", "description": "Numero massimo di vini da elencare", "default": 10},
+                            "include_ok": {"type": "boolean", "description": "Includi anche i vini con scorte sufficienti", "default": False}
+                        }
+                    }
+                }
+            },
             {
                 "type": "function",
                 "function": {
@@ -2070,6 +2090,231 @@ Formato filters: {"region": "Toscana", "country": "Italia", "wine_type": "rosso"
         ]
         return tools
     
+    def _format_reorder_forecast(self, forecast: Dict[str, Any], limit: int, include_ok: bool) -> str:
+        """Riepilogo testuale della previsione scorte (numeri già calcolati, da non ricalcolare)"""
+        wines = [w for w in forecast["wines"] if include_ok or w["status"] != "ok"][:limit]
+        summary = forecast["summary"]
+        lines = [
+            f"📦 **Previsione scorte** (consumi ultimi {forecast['window_days']} giorni, "
+            f"consegna in {forecast['lead_time_days']} giorni, riordino per {forecast['coverage_days']} giorni)",
+            f"Esauriti: {summary.get('out_of_stock', 0)} · Urgenti: {summary.get('urgent', 0)} · "
+            f"Da riordinare: {summary.get('reorder', 0)} · OK: {summary.get('ok', 0)}",
+        ]
+        if not wines:
+            lines.append("Nessun vino da riordinare al momento.")
+        labels = {"out_of_stock": "ESAURITO", "urgent": "URGENTE", "reorder": "RIORDINA", "ok": "OK"}
+        for w in wines:
+            line = (
+                f"• **{w['wine_name']}** [{labels[w['status']]}] - stock {w['current_stock']}, "
+                f"consumo {w['daily_consumption']}/giorno"
+            )
+            if w["days_to_stockout"] is not None:
+                line += f", esaurimento tra {w['days_to_stockout']} giorni ({w['stockout_date']})"
+            line += f", punto di riordino {w['reorder_point']}, riordino suggerito {w['suggested_reorder']} bottiglie"
+            lines.append(line)
+        return "\n".join(lines)
+    
+    async def resolve_movement(
+        self,
+        user_id: int,
+        movement_type: str,
+        wine_name: Optional[str],
+        quantity: Optional[int],
+        log_prefix: str = "movement"
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Valida un movimento e risolve il nome esatto del vino (fuzzy matching).
+        
+        Returns:
+            (movimento, None) con wine_name, movement_type, quantity e wines (candidati trovati),
+            oppure (None, risultato tool) se la richiesta è incompleta o serve conferma del vino
+        """
+        wine_name = (wine_name or "").strip()
+        if not wine_name or not quantity or quantity <= 0:
+            error_html = self._generate_error_message_html("Richiesta incompleta: specifica vino e quantità valida.")
+            return None, {"success": False, "error": error_html, "is_html": True}
+        
+        # ✅ FUZZY MATCHING: Cerca il vino nel database PRIMA di chiamare il processor
+        # Usa cascading retry search per trovare il nome esatto del vino
+        logger.info(f"[TOOLS] {log_prefix}: Ricerca fuzzy matching per '{wine_name}'")
+        wines, retry_query_used, level_used = await self._cascading_retry_search(
+            user_id=user_id,
+            original_query=wine_name,
+            search_func=db_manager.search_wines,
+            search_func_args={"user_id": user_id, "search_term": wine_name, "limit": 10},
+            original_filters=None
+        )
+        
+        # Se trovato più di un vino, chiedi conferma all'utente con pulsanti
+        if wines and len(wines) > 1:
+            logger.info(f"[TOOLS] {log_prefix}: Trovati {len(wines)} vini possibili per '{wine_name}', richiedo conferma")
+            # Genera card HTML per chiedere conferma
+            confirmation_html = self._generate_wine_confirmation_html(
+                wine_query=wine_name,
+                wines=wines,
+                movement_type=movement_type,
+                quantity=quantity
+            )
+            # Genera buttons per la selezione
+            buttons = [
+                {
+                    "id": wine.id,
+                    "text": f"{wine.name}" + (f" ({wine.producer})" if wine.producer else "") + (f" {wine.vintage}" if wine.vintage else ""),
+                    "data": {
+                        "wine_id": wine.id,
+                        "wine_name": wine.name,
+                        "movement_type": movement_type,
+                        "quantity": quantity
+                    }
+                }
+                for wine in wines[:10]
+            ]
+            return None, {
+                "success": False,
+                "error": confirmation_html,
+                "is_html": True,
+                "buttons": buttons,
+                "needs_confirmation": True
+            }
+        elif wines and len(wines) == 1:
+            # Un solo vino trovato: usa direttamente
+            matched_wine_name = wines[0].name
+            logger.info(f"[TOOLS] {log_prefix}: Fuzzy matching '{wine_name}' → '{matched_wine_name}' (livello: {level_used})")
+            wine_name = matched_wine_name  # Usa nome esatto trovato nel database
+        else:
+            # Se non trovato, prova comunque con il nome originale (potrebbe essere un nuovo vino)
+            logger.warning(f"[TOOLS] {log_prefix}: Nessun vino trovato per '{wine_name}', uso nome originale")
+        
+        return {
+            "wine_name": wine_name,
+            "movement_type": movement_type,
+            "quantity": quantity,
+            "wines": wines
+        }, None
+        
+    async def _movement_result_response(
+        self,
+        user_id: int,
+        movement: Dict[str, Any],
+        result: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Risultato tool (card movimento o card errore) dalla risposta del processor a un movimento."""
+        wine_name = movement["wine_name"]
+        movement_type = movement["movement_type"]
+        quantity = movement["quantity"]
+        wines = movement["wines"]
+        
+        if result.get('status') == 'success':
+            wine_name_result = result.get('wine_name', wine_name)
+            qty_before = result.get('quantity_before', 0)
+            qty_after = result.get('quantity_after', 0)
+        
+            # Genera HTML card invece di testo markdown
+            html_card = self._generate_movement_card_html(
+                movement_type=movement_type,
+                wine_name=wine_name_result,
+                quantity=quantity,
+                qty_before=qty_before,
+                qty_after=qty_after
+            )
+            return {"success": True, "message": html_card, "use_template": False, "is_html": True}
+        
+        error_msg = result.get('error', 'Errore sconosciuto')
+        
+        # Se è errore quantità insufficiente, mostra wine card con info disponibile
+        if "insufficiente" in error_msg.lower() or "disponibili" in error_msg.lower():
+            # Cerca il vino nel database per mostrare card con quantità disponibile
+            try:
+                wine_to_show = None
+        
+                # Prova prima con il vino trovato dal fuzzy matching (se disponibile)
+                if wines and len(wines) == 1:
+                    wine_to_show = wines[0]
+                    logger.info(f"[TOOLS] Usando vino trovato da fuzzy matching per card errore: {wine_to_show.name}")
+        
+                # Se non disponibile, cerca di nuovo il vino usando il nome esatto dal risultato
+                if not wine_to_show:
+                    wine_name_from_result = result.get('wine_name', wine_name)
+                    logger.info(f"[TOOLS] Cercando vino per card errore: '{wine_name_from_result}'")
+                    search_results = await db_manager.search_wines(user_id, wine_name_from_result, limit=1)
+                    if search_results:
+                        wine_to_show = search_results[0]
+                        logger.info(f"[TOOLS] Vino trovato per card errore: {wine_to_show.name}")
+        
+                # Se ancora non trovato, prova con il nome originale
+                if not wine_to_show:
+                    logger.info(f"[TOOLS] Cercando vino con nome originale: '{wine_name}'")
+                    search_results = await db_manager.search_wines(user_id, wine_name, limit=1)
+                    if search_results:
+                        wine_to_show = search_results[0]
+                        logger.info(f"[TOOLS] Vino trovato con nome originale: {wine_to_show.name}")
+        
+                if wine_to_show:
+                    # Estrai quantità disponibile dal messaggio di errore se possibile
+                    available_qty = wine_to_show.quantity or 0
+                    # Prova a estrarre dal messaggio errore (es: "disponibili 19")
+                    import re
+                    disponibili_match = re.search(r'disponibili\s+(\d+)', error_msg.lower())
+                    if disponibili_match:
+                        available_qty = int(disponibili_match.group(1))
+        
+                    # Mostra wine card con badge errore e quantità disponibile
+                    html_card = self._generate_wine_card_html(
+                        wine_to_show,
+                        is_new=False,
+                        error_info={
+                            "message": error_msg,
+                            "requested_quantity": quantity,
+                            "available_quantity": available_qty
+                        }
+                    )
+                    logger.info(f"[TOOLS] Generata wine card errore per '{wine_to_show.name}': richiesto={quantity}, disponibile={available_qty}")
+                    return {"success": False, "error": html_card, "is_html": True}
+                else:
+                    logger.warning(f"[TOOLS] Vino non trovato per card errore: '{wine_name}'")
+            except Exception as e:
+                logger.error(f"[TOOLS] Errore recupero vino per card errore: {e}", exc_info=True)
+        
+        # Fallback: usa error card standard
+        error_html = self._generate_error_message_html(f"Errore: {error_msg}")
+        return {"success": False, "error": error_html, "is_html": True}
+        
+    async def register_movements(
+        self,
+        user_id: int,
+        movements: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Registra più movimenti già risolti (vedi resolve_movement) in una sola
+        richiesta al processor (process_movements_batch).
+        
+        Returns:
+            Un risultato tool per movimento, nello stesso ordine
+        """
+        if not movements:
+            return []
+        user = await db_manager.get_user_by_id(user_id)
+        if not user or not user.business_name:
+            return [
+                {"success": False, "error": "Nome locale non trovato. Completa prima l'onboarding."}
+                for _ in movements
+            ]
+        try:
+            batch = await processor_client.process_movements_batch(
+                user_id=user_id,
+                business_name=user.business_name,
+                movements=movements
+            )
+        except Exception as e:
+            logger.error(f"[TOOLS] Errore processamento movimenti batch: {e}", exc_info=True)
+            error_html = self._generate_error_message_html(f"Errore durante il processamento: {str(e)[:200]}")
+            return [{"success": False, "error": error_html, "is_html": True} for _ in movements]
+        
+        responses = []
+        for movement, result in zip(movements, batch["results"]):
+            responses.append(await self._movement_result_response(user_id, movement, result))
+        return responses
+    
     async def _execute_tool(
         self,
         tool_name: str,
@@ -2373,67 +2618,36 @@ Formato filters: {"region": "Toscana", "country": "Italia", "wine_type": "rosso"
                 empty_html = self._generate_empty_state_html("Il tuo inventario è vuoto.")
                 return {"success": True, "message": empty_html, "use_template": False, "is_html": True}
             
+            # get_reorder_forecast
+            if tool_name == "get_reorder_forecast":
+                limit = int(tool_args.get("limit", 10))
+                include_ok = bool(tool_args.get("include_ok", False))
+                user = await db_manager.get_user_by_id(user_id)
+                if not user or not user.business_name:
+                    return {"success": False, "error": "Nome locale non trovato. Completa prima l'onboarding."}
+                async with db_session() as session:
+                    forecast = await stock_forecast.forecast(
+                        session, user.id, tenant_table(user.id, user.business_name, STORICO_VINO)
+                    )
+                if forecast is None:
+                    return {"success": False, "error": "Previsione non disponibile: storico movimenti non accessibile."}
+                return {
+                    "success": True,
+                    "message": self._format_reorder_forecast(forecast, limit, include_ok),
+                    "use_template": False
+                }
+            
             # register_consumption / register_replenishment
             if tool_name in ("register_consumption", "register_replenishment"):
-                wine_name = (tool_args.get("wine_name") or "").strip()
-                quantity = tool_args.get("quantity")
-                
-                if not wine_name or not quantity or quantity <= 0:
-                    error_html = self._generate_error_message_html("Richiesta incompleta: specifica vino e quantità valida.")
-                    return {"success": False, "error": error_html, "is_html": True}
-                
-                movement_type = "consumo" if tool_name == "register_consumption" else "rifornimento"
-                
-                # ✅ FUZZY MATCHING: Cerca il vino nel database PRIMA di chiamare il processor
-                # Usa cascading retry search per trovare il nome esatto del vino
-                logger.info(f"[TOOLS] {tool_name}: Ricerca fuzzy matching per '{wine_name}'")
-                wines, retry_query_used, level_used = await self._cascading_retry_search(
-                    user_id=user_id,
-                    original_query=wine_name,
-                    search_func=db_manager.search_wines,
-                    search_func_args={"user_id": user_id, "search_term": wine_name, "limit": 10},
-                    original_filters=None
+                movement, error_result = await self.resolve_movement(
+                    user_id,
+                    "consumo" if tool_name == "register_consumption" else "rifornimento",
+                    tool_args.get("wine_name"),
+                    tool_args.get("quantity"),
+                    log_prefix=tool_name
                 )
-                
-                # Se trovato più di un vino, chiedi conferma all'utente con pulsanti
-                if wines and len(wines) > 1:
-                    logger.info(f"[TOOLS] {tool_name}: Trovati {len(wines)} vini possibili per '{wine_name}', richiedo conferma")
-                    # Genera card HTML per chiedere conferma
-                    confirmation_html = self._generate_wine_confirmation_html(
-                        wine_query=wine_name,
-                        wines=wines,
-                        movement_type=movement_type,
-                        quantity=quantity
-                    )
-                    # Genera buttons per la selezione
-                    buttons = [
-                        {
-                            "id": wine.id,
-                            "text": f"{wine.name}" + (f" ({wine.producer})" if wine.producer else "") + (f" {wine.vintage}" if wine.vintage else ""),
-                            "data": {
-                                "wine_id": wine.id,
-                                "wine_name": wine.name,
-                                "movement_type": movement_type,
-                                "quantity": quantity
-                            }
-                        }
-                        for wine in wines[:10]
-                    ]
-                    return {
-                        "success": False,
-                        "error": confirmation_html,
-                        "is_html": True,
-                        "buttons": buttons,
-                        "needs_confirmation": True
-                    }
-                elif wines and len(wines) == 1:
-                    # Un solo vino trovato: usa direttamente
-                    matched_wine_name = wines[0].name
-                    logger.info(f"[TOOLS] {tool_name}: Fuzzy matching '{wine_name}' → '{matched_wine_name}' (livello: {level_used})")
-                    wine_name = matched_wine_name  # Usa nome esatto trovato nel database
-                else:
-                    # Se non trovato, prova comunque con il nome originale (potrebbe essere un nuovo vino)
-                    logger.warning(f"[TOOLS] {tool_name}: Nessun vino trovato per '{wine_name}', uso nome originale")
+                if error_result is not None:
+                    return error_result
                 
                 # Processa movimento via Processor
                 try:
@@ -2444,85 +2658,11 @@ Formato filters: {"region": "Toscana", "country": "Italia", "wine_type": "rosso"
                     result = await processor_client.process_movement(
                         user_id=user_id,
                         business_name=user.business_name,
-                        wine_name=wine_name,  # Usa nome esatto trovato (o originale se non trovato)
-                        movement_type=movement_type,
-                        quantity=quantity
+                        wine_name=movement["wine_name"],  # Usa nome esatto trovato (o originale se non trovato)
+                        movement_type=movement["movement_type"],
+                        quantity=movement["quantity"]
                     )
-                    
-                    if result.get('status') == 'success':
-                        wine_name_result = result.get('wine_name', wine_name)
-                        qty_before = result.get('quantity_before', 0)
-                        qty_after = result.get('quantity_after', 0)
-                        
-                        # Genera HTML card invece di testo markdown
-                        html_card = self._generate_movement_card_html(
-                            movement_type=movement_type,
-                            wine_name=wine_name_result,
-                            quantity=quantity,
-                            qty_before=qty_before,
-                            qty_after=qty_after
-                        )
-                        return {"success": True, "message": html_card, "use_template": False, "is_html": True}
-                    else:
-                        error_msg = result.get('error', 'Errore sconosciuto')
-                        
-                        # Se è errore quantità insufficiente, mostra wine card con info disponibile
-                        if "insufficiente" in error_msg.lower() or "disponibili" in error_msg.lower():
-                            # Cerca il vino nel database per mostrare card con quantità disponibile
-                            try:
-                                wine_to_show = None
-                                
-                                # Prova prima con il vino trovato dal fuzzy matching (se disponibile)
-                                if wines and len(wines) == 1:
-                                    wine_to_show = wines[0]
-                                    logger.info(f"[TOOLS] Usando vino trovato da fuzzy matching per card errore: {wine_to_show.name}")
-                                
-                                # Se non disponibile, cerca di nuovo il vino usando il nome esatto dal risultato
-                                if not wine_to_show:
-                                    wine_name_from_result = result.get('wine_name', wine_name)
-                                    logger.info(f"[TOOLS] Cercando vino per card errore: '{wine_name_from_result}'")
-                                    search_results = await db_manager.search_wines(user_id, wine_name_from_result, limit=1)
-                                    if search_results:
-                                        wine_to_show = search_results[0]
-                                        logger.info(f"[TOOLS] Vino trovato per card errore: {wine_to_show.name}")
-                                
-                                # Se ancora non trovato, prova con il nome originale
-                                if not wine_to_show:
-                                    logger.info(f"[TOOLS] Cercando vino con nome originale: '{wine_name}'")
-                                    search_results = await db_manager.search_wines(user_id, wine_name, limit=1)
-                                    if search_results:
-                                        wine_to_show = search_results[0]
-                                        logger.info(f"[TOOLS] Vino trovato con nome originale: {wine_to_show.name}")
-                                
-                                if wine_to_show:
-                                    # Estrai quantità disponibile dal messaggio di errore se possibile
-                                    available_qty = wine_to_show.quantity or 0
-                                    # Prova a estrarre dal messaggio errore (es: "disponibili 19")
-                                    import re
-                                    disponibili_match = re.search(r'disponibili\s+(\d+)', error_msg.lower())
-                                    if disponibili_match:
-                                        available_qty = int(disponibili_match.group(1))
-                                    
-                                    # Mostra wine card con badge errore e quantità disponibile
-                                    html_card = self._generate_wine_card_html(
-                                        wine_to_show,
-                                        is_new=False,
-                                        error_info={
-                                            "message": error_msg,
-                                            "requested_quantity": quantity,
-                                            "available_quantity": available_qty
-                                        }
-                                    )
-                                    logger.info(f"[TOOLS] Generata wine card errore per '{wine_to_show.name}': richiesto={quantity}, disponibile={available_qty}")
-                                    return {"success": False, "error": html_card, "is_html": True}
-                                else:
-                                    logger.warning(f"[TOOLS] Vino non trovato per card errore: '{wine_name}'")
-                            except Exception as e:
-                                logger.error(f"[TOOLS] Errore recupero vino per card errore: {e}", exc_info=True)
-                        
-                        # Fallback: usa error card standard
-                        error_html = self._generate_error_message_html(f"Errore: {error_msg}")
-                        return {"success": False, "error": error_html, "is_html": True}
+                    return await self._movement_result_response(user_id, movement, result)
                 except Exception as e:
                     logger.error(f"[TOOLS] Errore processamento movimento: {e}", exc_info=True)
                     error_html = self._generate_error_message_html(f"Errore durante il processamento: {str(e)[:200]}")
@@ -2561,7 +2701,7 @@ Formato filters: {"region": "Toscana", "country": "Italia", "wine_type": "rosso"
 CAPACITÀ:
 - Analizzare l'inventario dell'utente in tempo reale
 - Rispondere a QUALSIASI domanda o messaggio
-- Suggerire riordini per scorte basse
+- Suggerire riordini per scorte basse (usa get_reorder_forecast: consumi, giorni all'esaurimento e quantità suggerite sono già calcolati)
 - Fornire consigli pratici su gestione magazzino
 - Analizzare movimenti e consumi
 - Generare report e statistiche
@@ -2594,7 +2734,7 @@ REGOLA D'ORO: Prima di rispondere a qualsiasi domanda informativa, consulta SEMP
             
             # Chiama OpenAI con tools
             logger.info(f"[FUNCTION_CALLING] Chiamata OpenAI con {len(tools)} tools disponibili")
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.openai_model,
                 messages=messages,
                 max_tokens=1500,
@@ -2602,6 +2742,7 @@ REGOLA D'ORO: Prima di rispondere a qualsiasi domanda informativa, consulta SEMP
                 tools=tools,
                 tool_choice="auto"
             )
+            record_usage(response.usage)
             
             choice = response.choices[0]
             message = choice.message
@@ -2610,15 +2751,19 @@ REGOLA D'ORO: Prima di rispondere a qualsiasi domanda informativa, consulta SEMP
             tool_calls = getattr(message, "tool_calls", None)
             
             if tool_calls:
+                # Da qui i tool possono scrivere: l'esecuzione speculativa non cancella più V1
+                mark_side_effects()
+                
                 # Gestisci multiple tool calls per movimenti multipli
                 movement_tools = ("register_consumption", "register_replenishment")
                 movement_calls = [call for call in tool_calls if getattr(call.function, "name", "") in movement_tools]
                 
-                # Se ci sono multiple chiamate per movimenti, eseguile tutte
+                # Se ci sono multiple chiamate per movimenti, registrale in un'unica richiesta al processor
                 if len(movement_calls) > 1:
-                    logger.info(f"[FUNCTION_CALLING] Rilevati {len(movement_calls)} movimenti multipli, esecuzione sequenziale")
+                    logger.info(f"[FUNCTION_CALLING] Rilevati {len(movement_calls)} movimenti multipli, registrazione in batch")
                     results_html = []
                     errors = []
+                    resolved = []
                     
                     for call in movement_calls:
                         fn = call.function
@@ -2632,8 +2777,20 @@ REGOLA D'ORO: Prima di rispondere a qualsiasi domanda informativa, consulta SEMP
                             continue
                         
                         logger.info(f"[FUNCTION_CALLING] Tool chiamato: {tool_name} con args: {tool_args}")
-                        tool_result = await self._execute_tool(tool_name, tool_args, user_id)
-                        
+                        movement, error_result = await self.resolve_movement(
+                            user_id,
+                            "consumo" if tool_name == "register_consumption" else "rifornimento",
+                            tool_args.get("wine_name"),
+                            tool_args.get("quantity"),
+                            log_prefix=tool_name
+                        )
+                        if error_result is not None:
+                            errors.append(f"{tool_name}: {error_result.get('error', 'Errore sconosciuto')}")
+                        else:
+                            resolved.append((tool_name, movement))
+                    
+                    tool_results = await self.register_movements(user_id, [movement for _, movement in resolved])
+                    for (tool_name, _), tool_result in zip(resolved, tool_results):
                         if tool_result.get("success"):
                             # Se il risultato è HTML, aggiungilo alla lista
                             if tool_result.get("is_html"):
@@ -2912,11 +3069,12 @@ Rispondi sempre in italiano in modo chiaro e professionale."""
             
             messages.append({"role": "user", "content": user_message})
             
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.openai_model,
                 messages=messages,
                 temperature=0.7
             )
+            record_usage(response.usage)
             
             message_content = response.choices[0].message.content
             
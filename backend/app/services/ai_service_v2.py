@@ -1,59 +1,147 @@
 """
 Nuovo servizio AI che usa sistema multi-agent.
 Integra RouterAgent, QueryAgent, MovementAgent, MultiMovementAgent e AnalyticsAgent.
+
+Gli agent sono costruiti on-demand al primo instradamento (slot lazy): l'import
+di app.api.chat non paga più la costruzione di tutti gli agent all'avvio.
+`warm_up()` permette di pre-costruirli in background dopo lo startup.
 """
-from .agents.router_agent import RouterAgent
-from .agents.query_agent import QueryAgent
-from .agents.movement_agent import MovementAgent
-from .agents.multi_movement_agent import MultiMovementAgent
-from .agents.analytics_agent import AnalyticsAgent
-from .agents.wine_management_agent import WineManagementAgent
-from .agents.validation_agent import ValidationAgent
-from .agents.notification_agent import NotificationAgent
-from .agents.conversation_agent import ConversationAgent
-from .agents.report_agent import ReportAgent
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import importlib
 import logging
+import time
+
+from app.core.config import get_settings
+from app.core.database import db_manager
+from app.core.openai_client import get_async_openai_client
+from .intent_router import LocalIntentRouter
 
 logger = logging.getLogger(__name__)
 
+# Slot agent -> (modulo, classe). Import e costruzione avvengono al primo accesso.
+AGENT_SLOTS = {
+    "router": (".agents.router_agent", "RouterAgent"),
+    "query": (".agents.query_agent", "QueryAgent"),
+    "movement": (".agents.movement_agent", "MovementAgent"),
+    "multi_movement": (".agents.multi_movement_agent", "MultiMovementAgent"),
+    "analytics": (".agents.analytics_agent", "AnalyticsAgent"),
+    "wine_management": (".agents.wine_management_agent", "WineManagementAgent"),
+    "validation": (".agents.validation_agent", "ValidationAgent"),
+    "notification": (".agents.notification_agent", "NotificationAgent"),
+    "conversation": (".agents.conversation_agent", "ConversationAgent"),
+    "report": (".agents.report_agent", "ReportAgent"),
+}
+
+
+class _LazyAgent:
+    """Descriptor: `service.<slot>` costruisce l'agent al primo accesso e lo memorizza"""
+    
+    def __set_name__(self, owner, name):
+        self.slot = name
+    
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return instance.get_agent(self.slot)
+
+
 class AIServiceV2:
     """Servizio AI con sistema multi-agent"""
     
+    router = _LazyAgent()
+    query = _LazyAgent()
+    movement = _LazyAgent()
+    multi_movement = _LazyAgent()
+    analytics = _LazyAgent()
+    wine_management = _LazyAgent()
+    validation = _LazyAgent()
+    notification = _LazyAgent()
+    conversation = _LazyAgent()
+    report = _LazyAgent()
+    
     def __init__(self):
-        """Inizializza tutti gli agent"""
-        logger.info("🚀 Inizializzazione sistema multi-agent...")
+        """Prepara gli slot agent (nessun agent viene costruito qui)"""
+        self._agents: Dict[str, Any] = {}
+        self.client = get_async_openai_client()
+        self.intent_threshold = get_settings().INTENT_ROUTER_CONFIDENCE_THRESHOLD
+        logger.info("🚀 Sistema multi-agent pronto (agent costruiti on-demand)")
+    
+    def get_agent(self, slot: str):
+        """
+        Ritorna l'agent dello slot, costruendolo al primo utilizzo.
+        
+        Args:
+            slot: Nome slot (vedi AGENT_SLOTS)
+        
+        Returns:
+            Istanza agent
+        """
+        agent = self._agents.get(slot)
+        if agent is not None:
+            return agent
         
+        module_name, class_name = AGENT_SLOTS[slot]
         try:
-            self.router = RouterAgent()
-            self.query = QueryAgent()
-            self.movement = MovementAgent()
-            # MultiMovementAgent usa MovementAgent per ogni movimento singolo
-            self.multi_movement = MultiMovementAgent(movement_agent=self.movement)
-            self.analytics = AnalyticsAgent()
-            self.wine_management = WineManagementAgent()
-            self.validation = ValidationAgent()
-            self.notification = NotificationAgent()
-            self.conversation = ConversationAgent()
-            self.report = ReportAgent()
-            
-            logger.info("✅ Sistema multi-agent inizializzato con successo")
+            agent_class = getattr(importlib.import_module(module_name, __package__), class_name)
+            if slot == "multi_movement":
+                # MultiMovementAgent usa MovementAgent per ogni movimento singolo
+                agent = agent_class(movement_agent=self.movement)
+            else:
+                agent = agent_class()
         except Exception as e:
-            logger.error(f"❌ Errore inizializzazione sistema multi-agent: {e}", exc_info=True)
+            logger.error(f"[AI_SERVICE_V2] ❌ Errore costruzione agent '{slot}': {e}", exc_info=True)
             raise
+        
+        self._agents[slot] = agent
+        logger.info(f"[AI_SERVICE_V2] ✅ Agent '{slot}' inizializzato")
+        return agent
+    
+    def is_agent_loaded(self, slot: str) -> bool:
+        """True se l'agent dello slot è già stato costruito"""
+        return slot in self._agents
+    
+    async def warm_up(self):
+        """
+        Pre-costruisce tutti gli agent e risolve i loro assistant.
+        Pensato per girare come background task dopo lo startup.
+        """
+        start = asyncio.get_running_loop().time()
+        for slot in AGENT_SLOTS:
+            try:
+                self.get_agent(slot)
+            except Exception:
+                continue
+            # Cede il loop tra una costruzione e l'altra
+            await asyncio.sleep(0)
+        
+        # Risolve gli assistant (registry) in parallelo per gli agent basati su Assistants API
+        ensures = [
+            agent._ensure_assistant()
+            for agent in self._agents.values()
+            if hasattr(agent, "_ensure_assistant")
+        ]
+        results = await asyncio.gather(*ensures, return_exceptions=True)
+        failed = sum(1 for r in results if isinstance(r, Exception))
+        elapsed = asyncio.get_running_loop().time() - start
+        logger.info(
+            f"[AI_SERVICE_V2] 🔥 Warm-up completato in {elapsed:.2f}s: "
+            f"{len(self._agents)}/{len(AGENT_SLOTS)} agent, {failed} assistant non risolti"
+        )
     
     async def process_message(
         self,
         user_message: str,
         user_id: int,
         conversation_history: Optional[list] = None,
-        conversation_id: Optional[int] = None
+        conversation_id: Optional[int] = None,
+        precomputed_route: Optional[Tuple[str, str]] = None
     ) -> Dict[str, Any]:
         """
         Processa messaggio usando sistema multi-agent.
         
         Flow:
-        1. Router analizza messaggio e determina agent appropriato
+        1. Router locale (o RouterAgent LLM se incerto) determina agent appropriato
         2. Valida routing e applica fallback se necessario
         3. Instrada al agent specializzato
         4. Agent processa con contesto inventario
@@ -63,6 +151,7 @@ class AIServiceV2:
             user_message: Messaggio dell'utente
             user_id: ID utente
             conversation_history: Storia conversazione (non usata ancora, per compatibilità)
+            precomputed_route: (agent, origine) già calcolato da route(), salta il routing
         
         Returns:
             Dict con risposta e metadati
@@ -76,12 +165,15 @@ class AIServiceV2:
         try:
             # Step 1: Router determina agent appropriato
             logger.info(f"[AI_SERVICE_V2] Processing message: {user_message[:50]}...")
-            agent_name = await self.router.route(user_message)
+            if precomputed_route:
+                agent_name, routing = precomputed_route
+            else:
+                agent_name, routing = await self.route(user_message, user_id)
             
             # Step 2: Valida e normalizza agent name
             agent_name = self._validate_and_normalize_agent(agent_name, user_message)
             
-            logger.info(f"[AI_SERVICE_V2] 📍 Router instradato a: {agent_name} (validato)")
+            logger.info(f"[AI_SERVICE_V2] 📍 Router instradato a: {agent_name} (validato, {routing})")
             
             # Step 3: Ottieni istanza agent
             agent_instance = self._get_agent_by_name(agent_name)
@@ -133,7 +225,8 @@ class AIServiceV2:
                         "type": "agent_response",
                         "agent": result.get("agent", agent_name),
                         "model": result.get("model"),
-                        "thread_id": result.get("thread_id")
+                        "thread_id": result.get("thread_id"),
+                        "routing": routing
                     },
                     "buttons": None,  # Per compatibilità con API esistente
                     "is_html": result.get("is_html", False)  # Usa is_html da result se disponibile
@@ -164,6 +257,46 @@ class AIServiceV2:
                 "is_html": False
             }
     
+    async def _inventory_wine_names(self, user_id: Optional[int]) -> Optional[List[str]]:
+        """Nomi dei vini del tenant per il router locale (inventario da inventory_cache), None se non disponibili"""
+        if user_id is None:
+            return None
+        try:
+            wines = await db_manager.get_user_wines(user_id)
+        except Exception as e:
+            logger.warning(f"[AI_SERVICE_V2] Inventario non disponibile per il routing locale: {e}")
+            return None
+        return [wine.name for wine in wines if wine.name]
+    
+    async def route(self, user_message: str, user_id: Optional[int] = None) -> Tuple[str, str]:
+        """
+        Determina l'agent: prima il router locale deterministico, poi il RouterAgent
+        LLM solo se la confidence locale è sotto soglia.
+        
+        Args:
+            user_message: Messaggio dell'utente
+            user_id: ID utente: i nomi dei vini in inventario migliorano il routing locale
+        
+        Returns:
+            (nome agent, "local" | "llm")
+        """
+        wine_names = await self._inventory_wine_names(user_id)
+        start = time.perf_counter()
+        agent_name, confidence = LocalIntentRouter.classify(user_message, wine_names)
+        local_ms = (time.perf_counter() - start) * 1000
+        
+        if confidence >= self.intent_threshold:
+            logger.info(
+                f"[AI_SERVICE_V2] ⚡ Routing locale: {agent_name} "
+                f"(confidence={confidence:.2f}, {local_ms:.2f}ms)"
+            )
+            return agent_name, "local"
+        
+        logger.info(
+            f"[AI_SERVICE_V2] Routing locale incerto ({agent_name}, confidence={confidence:.2f}), uso RouterAgent"
+        )
+        return await self.router.route(user_message), "llm"
+    
     def _validate_and_normalize_agent(self, agent_name: str, user_message: str) -> str:
         """
         Valida e normalizza il nome agent, applicando logica di fallback intelligente.
@@ -231,16 +364,12 @@ class AIServiceV2:
         Returns:
             Istanza agent o None se non trovato
         """
-        agents_map = {
-            "extraction": None,  # Non implementato
-            "query": self.query,
-            "movement": self.movement,
-            "multi_movement": self.multi_movement,
-            "analytics": self.analytics,
-            "wine_management": self.wine_management,
-            "report": self.report,
-            "notification": self.notification,
-            "conversation": self.conversation
+        # Solo gli agent instradabili; "extraction" non è implementato
+        routable = {
+            "query", "movement", "multi_movement", "analytics",
+            "wine_management", "report", "notification", "conversation"
         }
-        return agents_map.get(agent_name)
-
+        if agent_name not in routable:
+            return None
+        # Costruito solo l'agent richiesto (slot lazy)
+        return self.get_agent(agent_name)
@@ -9,6 +9,7 @@ from datetime import datetime, time, timedelta, timezone
 from typing import List
 from app.core.database import db_manager
 from app.core.notifications_service import save_notification, cleanup_expired_notifications
+from app.core.pdf_cache import pdf_cache
 from app.core.processor_client import processor_client
 
 logger = logging.getLogger(__name__)
@@ -64,11 +65,12 @@ async def generate_daily_reports_for_all_users():
             user_id = user.id
             business_name = user.business_name
             try:
-                # Recupera PDF da processor
-                pdf_data = await processor_client.get_daily_report_pdf(
-                    user_id=user_id,
-                    report_date=report_date_str
+                # Recupera PDF da processor (via pdf_cache: riusato dai download di /api/reports)
+                pdf = await pdf_cache.get(
+                    user_id, business_name, "daily", (report_date_str,),
+                    lambda: processor_client.get_daily_report_pdf(user_id=user_id, report_date=report_date_str)
                 )
+                pdf_data = await pdf.read() if pdf else None
                 
                 if pdf_data:
                     # Converti PDF in base64 per salvare nel metadata
@@ -0,0 +1,202 @@
+"""
+Router locale deterministico per il sistema multi-agent.
+
+Applica in locale le regole di priorità documentate in RouterAgent (keywords,
+verbo d'azione + quantità + vino, nome vino in inventario) riusando i pattern
+di RequestComplexityAnalyzer. Ritorna (agent, confidence): AIServiceV2 chiama
+il RouterAgent LLM solo quando la confidence è sotto soglia.
+"""
+import re
+import logging
+from typing import Iterable, Optional, Tuple
+
+from .request_complexity_analyzer import RequestComplexityAnalyzer
+
+logger = logging.getLogger(__name__)
+
+
+def _compile(patterns: Iterable[str]):
+    return [re.compile(p, re.IGNORECASE) for p in patterns]
+
+
+class LocalIntentRouter:
+    """Classificatore di intent basato su regole (nessuna chiamata di rete)"""
+
+    # Confidence sotto cui non ci si fida della regola (nessun match)
+    DEFAULT_CONFIDENCE = 0.3
+    # Penalità se il messaggio attiva anche categorie a priorità inferiore (ambiguità)
+    AMBIGUITY_PENALTY = 0.2
+    # Verdetto incerto (sotto la soglia di default 0.75): decide il RouterAgent LLM
+    UNSURE_CONFIDENCE = 0.5
+
+    # Verbi d'azione movimento (PRIORITÀ 2 del RouterAgent)
+    MOVEMENT_VERB = re.compile(
+        r"\b(ho\s+)?(consumat[oaie]|bevut[oaie]|vendut[oaie]|acquistat[oaie]|comprat[oaie]|"
+        r"riforni(to|ti|ta|te)|ricevut[oaie]|aggiunt[oaie]|tolt[oaie]|scaricat[oaie]|caricat[oaie]|"
+        r"rimoss[oaie]|consumo|vendo|acquisto|rifornisci|scarico|carico|tolgo|rimuovo|registra)\b",
+        re.IGNORECASE,
+    )
+    QUANTITY = re.compile(r"\b\d+\b")
+    # Numeri che non sono quantità: anni ("nel 2023", "Barolo 2018"), periodi ("ultimi 30 giorni"), prezzi
+    NOT_QUANTITY = re.compile(
+        r"\b(19|20)\d{2}\b|\b\d+\s+(giorn[oi]|settiman[ae]|mes[ei]|ann[oi]|or[ae]|minuti)\b"
+        r"|\b\d+([.,]\d+)?\s*(€|euro\b)|€\s*\d+([.,]\d+)?",
+        re.IGNORECASE,
+    )
+    # Quantità accanto al verbo ("venduto 3", "ho caricato oggi 12") o seguita da unità/vino
+    VERB_QUANTITY = re.compile(MOVEMENT_VERB.pattern + r"(\s+[^\s\d]+){0,2}?\s+\d+\b", re.IGNORECASE)
+    QUANTITY_BEFORE_WINE = re.compile(
+        r"\b\d+\s+(?:(bottigli[ae]|bt|cartoni?|casse?|calici?|magnum)\b\s*)?"
+        r"(?:(?:di|del|della|dello|dei|delle|d')\s*)?([^\W\d][\w']*)?",
+        re.IGNORECASE,
+    )
+    # Domande e richieste di visualizzazione: "quante bottiglie ho acquistato...", "mostrami il vino che ho comprato"
+    INTERROGATIVE = re.compile(
+        r"\?|\b(quant[oaie]|qual[ei]|quando|mostra(mi)?|dimmi|elenca|visualizza|fammi\s+vedere)\b", re.IGNORECASE
+    )
+    # Più coppie quantità/vino: "3 Barolo e 2 Chianti", "10 Brunello, 5 Amarone"
+    MULTI_QUANTITY_SEPARATOR = re.compile(r"\d+\s+[^,]+?(\s+e\s+|,\s*|\s+più\s+)\d+", re.IGNORECASE)
+
+    WINE_MANAGEMENT = _compile(
+        RequestComplexityAnalyzer.COMPLEX_PATTERNS["wine_management"]
+        + [r"(cambia|modifica)\s+(il\s+)?(prezzo|quantità|annata)", r"unifica\s+vini", r"duplicat[oi]"]
+    )
+    STATS = re.compile(r"\b(statistiche|statistica|andamento|grafico|trend|storico|movimenti)\b", re.IGNORECASE)
+    ANALYTICS = re.compile(
+        r"\b(statistiche|statistica|analisi|analizza|trend|quanti\s+vini|valore\s+inventario)\b", re.IGNORECASE
+    )
+    REPORT = re.compile(r"\b(report|riepilogo\s+dettagliato)\b", re.IGNORECASE)
+    ALERTS = _compile(
+        RequestComplexityAnalyzer.COMPLEX_PATTERNS["notifications"]
+        + [r"\besauriti\b", r"\bavvisi\b", r"\bnotifiche\b"]
+    )
+    CONVERSATION = _compile(
+        [r"cosa\s+abbiamo\s+detto", r"di\s+cosa\s+stavamo\s+parlando", r"riassumi\s+(la\s+)?conversazione"]
+    )
+    EXTRACTION = re.compile(
+        r"\b(carica\s+(il\s+)?(file|inventario)|importa|csv|excel|xlsx|elabora\s+(il\s+)?file)\b", re.IGNORECASE
+    )
+    QUERY = _compile(
+        RequestComplexityAnalyzer.SIMPLE_PATTERNS["simple_query"]
+        + RequestComplexityAnalyzer.SIMPLE_PATTERNS["simple_question"]
+        + [r"\b(cerca|trova|quale|quali|info|dettagli|lista|mostra|mostrami|dimmi|confronta)\b"]
+    )
+    # Vino specifico introdotto da preposizione: "del Barolo", "della Barbera"
+    WINE_AFTER_PREPOSITION = re.compile(
+        r"\b(del|della|dello|dei|delle|di|sul|sulla)\s+(l')?([A-ZÀ-Ý][\w'àèéìòù]+)"
+    )
+
+    @classmethod
+    def _mentions_inventory_wine(cls, message_lower: str, wine_names: Optional[Iterable[str]]) -> bool:
+        if not wine_names:
+            return False
+        for name in wine_names:
+            if name and len(name) > 3 and name.lower() in message_lower:
+                return True
+        return False
+
+    @classmethod
+    def _mentions_specific_wine(
+        cls, message: str, message_lower: str, wine_names: Optional[Iterable[str]]
+    ) -> Tuple[bool, bool]:
+        """Ritorna (vino specifico presente, match esatto con inventario)"""
+        if cls._mentions_inventory_wine(message_lower, wine_names):
+            return True, True
+        return bool(cls.WINE_AFTER_PREPOSITION.search(message)), False
+
+    @classmethod
+    def _has_movement_quantity(cls, message: str, wine_names: Optional[Iterable[str]]) -> bool:
+        """
+        Quantità da movimento: accanto al verbo d'azione oppure seguita da unità
+        o vino (nome in inventario, altrimenti parola con iniziale maiuscola).
+        `message` è già privo di anni, periodi e prezzi (NOT_QUANTITY).
+        """
+        if cls.VERB_QUANTITY.search(message):
+            return True
+        wine_words = {name.split()[0].lower() for name in wine_names or () if name and name.split()}
+        for match in cls.QUANTITY_BEFORE_WINE.finditer(message):
+            unit, word = match.group(1), match.group(2)
+            if unit or (word and (word.lower() in wine_words or word[0].isupper())):
+                return True
+        return False
+
+    @classmethod
+    def _candidates(cls, message: str, wine_names: Optional[Iterable[str]]):
+        """Genera (agent, confidence) per ogni regola attivata, in ordine di priorità"""
+        message_lower = message.lower()
+        has_verb = bool(cls.MOVEMENT_VERB.search(message_lower))
+
+        # PRIORITÀ MASSIMA: verbo d'azione + quantità -> movimento
+        if has_verb:
+            if cls.INTERROGATIVE.search(message_lower):
+                # "quanto ho venduto a marzo?": lettura dello storico, non un movimento da registrare.
+                # Nessun verdetto locale: confidence sotto soglia, decide il RouterAgent LLM
+                yield "query", cls.UNSURE_CONFIDENCE
+                return
+            quantities = cls.NOT_QUANTITY.sub(" ", message)
+            if cls._has_movement_quantity(quantities, wine_names):
+                quantities_lower = quantities.lower()
+                if cls.MULTI_QUANTITY_SEPARATOR.search(quantities_lower) and len(cls.QUANTITY.findall(quantities_lower)) > 1:
+                    yield "multi_movement", 0.9
+                else:
+                    yield "movement", 0.95
+
+        if any(p.search(message_lower) for p in cls.WINE_MANAGEMENT):
+            yield "wine_management", 0.9
+
+        if cls.REPORT.search(message_lower):
+            yield "report", 0.9
+
+        if cls.STATS.search(message_lower):
+            specific, exact = cls._mentions_specific_wine(message, message_lower, wine_names)
+            if specific:
+                yield "notification", 0.9 if exact else 0.8
+            elif cls.ANALYTICS.search(message_lower):
+                yield "analytics", 0.85
+        elif cls.ANALYTICS.search(message_lower):
+            yield "analytics", 0.85
+
+        if any(p.search(message_lower) for p in cls.ALERTS):
+            yield "notification", 0.85
+
+        if any(p.search(message_lower) for p in cls.CONVERSATION):
+            yield "conversation", 0.9
+
+        if cls.EXTRACTION.search(message_lower):
+            yield "extraction", 0.85
+
+        if any(p.search(message_lower) for p in cls.QUERY):
+            yield "query", 0.8
+        elif cls._mentions_inventory_wine(message_lower, wine_names) and not has_verb:
+            # Solo nome vino in inventario ("Barolo 2018?") -> ricerca
+            yield "query", 0.75
+
+    @classmethod
+    def classify(cls, message: str, wine_names: Optional[Iterable[str]] = None) -> Tuple[str, float]:
+        """
+        Classifica il messaggio.
+
+        Args:
+            message: Messaggio utente
+            wine_names: Nomi vini in inventario (opzionale, migliora il riconoscimento del vino specifico)
+
+        Returns:
+            (nome agent, confidence 0-1)
+        """
+        if not message or not message.strip():
+            return "query", cls.DEFAULT_CONFIDENCE
+
+        message_clean = re.sub(r"\s+", " ", message.strip())
+        if wine_names is not None:
+            wine_names = list(wine_names)
+        candidates = list(cls._candidates(message_clean, wine_names))
+        if not candidates:
+            return "query", cls.DEFAULT_CONFIDENCE
+
+        agent_name, confidence = candidates[0]
+        # Categorie diverse a priorità inferiore (escluse le query generiche) indicano ambiguità
+        competing = {name for name, _ in candidates[1:] if name not in (agent_name, "query")}
+        if competing and agent_name not in ("movement", "multi_movement"):
+            confidence -= cls.AMBIGUITY_PENALTY
+
+        return agent_name, round(confidence, 2)
@@ -6,7 +6,11 @@ from datetime import datetime, timedelta, date, timezone
 from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy import text as sql_text
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import AsyncSessionLocal, db_manager
+from app.core.database import db_session, db_manager
+from app.core.movements_ledger import DATE_PREFIX_RE, INTEGER_RE, history_int_field, movements_ledger
+from app.core.stock_trajectories import stock_trajectories
+from app.core.table_catalog import table_catalog
+from app.core.tenant_tables import STORICO_VINO, tenant_table
 import json
 
 logger = logging.getLogger(__name__)
@@ -71,6 +75,185 @@ def parse_period(period_str: str) -> Tuple[Optional[date], Optional[date], str]:
     return (None, None, period_str)
 
 
+def filter_history_movements(
+    storico_rows: List[Any],
+    start_date: date,
+    end_date: date
+) -> Tuple[List[Dict[str, Any]], int, int]:
+    """
+    Filtra i movimenti del periodo leggendo le history JSON di tutte le righe di
+    Storico vino (percorso usato quando il registro movimenti non è disponibile).
+    
+    Args:
+        storico_rows: Righe (wine_name, current_stock, history, ...)
+        start_date: Data inizio periodo
+        end_date: Data fine periodo
+    
+    Returns:
+        (wines_with_movements, total_consumi, total_rifornimenti)
+    """
+    # Filtra movimenti nel periodo
+    wines_with_movements = []
+    total_consumi = 0
+    total_rifornimenti = 0
+    
+    for row in storico_rows:
+        wine_name = row[0]
+        current_stock = row[1] or 0
+        history_json = row[2]
+        
+        if not history_json:
+            continue
+        
+        try:
+            history = json.loads(history_json) if isinstance(history_json, str) else history_json
+            if not isinstance(history, list):
+                continue
+            
+            # Filtra movimenti nel periodo
+            period_movements = []
+            wine_consumi = 0
+            wine_rifornimenti = 0
+            
+            logger.debug(f"[MOVEMENTS] Analizzando {len(history)} movimenti per vino {wine_name}")
+            
+            for movement in history:
+                if not isinstance(movement, dict):
+                    continue
+                
+                movement_date_str = movement.get("date")
+                if not movement_date_str:
+                    continue
+                
+                try:
+                    # Parse data movimento (formato ISO: 2025-01-23T10:30:00.123456 o 2025-01-23)
+                    movement_date = None
+                    
+                    # Prova formato ISO completo (con T e orario)
+                    if "T" in movement_date_str:
+                        # Estrai solo la parte data (prima della T)
+                        date_part = movement_date_str.split("T")[0]
+                        movement_date = datetime.strptime(date_part, "%Y-%m-%d").date()
+                    # Prova formato con spazio (es: "2025-01-23 10:30:00")
+                    elif " " in movement_date_str:
+                        movement_date = datetime.strptime(movement_date_str.split()[0], "%Y-%m-%d").date()
+                    # Prova formato semplice YYYY-MM-DD
+                    else:
+                        movement_date = datetime.strptime(movement_date_str, "%Y-%m-%d").date()
+                    
+                    if movement_date is None:
+                        logger.debug(f"[MOVEMENTS] Impossibile parsare data: {movement_date_str}")
+                        continue
+                    
+                    # Verifica se è nel periodo
+                    if start_date <= movement_date <= end_date:
+                        logger.debug(f"[MOVEMENTS] Movimento nel periodo: vino={wine_name}, data={movement_date}, tipo={movement.get('type')}, qty={movement.get('quantity')}")
+                        period_movements.append(movement)
+                        movement_type = movement.get("type", "").lower()
+                        quantity = abs(int(movement.get("quantity", 0)))
+                        
+                        if "consumo" in movement_type or "consum" in movement_type:
+                            wine_consumi += quantity
+                            total_consumi += quantity
+                        elif "rifornimento" in movement_type or "riforn" in movement_type:
+                            wine_rifornimenti += quantity
+                            total_rifornimenti += quantity
+                    else:
+                        logger.debug(f"[MOVEMENTS] Movimento FUORI periodo: vino={wine_name}, data={movement_date} (periodo: {start_date} - {end_date})")
+                except Exception as e:
+                    logger.warning(f"[MOVEMENTS] Errore parsing data movimento '{movement_date_str}': {e}")
+                    continue
+            
+            if period_movements:
+                wines_with_movements.append({
+                    "wine_name": wine_name,
+                    "current_stock": current_stock,
+                    "movements": period_movements,
+                    "total_consumi": wine_consumi,
+                    "total_rifornimenti": wine_rifornimenti
+                })
+        
+        except Exception as e:
+            logger.warning(f"[MOVEMENTS] Errore parsing history per {wine_name}: {e}")
+            continue
+    
+    return wines_with_movements, total_consumi, total_rifornimenti
+
+
+async def pushdown_period_movements(
+    session: AsyncSession,
+    user_id: int,
+    table_storico: str,
+    start_date: date,
+    end_date: date
+) -> Optional[Tuple[List[Dict[str, Any]], int, int]]:
+    """
+    Filtra i movimenti del periodo direttamente in Postgres: le history vengono
+    scompattate con jsonb_array_elements e filtrate sul prefisso data, i totali
+    per vino calcolati con SUM ... FILTER. Al client arrivano solo i movimenti
+    del periodo, non le history complete.
+    
+    Stesse regole di filter_history_movements (voci senza data valida scartate,
+    tipo con "consum"/"riforn", quantità in valore assoluto).
+    
+    Returns:
+        (wines_with_movements, total_consumi, total_rifornimenti), oppure None se
+        la query fallisce (es. history TEXT con JSON non valido)
+    """
+    try:
+        async with session.begin_nested():
+            result = await session.execute(sql_text(f"""
+                SELECT s.wine_name, s.current_stock, p.movements, p.consumi, p.rifornimenti
+                FROM {table_storico} s
+                CROSS JOIN LATERAL (
+                    SELECT
+                        jsonb_agg(e.value ORDER BY e.ord) AS movements,
+                        COALESCE(SUM(m.quantity) FILTER (WHERE strpos(m.movement_type, 'consum') > 0), 0) AS consumi,
+                        COALESCE(SUM(m.quantity) FILTER (
+                            WHERE strpos(m.movement_type, 'consum') = 0 AND strpos(m.movement_type, 'riforn') > 0
+                        ), 0) AS rifornimenti
+                    FROM jsonb_array_elements(
+                        CASE WHEN jsonb_typeof(s.history::jsonb) = 'array' THEN s.history::jsonb ELSE '[]'::jsonb END
+                    ) WITH ORDINALITY AS e(value, ord)
+                    CROSS JOIN LATERAL (
+                        SELECT
+                            lower(COALESCE(e.value->>'type', '')) AS movement_type,
+                            abs(COALESCE({history_int_field('quantity')}, 0)) AS quantity
+                    ) m
+                    WHERE jsonb_typeof(e.value) = 'object'
+                      AND e.value->>'date' ~ :date_re
+                      AND substr(e.value->>'date', 1, 10) BETWEEN :start AND :end
+                ) p
+                WHERE s.user_id = :user_id AND p.movements IS NOT NULL
+            """), {
+                "user_id": user_id,
+                "date_re": DATE_PREFIX_RE,
+                "int_re": INTEGER_RE,
+                "start": start_date.isoformat(),
+                "end": end_date.isoformat(),
+            })
+            rows = result.fetchall()
+    except Exception as e:
+        logger.warning(f"[MOVEMENTS] Push-down SQL non riuscito per user_id={user_id}, filtro in Python: {e}")
+        return None
+    
+    wines_with_movements = []
+    total_consumi = 0
+    total_rifornimenti = 0
+    for wine_name, current_stock, movements, wine_consumi, wine_rifornimenti in rows:
+        wines_with_movements.append({
+            "wine_name": wine_name,
+            "current_stock": current_stock or 0,
+            "movements": json.loads(movements) if isinstance(movements, str) else movements,
+            "total_consumi": int(wine_consumi),
+            "total_rifornimenti": int(wine_rifornimenti)
+        })
+        total_consumi += int(wine_consumi)
+        total_rifornimenti += int(wine_rifornimenti)
+    
+    return wines_with_movements, total_consumi, total_rifornimenti
+
+
 async def get_movements_for_period(
     user_id: int,
     start_date: date,
@@ -104,22 +287,14 @@ async def get_movements_for_period(
                 "period_description": period_description
             }
         
-        table_storico = f'"{user_id}/{user.business_name} Storico vino"'
+        table_storico = tenant_table(user_id, user.business_name, STORICO_VINO)
         
         logger.info(f"[MOVEMENTS] Recupero movimenti per user_id={user_id}, periodo={period_description} ({start_date} - {end_date}), tabella={table_storico}")
         
-        async with AsyncSessionLocal() as session:
+        async with db_session() as session:
             # Verifica che la tabella esista
             table_name_check = table_storico.strip('"')
-            check_table_query = sql_text("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = :table_name
-                )
-            """)
-            result = await session.execute(check_table_query, {"table_name": table_name_check})
-            table_exists = result.scalar()
+            table_exists = await table_catalog.table_exists(session, table_name_check)
             
             if not table_exists:
                 logger.warning(f"[MOVEMENTS] Tabella Storico vino non esiste per user_id={user_id}, table_name={table_name_check}")
@@ -132,115 +307,57 @@ async def get_movements_for_period(
             
             logger.info(f"[MOVEMENTS] Tabella {table_name_check} trovata, recupero dati...")
             
-            # Recupera tutti i vini
-            query_storico = sql_text(f"""
-                SELECT 
-                    wine_name,
-                    current_stock,
-                    history,
-                    total_consumi,
-                    total_rifornimenti
-                FROM {table_storico}
-                WHERE user_id = :user_id
-            """)
-            result = await session.execute(query_storico, {"user_id": user_id})
-            storico_rows = result.fetchall()
-            
-            logger.info(f"[MOVEMENTS] Recuperate {len(storico_rows)} righe dalla tabella Storico vino")
-            
-            if not storico_rows:
-                logger.info(f"[MOVEMENTS] Nessun vino nello storico per user_id={user_id}")
-                return {
-                    "wines_with_movements": [],
-                    "total_consumi": 0,
-                    "total_rifornimenti": 0,
-                    "period_description": period_description
-                }
-            
-            # Filtra movimenti nel periodo
-            wines_with_movements = []
-            total_consumi = 0
-            total_rifornimenti = 0
-            
-            for row in storico_rows:
-                wine_name = row[0]
-                current_stock = row[1] or 0
-                history_json = row[2]
+            # Registro movimenti indicizzato (range scan su user_id, ts)
+            ledger_result = await movements_ledger.period_movements(session, user_id, table_storico, start_date, end_date)
+            period_result = ledger_result
+            if period_result is None:
+                # Senza registro: filtro del periodo in SQL sulle history
+                period_result = await pushdown_period_movements(session, user_id, table_storico, start_date, end_date)
+            if period_result is not None:
+                wines_with_movements, total_consumi, total_rifornimenti = period_result
+            else:
+                # Recupera tutti i vini
+                query_storico = sql_text(f"""
+                    SELECT 
+                        wine_name,
+                        current_stock,
+                        history,
+                        total_consumi,
+                        total_rifornimenti
+                    FROM {table_storico}
+                    WHERE user_id = :user_id
+                """)
+                result = await session.execute(query_storico, {"user_id": user_id})
+                storico_rows = result.fetchall()
                 
-                if not history_json:
-                    continue
+                logger.info(f"[MOVEMENTS] Recuperate {len(storico_rows)} righe dalla tabella Storico vino")
                 
-                try:
-                    history = json.loads(history_json) if isinstance(history_json, str) else history_json
-                    if not isinstance(history, list):
-                        continue
-                    
-                    # Filtra movimenti nel periodo
-                    period_movements = []
-                    wine_consumi = 0
-                    wine_rifornimenti = 0
-                    
-                    logger.debug(f"[MOVEMENTS] Analizzando {len(history)} movimenti per vino {wine_name}")
-                    
-                    for movement in history:
-                        if not isinstance(movement, dict):
-                            continue
-                        
-                        movement_date_str = movement.get("date")
-                        if not movement_date_str:
-                            continue
-                        
-                        try:
-                            # Parse data movimento (formato ISO: 2025-01-23T10:30:00.123456 o 2025-01-23)
-                            movement_date = None
-                            
-                            # Prova formato ISO completo (con T e orario)
-                            if "T" in movement_date_str:
-                                # Estrai solo la parte data (prima della T)
-                                date_part = movement_date_str.split("T")[0]
-                                movement_date = datetime.strptime(date_part, "%Y-%m-%d").date()
-                            # Prova formato con spazio (es: "2025-01-23 10:30:00")
-                            elif " " in movement_date_str:
-                                movement_date = datetime.strptime(movement_date_str.split()[0], "%Y-%m-%d").date()
-                            # Prova formato semplice YYYY-MM-DD
-                            else:
-                                movement_date = datetime.strptime(movement_date_str, "%Y-%m-%d").date()
-                            
-                            if movement_date is None:
-                                logger.debug(f"[MOVEMENTS] Impossibile parsare data: {movement_date_str}")
-                                continue
-                            
-                            # Verifica se è nel periodo
-                            if start_date <= movement_date <= end_date:
-                                logger.debug(f"[MOVEMENTS] Movimento nel periodo: vino={wine_name}, data={movement_date}, tipo={movement.get('type')}, qty={movement.get('quantity')}")
-                                period_movements.append(movement)
-                                movement_type = movement.get("type", "").lower()
-                                quantity = abs(int(movement.get("quantity", 0)))
-                                
-                                if "consumo" in movement_type or "consum" in movement_type:
-                                    wine_consumi += quantity
-                                    total_consumi += quantity
-                                elif "rifornimento" in movement_type or "riforn" in movement_type:
-                                    wine_rifornimenti += quantity
-                                    total_rifornimenti += quantity
-                            else:
-                                logger.debug(f"[MOVEMENTS] Movimento FUORI periodo: vino={wine_name}, data={movement_date} (periodo: {start_date} - {end_date})")
-                        except Exception as e:
-                            logger.warning(f"[MOVEMENTS] Errore parsing data movimento '{movement_date_str}': {e}")
-                            continue
-                    
-                    if period_movements:
-                        wines_with_movements.append({
-                            "wine_name": wine_name,
-                            "current_stock": current_stock,
-                            "movements": period_movements,
-                            "total_consumi": wine_consumi,
-                            "total_rifornimenti": wine_rifornimenti
-                        })
+                if not storico_rows:
+                    logger.info(f"[MOVEMENTS] Nessun vino nello storico per user_id={user_id}")
+                    return {
+                        "wines_with_movements": [],
+                        "total_consumi": 0,
+                        "total_rifornimenti": 0,
+                        "period_description": period_description
+                    }
                 
-                except Exception as e:
-                    logger.warning(f"[MOVEMENTS] Errore parsing history per {wine_name}: {e}")
-                    continue
+                wines_with_movements, total_consumi, total_rifornimenti = filter_history_movements(
+                    storico_rows, start_date, end_date
+                )
+            
+            if ledger_result is not None and wines_with_movements:
+                # Stock a inizio/fine periodo di tutti i vini in un passaggio (bucket mensile: servono solo gli estremi)
+                batch = await stock_trajectories.trajectories(
+                    session, user_id, table_storico,
+                    [wine["wine_name"] for wine in wines_with_movements], start_date, end_date, "month"
+                )
+                if batch is not None:
+                    trajectories = {wine["wine_name"]: wine for wine in batch["wines"]}
+                    for wine in wines_with_movements:
+                        trajectory = trajectories.get(wine["wine_name"])
+                        if trajectory:
+                            wine["opening_stock"] = trajectory["opening_stock"]
+                            wine["closing_stock"] = trajectory["closing_stock"]
             
             logger.info(f"[MOVEMENTS] Trovati {len(wines_with_movements)} vini con movimenti nel periodo {period_description}")
             return {
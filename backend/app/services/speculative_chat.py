@@ -0,0 +1,233 @@
+"""
+Esecuzione speculativa V1/V2 per il sistema ibrido.
+
+Per i messaggi che RequestComplexityAnalyzer giudica complessi, V2 parte in
+parallelo a V1 invece di aspettare che V1 fallisca. V2 completa la risposta
+in anticipo solo se il routing porta a un agent di sola lettura; per gli agent
+che scrivono (movimenti, gestione vini) anticipa solo il routing, così V1 e V2
+non possono registrare due volte lo stesso movimento.
+
+Vince la prima risposta accettabile, l'altro ramo viene cancellato. V1 però
+registra movimenti tramite function calling: una volta entrato nell'esecuzione
+dei tool (mark_side_effects) non viene più cancellato, si attende la sua
+risposta (che conferma la scrittura all'utente) e quella di V2 è scartata.
+Tempi per ramo e token sprecati finiscono nei metadata della risposta e in
+`speculation_stats`.
+"""
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from .response_validator import ResponseValidator
+from .token_meter import start_token_meter
+
+logger = logging.getLogger(__name__)
+
+# Agent V2 che non modificano l'inventario: possono completare in parallelo a V1
+READ_ONLY_AGENTS = {"query", "analytics", "report", "notification", "conversation"}
+
+
+class SpeculationStats:
+    """Contatori process-wide dell'esecuzione speculativa"""
+
+    def __init__(self):
+        self.runs = 0
+        self.v1_wins = 0
+        self.v2_wins = 0
+        self.route_only = 0
+        self.v2_discarded = 0
+        self.wasted_tokens = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "v1_wins": self.v1_wins,
+            "v2_wins": self.v2_wins,
+            "route_only": self.route_only,
+            "v2_discarded": self.v2_discarded,
+            "wasted_tokens": self.wasted_tokens,
+        }
+
+
+speculation_stats = SpeculationStats()
+
+_current_branch: ContextVar[Optional["_Branch"]] = ContextVar("speculative_branch", default=None)
+
+
+def mark_side_effects() -> None:
+    """
+    Da chiamare prima di eseguire operazioni che possono scrivere (tool di V1):
+    il ramo speculativo corrente non verrà più cancellato. No-op fuori da
+    un'esecuzione speculativa.
+    """
+    branch = _current_branch.get()
+    if branch is not None:
+        branch.side_effects = True
+
+
+class _Branch:
+    """Un ramo speculativo: task, token consumati e durata"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.meter = None
+        self.started_at = time.perf_counter()
+        self.elapsed_ms: Optional[float] = None
+        self.cancelled = False
+        # Il ramo ha iniziato operazioni con effetti (mark_side_effects): non va cancellato
+        self.side_effects = False
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self, coro_factory) -> "_Branch":
+        self.task = asyncio.create_task(self._run(coro_factory))
+        return self
+
+    async def _run(self, coro_factory):
+        # Meter e ramo vivono nel contesto del task: contano solo le chiamate di questo ramo
+        self.meter = start_token_meter()
+        _current_branch.set(self)
+        try:
+            return await coro_factory()
+        finally:
+            self.elapsed_ms = round((time.perf_counter() - self.started_at) * 1000, 1)
+
+    async def cancel(self) -> None:
+        if self.side_effects:
+            # Tool in esecuzione: interromperlo lascerebbe scritture a metà o non confermate
+            return
+        if self.task is not None and not self.task.done():
+            self.cancelled = True
+            self.task.cancel()
+            try:
+                await self.task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    @property
+    def tokens(self) -> int:
+        return self.meter.total_tokens if self.meter is not None else 0
+
+
+async def process_speculative(
+    ai_service_v1,
+    ai_service_v2,
+    user_message: str,
+    user_id: int,
+    conversation_history: Optional[list] = None,
+    conversation_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Esegue V1 e V2 in parallelo e ritorna la prima risposta accettabile.
+
+    Returns:
+        Dict risposta (formato process_message) con metadata["speculation"]
+    """
+
+    async def run_v2():
+        try:
+            route = await ai_service_v2.route(user_message, user_id)
+        except Exception as e:
+            logger.warning(f"[SPECULATIVE] Routing V2 fallito, rinvio a dopo V1: {e}")
+            return None, None
+        agent_name = ai_service_v2._validate_and_normalize_agent(route[0], user_message)
+        if agent_name not in READ_ONLY_AGENTS:
+            # Agent che scrive: non anticipare l'esecuzione, solo il routing
+            return route, None
+        result = await ai_service_v2.process_message(
+            user_message=user_message,
+            user_id=user_id,
+            conversation_history=conversation_history,
+            conversation_id=conversation_id,
+            precomputed_route=route
+        )
+        return route, result
+
+    speculation_stats.runs += 1
+    v1 = _Branch("v1").start(lambda: ai_service_v1.process_message(
+        user_message=user_message,
+        user_id=user_id,
+        conversation_history=conversation_history
+    ))
+    v2 = _Branch("v2").start(run_v2)
+
+    try:
+        winner, loser = None, None
+        result = None
+        v2_mode = "full"
+
+        done, _ = await asyncio.wait({v1.task, v2.task}, return_when=asyncio.FIRST_COMPLETED)
+        if v2.task in done and v1.task not in done:
+            route, v2_result = v2.task.result()
+            if v2_result is not None and ResponseValidator.is_response_valid(v2_result):
+                if v1.side_effects:
+                    # V1 sta eseguendo tool che scrivono: vale la sua risposta, V2 viene scartato
+                    logger.info("[SPECULATIVE] V2 pronto ma V1 sta eseguendo tool, attendo V1")
+                    speculation_stats.v2_discarded += 1
+                else:
+                    winner, loser, result = v2, v1, v2_result
+
+        if winner is None:
+            v1_result = await v1.task
+            if not ResponseValidator.should_fallback_to_v2(v1_result):
+                winner, loser, result = v1, v2, v1_result
+            else:
+                logger.info("[SPECULATIVE] ⚠️ Risposta V1 non soddisfacente, uso V2")
+                route, v2_result = await v2.task
+                if v2_result is None:
+                    # V2 aveva anticipato solo il routing (o è fallito): esegue ora l'agent
+                    v2_mode = "route_only" if route else "sequential"
+                    v2_result = await ai_service_v2.process_message(
+                        user_message=user_message,
+                        user_id=user_id,
+                        conversation_history=conversation_history,
+                        conversation_id=conversation_id,
+                        precomputed_route=route
+                    )
+                winner, loser, result = v2, v1, v2_result
+    except asyncio.CancelledError:
+        # Richiesta annullata dal client: non lasciare rami (e run OpenAI) attivi
+        # (V1 con tool già in esecuzione completa in background)
+        await v1.cancel()
+        await v2.cancel()
+        raise
+
+    await loser.cancel()
+    if v2.cancelled:
+        v2_mode = "cancelled"
+    elif v2_mode == "full" and v2.task.exception() is None and v2.task.result()[1] is None:
+        v2_mode = "route_only"
+    if v2_mode == "route_only":
+        speculation_stats.route_only += 1
+
+    # Token del ramo perdente = token sprecati (limite inferiore: le chiamate
+    # interrotte dalla cancellazione non riportano usage)
+    wasted = loser.tokens
+    if winner is v1:
+        speculation_stats.v1_wins += 1
+    else:
+        speculation_stats.v2_wins += 1
+    speculation_stats.wasted_tokens += wasted
+
+    speculation = {
+        "winner": winner.name,
+        "v1_ms": v1.elapsed_ms,
+        "v2_ms": v2.elapsed_ms,
+        "v1_tokens": v1.tokens,
+        "v2_tokens": v2.tokens,
+        "wasted_tokens": wasted,
+        "cancelled": loser.name if loser.cancelled else None,
+        "v2_mode": v2_mode,
+        "v1_side_effects": v1.side_effects,
+    }
+    logger.info(
+        f"[SPECULATIVE] Vince {winner.name}: v1={v1.elapsed_ms}ms ({v1.tokens} tok) "
+        f"v2={v2.elapsed_ms}ms ({v2.tokens} tok, {v2_mode}) sprecati={wasted} tok"
+    )
+
+    if isinstance(result, dict):
+        metadata = result.get("metadata") or {}
+        metadata["speculation"] = speculation
+        result["metadata"] = metadata
+    return result
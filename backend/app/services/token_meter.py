@@ -0,0 +1,52 @@
+"""
+Contatore token per ramo di esecuzione.
+
+Un TokenMeter viene attivato in un contextvar: le chiamate OpenAI fatte nello
+stesso task (e nei task figli) registrano lì il proprio `usage`. Serve a
+misurare il costo di ogni ramo dell'esecuzione speculativa V1/V2.
+"""
+from contextvars import ContextVar
+from typing import Any, Optional
+
+
+class TokenMeter:
+    """Somma prompt/completion token delle chiamate registrate"""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, usage: Any) -> None:
+        self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+        self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+        self.calls += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "calls": self.calls,
+        }
+
+
+_current_meter: ContextVar[Optional[TokenMeter]] = ContextVar("token_meter", default=None)
+
+
+def start_token_meter() -> TokenMeter:
+    """Attiva un nuovo TokenMeter nel contesto corrente e lo ritorna"""
+    meter = TokenMeter()
+    _current_meter.set(meter)
+    return meter
+
+
+def record_usage(usage: Any) -> None:
+    """Registra l'usage di una risposta OpenAI nel meter attivo (no-op se assente)"""
+    meter = _current_meter.get()
+    if meter is not None and usage is not None:
+        meter.add(usage)
@@ -0,0 +1,75 @@
+"""
+Popola il registro movimenti (wine_movements) dalle history di "Storico vino".
+
+Il registro si allinea comunque da solo alla prima lettura di ogni tenant: lo
+script evita che quella prima lettura paghi la ricostruzione completa sui tenant
+con storici lunghi. È ripetibile (sincronizzazione incrementale).
+
+Uso:
+    python scripts/backfill_movements_ledger.py [--user-id 12 ...] [--rebuild]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import text as sql_text  # noqa: E402
+
+from app.core.database import AsyncSessionLocal, engine  # noqa: E402
+from app.core.movements_ledger import migrate_movements_ledger_tables, movements_ledger  # noqa: E402
+from app.core.movements_rollup import migrate_movements_rollup_table  # noqa: E402
+from app.core.tenant_tables import STORICO_VINO, tenant_table, tenant_tables  # noqa: E402
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Backfill registro movimenti")
+    parser.add_argument("--user-id", type=int, action="append", dest="user_ids",
+                        help="Limita ai tenant indicati (ripetibile)")
+    parser.add_argument("--rebuild", action="store_true", help="Ricostruisce da zero il registro dei tenant")
+    args = parser.parse_args()
+
+    async with AsyncSessionLocal() as session:
+        await migrate_movements_ledger_tables(session)
+        await migrate_movements_rollup_table(session)
+        await session.commit()
+        if tenant_tables.enabled:
+            await tenant_tables.refresh(session)
+        query = """
+            SELECT id, business_name FROM users
+            WHERE business_name IS NOT NULL AND business_name != ''
+        """
+        params = {}
+        if args.user_ids:
+            query += " AND id = ANY(:user_ids)"
+            params["user_ids"] = args.user_ids
+        tenants = (await session.execute(sql_text(query + " ORDER BY id"), params)).fetchall()
+
+    synced = 0
+    try:
+        for user_id, business_name in tenants:
+            if args.rebuild:
+                movements_ledger.invalidate_tenant(user_id)
+            start = time.perf_counter()
+            async with AsyncSessionLocal() as session:
+                ok = await movements_ledger.ensure_synced(
+                    session, user_id, tenant_table(user_id, business_name, STORICO_VINO)
+                )
+                count = (await session.execute(
+                    sql_text("SELECT COUNT(*) FROM wine_movements WHERE user_id = :user_id"), {"user_id": user_id}
+                )).scalar()
+            elapsed = time.perf_counter() - start
+            if ok:
+                synced += 1
+                print(f"✅ user_id={user_id}: {count} movimenti ({elapsed:.2f}s)")
+            else:
+                print(f"⚠️  user_id={user_id}: registro non disponibile (Storico vino assente o history non valide)")
+    finally:
+        await engine.dispose()
+    print(f"Tenant sincronizzati: {synced}/{len(tenants)} ({movements_ledger.stats()})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
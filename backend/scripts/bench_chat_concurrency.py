@@ -0,0 +1,85 @@
+"""
+Benchmark concorrenza: verifica che l'event loop resti libero durante le chiamate LLM.
+
+Lancia N richieste /api/chat/message in parallelo e, mentre sono in corso,
+misura la latenza di /health e /api/viewer/snapshot. Con il client AsyncOpenAI
+le latenze devono restare piatte rispetto alla baseline a riposo.
+
+Uso:
+    BENCH_BASE_URL=http://localhost:8000 BENCH_TOKEN=<jwt> python scripts/bench_chat_concurrency.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+BASE_URL = os.getenv("BENCH_BASE_URL", "http://localhost:8000").rstrip("/")
+TOKEN = os.getenv("BENCH_TOKEN", "")
+CHAT_REQUESTS = int(os.getenv("BENCH_CHAT_REQUESTS", "20"))
+PROBE_INTERVAL = float(os.getenv("BENCH_PROBE_INTERVAL", "0.2"))
+CHAT_MESSAGE = os.getenv("BENCH_CHAT_MESSAGE", "Quali vini rossi ho in cantina?")
+
+
+def _summary(samples: list[float]) -> str:
+    if not samples:
+        return "n/a"
+    ordered = sorted(samples)
+    p50 = statistics.median(ordered)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"n={len(ordered)} p50={p50 * 1000:.1f}ms p95={p95 * 1000:.1f}ms max={ordered[-1] * 1000:.1f}ms"
+
+
+async def _probe(client: httpx.AsyncClient, path: str, stop: asyncio.Event, samples: list[float]):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get(path)
+        samples.append(time.perf_counter() - start)
+        await asyncio.sleep(PROBE_INTERVAL)
+
+
+async def _measure_probes(client: httpx.AsyncClient, duration: float) -> dict[str, list[float]]:
+    stop = asyncio.Event()
+    samples = {"/health": [], "/api/viewer/snapshot": []}
+    tasks = [asyncio.create_task(_probe(client, path, stop, s)) for path, s in samples.items()]
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return samples
+
+
+async def main():
+    if not TOKEN:
+        print("❌ BENCH_TOKEN mancante (JWT utente di test)")
+        sys.exit(1)
+
+    headers = {"Authorization": f"Bearer {TOKEN}"}
+    async with httpx.AsyncClient(base_url=BASE_URL, headers=headers, timeout=120.0) as client:
+        print("📏 Baseline (nessuna chat in corso)...")
+        baseline = await _measure_probes(client, duration=3.0)
+
+        print(f"🔥 Avvio {CHAT_REQUESTS} richieste chat concorrenti...")
+        stop = asyncio.Event()
+        loaded = {"/health": [], "/api/viewer/snapshot": []}
+        probes = [asyncio.create_task(_probe(client, path, stop, s)) for path, s in loaded.items()]
+
+        chat_start = time.perf_counter()
+        chats = await asyncio.gather(
+            *[client.post("/api/chat/message", json={"message": CHAT_MESSAGE}) for _ in range(CHAT_REQUESTS)],
+            return_exceptions=True
+        )
+        chat_elapsed = time.perf_counter() - chat_start
+        stop.set()
+        await asyncio.gather(*probes)
+
+    ok = sum(1 for r in chats if isinstance(r, httpx.Response) and r.status_code == 200)
+    print(f"\nChat completate: {ok}/{CHAT_REQUESTS} in {chat_elapsed:.1f}s")
+    for path in baseline:
+        print(f"{path:24} baseline: {_summary(baseline[path])}")
+        print(f"{path:24} sotto carico: {_summary(loaded[path])}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+Benchmark pool DB: acquisizioni di connessione per turno chat, con e senza RequestContext.
+
+Simula le letture/scritture DB di un turno chat (auth, log messaggi, storia,
+inventario, ricerca, movimenti) e conta i checkout dal pool SQLAlchemy. Poi
+lancia BENCH_CONCURRENCY turni concorrenti per mostrare la saturazione del pool
+(picco connessioni in uso e durata complessiva).
+
+Uso:
+    BENCH_USER_ID=<id utente con inventario> python scripts/bench_db_acquisitions.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import event  # noqa: E402
+
+from app.core.database import db_manager, engine  # noqa: E402
+from app.core.inventory_cache import inventory_cache  # noqa: E402
+from app.core.request_context import RequestContext, _current_request, bind_request_user  # noqa: E402
+from app.services.movements_service import get_movements_for_period, parse_period  # noqa: E402
+
+USER_ID = int(os.getenv("BENCH_USER_ID", "0"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "30"))
+TURNS = int(os.getenv("BENCH_TURNS", "5"))
+
+
+class PoolCounter:
+    def __init__(self):
+        self.checkouts = 0
+        self.in_use = 0
+        self.peak = 0
+
+    def on_checkout(self, *args):
+        self.checkouts += 1
+        self.in_use += 1
+        self.peak = max(self.peak, self.in_use)
+
+    def on_checkin(self, *args):
+        self.in_use -= 1
+
+    def reset(self):
+        self.checkouts = 0
+        self.peak = self.in_use
+
+
+counter = PoolCounter()
+event.listen(engine.sync_engine.pool, "checkout", counter.on_checkout)
+event.listen(engine.sync_engine.pool, "checkin", counter.on_checkin)
+
+
+async def chat_turn():
+    """Sequenza di chiamate DB tipica di un turno chat (V1, ricerca + movimenti)"""
+    inventory_cache.invalidate(USER_ID)  # confronto equo: nessun hit di cache inventario
+    user = await db_manager.get_user_by_id(USER_ID)  # get_current_user
+    bind_request_user(user)
+    await db_manager.get_recent_chat_messages(USER_ID, limit=10)
+    await db_manager.get_user_by_id(USER_ID)
+    await db_manager.get_user_wines(USER_ID)
+    await db_manager.search_wines(USER_ID, "rosso", limit=5)
+    await get_movements_for_period(USER_ID, *parse_period("ultimi 7 giorni"))
+    await db_manager.get_user_by_id(USER_ID)
+
+
+async def run_turn(with_context: bool):
+    if not with_context:
+        await chat_turn()
+        return
+    ctx = RequestContext()
+    token = _current_request.set(ctx)
+    try:
+        await chat_turn()
+    finally:
+        await ctx.close()
+        _current_request.reset(token)
+
+
+async def measure(with_context: bool):
+    label = "con RequestContext" if with_context else "senza contesto"
+
+    per_turn = []
+    for _ in range(TURNS):
+        counter.reset()
+        await run_turn(with_context)
+        per_turn.append(counter.checkouts)
+
+    counter.reset()
+    start = time.perf_counter()
+    await asyncio.gather(*[run_turn(with_context) for _ in range(CONCURRENCY)])
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{label:20} acquisizioni/turno p50={statistics.median(per_turn):.0f} | "
+        f"{CONCURRENCY} turni concorrenti: {counter.checkouts} acquisizioni, "
+        f"picco connessioni={counter.peak}/{engine.pool.size()}, durata={elapsed * 1000:.0f}ms"
+    )
+
+
+async def main():
+    if not USER_ID:
+        print("❌ BENCH_USER_ID mancante")
+        sys.exit(1)
+    await measure(with_context=False)
+    await measure(with_context=True)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,164 @@
+"""
+Benchmark routing: accuratezza e latenza del router locale su messaggi etichettati.
+
+Per ogni messaggio del set confronta l'agent scelto da LocalIntentRouter con
+l'etichetta attesa e misura la latenza, nelle due configurazioni di
+AIServiceV2.route: con i nomi dei vini dell'inventario del tenant e senza
+(inventario vuoto o non leggibile, chiamate senza user_id). Con BENCH_WITH_LLM=1 (OPENAI_API_KEY e
+DATABASE_URL configurati) misura anche il RouterAgent LLM sullo stesso set.
+
+Uso:
+    python scripts/bench_intent_router.py
+    BENCH_WITH_LLM=1 python scripts/bench_intent_router.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.intent_router import LocalIntentRouter  # noqa: E402
+
+WITH_LLM = os.getenv("BENCH_WITH_LLM", "0") == "1"
+REPEAT = int(os.getenv("BENCH_ROUTER_REPEAT", "200"))
+
+# Nomi vini di esempio (simulano l'inventario dell'utente, passato da route() al router)
+WINE_NAMES = ["Barolo", "Chianti Classico", "Brunello di Montalcino", "Amarone", "Costa Marina", "Vermentino"]
+
+LABELLED = [
+    ("ho venduto 3 Barolo", "movement"),
+    ("consumato 2 Chianti", "movement"),
+    ("ho caricato 3 bottiglie di Costa Marina", "movement"),
+    ("ho ricevuto 12 bottiglie di Vermentino", "movement"),
+    ("scarico 1 Amarone", "movement"),
+    ("registra consumo 4 Brunello", "movement"),
+    ("ho bevuto 1 bottiglia di Barolo ieri sera", "movement"),
+    ("ho venduto 3 Barolo e 2 Chianti", "multi_movement"),
+    ("ricevuto 10 Brunello, 5 Amarone e 3 Chianti", "multi_movement"),
+    ("ho consumato 2 Vermentino, 1 Barolo", "multi_movement"),
+    ("aggiungi vino Pinot Nero 2019", "wine_management"),
+    ("crea vino nuovo Lugana", "wine_management"),
+    ("modifica il prezzo del Barolo a 45 euro", "wine_management"),
+    ("elimina vino Chianti", "wine_management"),
+    ("nuovo vino: Etna Rosso 2020", "wine_management"),
+    ("statistiche del Barolo", "notification"),
+    ("andamento del Chianti Classico", "notification"),
+    ("grafico del Brunello", "notification"),
+    ("trend dell'Amarone", "notification"),
+    ("quali vini sono esauriti?", "notification"),
+    ("scorte basse", "notification"),
+    ("mandami un alert quando finisce il Vermentino", "notification"),
+    ("cerca Barolo", "query"),
+    ("trova vini rossi sotto 20 euro", "query"),
+    ("dimmi del Brunello", "query"),
+    ("info su Costa Marina", "query"),
+    ("mostrami tutti i vini", "query"),
+    ("lista vini", "query"),
+    ("quali vini ho in cantina?", "query"),
+    ("quante bottiglie ho di Amarone?", "query"),
+    ("confronta Barolo e Chianti", "query"),
+    ("statistiche inventario", "analytics"),
+    ("quanti vini ho in totale?", "analytics"),
+    ("analisi trend generale", "analytics"),
+    ("valore inventario", "analytics"),
+    ("report vendite", "report"),
+    ("report inventario completo", "report"),
+    ("riepilogo dettagliato del mese", "report"),
+    ("cosa abbiamo detto prima?", "conversation"),
+    ("di cosa stavamo parlando?", "conversation"),
+    ("riassumi la conversazione", "conversation"),
+    ("importa CSV", "extraction"),
+    ("carica file excel dell'inventario", "extraction"),
+    ("ho venduto 2 Barolo 2016 a 40 euro", "movement"),
+]
+
+# Domande con verbo di movimento, anni o periodi: mai "movement"/"multi_movement" sopra soglia
+READ_ONLY_WITH_MOVEMENT_VERB = [
+    "quante bottiglie ho acquistato nel 2023?",
+    "quanto ho venduto a marzo 2024?",
+    "quanti vini ho ricevuto negli ultimi 30 giorni?",
+    "mostrami il Barolo 2018 che ho comprato",
+    "quali vini ho venduto la settimana scorsa",
+    "dimmi quante casse di Amarone ho caricato",
+]
+
+
+def _percentiles(samples):
+    ordered = sorted(samples)
+    p50 = statistics.median(ordered)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return p50, p95
+
+
+def bench_local(threshold: float, wine_names, label: str):
+    correct = 0
+    confident = 0
+    confident_correct = 0
+    latencies = []
+    errors = []
+    for message, expected in LABELLED:
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            agent, confidence = LocalIntentRouter.classify(message, wine_names)
+            latencies.append(time.perf_counter() - start)
+        if agent == expected:
+            correct += 1
+        else:
+            errors.append((message, expected, agent, confidence))
+        if confidence >= threshold:
+            confident += 1
+            confident_correct += int(agent == expected)
+
+    total = len(LABELLED)
+    p50, p95 = _percentiles(latencies)
+    print(f"Router locale {label}: accuratezza {correct}/{total} ({correct / total:.0%})")
+    print(
+        f"  sopra soglia {threshold}: {confident}/{total} messaggi senza LLM, "
+        f"accuratezza {confident_correct}/{max(confident, 1)} ({confident_correct / max(confident, 1):.0%})"
+    )
+    print(f"  latenza p50={p50 * 1e6:.1f}µs p95={p95 * 1e6:.1f}µs")
+    for message, expected, agent, confidence in errors:
+        print(f"  ✗ '{message}': atteso {expected}, ottenuto {agent} ({confidence:.2f})")
+
+    misrouted = []
+    for message in READ_ONLY_WITH_MOVEMENT_VERB:
+        agent, confidence = LocalIntentRouter.classify(message, wine_names)
+        if agent in ("movement", "multi_movement") and confidence >= threshold:
+            misrouted.append((message, agent, confidence))
+    total_read_only = len(READ_ONLY_WITH_MOVEMENT_VERB)
+    print(f"Domande in sola lettura non instradate a movimenti: {total_read_only - len(misrouted)}/{total_read_only}")
+    for message, agent, confidence in misrouted:
+        print(f"  ✗ '{message}': instradato a {agent} ({confidence:.2f})")
+
+
+async def bench_llm():
+    from app.services.agents.router_agent import RouterAgent
+
+    router = RouterAgent()
+    correct = 0
+    latencies = []
+    for message, expected in LABELLED:
+        start = time.perf_counter()
+        agent = await router.route(message)
+        latencies.append(time.perf_counter() - start)
+        correct += int(agent == expected)
+
+    total = len(LABELLED)
+    p50, p95 = _percentiles(latencies)
+    print(f"RouterAgent LLM: accuratezza {correct}/{total} ({correct / total:.0%})")
+    print(f"  latenza p50={p50 * 1000:.0f}ms p95={p95 * 1000:.0f}ms")
+
+
+def main():
+    threshold = float(os.getenv("INTENT_ROUTER_CONFIDENCE_THRESHOLD", "0.75"))
+    bench_local(threshold, WINE_NAMES, "con inventario")
+    bench_local(threshold, None, "senza inventario")
+    if WITH_LLM:
+        asyncio.run(bench_llm())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark letture movimenti per periodo: history JSON di "Storico vino" vs registro wine_movements.
+
+Crea un tenant temporaneo con una tabella Storico vino di BENCH_WINES vini e
+BENCH_MOVEMENTS movimenti in totale (default 100.000) distribuiti sugli ultimi
+BENCH_DAYS giorni. Per i periodi oggi / 7 / 30 / 365 giorni misura:
+- history: lettura di tutte le history + filtro in Python (filter_history_movements);
+- ledger: totali dal rollup giornaliero + primi movimenti per vino
+  (movements_ledger.period_movements, inclusa la verifica del token di versione).
+Stampa anche il tempo del backfill iniziale. Tenant e tabella vengono eliminati alla fine.
+
+Uso:
+    python scripts/bench_movements_ledger.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import text as sql_text  # noqa: E402
+
+from app.core.database import AsyncSessionLocal, engine  # noqa: E402
+from app.core.movements_ledger import migrate_movements_ledger_tables, movements_ledger  # noqa: E402
+from app.core.movements_rollup import migrate_movements_rollup_table  # noqa: E402
+from app.services.movements_service import filter_history_movements  # noqa: E402
+
+WINES = int(os.getenv("BENCH_WINES", "200"))
+MOVEMENTS = int(os.getenv("BENCH_MOVEMENTS", "100000"))
+DAYS = int(os.getenv("BENCH_DAYS", "730"))
+REPEAT = int(os.getenv("BENCH_REPEAT", "10"))
+BUSINESS_NAME = "Bench Ledger"
+
+PERIODS = [("oggi", 0), ("7 giorni", 6), ("30 giorni", 29), ("365 giorni", 364)]
+
+
+async def create_tenant() -> tuple:
+    async with AsyncSessionLocal() as session:
+        await migrate_movements_ledger_tables(session)
+        await migrate_movements_rollup_table(session)
+        user_id = (await session.execute(sql_text("""
+            INSERT INTO users (username, business_name) VALUES ('bench_ledger', :business_name) RETURNING id
+        """), {"business_name": BUSINESS_NAME})).scalar()
+        table = f'"{user_id}/{BUSINESS_NAME} Storico vino"'
+        await session.execute(sql_text(f"""
+            CREATE TABLE {table} (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                wine_name TEXT,
+                current_stock INTEGER,
+                history JSONB,
+                first_movement_date TIMESTAMP,
+                last_movement_date TIMESTAMP,
+                total_consumi INTEGER DEFAULT 0,
+                total_rifornimenti INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        # Movimento i: vino i % WINES, data a ritroso fino a DAYS giorni, tipo alternato
+        await session.execute(sql_text(f"""
+            INSERT INTO {table} (user_id, wine_name, current_stock, history, first_movement_date, last_movement_date)
+            SELECT :user_id, 'Vino ' || w, 50, h.history, h.first_date, h.last_date
+            FROM generate_series(0, :wines - 1) AS w
+            CROSS JOIN LATERAL (
+                SELECT
+                    jsonb_agg(jsonb_build_object(
+                        'date', to_char(m.ts, 'YYYY-MM-DD"T"HH24:MI:SS'),
+                        'type', CASE WHEN m.i % 3 = 0 THEN 'rifornimento' ELSE 'consumo' END,
+                        'quantity', 1 + m.i % 6,
+                        'quantity_before', 40,
+                        'quantity_after', 40 + CASE WHEN m.i % 3 = 0 THEN 1 + m.i % 6 ELSE -(1 + m.i % 6) END
+                    ) ORDER BY m.ts) AS history,
+                    MIN(m.ts) AS first_date,
+                    MAX(m.ts) AS last_date
+                FROM (
+                    SELECT i, LOCALTIMESTAMP - (i * (:days * 86400.0 / :movements)) * INTERVAL '1 second' AS ts
+                    FROM generate_series(w, :movements - 1, :wines) AS i
+                ) m
+            ) h
+        """), {"user_id": user_id, "wines": WINES, "movements": MOVEMENTS, "days": DAYS})
+        await session.commit()
+        return user_id, table
+
+
+async def history_path(user_id: int, table: str, start: date, end: date) -> int:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(sql_text(f"""
+            SELECT wine_name, current_stock, history, total_consumi, total_rifornimenti
+            FROM {table} WHERE user_id = :user_id
+        """), {"user_id": user_id})
+        wines, _, _ = filter_history_movements(result.fetchall(), start, end)
+        return sum(len(w["movements"]) for w in wines)
+
+
+async def ledger_path(user_id: int, table: str, start: date, end: date) -> int:
+    async with AsyncSessionLocal() as session:
+        wines, _, _ = await movements_ledger.period_movements(session, user_id, table, start, end)
+        return sum(w["movements_count"] for w in wines)
+
+
+async def measure(label: str, path, user_id: int, table: str, start: date, end: date) -> str:
+    samples = []
+    found = 0
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        found = await path(user_id, table, start, end)
+        samples.append((time.perf_counter() - t0) * 1000)
+    ordered = sorted(samples)
+    p95 = ordered[max(int(len(ordered) * 0.95) - 1, 0)]
+    return f"{label:8} p50={statistics.median(ordered):8.1f}ms p95={p95:8.1f}ms movimenti={found}"
+
+
+async def main():
+    print(f"{WINES} vini, {MOVEMENTS} movimenti su {DAYS} giorni, {REPEAT} ripetizioni")
+    user_id, table = await create_tenant()
+    try:
+        t0 = time.perf_counter()
+        async with AsyncSessionLocal() as session:
+            if not await movements_ledger.ensure_synced(session, user_id, table):
+                print("❌ Registro movimenti non disponibile")
+                return
+        print(f"Backfill registro: {time.perf_counter() - t0:.2f}s")
+
+        today = date.today()
+        for label, days in PERIODS:
+            start = today - timedelta(days=days)
+            print(f"Periodo {label}:")
+            print("  " + await measure("history", history_path, user_id, table, start, today))
+            print("  " + await measure("ledger", ledger_path, user_id, table, start, today))
+    finally:
+        async with AsyncSessionLocal() as session:
+            await session.execute(sql_text(f"DROP TABLE IF EXISTS {table}"))
+            # wine_movements e wine_movements_sync: ON DELETE CASCADE
+            await session.execute(sql_text("DELETE FROM users WHERE id = :user_id"), {"user_id": user_id})
+            await session.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+"""
+Benchmark filtro movimenti per periodo: history in Python vs push-down SQL (jsonb_array_elements).
+
+Crea una tabella Storico vino temporanea di BENCH_WINES vini e BENCH_MOVEMENTS
+movimenti in totale (default 100.000) distribuiti sugli ultimi BENCH_DAYS giorni.
+Per i periodi oggi / 7 / 30 / 365 giorni misura, per ciascun percorso:
+- byte del risultato ricevuto dal client (righe serializzate in JSON, approssima
+  il trasferito sulla connessione);
+- latenza p50/p95 (query + elaborazione in Python).
+I due percorsi devono restituire gli stessi totali. La tabella viene eliminata alla fine.
+
+Uso:
+    python scripts/bench_movements_pushdown.py
+"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import text as sql_text  # noqa: E402
+
+from app.core.database import AsyncSessionLocal, engine  # noqa: E402
+from app.services.movements_service import filter_history_movements, pushdown_period_movements  # noqa: E402
+
+WINES = int(os.getenv("BENCH_WINES", "200"))
+MOVEMENTS = int(os.getenv("BENCH_MOVEMENTS", "100000"))
+DAYS = int(os.getenv("BENCH_DAYS", "730"))
+REPEAT = int(os.getenv("BENCH_REPEAT", "10"))
+USER_ID = 0
+TABLE = f'"{USER_ID}/Bench Pushdown Storico vino"'
+
+PERIODS = [("oggi", 0), ("7 giorni", 6), ("30 giorni", 29), ("365 giorni", 364)]
+
+
+async def create_table() -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(sql_text(f"DROP TABLE IF EXISTS {TABLE}"))
+        await session.execute(sql_text(f"""
+            CREATE TABLE {TABLE} (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                wine_name TEXT,
+                current_stock INTEGER,
+                history JSONB,
+                total_consumi INTEGER DEFAULT 0,
+                total_rifornimenti INTEGER DEFAULT 0
+            )
+        """))
+        # Movimento i: vino i % WINES, data a ritroso fino a DAYS giorni, tipo alternato
+        await session.execute(sql_text(f"""
+            INSERT INTO {TABLE} (user_id, wine_name, current_stock, history)
+            SELECT :user_id, 'Vino ' || w, 50, h.history
+            FROM generate_series(0, :wines - 1) AS w
+            CROSS JOIN LATERAL (
+                SELECT jsonb_agg(jsonb_build_object(
+                    'date', to_char(m.ts, 'YYYY-MM-DD"T"HH24:MI:SS'),
+                    'type', CASE WHEN m.i % 3 = 0 THEN 'rifornimento' ELSE 'consumo' END,
+                    'quantity', 1 + m.i % 6,
+                    'quantity_before', 40,
+                    'quantity_after', 40 + CASE WHEN m.i % 3 = 0 THEN 1 + m.i % 6 ELSE -(1 + m.i % 6) END
+                ) ORDER BY m.ts) AS history
+                FROM (
+                    SELECT i, LOCALTIMESTAMP - (i * (:days * 86400.0 / :movements)) * INTERVAL '1 second' AS ts
+                    FROM generate_series(w, :movements - 1, :wines) AS i
+                ) m
+            ) h
+        """), {"user_id": USER_ID, "wines": WINES, "movements": MOVEMENTS, "days": DAYS})
+        await session.commit()
+
+
+def payload_bytes(rows) -> int:
+    return sum(len(json.dumps(list(row), default=str)) for row in rows)
+
+
+async def python_path(start: date, end: date) -> tuple:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(sql_text(f"""
+            SELECT wine_name, current_stock, history, total_consumi, total_rifornimenti
+            FROM {TABLE} WHERE user_id = :user_id
+        """), {"user_id": USER_ID})
+        rows = result.fetchall()
+        _, total_consumi, total_rifornimenti = filter_history_movements(rows, start, end)
+        return payload_bytes(rows), total_consumi, total_rifornimenti
+
+
+async def pushdown_path(start: date, end: date) -> tuple:
+    async with AsyncSessionLocal() as session:
+        wines, total_consumi, total_rifornimenti = await pushdown_period_movements(
+            session, USER_ID, TABLE, start, end
+        )
+        rows = [
+            (w["wine_name"], w["current_stock"], w["movements"], w["total_consumi"], w["total_rifornimenti"])
+            for w in wines
+        ]
+        return payload_bytes(rows), total_consumi, total_rifornimenti
+
+
+async def measure(label: str, path, start: date, end: date) -> tuple:
+    samples = []
+    outcome = None
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        outcome = await path(start, end)
+        samples.append((time.perf_counter() - t0) * 1000)
+    ordered = sorted(samples)
+    p95 = ordered[max(int(len(ordered) * 0.95) - 1, 0)]
+    size, total_consumi, total_rifornimenti = outcome
+    print(
+        f"  {label:9} byte={size / 1024:9.1f}KB p50={statistics.median(ordered):8.1f}ms p95={p95:8.1f}ms "
+        f"consumi={total_consumi} rifornimenti={total_rifornimenti}"
+    )
+    return total_consumi, total_rifornimenti
+
+
+async def main():
+    print(f"{WINES} vini, {MOVEMENTS} movimenti su {DAYS} giorni, {REPEAT} ripetizioni")
+    await create_table()
+    try:
+        today = date.today()
+        for label, days in PERIODS:
+            start = today - timedelta(days=days)
+            print(f"Periodo {label}:")
+            expected = await measure("python", python_path, start, today)
+            if await measure("push-down", pushdown_path, start, today) != expected:
+                print("  ❌ Totali diversi tra i due percorsi")
+    finally:
+        async with AsyncSessionLocal() as session:
+            await session.execute(sql_text(f"DROP TABLE IF EXISTS {TABLE}"))
+            await session.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""
+Benchmark ProcessorClient: una ClientSession per chiamata vs sessione condivisa con pool keep-alive.
+
+Avvia in-process un processor stub (aiohttp.web su 127.0.0.1, porta libera) che
+risponde a /process-movement come il processor reale (JSON di successo, latenza
+simulata BENCH_STUB_LATENCY_MS) e invia BENCH_REQUESTS movimenti (default 2000)
+con BENCH_CONCURRENCY chiamate in parallelo (default 50):
+- per_call: una ClientSession aperta e chiusa per richiesta (comportamento
+  precedente: nuova connessione TCP a ogni chiamata);
+- shared: processor_client.process_movement con la sessione condivisa.
+Riporta throughput, latenza p50/p95 e connessioni TCP accettate dallo stub.
+Lo stub è HTTP in chiaro: in produzione (HTTPS) il risparmio include anche
+l'handshake TLS. Nessun accesso al database (la registrazione nel ledger
+dopo i movimenti è disattivata per il benchmark).
+
+Uso:
+    python scripts/bench_processor_session.py
+"""
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import aiohttp  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+from app.core.processor_client import ProcessorClient  # noqa: E402
+
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "2000"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "50"))
+STUB_LATENCY_MS = float(os.getenv("BENCH_STUB_LATENCY_MS", "2"))
+
+
+class StubProcessor:
+    """Processor finto: registra le connessioni TCP (porta client) che ricevono richieste"""
+
+    def __init__(self):
+        self.peers = set()
+
+    @property
+    def connections(self) -> int:
+        return len(self.peers)
+
+    async def process_movement(self, request: web.Request) -> web.Response:
+        self.peers.add(request.transport.get_extra_info("peername"))
+        form = await request.post()
+        await asyncio.sleep(STUB_LATENCY_MS / 1000)
+        return web.json_response({
+            "status": "success",
+            "wine_name": form.get("wine_name"),
+            "quantity_before": 10,
+            "quantity_after": 10 - int(form.get("quantity", 1)),
+        })
+
+    async def start(self) -> web.AppRunner:
+        self.socket = socket.socket()
+        self.socket.bind(("127.0.0.1", 0))
+        self.port = self.socket.getsockname()[1]
+        app = web.Application()
+        app.router.add_post("/process-movement", self.process_movement)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.SockSite(runner, self.socket)
+        await site.start()
+        return runner
+
+
+def movement_form(i: int) -> dict:
+    return {
+        "user_id": 0, "business_name": "Bench", "wine_name": f"Vino {i % 100}",
+        "movement_type": "consumo", "quantity": 1,
+    }
+
+
+async def per_call_request(base_url: str, i: int) -> dict:
+    """Comportamento precedente: sessione creata e chiusa a ogni chiamata"""
+    timeout = aiohttp.ClientTimeout(total=30.0)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.post(f"{base_url}/process-movement", data=movement_form(i)) as response:
+            response.raise_for_status()
+            return await response.json()
+
+
+async def run(label: str, call, stub: StubProcessor) -> None:
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    samples = []
+    errors = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            t0 = time.perf_counter()
+            result = await call(i)
+            samples.append((time.perf_counter() - t0) * 1000)
+            if result.get("status") != "success":
+                errors += 1
+
+    stub.peers.clear()
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(REQUESTS)))
+    elapsed = time.perf_counter() - t0
+    ordered = sorted(samples)
+    p95 = ordered[max(int(len(ordered) * 0.95) - 1, 0)]
+    print(
+        f"{label:9} {REQUESTS / elapsed:8.0f} req/s p50={statistics.median(ordered):6.1f}ms "
+        f"p95={p95:6.1f}ms connessioni={stub.connections} errori={errors}"
+    )
+
+
+async def main():
+    stub = StubProcessor()
+    runner = await stub.start()
+    base_url = f"http://127.0.0.1:{stub.port}"
+    client = ProcessorClient(base_url=base_url)
+    # Solo HTTP: il decoratore che registra i movimenti nel ledger richiederebbe il database
+    shared_call = ProcessorClient.process_movement.__wrapped__.__wrapped__
+    print(f"{REQUESTS} richieste, concorrenza {CONCURRENCY}, latenza stub {STUB_LATENCY_MS}ms")
+    try:
+        await run("per_call", lambda i: per_call_request(base_url, i), stub)
+        await run("shared", lambda i: shared_call(client, **movement_form(i)), stub)
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,131 @@
+"""
+Benchmark avvio: confronta import di app.main con agent V2 lazy vs eager.
+
+Ogni misura gira in un processo Python nuovo (import a freddo) con
+USE_AGENT_SYSTEM=True. La modalità "eager" riproduce l'avvio precedente agli
+slot lazy: AIServiceV2.__init__ costruiva tutti gli agent e BaseAgent.__init__
+creava il proprio assistant con una chiamata sincrona a
+client.beta.assistants.create. Gli agent attuali non fanno più chiamate di rete
+nel costruttore (assistant risolti da assistant_registry al primo uso): la
+modalità eager costruisce ogni slot e poi ripete la create con il client OpenAI
+sincrono verso un endpoint stub locale (http.server su 127.0.0.1, porta libera)
+che risponde dopo BENCH_ASSISTANT_LATENCY_MS (default 250, round trip tipico
+verso api.openai.com). Il risparmio riportato è quindi costruzione degli agent
++ una create per agent.
+
+Uso:
+    python scripts/bench_startup_import.py            # 5 run per modalità
+    BENCH_STARTUP_RUNS=10 BENCH_ASSISTANT_LATENCY_MS=400 python scripts/bench_startup_import.py
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+RUNS = int(os.getenv("BENCH_STARTUP_RUNS", "5"))
+ASSISTANT_LATENCY_MS = float(os.getenv("BENCH_ASSISTANT_LATENCY_MS", "250"))
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+_CHILD = """
+import os
+import time
+start = time.perf_counter()
+import app.main
+from app.api import chat
+imported = time.perf_counter()
+if {eager} and chat.ai_service_v2 is not None:
+    from openai import OpenAI
+    from app.services.ai_service_v2 import AGENT_SLOTS
+    client = OpenAI(
+        api_key="bench",
+        base_url=os.environ["BENCH_OPENAI_BASE_URL"],
+        default_headers={{"OpenAI-Beta": "assistants=v2"}},
+    )
+    for slot in AGENT_SLOTS:
+        agent = chat.ai_service_v2.get_agent(slot)
+        # Come il vecchio BaseAgent._create_assistant: una create sincrona per agent
+        client.beta.assistants.create(
+            name=agent.name, instructions=agent.instructions, model=agent.model, tools=agent.tools
+        )
+done = time.perf_counter()
+print(f"{{(imported - start) * 1000:.1f}} {{(done - start) * 1000:.1f}}")
+"""
+
+
+class _StubAssistants(BaseHTTPRequestHandler):
+    """POST /v1/assistants: risposta di assistants.create dopo la latenza simulata"""
+
+    created = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(ASSISTANT_LATENCY_MS / 1000)
+        _StubAssistants.created += 1
+        payload = json.dumps({
+            "id": f"asst_bench_{_StubAssistants.created}",
+            "object": "assistant",
+            "created_at": int(time.time()),
+            "name": body.get("name"),
+            "description": None,
+            "model": body.get("model"),
+            "instructions": body.get("instructions"),
+            "tools": body.get("tools") or [],
+            "metadata": {},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _run(eager: bool, base_url: str) -> float:
+    env = dict(os.environ, USE_AGENT_SYSTEM="True", BENCH_OPENAI_BASE_URL=base_url)
+    proc = subprocess.run(
+        [sys.executable, "-c", _CHILD.format(eager=eager)],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        print(proc.stderr)
+        sys.exit(1)
+    # L'ultima riga è la misura, le precedenti sono log dell'app
+    _, total_ms = proc.stdout.strip().splitlines()[-1].split()
+    return float(total_ms)
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubAssistants)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    print(f"Latenza simulata assistants.create: {ASSISTANT_LATENCY_MS:.0f}ms")
+
+    results = {}
+    try:
+        for label, eager in (("lazy", False), ("eager", True)):
+            samples = [_run(eager, base_url) for _ in range(RUNS)]
+            results[label] = samples
+            print(
+                f"{label:6} n={RUNS} p50={statistics.median(samples):.1f}ms "
+                f"min={min(samples):.1f}ms max={max(samples):.1f}ms"
+            )
+    finally:
+        server.shutdown()
+
+    saved = statistics.median(results["eager"]) - statistics.median(results["lazy"])
+    print(f"\nAssistant creati dallo stub (modalità eager): {_StubAssistants.created}")
+    print(f"Risparmio mediano all'avvio: {saved:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
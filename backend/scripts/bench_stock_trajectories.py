@@ -0,0 +1,106 @@
+"""
+Benchmark traiettorie di stock: ciclo Python per vino vs calcolo batch NumPy (compute_trajectories).
+
+Genera in memoria le righe del rollup giornaliero di BENCH_WINES vini
+(default 500) su BENCH_DAYS giorni (default 365), con un movimento per vino
+nel BENCH_DENSITY dei giorni, e calcola per tutti i vini stock di apertura e
+chiusura, totali e curva di stock a fine giorno:
+- python: per ogni vino scorre le sue righe e accumula (come la ricostruzione
+  dalle history);
+- numpy: un solo passaggio su array contigui.
+Verifica che i risultati coincidano. Nessun accesso al database.
+
+Uso:
+    python scripts/bench_stock_trajectories.py
+"""
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+
+from app.core.stock_trajectories import compute_trajectories  # noqa: E402
+
+WINES = int(os.getenv("BENCH_WINES", "500"))
+DAYS = int(os.getenv("BENCH_DAYS", "365"))
+DENSITY = float(os.getenv("BENCH_DENSITY", "0.3"))
+REPEAT = int(os.getenv("BENCH_REPEAT", "10"))
+
+
+def python_trajectories(wine_names, current_stock, rows, start_date, end_date):
+    """Riferimento: un vino alla volta, un giorno alla volta"""
+    days = (end_date - start_date).days + 1
+    by_wine = {}
+    for row in rows:
+        by_wine.setdefault(row[0], []).append(row)
+    result = []
+    for i, stock_now in enumerate(current_stock):
+        wine_rows = by_wine.get(i, [])
+        after = sum(r - c for _, offset, c, r in wine_rows if offset >= days)
+        closing = stock_now - after
+        deltas = [0] * days
+        consumi = [0] * days
+        rifornimenti = [0] * days
+        for _, offset, c, r in wine_rows:
+            if offset < days:
+                deltas[offset] += r - c
+                consumi[offset] += c
+                rifornimenti[offset] += r
+        opening = closing - sum(deltas)
+        curve = []
+        stock = opening
+        for delta in deltas:
+            stock += delta
+            curve.append(stock)
+        result.append((opening, closing, consumi, rifornimenti, curve))
+    return result
+
+
+def main():
+    rng = random.Random(42)
+    today = date.today()
+    start_date = today - timedelta(days=DAYS - 1)
+    wine_names = [f"Vino {i}" for i in range(WINES)]
+    current_stock = [rng.randint(0, 120) for _ in wine_names]
+    # Righe come le restituisce la query dell'engine: (indice vino, offset giorno, consumi, rifornimenti)
+    rows = []
+    for i in range(WINES):
+        for offset in range(DAYS):
+            if rng.random() < DENSITY:
+                rows.append((i, offset, rng.randint(0, 6), rng.choice((0, 0, 0, 12))))
+    # Il periodo misurato esclude gli ultimi 30 giorni: verifica anche l'ancoraggio allo stock attuale
+    end_date = today - timedelta(days=30)
+    print(f"{WINES} vini, {DAYS} giorni, {len(rows)} righe rollup, {REPEAT} ripetizioni")
+
+    timings = {"python": [], "numpy": []}
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        expected = python_trajectories(wine_names, current_stock, rows, start_date, end_date)
+        timings["python"].append((time.perf_counter() - t0) * 1000)
+
+        # Inclusa la conversione delle righe in matrice int, come nell'engine
+        t0 = time.perf_counter()
+        batch = compute_trajectories(
+            wine_names, current_stock, np.array(rows, dtype=np.int64), start_date, end_date, "day"
+        )
+        timings["numpy"].append((time.perf_counter() - t0) * 1000)
+
+    actual = [
+        (w["opening_stock"], w["closing_stock"], w["consumi"], w["rifornimenti"], w["stock"])
+        for w in batch["wines"]
+    ]
+    for label, samples in timings.items():
+        ordered = sorted(samples)
+        p95 = ordered[max(int(len(ordered) * 0.95) - 1, 0)]
+        print(f"{label:7} p50={statistics.median(ordered):9.1f}ms p95={p95:9.1f}ms")
+    print("✅ Risultati identici" if actual == expected else "❌ Risultati diversi")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Benchmark storage tenant: una tabella INVENTARIO per tenant vs tabella condivisa
+partizionata per hash(user_id).
+
+Crea BENCH_TENANTS tenant sintetici (default 1.000) con BENCH_ROWS_PER_TENANT
+vini ciascuno nello schema temporaneo bench_tenancy, in entrambi i layout, e
+per ciascuno misura:
+- dimensione del catalogo: relazioni create e crescita di pg_class/pg_attribute/
+  pg_type/pg_depend/pg_index;
+- hit rate della cache dei prepared statement: LRU da STATEMENT_CACHE_SIZE testi
+  SQL per connessione, come la cache del dialetto asyncpg di SQLAlchemy
+  (prepared_statement_cache_size=100);
+- latenza p50/p95 di BENCH_QUERIES letture inventario su tenant casuali, sulla
+  stessa connessione (i miss pagano parse/plan del prepare).
+Lo schema viene eliminato alla fine.
+
+Uso:
+    python scripts/bench_tenant_storage.py
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import text as sql_text  # noqa: E402
+
+from app.core.database import engine  # noqa: E402
+
+TENANTS = int(os.getenv("BENCH_TENANTS", "1000"))
+ROWS_PER_TENANT = int(os.getenv("BENCH_ROWS_PER_TENANT", "50"))
+QUERIES = int(os.getenv("BENCH_QUERIES", "5000"))
+PARTITIONS = int(os.getenv("BENCH_PARTITIONS", "16"))
+STATEMENT_CACHE_SIZE = 100
+SCHEMA = "bench_tenancy"
+
+COLUMNS = """
+    user_id INTEGER NOT NULL,
+    name TEXT, producer TEXT, vintage INTEGER, wine_type TEXT,
+    quantity INTEGER DEFAULT 0, selling_price FLOAT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+"""
+ROWS_SQL = """
+    SELECT {user_id}, 'Vino ' || i, 'Produttore ' || (i % 20), 2005 + i % 18,
+           CASE WHEN i % 2 = 0 THEN 'Rosso' ELSE 'Bianco' END, i % 30, 10 + i % 90
+    FROM generate_series(1, {rows}) AS i
+"""
+READ_SQL = "SELECT * FROM {table} WHERE user_id = :user_id ORDER BY name LIMIT 20"
+
+CATALOG_TABLES = ("pg_class", "pg_attribute", "pg_type", "pg_depend", "pg_index")
+
+
+def per_tenant_table(user_id: int) -> str:
+    return f'{SCHEMA}."{user_id}/Bench INVENTARIO"'
+
+
+SHARED_TABLE = f"{SCHEMA}.tenant_inventario"
+
+
+async def catalog_bytes(conn) -> int:
+    sizes = " + ".join(f"pg_total_relation_size('pg_catalog.{name}')" for name in CATALOG_TABLES)
+    return (await conn.execute(sql_text(f"SELECT {sizes}"))).scalar()
+
+
+async def schema_relations(conn) -> int:
+    return (await conn.execute(sql_text("""
+        SELECT COUNT(*) FROM pg_class WHERE relnamespace = to_regnamespace(:schema)
+    """), {"schema": SCHEMA})).scalar()
+
+
+async def create_per_tenant(conn) -> None:
+    for user_id in range(1, TENANTS + 1):
+        table = per_tenant_table(user_id)
+        await conn.execute(sql_text(f"CREATE TABLE {table} (id SERIAL PRIMARY KEY, {COLUMNS})"))
+        await conn.execute(sql_text(
+            f"INSERT INTO {table} (user_id, name, producer, vintage, wine_type, quantity, selling_price) "
+            + ROWS_SQL.format(user_id=user_id, rows=ROWS_PER_TENANT)
+        ))
+        if user_id % 100 == 0:
+            await conn.commit()
+    await conn.commit()
+
+
+async def create_shared(conn) -> None:
+    await conn.execute(sql_text(f"""
+        CREATE TABLE {SHARED_TABLE} (id BIGSERIAL, {COLUMNS}, PRIMARY KEY (user_id, id))
+        PARTITION BY HASH (user_id)
+    """))
+    for remainder in range(PARTITIONS):
+        await conn.execute(sql_text(f"""
+            CREATE TABLE {SHARED_TABLE}_p{remainder} PARTITION OF {SHARED_TABLE}
+            FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})
+        """))
+    await conn.execute(sql_text(f"""
+        INSERT INTO {SHARED_TABLE} (user_id, name, producer, vintage, wine_type, quantity, selling_price)
+        SELECT u, 'Vino ' || i, 'Produttore ' || (i % 20), 2005 + i % 18,
+               CASE WHEN i % 2 = 0 THEN 'Rosso' ELSE 'Bianco' END, i % 30, 10 + i % 90
+        FROM generate_series(1, {TENANTS}) AS u, generate_series(1, {ROWS_PER_TENANT}) AS i
+    """))
+    await conn.execute(sql_text(f"ANALYZE {SHARED_TABLE}"))
+    await conn.commit()
+
+
+def statement_cache_hit_rate(statements: list) -> float:
+    """LRU per testo SQL, come la cache prepared statement del dialetto asyncpg"""
+    cache: OrderedDict = OrderedDict()
+    hits = 0
+    for statement in statements:
+        if statement in cache:
+            hits += 1
+            cache.move_to_end(statement)
+        else:
+            cache[statement] = True
+            if len(cache) > STATEMENT_CACHE_SIZE:
+                cache.popitem(last=False)
+    return hits / len(statements)
+
+
+async def measure(label: str, build, create, tenants_sequence: list) -> None:
+    async with engine.connect() as conn:
+        before_bytes = await catalog_bytes(conn)
+        before_relations = await schema_relations(conn)
+        start = time.perf_counter()
+        await create(conn)
+        setup_seconds = time.perf_counter() - start
+        relations = await schema_relations(conn) - before_relations
+        growth = await catalog_bytes(conn) - before_bytes
+
+    statements = [build(user_id) for user_id in tenants_sequence]
+    hit_rate = statement_cache_hit_rate(statements)
+
+    # Stessa sequenza di tenant per entrambi i layout, su una sola connessione
+    timings = []
+    async with engine.connect() as conn:
+        for user_id, statement in zip(tenants_sequence, statements):
+            start = time.perf_counter()
+            result = await conn.execute(sql_text(statement), {"user_id": user_id})
+            result.fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+        await conn.commit()
+
+    ordered = sorted(timings)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(
+        f"{label:10} relazioni={relations:6d} catalogo +{growth / 1024 / 1024:7.1f}MB "
+        f"setup={setup_seconds:6.1f}s | hit cache statement={hit_rate:6.1%} | "
+        f"p50={statistics.median(ordered):6.2f}ms p95={p95:6.2f}ms"
+    )
+
+
+async def main():
+    rng = random.Random(42)
+    tenants_sequence = [rng.randint(1, TENANTS) for _ in range(QUERIES)]
+    print(f"{TENANTS} tenant x {ROWS_PER_TENANT} vini, {QUERIES} letture, {PARTITIONS} partizioni")
+
+    async with engine.connect() as conn:
+        await conn.execute(sql_text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(sql_text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.commit()
+    try:
+        await measure(
+            "per-tenant", lambda user_id: READ_SQL.format(table=per_tenant_table(user_id)),
+            create_per_tenant, tenants_sequence,
+        )
+        await measure(
+            "condivisa", lambda user_id: READ_SQL.format(table=SHARED_TABLE),
+            create_shared, tenants_sequence,
+        )
+    finally:
+        async with engine.connect() as conn:
+            await conn.execute(sql_text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            await conn.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+"""
+Benchmark upload inventario: file intero in memoria (bytes) vs UploadStream a blocchi.
+
+Scrive un file temporaneo di BENCH_SIZES_MB (default 1,10,40 MB) e lo invia a un
+processor stub in-process (aiohttp.web su 127.0.0.1) che legge il corpo a
+blocchi scartandolo, con ProcessorClient.admin_insert_inventory:
+- bytes: lettura completa del file come faceva l'endpoint admin (file.read());
+- stream: UploadStream sullo stesso file (letto a blocchi di UPLOAD_CHUNK_BYTES).
+Riporta tempo e picco di memoria allocata (tracemalloc) per upload e verifica
+che lo stub abbia ricevuto tutti i byte. Nessun accesso al database.
+
+Uso:
+    python scripts/bench_upload_stream.py
+"""
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiohttp import web  # noqa: E402
+
+from app.core.processor_client import ProcessorClient  # noqa: E402
+from app.core.upload_stream import UploadStream  # noqa: E402
+
+SIZES_MB = [int(size) for size in os.getenv("BENCH_SIZES_MB", "1,10,40").split(",")]
+
+
+class AsyncFile:
+    """File su disco con read/seek asincroni (come UploadFile di Starlette)"""
+
+    def __init__(self, path: str):
+        self.filename = os.path.basename(path)
+        self._file = open(path, "rb")
+
+    async def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    async def seek(self, offset: int) -> None:
+        self._file.seek(offset)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class StubProcessor:
+    """Processor finto: conta i byte ricevuti senza tenerli in memoria"""
+
+    def __init__(self):
+        self.received = 0
+
+    async def insert_inventory(self, request: web.Request) -> web.Response:
+        self.received = 0
+        async for chunk in request.content.iter_chunked(64 * 1024):
+            self.received += len(chunk)
+        return web.json_response({"status": "success", "job_id": "bench"})
+
+    async def start(self) -> web.AppRunner:
+        self.socket = socket.socket()
+        self.socket.bind(("127.0.0.1", 0))
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_post("/admin/insert-inventory", self.insert_inventory)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.SockSite(runner, self.socket).start()
+        return runner
+
+
+async def upload(client: ProcessorClient, path: str, streaming: bool) -> tuple:
+    # Invio senza invalidazioni di cache/catalogo (richiederebbero il database)
+    insert = ProcessorClient.admin_insert_inventory.__wrapped__.__wrapped__
+    source = AsyncFile(path)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        content = UploadStream(source) if streaming else await source.read()
+        result = await insert(client, 0, "Bench", content, source.filename)
+    finally:
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        source.close()
+    return result, elapsed, peak
+
+
+async def main():
+    stub = StubProcessor()
+    runner = await stub.start()
+    client = ProcessorClient(base_url=f"http://127.0.0.1:{stub.socket.getsockname()[1]}")
+    try:
+        for size_mb in SIZES_MB:
+            with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as tmp:
+                line = b"Barolo,Cantina,2019,12,35.00\n"
+                tmp.write(line * (size_mb * 1024 * 1024 // len(line)))
+                path = tmp.name
+            size = os.path.getsize(path)
+            print(f"File {size / 1024 / 1024:.1f}MB:")
+            try:
+                for label, streaming in (("bytes", False), ("stream", True)):
+                    result, elapsed, peak = await upload(client, path, streaming)
+                    complete = "ok" if stub.received >= size and result.get("status") == "success" else "INCOMPLETO"
+                    print(f"  {label:6} {elapsed * 1000:8.1f}ms picco memoria={peak / 1024 / 1024:7.2f}MB ricevuti={complete}")
+            finally:
+                os.unlink(path)
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+"""
+Microbenchmark: conversione di righe inventario in oggetti vino.
+
+Confronta l'idratazione precedente (dict per riga + Wine() dichiarativo +
+setattr campo per campo) con WineRow.from_rows (__slots__, costruito dalla riga
+del driver). Misura CPU (migliore di BENCH_REPEAT esecuzioni) e memoria
+trattenuta (tracemalloc) per BENCH_ROWS righe sintetiche. Non usa il database.
+
+Uso:
+    python scripts/bench_wine_rows.py
+"""
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.database import WINE_FIELDS, Wine, WineRow  # noqa: E402
+
+ROWS = int(os.getenv("BENCH_ROWS", "10000"))
+REPEAT = int(os.getenv("BENCH_REPEAT", "5"))
+
+# Come le righe del driver: accesso per posizione e per attributo
+Row = namedtuple("Row", WINE_FIELDS)
+
+
+def make_rows(n: int) -> list:
+    now = datetime.utcnow()
+    return [
+        Row(i, 1, f"Vino {i}", f"Produttore {i % 300}", 2000 + i % 24, "Nebbiolo", "Piemonte", "Italia",
+            "Rosso", f"Fornitore {i % 40}", "DOCG", i % 60, 6, 12.5, 28.0, 14.0,
+            "Descrizione del vino di prova", None, now, now)
+        for i in range(n)
+    ]
+
+
+def hydrate_orm(rows: list) -> list:
+    """Conversione precedente (get_user_wines / search_wines)"""
+    wines = []
+    for row in rows:
+        wine_dict = {
+            'id': row.id,
+            'user_id': row.user_id,
+            'name': row.name,
+            'producer': row.producer,
+            'vintage': row.vintage,
+            'grape_variety': row.grape_variety,
+            'region': row.region,
+            'country': row.country,
+            'wine_type': row.wine_type,
+            'classification': row.classification,
+            'quantity': row.quantity,
+            'min_quantity': row.min_quantity if hasattr(row, 'min_quantity') else 0,
+            'cost_price': row.cost_price,
+            'selling_price': row.selling_price,
+            'alcohol_content': row.alcohol_content,
+            'description': row.description,
+            'notes': row.notes,
+            'created_at': row.created_at,
+            'updated_at': row.updated_at
+        }
+        wine = Wine()
+        for key, value in wine_dict.items():
+            setattr(wine, key, value)
+        wines.append(wine)
+    return wines
+
+
+def hydrate_rows(rows: list) -> list:
+    return WineRow.from_rows(list(WINE_FIELDS), rows)
+
+
+def measure(label: str, convert, rows: list) -> None:
+    timings = []
+    for _ in range(REPEAT):
+        gc.collect()
+        start = time.perf_counter()
+        convert(rows)
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    wines = convert(rows)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(timings)
+    print(
+        f"{label:10} {best * 1000:8.1f}ms ({best / len(rows) * 1e6:5.2f}µs/riga) | "
+        f"memoria trattenuta {retained / 1024 / 1024:6.2f}MB ({retained / len(rows):5.0f} byte/riga)"
+    )
+    del wines
+
+
+def main():
+    rows = make_rows(ROWS)
+    print(f"{ROWS} righe, migliore di {REPEAT} esecuzioni")
+    measure("Wine ORM", hydrate_orm, rows)
+    measure("WineRow", hydrate_rows, rows)
+
+
+if __name__ == "__main__":
+    main()
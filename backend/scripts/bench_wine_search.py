@@ -0,0 +1,147 @@
+"""
+Benchmark ricerca vini: query legacy (ILIKE + translate per riga) vs indice trigram su search_document.
+
+Crea una tabella INVENTARIO temporanea con BENCH_ROWS vini sintetici (default
+10.000), esegue le stesse ricerche con entrambe le query e stampa p50/p95 e il
+numero di risultati. La tabella viene eliminata alla fine.
+
+Uso:
+    python scripts/bench_wine_search.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import text as sql_text  # noqa: E402
+
+from app.core.database import AsyncSessionLocal, db_manager, engine  # noqa: E402
+from app.core.wine_search import build_search_query, ensure_search_index, forget_search_index  # noqa: E402
+
+ROWS = int(os.getenv("BENCH_ROWS", "10000"))
+REPEAT = int(os.getenv("BENCH_REPEAT", "20"))
+USER_ID = 0
+TABLE_NAME = '"0/Bench Ricerca INVENTARIO"'
+
+TERMS = [
+    "barolo", "brunello di montalcino", "nebbiolo", "rosé", "chianti classico",
+    "gaja", "ca del bosco", "toscana", "2018", "bianchi", "vermentino sardegna", "xyz",
+]
+
+NAMES = ["Barolo", "Barbaresco", "Brunello di Montalcino", "Chianti Classico", "Amarone della Valpolicella",
+         "Vermentino", "Franciacorta Brut", "Prosecco Superiore", "Lugana", "Etna Rosso", "Rosé di Primitivo",
+         "Sagrantino", "Aglianico del Vulture", "Verdicchio", "Gewürztraminer"]
+PRODUCERS = ["Gaja", "Antinori", "Ca' del Bosco", "Tenuta San Guido", "Planeta", "Feudi di San Gregorio",
+             "Bellavista", "Masi", "Frescobaldi", "Cantina Terlano", "Argiolas", "Marchesi di Barolo"]
+GRAPES = ["Nebbiolo", "Sangiovese", "Corvina", "Vermentino", "Chardonnay", "Glera", "Turbiana",
+          "Nerello Mascalese", "Primitivo", "Sagrantino", "Aglianico", "Verdicchio", "Gewürztraminer"]
+REGIONS = ["Piemonte", "Toscana", "Veneto", "Sardegna", "Lombardia", "Sicilia", "Puglia", "Umbria",
+           "Basilicata", "Marche", "Alto Adige"]
+TYPES = ["Rosso", "Bianco", "Rosato", "Spumante"]
+
+
+def _array(values):
+    return "ARRAY[" + ", ".join("'" + v.replace("'", "''") + "'" for v in values) + "]"
+
+
+async def create_table():
+    async with AsyncSessionLocal() as session:
+        await session.execute(sql_text(f"DROP TABLE IF EXISTS {TABLE_NAME}"))
+        await session.execute(sql_text(f"""
+            CREATE TABLE {TABLE_NAME} (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                name TEXT, producer TEXT, supplier TEXT, vintage INTEGER,
+                grape_variety TEXT, region TEXT, country TEXT, wine_type TEXT, classification TEXT,
+                quantity INTEGER DEFAULT 0, min_quantity INTEGER DEFAULT 0,
+                cost_price FLOAT, selling_price FLOAT, alcohol_content FLOAT,
+                description TEXT, notes TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        # Combinazioni deterministiche: indici primi fra loro per variare le tuple
+        await session.execute(sql_text(f"""
+            INSERT INTO {TABLE_NAME}
+                (user_id, name, producer, supplier, vintage, grape_variety, region, country,
+                 wine_type, classification, quantity, cost_price, selling_price)
+            SELECT :user_id,
+                arr.n[1 + i % {len(NAMES)}] || ' ' || i,
+                arr.p[1 + i % {len(PRODUCERS)}],
+                'Distribuzione ' || (i % 40),
+                2005 + i % 18,
+                arr.g[1 + i % {len(GRAPES)}],
+                arr.r[1 + i % {len(REGIONS)}],
+                'Italia',
+                arr.t[1 + i % {len(TYPES)}],
+                CASE WHEN i % 3 = 0 THEN 'DOCG' ELSE 'DOC' END,
+                i % 50,
+                10 + i % 90,
+                20 + i % 180
+            FROM generate_series(1, :rows) AS i
+            CROSS JOIN (
+                SELECT {_array(NAMES)} AS n, {_array(PRODUCERS)} AS p, {_array(GRAPES)} AS g,
+                       {_array(REGIONS)} AS r, {_array(TYPES)} AS t
+            ) AS arr
+        """), {"user_id": USER_ID, "rows": ROWS})
+        await session.commit()
+
+
+async def run_query(query, params) -> tuple[float, int]:
+    async with AsyncSessionLocal() as session:
+        start = time.perf_counter()
+        result = await session.execute(query, params)
+        rows = result.fetchall()
+        return (time.perf_counter() - start) * 1000, len(rows)
+
+
+async def measure(label: str, build) -> list[float]:
+    timings = []
+    for term in TERMS:
+        query, params = build(term)
+        samples = []
+        count = 0
+        for _ in range(REPEAT):
+            elapsed, count = await run_query(query, params)
+            samples.append(elapsed)
+        timings.extend(samples)
+        print(f"  {label:8} {term!r:28} p50={statistics.median(samples):7.2f}ms risultati={count}")
+    return timings
+
+
+def summary(label: str, timings: list[float]) -> str:
+    ordered = sorted(timings)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    return f"{label:8} p50={statistics.median(ordered):7.2f}ms p95={p95:7.2f}ms"
+
+
+async def main():
+    print(f"Creazione tabella con {ROWS} vini...")
+    await create_table()
+    try:
+        legacy = await measure("legacy", lambda term: db_manager._build_legacy_search_query(TABLE_NAME, term, USER_ID, 10))
+
+        async with AsyncSessionLocal() as session:
+            if not await ensure_search_index(session, TABLE_NAME):
+                print("❌ Indice trigram non disponibile (pg_trgm mancante o permessi insufficienti)")
+                return
+            await session.execute(sql_text(f"ANALYZE {TABLE_NAME}"))
+            await session.commit()
+        trigram = await measure("trigram", lambda term: build_search_query(TABLE_NAME, term, USER_ID, 10))
+
+        print(summary("legacy", legacy))
+        print(summary("trigram", trigram))
+    finally:
+        forget_search_index(TABLE_NAME)
+        async with AsyncSessionLocal() as session:
+            await session.execute(sql_text(f"DROP TABLE IF EXISTS {TABLE_NAME}"))
+            await session.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""
+Verifica: un job più lungo della deadline della richiesta arriva comunque allo stato finale.
+
+Lo stream SSE /api/processor/jobs/{job_id}/events resta aperto all'interno della
+richiesta (RequestContext con deadline REQUEST_DEADLINE_SECONDS): il poller di
+job_tracker non deve ereditarne la deadline, altrimenti dopo la scadenza ogni
+get_job_status fallisce con DeadlineExceeded e il job non si aggiorna più.
+
+Avvia in-process un processor stub (aiohttp.web su 127.0.0.1, porta libera) che
+risponde a /status/{job_id} con "processing" per CHECK_JOB_SECONDS (default 3)
+e poi "completed"; la richiesta ha una deadline di CHECK_DEADLINE_SECONDS
+(default 1, in scala rispetto ai 60 secondi di produzione). Si sottoscrive al job
+come job_events e attende lo stato finale. Esce con codice 1 se non arriva.
+Nessun accesso al database.
+
+Uso:
+    python scripts/check_job_tracker_deadline.py
+"""
+import asyncio
+import os
+import socket
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiohttp import web  # noqa: E402
+
+JOB_SECONDS = float(os.getenv("CHECK_JOB_SECONDS", "3"))
+DEADLINE_SECONDS = float(os.getenv("CHECK_DEADLINE_SECONDS", "1"))
+
+# Porta libera nota prima dell'import: processor_client legge PROCESSOR_URL all'avvio
+_socket = socket.socket()
+_socket.bind(("127.0.0.1", 0))
+os.environ["PROCESSOR_URL"] = f"http://127.0.0.1:{_socket.getsockname()[1]}"
+os.environ.setdefault("JOB_POLL_INITIAL_SECONDS", "0.1")
+os.environ.setdefault("JOB_POLL_MAX_SECONDS", "0.3")
+
+from app.core.job_tracker import TERMINAL_STATUSES, job_tracker  # noqa: E402
+from app.core.processor_client import processor_client  # noqa: E402
+from app.core.request_context import RequestContext, _current_request  # noqa: E402
+
+
+class StubProcessor:
+    """Processor finto: job in elaborazione per JOB_SECONDS, poi completato"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.polls = 0
+
+    async def status(self, request: web.Request) -> web.Response:
+        self.polls += 1
+        done = time.monotonic() - self.started >= JOB_SECONDS
+        return web.json_response({
+            "job_id": request.match_info["job_id"],
+            "status": "completed" if done else "processing",
+            "user_id": 1,
+        })
+
+    async def start(self) -> web.AppRunner:
+        app = web.Application()
+        app.router.add_get("/status/{job_id}", self.status)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.SockSite(runner, _socket).start()
+        return runner
+
+
+async def sse_request(job_id: str) -> list:
+    """Come job_events: sottoscrizione dentro il contesto della richiesta fino allo stato finale"""
+    ctx = RequestContext(deadline=time.monotonic() + DEADLINE_SECONDS)
+    token = _current_request.set(ctx)
+    try:
+        queue = job_tracker.subscribe(job_id, 1)
+        statuses = []
+        try:
+            while True:
+                status = await queue.get()
+                statuses.append(status.get("status"))
+                if status.get("status") in TERMINAL_STATUSES:
+                    return statuses
+        finally:
+            job_tracker.unsubscribe(job_id, queue)
+    finally:
+        await ctx.close()
+        _current_request.reset(token)
+
+
+async def main() -> int:
+    stub = StubProcessor()
+    runner = await stub.start()
+    await processor_client.start()
+    timeout = JOB_SECONDS + 5
+    print(f"job {JOB_SECONDS:.1f}s, deadline richiesta {DEADLINE_SECONDS:.1f}s, attesa massima {timeout:.1f}s")
+    try:
+        t0 = time.monotonic()
+        statuses = await asyncio.wait_for(sse_request("job-lungo"), timeout=timeout)
+        print(f"stati ricevuti: {statuses} in {time.monotonic() - t0:.1f}s, poll allo stub: {stub.polls}")
+        return 0 if statuses[-1] == "completed" else 1
+    except asyncio.TimeoutError:
+        print(f"stato finale non ricevuto entro {timeout:.1f}s (poll allo stub: {stub.polls})")
+        return 1
+    finally:
+        await processor_client.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
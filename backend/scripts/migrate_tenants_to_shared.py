@@ -0,0 +1,370 @@
+"""
+Migrazione online dei tenant dalle tabelle per-tenant alle tabelle condivise.
+
+Le tabelle condivise (tenant_tables.SHARED_TABLE_NAMES) sono partizionate per
+hash(user_id) con chiave primaria (user_id, id). Le tabelle per-tenant non
+vengono mai modificate né eliminate: il rollback è sempre possibile.
+
+Fasi (ripetibili e riprendibili, stato in tenant_storage):
+    prepare   crea le tabelle condivise (colonne = unione delle tabelle dei tenant),
+              le partizioni, gli indici e le righe di registro
+    copy      copia incrementale a blocchi (cursore sull'id per tenant e tipo) +
+              righe modificate dall'ultimo passaggio (updated_at); l'app continua
+              a usare le tabelle per-tenant
+    cutover   ultimo passaggio di copy, riconciliazione delle righe eliminate e
+              passaggio del tenant a 'shared'; dopo TENANT_STORAGE_REFRESH_SECONDS
+              (tutti i processi hanno ricaricato il registro) copia le ultime scritture
+    rollback  riporta il tenant a 'per_tenant', ricopia nelle tabelle per-tenant
+              le righe scritte dopo il cutover e svuota la sua parte condivisa
+    status    stato della migrazione
+
+Richiede TENANT_STORAGE_MODE=shared nell'app. Solo i tipi in
+TENANT_SHARED_TABLE_KINDS (o --kinds) vengono migrati: i tipi scritti dal
+processor vanno migrati solo quando il processor scrive sulle tabelle condivise.
+
+Uso:
+    python scripts/migrate_tenants_to_shared.py prepare
+    python scripts/migrate_tenants_to_shared.py copy [--user-id 12 ...] [--batch-size 5000]
+    python scripts/migrate_tenants_to_shared.py cutover [--user-id 12 ...]
+    python scripts/migrate_tenants_to_shared.py rollback --user-id 12
+    python scripts/migrate_tenants_to_shared.py status
+"""
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import text as sql_text  # noqa: E402
+
+from app.core.config import get_settings  # noqa: E402
+from app.core.database import AsyncSessionLocal  # noqa: E402
+from app.core.tenant_tables import (  # noqa: E402
+    INVENTARIO, LOG_INTERAZIONE, SHARED_TABLE_NAMES, STORICO_VINO, CONSUMI_RIFORNIMENTI,
+    STORAGE_PER_TENANT, STORAGE_SHARED, TENANT_TABLE_KINDS,
+    legacy_table_name, migrate_tenant_storage_table,
+)
+
+# Indici secondari delle tabelle condivise (creati solo se le colonne esistono)
+SECONDARY_INDEXES: Dict[str, List[Tuple[str, ...]]] = {
+    INVENTARIO: [("user_id", "name"), ("user_id", "updated_at")],
+    STORICO_VINO: [("user_id", "wine_name")],
+    LOG_INTERAZIONE: [("user_id", "created_at"), ("user_id", "conversation_id")],
+    CONSUMI_RIFORNIMENTI: [("user_id", "movement_date")],
+}
+
+# Al cutover la sequenza condivisa salta avanti di questo margine: le righe scritte
+# sulla tabella per-tenant durante la finestra di refresh non collidono con le nuove
+CUTOVER_ID_GAP = 10_000
+
+
+def _seq_name(shared: str) -> str:
+    return f"{shared}_id_seq"
+
+
+async def _columns(session, table_name: str) -> List[Tuple[str, str]]:
+    """(colonna, tipo) non generate, in ordine; vuoto se la tabella non esiste"""
+    result = await session.execute(sql_text("""
+        SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+        FROM pg_attribute a
+        WHERE a.attrelid = to_regclass(:table_name)
+          AND a.attnum > 0 AND NOT a.attisdropped AND a.attgenerated = ''
+        ORDER BY a.attnum
+    """), {"table_name": table_name})
+    return [(row[0], row[1]) for row in result.fetchall()]
+
+
+async def _tenants(session, user_ids: Optional[List[int]]) -> List[Tuple[int, str]]:
+    query = """
+        SELECT id, business_name FROM users
+        WHERE business_name IS NOT NULL AND business_name != ''
+    """
+    params = {}
+    if user_ids:
+        query += " AND id = ANY(:user_ids)"
+        params["user_ids"] = user_ids
+    result = await session.execute(sql_text(query + " ORDER BY id"), params)
+    return [(row[0], row[1]) for row in result.fetchall()]
+
+
+async def _registry(session, user_id: int) -> Dict:
+    result = await session.execute(sql_text("""
+        SELECT storage_mode, cursors, synced_at, migrated_at FROM tenant_storage WHERE user_id = :user_id
+    """), {"user_id": user_id})
+    row = result.fetchone()
+    if row is None:
+        return {"storage_mode": STORAGE_PER_TENANT, "cursors": {}, "synced_at": None, "migrated_at": None}
+    cursors = row[1] if isinstance(row[1], dict) else json.loads(row[1] or "{}")
+    return {"storage_mode": row[0], "cursors": cursors, "synced_at": row[2], "migrated_at": row[3]}
+
+
+async def _save_registry(session, user_id: int, **fields) -> None:
+    if "cursors" in fields:
+        fields["cursors"] = json.dumps(fields["cursors"])
+    assignments = ", ".join(
+        f"{key} = CAST(:{key} AS JSONB)" if key == "cursors" else f"{key} = :{key}" for key in fields
+    )
+    await session.execute(sql_text("""
+        INSERT INTO tenant_storage (user_id) VALUES (:user_id) ON CONFLICT (user_id) DO NOTHING
+    """), {"user_id": user_id})
+    await session.execute(sql_text(f"""
+        UPDATE tenant_storage SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE user_id = :user_id
+    """), {"user_id": user_id, **fields})
+
+
+async def prepare(kinds: List[str], partitions: int) -> None:
+    async with AsyncSessionLocal() as session:
+        await migrate_tenant_storage_table(session)
+        tenants = await _tenants(session, None)
+
+        for kind in kinds:
+            shared = SHARED_TABLE_NAMES[kind]
+            # Unione delle colonne di tutte le tabelle del tipo (l'ordine segue la prima trovata)
+            union: Dict[str, str] = {}
+            for user_id, business_name in tenants:
+                for name, col_type in await _columns(session, legacy_table_name(user_id, business_name, kind)):
+                    union.setdefault(name, col_type)
+            if "user_id" not in union:
+                print(f"⚠️  {kind}: nessuna tabella per-tenant trovata, skip")
+                continue
+            union["id"] = "BIGINT"
+            if kind == LOG_INTERAZIONE:
+                union.setdefault("conversation_id", "INTEGER")
+
+            seq = _seq_name(shared)
+            await session.execute(sql_text(f"CREATE SEQUENCE IF NOT EXISTS {seq}"))
+            column_defs = ", ".join(
+                f"id BIGINT NOT NULL DEFAULT nextval('{seq}')" if name == "id" else f'"{name}" {col_type}'
+                for name, col_type in union.items()
+            )
+            await session.execute(sql_text(f"""
+                CREATE TABLE IF NOT EXISTS {shared} ({column_defs}, PRIMARY KEY (user_id, id))
+                PARTITION BY HASH (user_id)
+            """))
+            for name, col_type in union.items():
+                await session.execute(sql_text(f'ALTER TABLE {shared} ADD COLUMN IF NOT EXISTS "{name}" {col_type}'))
+            for remainder in range(partitions):
+                await session.execute(sql_text(f"""
+                    CREATE TABLE IF NOT EXISTS {shared}_p{remainder} PARTITION OF {shared}
+                    FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})
+                """))
+            for columns in SECONDARY_INDEXES.get(kind, []):
+                if all(col in union for col in columns):
+                    await session.execute(sql_text(f"""
+                        CREATE INDEX IF NOT EXISTS idx_{shared}_{'_'.join(columns)} ON {shared} ({', '.join(columns)})
+                    """))
+            print(f"✅ {kind}: {shared} ({len(union)} colonne, {partitions} partizioni)")
+
+        await session.execute(sql_text("""
+            INSERT INTO tenant_storage (user_id)
+            SELECT id FROM users WHERE business_name IS NOT NULL AND business_name != ''
+            ON CONFLICT (user_id) DO NOTHING
+        """))
+        await session.commit()
+        print(f"✅ Registro tenant_storage: {len(tenants)} tenant")
+
+
+async def _upsert(session, source: str, target: str, columns: List[str], where: str, params: Dict,
+                  conflict: str = "(user_id, id)", limit: Optional[int] = None) -> List[int]:
+    """Copia righe source → target (stesse colonne), ritorna gli id copiati"""
+    column_list = ", ".join(f'"{col}"' for col in columns)
+    updates = ", ".join(f'"{col}" = EXCLUDED."{col}"' for col in columns if col not in ("id", "user_id"))
+    on_conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+    result = await session.execute(sql_text(f"""
+        INSERT INTO {target} ({column_list})
+        SELECT {column_list} FROM {source}
+        WHERE user_id = :user_id AND {where}
+        ORDER BY id
+        {f'LIMIT {int(limit)}' if limit else ''}
+        ON CONFLICT {conflict} {on_conflict}
+        RETURNING id
+    """), params)
+    return [row[0] for row in result.fetchall()]
+
+
+async def _common_columns(session, legacy: str, shared: str) -> List[str]:
+    shared_columns = {name for name, _ in await _columns(session, shared)}
+    return [name for name, _ in await _columns(session, legacy) if name in shared_columns]
+
+
+async def _bump_sequence(session, shared: str, max_id: int, gap: int = 0) -> None:
+    seq = _seq_name(shared)
+    await session.execute(sql_text(f"""
+        SELECT setval('{seq}', GREATEST((SELECT last_value FROM {seq}), :max_id + :gap))
+    """), {"max_id": max_id, "gap": gap})
+
+
+async def copy_tenant(user_id: int, business_name: str, kinds: List[str], batch_size: int) -> Dict[str, int]:
+    """Un passaggio di copia incrementale: righe nuove (cursore id) + righe modificate (updated_at)"""
+    copied: Dict[str, int] = {}
+    async with AsyncSessionLocal() as session:
+        registry = await _registry(session, user_id)
+        cursors = registry["cursors"]
+        since = registry["synced_at"]
+        mode = STORAGE_SHARED if registry["storage_mode"] == STORAGE_SHARED else "copying"
+        pass_started = (await session.execute(sql_text("SELECT LOCALTIMESTAMP"))).scalar()
+
+        for kind in kinds:
+            legacy = legacy_table_name(user_id, business_name, kind)
+            shared = SHARED_TABLE_NAMES[kind]
+            columns = await _common_columns(session, legacy, shared)
+            if "id" not in columns:
+                continue
+            cursor = int(cursors.get(kind, 0))
+            total = 0
+            while True:
+                ids = await _upsert(
+                    session, legacy, shared, columns, "id > :cursor",
+                    {"user_id": user_id, "cursor": cursor}, limit=batch_size,
+                )
+                if not ids:
+                    break
+                cursor = max(ids)
+                cursors[kind] = cursor
+                total += len(ids)
+                await _bump_sequence(session, shared, cursor)
+                # Un commit per blocco: la copia riprende dal cursore salvato
+                await _save_registry(session, user_id, cursors=cursors, storage_mode=mode)
+                await session.commit()
+            if since is not None and "updated_at" in columns:
+                total += len(await _upsert(
+                    session, legacy, shared, columns, "id <= :cursor AND updated_at >= :since",
+                    {"user_id": user_id, "cursor": cursor, "since": since},
+                ))
+            copied[kind] = total
+
+        await _save_registry(session, user_id, cursors=cursors, synced_at=pass_started)
+        await session.commit()
+    return copied
+
+
+async def _reconcile_deletes(session, user_id: int, business_name: str, kinds: List[str]) -> int:
+    deleted = 0
+    for kind in kinds:
+        legacy = legacy_table_name(user_id, business_name, kind)
+        result = await session.execute(sql_text(f"""
+            DELETE FROM {SHARED_TABLE_NAMES[kind]} s
+            WHERE s.user_id = :user_id
+              AND NOT EXISTS (SELECT 1 FROM {legacy} l WHERE l.user_id = :user_id AND l.id = s.id)
+        """), {"user_id": user_id})
+        deleted += result.rowcount or 0
+    return deleted
+
+
+async def cutover(tenants: List[Tuple[int, str]], kinds: List[str], batch_size: int, refresh_seconds: float) -> None:
+    switched = []
+    for user_id, business_name in tenants:
+        copied = await copy_tenant(user_id, business_name, kinds, batch_size)
+        async with AsyncSessionLocal() as session:
+            deleted = await _reconcile_deletes(session, user_id, business_name, kinds)
+            for kind in kinds:
+                cursor = (await _registry(session, user_id))["cursors"].get(kind, 0)
+                await _bump_sequence(session, SHARED_TABLE_NAMES[kind], int(cursor), CUTOVER_ID_GAP)
+            await _save_registry(session, user_id, storage_mode=STORAGE_SHARED)
+            await session.execute(sql_text("""
+                UPDATE tenant_storage SET migrated_at = CURRENT_TIMESTAMP WHERE user_id = :user_id
+            """), {"user_id": user_id})
+            await session.commit()
+        switched.append((user_id, business_name))
+        print(f"✅ user_id={user_id}: cutover (copiate {copied}, eliminate {deleted})")
+
+    if not switched:
+        return
+    # Scritture arrivate alle tabelle per-tenant prima che i processi ricaricassero il registro
+    print(f"⏳ Attesa refresh registro ({refresh_seconds:.0f}s) per le ultime scritture...")
+    await asyncio.sleep(refresh_seconds + 1)
+    for user_id, business_name in switched:
+        copied = await copy_tenant(user_id, business_name, kinds, batch_size)
+        if any(copied.values()):
+            print(f"   user_id={user_id}: recuperate {copied}")
+
+
+async def rollback(tenants: List[Tuple[int, str]], kinds: List[str], refresh_seconds: float) -> None:
+    async with AsyncSessionLocal() as session:
+        for user_id, _ in tenants:
+            await _save_registry(session, user_id, storage_mode=STORAGE_PER_TENANT)
+        await session.commit()
+    print(f"⏳ Attesa refresh registro ({refresh_seconds:.0f}s)...")
+    await asyncio.sleep(refresh_seconds + 1)
+
+    for user_id, business_name in tenants:
+        async with AsyncSessionLocal() as session:
+            registry = await _registry(session, user_id)
+            restored = {}
+            for kind in kinds:
+                legacy = legacy_table_name(user_id, business_name, kind)
+                shared = SHARED_TABLE_NAMES[kind]
+                columns = await _common_columns(session, legacy, shared)
+                if "id" not in columns:
+                    continue
+                where = "id > :cursor"
+                params = {"user_id": user_id, "cursor": int(registry["cursors"].get(kind, 0))}
+                if registry["migrated_at"] is not None and "updated_at" in columns:
+                    where = "(id > :cursor OR updated_at >= :migrated_at)"
+                    params["migrated_at"] = registry["migrated_at"]
+                # Le tabelle per-tenant hanno chiave primaria su id
+                restored[kind] = len(await _upsert(session, shared, legacy, columns, where, params, conflict="(id)"))
+                await session.execute(sql_text(f"DELETE FROM {shared} WHERE user_id = :user_id"), {"user_id": user_id})
+            await _save_registry(session, user_id, cursors={}, synced_at=None, migrated_at=None)
+            await session.commit()
+        print(f"↩️  user_id={user_id}: rollback (righe ricopiate {restored})")
+
+
+async def status(user_ids: Optional[List[int]]) -> None:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(sql_text("""
+            SELECT storage_mode, COUNT(*) FROM tenant_storage GROUP BY storage_mode ORDER BY storage_mode
+        """))
+        for mode, count in result.fetchall():
+            print(f"{mode:12} {count}")
+        for user_id in user_ids or []:
+            print(f"user_id={user_id}: {await _registry(session, user_id)}")
+
+
+async def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Migrazione tenant verso tabelle condivise")
+    parser.add_argument("command", choices=["prepare", "copy", "cutover", "rollback", "status"])
+    parser.add_argument("--user-id", type=int, action="append", dest="user_ids",
+                        help="Limita ai tenant indicati (ripetibile)")
+    parser.add_argument("--kinds", default=settings.TENANT_SHARED_TABLE_KINDS,
+                        help="Tipi tabella comma-separated (default: TENANT_SHARED_TABLE_KINDS)")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    unknown = [kind for kind in kinds if kind not in TENANT_TABLE_KINDS]
+    if unknown:
+        parser.error(f"tipi tabella sconosciuti: {unknown}")
+    if settings.TENANT_STORAGE_MODE != STORAGE_SHARED and args.command in ("cutover", "rollback"):
+        print("⚠️  TENANT_STORAGE_MODE non è 'shared': l'app continuerà a usare le tabelle per-tenant")
+
+    if args.command == "prepare":
+        await prepare(kinds, settings.TENANT_SHARED_PARTITIONS)
+    elif args.command == "status":
+        await status(args.user_ids)
+    else:
+        if args.command == "rollback" and not args.user_ids:
+            parser.error("rollback richiede --user-id")
+        async with AsyncSessionLocal() as session:
+            tenants = await _tenants(session, args.user_ids)
+            if args.command != "rollback":
+                # I tenant già condivisi scrivono solo sulle tabelle condivise: niente da copiare
+                tenants = [
+                    (user_id, business_name) for user_id, business_name in tenants
+                    if (await _registry(session, user_id))["storage_mode"] != STORAGE_SHARED
+                ]
+        if args.command == "copy":
+            for user_id, business_name in tenants:
+                print(f"user_id={user_id}: copiate {await copy_tenant(user_id, business_name, kinds, args.batch_size)}")
+        elif args.command == "cutover":
+            await cutover(tenants, kinds, args.batch_size, settings.TENANT_STORAGE_REFRESH_SECONDS)
+        else:
+            await rollback(tenants, kinds, settings.TENANT_STORAGE_REFRESH_SECONDS)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""
+Ricostruisce il rollup giornaliero dei movimenti (wine_movements_daily) da wine_movements.
+
+Il rollup si aggiorna da solo a ogni sincronizzazione del registro movimenti;
+lo script serve dopo correzioni manuali del registro o per verificare/riallineare
+i tenant. Per ogni tenant allinea prima il registro allo Storico vino, poi
+ricalcola tutti i giorni.
+
+Uso:
+    python scripts/rebuild_movements_rollup.py [--user-id 12 ...]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import text as sql_text  # noqa: E402
+
+from app.core.database import AsyncSessionLocal, engine  # noqa: E402
+from app.core.movements_ledger import migrate_movements_ledger_tables, movements_ledger  # noqa: E402
+from app.core.movements_rollup import migrate_movements_rollup_table, movements_rollup  # noqa: E402
+from app.core.tenant_tables import STORICO_VINO, tenant_table, tenant_tables  # noqa: E402
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Ricostruzione rollup giornaliero movimenti")
+    parser.add_argument("--user-id", type=int, action="append", dest="user_ids",
+                        help="Limita ai tenant indicati (ripetibile)")
+    args = parser.parse_args()
+
+    async with AsyncSessionLocal() as session:
+        await migrate_movements_ledger_tables(session)
+        await migrate_movements_rollup_table(session)
+        await session.commit()
+        if tenant_tables.enabled:
+            await tenant_tables.refresh(session)
+        query = """
+            SELECT id, business_name FROM users
+            WHERE business_name IS NOT NULL AND business_name != ''
+        """
+        params = {}
+        if args.user_ids:
+            query += " AND id = ANY(:user_ids)"
+            params["user_ids"] = args.user_ids
+        tenants = (await session.execute(sql_text(query + " ORDER BY id"), params)).fetchall()
+
+    rebuilt = 0
+    try:
+        for user_id, business_name in tenants:
+            start = time.perf_counter()
+            async with AsyncSessionLocal() as session:
+                if not await movements_ledger.ensure_synced(
+                    session, user_id, tenant_table(user_id, business_name, STORICO_VINO)
+                ):
+                    print(f"⚠️  user_id={user_id}: registro movimenti non disponibile, rollup non ricostruito")
+                    continue
+                await movements_rollup.rebuild(session, user_id)
+                days = (await session.execute(
+                    sql_text("SELECT COUNT(*) FROM wine_movements_daily WHERE user_id = :user_id"),
+                    {"user_id": user_id}
+                )).scalar()
+                await session.commit()
+            rebuilt += 1
+            print(f"✅ user_id={user_id}: {days} righe (vino, giorno) ({time.perf_counter() - start:.2f}s)")
+    finally:
+        await engine.dispose()
+    print(f"Tenant ricostruiti: {rebuilt}/{len(tenants)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())